@@ -272,8 +272,11 @@ class CommandSequencer(object):
                 print "fyi: instantiating registered non-built-in command %r" % (actual_class,)
                 self._instantiate_cached_command( actual_class)
 
-        # todo: something to support lazily loaded/instantiated commands
-        # (make self._commandTable a dictlike object that loads on demand?)
+        # note: if the debug_pref for loading most commands lazily is set,
+        # preloaded_command_classes leaves out most builtin commands; they
+        # are loaded and instantiated on first use by _load_command_lazily.
+        # (todo: make self._commandTable a dictlike object that loads on
+        #  demand?) [2009]
 
         ## self.start_using_initial_mode( '$DEFAULT_MODE')
         #bruce 050911 removed this; now we leave it at nullmode,
@@ -416,8 +419,9 @@ class CommandSequencer(object):
     def register_command_class(self, commandName, command_class): #bruce 080805
         """
         Cause this command class to be instantiated by the next call
-        of self._reinit_modes, or [nim] the next time something needs
-        to look up a command object for commandName.
+        of self._reinit_modes, or the next time something needs
+        to look up a command object for commandName (if none is
+        instantiated by then).
         """
         assert command_class.commandName == commandName
         self._registered_command_classes[commandName] = command_class
@@ -571,8 +575,12 @@ class CommandSequencer(object):
                 commandName = self.startup_commandName() # might be '$DEFAULT_MODE'
             if commandName == '$DEFAULT_MODE':
                 commandName = self.default_commandName()
-            # todo: provision for lazy instantiation, if not already in _commandTable
-            return self._commandTable[ commandName]
+            try:
+                return self._commandTable[ commandName]
+            except KeyError:
+                # not preloaded (or registered since the last _reinit_modes);
+                # load it now, or raise KeyError if it's unknown [2009]
+                return self._load_command_lazily( commandName)
         else:
             # assume it's a command object; make sure it's legit
             command = commandName_or_obj
@@ -590,6 +598,26 @@ class CommandSequencer(object):
             return command
         pass
 
+    def _load_command_lazily(self, commandName): #2009
+        """
+        [private helper for _find_command_instance]
+
+        Instantiate and return a command object for commandName, which was
+        not instantiated by _reinit_modes (since it was registered later,
+        or since it is a builtin command we load only on first use).
+
+        Raise KeyError if there is no such command.
+        """
+        command_class = self._registered_command_classes.get(commandName)
+        if command_class is None:
+            from commandSequencer.builtin_command_loaders import load_builtin_command_class
+            command_class = load_builtin_command_class(commandName)
+        if command_class is None:
+            raise KeyError(commandName)
+        if _DEBUG_CSEQ_INIT:
+            print "_DEBUG_CSEQ_INIT: lazily instantiating %r" % (command_class,)
+        return self._instantiate_cached_command( command_class)
+
     def _commandName_properties(self, commandName): #bruce 080814
         # STUB -- just use the cached instance for its properties.
         # (Note: if commandName is a command object, this method just returns that object.
@@ -1,9 +1,9 @@
-# Copyright 2004-2008 Nanorex, Inc.  See LICENSE file for details. 
+# Copyright 2004-2009 Nanorex, Inc.  See LICENSE file for details. 
 """
 builtin_command_loaders.py -- loaders for NE1 builtin commands, used in order.
 
 @version: $Id$
-@copyright: 2004-2008 Nanorex, Inc.  See LICENSE file for details.
+@copyright: 2004-2009 Nanorex, Inc.  See LICENSE file for details.
 
 Module classification: [bruce 080209]
 
@@ -22,87 +22,188 @@ for purely historical reasons). Semantically it was part
 of the Command Sequencer, and it's now split out of there
 too.
 
+2009: the builtin commands are now described by a table of their
+commandNames, modules and classes, and only imported when needed.
+If the debug_pref "Startup: load most commands on first use
+(next session)?" is set, only the commands in
+_ALWAYS_PRELOADED_COMMANDNAMES are loaded on startup; the Command
+Sequencer loads the others (using load_builtin_command_class) the first
+time it needs them, which saves the time to import them (and their
+property managers and other dependencies) at startup.
+
 TODO:
 
 Refactor the code that uses this data (in Command Sequencer)
 so its _commandTable is a separate object with which
-we register the loading code herein, so it can load
-some commands lazily.
+we register the loading code herein.
 """
 
-from commands.BuildCrystal.BuildCrystal_Command import BuildCrystal_Command 
-from commands.Extrude.extrudeMode import extrudeMode
-from commands.Paste.PasteFromClipboard_Command import PasteFromClipboard_Command
-from commands.PartLibrary.PartLibrary_Command import PartLibrary_Command
-from commands.PlayMovie.movieMode import movieMode
-from commands.PlaneProperties.Plane_EditCommand import Plane_EditCommand
-from commands.RotaryMotorProperties.RotaryMotor_EditCommand import RotaryMotor_EditCommand
-from commands.LinearMotorProperties.LinearMotor_EditCommand import LinearMotor_EditCommand
-from commands.BuildAtoms.BuildAtoms_Command import BuildAtoms_Command
-from commands.SelectAtoms.SelectAtoms_Command import SelectAtoms_Command
-from commands.SelectChunks.SelectChunks_Command import SelectChunks_Command
-from commands.Move.Move_Command import Move_Command
-from commands.Rotate.RotateChunks_Command import RotateChunks_Command
-from commands.Translate.TranslateChunks_Command import TranslateChunks_Command
-from commands.Fuse.FuseChunks_Command import FuseChunks_Command
-from commands.StereoProperties.StereoProperties_Command import StereoProperties_Command
-from commands.TestGraphics.TestGraphics_Command import TestGraphics_Command
-from commands.ColorScheme.ColorScheme_Command import ColorScheme_Command
-from commands.LightingScheme.LightingScheme_Command import LightingScheme_Command
-from commands.QuteMol.QuteMol_Command import QuteMol_Command
-
-from temporary_commands.ZoomToAreaMode import ZoomToAreaMode
-from temporary_commands.ZoomInOutMode import ZoomInOutMode
-from temporary_commands.PanMode import PanMode
-from temporary_commands.RotateMode import RotateMode
-from temporary_commands.LineMode.Line_Command import Line_Command
-from temporary_commands.RotateAboutPoint_Command import RotateAboutPoint_Command
-
-# Carbon nanotube commands 
-from cnt.commands.BuildNanotube.BuildNanotube_EditCommand import BuildNanotube_EditCommand
-from cnt.commands.InsertNanotube.InsertNanotube_EditCommand import InsertNanotube_EditCommand
-from cnt.commands.EditNanotube.EditNanotube_EditCommand import EditNanotube_EditCommand
-
-# DNA commands
-from dna.commands.BuildDna.BuildDna_EditCommand     import BuildDna_EditCommand
-from dna.commands.InsertDna.InsertDna_EditCommand import InsertDna_EditCommand
-from dna.commands.DnaSegment.DnaSegment_EditCommand import DnaSegment_EditCommand
-from dna.commands.DnaStrand.DnaStrand_EditCommand   import DnaStrand_EditCommand
-from dna.commands.MakeCrossovers.MakeCrossovers_Command import MakeCrossovers_Command
-from dna.commands.BreakStrands.BreakStrands_Command import BreakStrands_Command
-from dna.commands.JoinStrands.JoinStrands_Command import JoinStrands_Command
-from dna.commands.OrderDna.OrderDna_Command       import OrderDna_Command
-from dna.commands.DnaDisplayStyle.DnaDisplayStyle_Command import DnaDisplayStyle_Command
-from dna.commands.MultipleDnaSegmentResize.MultipleDnaSegmentResize_EditCommand import MultipleDnaSegmentResize_EditCommand
-from dna.temporary_commands.DnaLineMode             import DnaLineMode
-from dna.commands.JoinStrands.ClickToJoinStrands_Command import ClickToJoinStrands_Command
-from dna.commands.JoinStrands.JoinStrands_By_DND_RequestCommand import JoinStrands_By_DND_RequestCommand
-from dna.commands.ConvertDna.ConvertDna_Command import ConvertDna_Command
-
-# Protein commands
-from protein.commands.InsertPeptide.InsertPeptide_EditCommand import InsertPeptide_EditCommand
-from protein.commands.ProteinDisplayStyle.ProteinDisplayStyle_Command import ProteinDisplayStyle_Command
-from protein.commands.EditProtein.EditProtein_Command import EditProtein_Command
-from protein.commands.EditResidues.EditResidues_Command import EditResidues_Command
-from protein.commands.CompareProteins.CompareProteins_Command import CompareProteins_Command
-
-from protein.commands.BuildProtein.BuildProtein_Command import BuildProtein_Command
-from protein.commands.BuildProtein.ModelProtein_Command import ModelProtein_Command
-from protein.commands.BuildProtein.SimulateProtein_Command import SimulateProtein_Command
-from protein.commands.FixedBBProteinSim.FixedBBProteinSim_Command import FixedBBProteinSim_Command
-from protein.commands.BackrubProteinSim.BackrubProteinSim_Command import BackrubProteinSim_Command
-
-# Graphene commands 
-from commands.InsertGraphene.Graphene_EditCommand import Graphene_EditCommand
-
-from commands.BuildAtoms.BondTool_Command import SingleBondTool
-from commands.BuildAtoms.BondTool_Command import DoubleBondTool
-from commands.BuildAtoms.BondTool_Command import TripleBondTool
-from commands.BuildAtoms.BondTool_Command import AromaticBondTool
-from commands.BuildAtoms.BondTool_Command import GraphiticBondTool
-from commands.BuildAtoms.BondTool_Command import DeleteBondTool
-from commands.BuildAtoms.BondTool_Command import BondTool_Command
-from commands.BuildAtoms.AtomsTool_Command import AtomsTool_Command
+from utilities.debug_prefs import debug_pref, Choice_boolean_False
+
+
+# (commandName, module name, class name) for all builtin commands
+# (or unsplit modes), in order of desired instantiation
+# (see preloaded_command_classes for why that order matters)
+_BUILTIN_COMMANDS = [
+    ( 'SELECTMOLS',
+      'commands.SelectChunks.SelectChunks_Command', 'SelectChunks_Command' ),
+    ( 'SELECTATOMS',
+      'commands.SelectAtoms.SelectAtoms_Command', 'SelectAtoms_Command' ),
+    ( 'DEPOSIT',
+      'commands.BuildAtoms.BuildAtoms_Command', 'BuildAtoms_Command' ),
+    ( 'MODIFY',
+      'commands.Move.Move_Command', 'Move_Command' ),
+    ( 'CRYSTAL',
+      'commands.BuildCrystal.BuildCrystal_Command', 'BuildCrystal_Command' ),
+    ( 'EXTRUDE',
+      'commands.Extrude.extrudeMode', 'extrudeMode' ),
+    ( 'MOVIE',
+      'commands.PlayMovie.movieMode', 'movieMode' ),
+    ( 'ZOOMTOAREA',
+      'temporary_commands.ZoomToAreaMode', 'ZoomToAreaMode' ),
+    ( 'ZOOMINOUT',
+      'temporary_commands.ZoomInOutMode', 'ZoomInOutMode' ),
+    ( 'PAN',
+      'temporary_commands.PanMode', 'PanMode' ),
+    ( 'ROTATE',
+      'temporary_commands.RotateMode', 'RotateMode' ),
+    ( 'PASTE',
+      'commands.Paste.PasteFromClipboard_Command', 'PasteFromClipboard_Command' ),
+    ( 'PARTLIB',
+      'commands.PartLibrary.PartLibrary_Command', 'PartLibrary_Command' ),
+    ( 'Line_Command',
+      'temporary_commands.LineMode.Line_Command', 'Line_Command' ),
+    ( 'DNA_LINE_MODE',
+      'dna.temporary_commands.DnaLineMode', 'DnaLineMode' ),
+    ( 'INSERT_DNA',
+      'dna.commands.InsertDna.InsertDna_EditCommand', 'InsertDna_EditCommand' ),
+    ( 'REFERENCE_PLANE',
+      'commands.PlaneProperties.Plane_EditCommand', 'Plane_EditCommand' ),
+    ( 'LINEAR_MOTOR',
+      'commands.LinearMotorProperties.LinearMotor_EditCommand', 'LinearMotor_EditCommand' ),
+    ( 'ROTARY_MOTOR',
+      'commands.RotaryMotorProperties.RotaryMotor_EditCommand', 'RotaryMotor_EditCommand' ),
+    ( 'BREAK_STRANDS',
+      'dna.commands.BreakStrands.BreakStrands_Command', 'BreakStrands_Command' ),
+    ( 'JOIN_STRANDS',
+      'dna.commands.JoinStrands.JoinStrands_Command', 'JoinStrands_Command' ),
+    ( 'CLICK_TO_JOIN_STRANDS',
+      'dna.commands.JoinStrands.ClickToJoinStrands_Command', 'ClickToJoinStrands_Command' ),
+    ( 'JoinStrands_By_DND',
+      'dna.commands.JoinStrands.JoinStrands_By_DND_RequestCommand', 'JoinStrands_By_DND_RequestCommand' ),
+    ( 'MAKE_CROSSOVERS',
+      'dna.commands.MakeCrossovers.MakeCrossovers_Command', 'MakeCrossovers_Command' ),
+    ( 'BUILD_DNA',
+      'dna.commands.BuildDna.BuildDna_EditCommand', 'BuildDna_EditCommand' ),
+    ( 'DNA_SEGMENT',
+      'dna.commands.DnaSegment.DnaSegment_EditCommand', 'DnaSegment_EditCommand' ),
+    ( 'DNA_STRAND',
+      'dna.commands.DnaStrand.DnaStrand_EditCommand', 'DnaStrand_EditCommand' ),
+    ( 'MULTIPLE_DNA_SEGMENT_RESIZE',
+      'dna.commands.MultipleDnaSegmentResize.MultipleDnaSegmentResize_EditCommand', 'MultipleDnaSegmentResize_EditCommand' ),
+    ( 'ORDER_DNA',
+      'dna.commands.OrderDna.OrderDna_Command', 'OrderDna_Command' ),
+    ( 'CONVERT_DNA',
+      'dna.commands.ConvertDna.ConvertDna_Command', 'ConvertDna_Command' ),
+    ( 'EDIT_DNA_DISPLAY_STYLE',
+      'dna.commands.DnaDisplayStyle.DnaDisplayStyle_Command', 'DnaDisplayStyle_Command' ),
+    ( 'BUILD_NANOTUBE',
+      'cnt.commands.BuildNanotube.BuildNanotube_EditCommand', 'BuildNanotube_EditCommand' ),
+    ( 'INSERT_NANOTUBE',
+      'cnt.commands.InsertNanotube.InsertNanotube_EditCommand', 'InsertNanotube_EditCommand' ),
+    ( 'EDIT_NANOTUBE',
+      'cnt.commands.EditNanotube.EditNanotube_EditCommand', 'EditNanotube_EditCommand' ),
+    ( 'BUILD_GRAPHENE',
+      'commands.InsertGraphene.Graphene_EditCommand', 'Graphene_EditCommand' ),
+    ( 'ROTATE_CHUNKS',
+      'commands.Rotate.RotateChunks_Command', 'RotateChunks_Command' ),
+    ( 'TRANSLATE_CHUNKS',
+      'commands.Translate.TranslateChunks_Command', 'TranslateChunks_Command' ),
+    ( 'FUSECHUNKS',
+      'commands.Fuse.FuseChunks_Command', 'FuseChunks_Command' ),
+    ( 'RotateAboutPoint',
+      'temporary_commands.RotateAboutPoint_Command', 'RotateAboutPoint_Command' ),
+    ( 'STEREO_PROPERTIES',
+      'commands.StereoProperties.StereoProperties_Command', 'StereoProperties_Command' ),
+    ( 'TEST_GRAPHICS',
+      'commands.TestGraphics.TestGraphics_Command', 'TestGraphics_Command' ),
+    ( 'QUTEMOL',
+      'commands.QuteMol.QuteMol_Command', 'QuteMol_Command' ),
+    ( 'COLOR_SCHEME',
+      'commands.ColorScheme.ColorScheme_Command', 'ColorScheme_Command' ),
+    ( 'INSERT_PEPTIDE',
+      'protein.commands.InsertPeptide.InsertPeptide_EditCommand', 'InsertPeptide_EditCommand' ),
+    ( 'EDIT_PROTEIN_DISPLAY_STYLE',
+      'protein.commands.ProteinDisplayStyle.ProteinDisplayStyle_Command', 'ProteinDisplayStyle_Command' ),
+    ( 'LIGHTING_SCHEME',
+      'commands.LightingScheme.LightingScheme_Command', 'LightingScheme_Command' ),
+    ( 'EDIT_PROTEIN',
+      'protein.commands.EditProtein.EditProtein_Command', 'EditProtein_Command' ),
+    ( 'EDIT_RESIDUES',
+      'protein.commands.EditResidues.EditResidues_Command', 'EditResidues_Command' ),
+    ( 'COMPARE_PROTEINS',
+      'protein.commands.CompareProteins.CompareProteins_Command', 'CompareProteins_Command' ),
+    ( 'MODEL_PROTEIN',
+      'protein.commands.BuildProtein.ModelProtein_Command', 'ModelProtein_Command' ),
+    ( 'SIMULATE_PROTEIN',
+      'protein.commands.BuildProtein.SimulateProtein_Command', 'SimulateProtein_Command' ),
+    ( 'BUILD_PROTEIN',
+      'protein.commands.BuildProtein.BuildProtein_Command', 'BuildProtein_Command' ),
+    ( 'FIXED_BACKBONE_PROTEIN_SEQUENCE_DESIGN',
+      'protein.commands.FixedBBProteinSim.FixedBBProteinSim_Command', 'FixedBBProteinSim_Command' ),
+    ( 'BACKRUB_PROTEIN_SEQUENCE_DESIGN',
+      'protein.commands.BackrubProteinSim.BackrubProteinSim_Command', 'BackrubProteinSim_Command' ),
+    ( 'SINGLE_BOND_TOOL',
+      'commands.BuildAtoms.BondTool_Command', 'SingleBondTool' ),
+    ( 'DOUBLE_BOND_TOOL',
+      'commands.BuildAtoms.BondTool_Command', 'DoubleBondTool' ),
+    ( 'TRIPLE_BOND_TOOL',
+      'commands.BuildAtoms.BondTool_Command', 'TripleBondTool' ),
+    ( 'AROMATIC_BOND_TOOL',
+      'commands.BuildAtoms.BondTool_Command', 'AromaticBondTool' ),
+    ( 'GRAPHITIC_BOND_TOOL',
+      'commands.BuildAtoms.BondTool_Command', 'GraphiticBondTool' ),
+    ( 'DELETE_BOND_TOOL',
+      'commands.BuildAtoms.BondTool_Command', 'DeleteBondTool' ),
+    ( 'ATOMS_TOOL',
+      'commands.BuildAtoms.AtomsTool_Command', 'AtomsTool_Command' ),
+    ( 'BOND_TOOL',
+      'commands.BuildAtoms.BondTool_Command', 'BondTool_Command' ),
+]
+
+# commandNames of the builtin commands which are loaded on startup
+# even when the others are loaded lazily (the usual default and startup
+# commands, and the temporary commands used for viewing)
+_ALWAYS_PRELOADED_COMMANDNAMES = [
+    'SELECTMOLS',
+    'SELECTATOMS',
+    'DEPOSIT',
+    'MODIFY',
+    'ZOOMTOAREA',
+    'ZOOMINOUT',
+    'PAN',
+    'ROTATE',
+]
+
+_load_commands_lazily = None # set on first use, and fixed for the session
+
+def _pref_load_commands_lazily():
+    """
+    Should we load only some builtin commands on startup,
+    and the others on first use? (Only read once per session.)
+    """
+    global _load_commands_lazily
+    if _load_commands_lazily is None:
+        _load_commands_lazily = debug_pref(
+            "Startup: load most commands on first use (next session)?",
+            Choice_boolean_False,
+            non_debug = True,
+            prefs_key = True )
+    return _load_commands_lazily
+
+def _import_command_class(module_name, class_name):
+    module = __import__(module_name, globals(), locals(), [class_name])
+    return getattr(module, class_name)
 
 def preloaded_command_classes():
     """
@@ -110,9 +211,9 @@ def preloaded_command_classes():
     on startup, and should always be reinitialized (in this order)
     when new command objects are needed.
 
-    @note: currently this includes all loadable builtin commands,
-           but soon we will implement a way for some commands to be
-           loaded lazily, and remove many commands from this list.
+    @note: this includes all builtin commands unless the debug_pref for
+           loading most commands lazily is set; then the others are loaded
+           by load_builtin_command_class when first needed.
 
     @note: commands should be initialized in this order, in case this makes
            some bugs deterministic. In theory, any order should work (and it's
@@ -122,77 +223,33 @@ def preloaded_command_classes():
            deterministic, even at the cost of failing to detect our own
            order-dependency bugs if any creep in.
     """
-    # classes for builtin commands (or unsplit modes) which were preloaded
-    # by toplevel imports above, in order of desired instantiation:
-    command_classes = [
-        SelectChunks_Command, 
-        SelectAtoms_Command,
-        BuildAtoms_Command,
-        Move_Command,
-        BuildCrystal_Command, 
-        extrudeMode, 
-        movieMode, 
-        ZoomToAreaMode, 
-        ZoomInOutMode,
-        PanMode, 
-        RotateMode, 
-        PasteFromClipboard_Command, 
-        PartLibrary_Command, 
-        Line_Command, 
-        DnaLineMode, 
-        InsertDna_EditCommand,
-        Plane_EditCommand,
-        LinearMotor_EditCommand,
-        RotaryMotor_EditCommand,
-        BreakStrands_Command,
-        JoinStrands_Command,
-        ClickToJoinStrands_Command,
-        JoinStrands_By_DND_RequestCommand,
-        MakeCrossovers_Command,
-        BuildDna_EditCommand,
-        DnaSegment_EditCommand, 
-        DnaStrand_EditCommand,
-        MultipleDnaSegmentResize_EditCommand,
-        OrderDna_Command,
-        ConvertDna_Command,
-        DnaDisplayStyle_Command,
-        BuildNanotube_EditCommand,
-        InsertNanotube_EditCommand,
-        EditNanotube_EditCommand, 
-        Graphene_EditCommand,
-        RotateChunks_Command,
-        TranslateChunks_Command, 
-        FuseChunks_Command,
-        RotateAboutPoint_Command,        
-        StereoProperties_Command,
-        TestGraphics_Command,
-        QuteMol_Command,
-        ColorScheme_Command,
-        InsertPeptide_EditCommand,
-        ProteinDisplayStyle_Command,
-        LightingScheme_Command,
-        EditProtein_Command,
-        EditResidues_Command,
-        CompareProteins_Command,
-        ModelProtein_Command,
-        SimulateProtein_Command,
-        BuildProtein_Command,
-        FixedBBProteinSim_Command,
-        BackrubProteinSim_Command,
-        #Tools in Build Atoms command --
-        SingleBondTool,
-        DoubleBondTool,
-        TripleBondTool,
-        AromaticBondTool,
-        GraphiticBondTool,
-        DeleteBondTool, 
-        AtomsTool_Command, 
-        BondTool_Command
-    ]
+    lazily = _pref_load_commands_lazily()
+    command_classes = []
+    for commandName, module_name, class_name in _BUILTIN_COMMANDS:
+        if lazily and commandName not in _ALWAYS_PRELOADED_COMMANDNAMES:
+            continue
+        command_class = _import_command_class(module_name, class_name)
+        assert command_class.commandName == commandName
+        command_classes.append(command_class)
+        continue
     
     # note: we could extract each one's commandName (class constant)
     # if we wanted to return them as commandName, commandClass pairs
     return command_classes
 
-# end
+def load_builtin_command_class(commandName):
+    """
+    Import and return the class of the builtin command with the given
+    commandName, or return None if there is no such builtin command.
+
+    This is used by the Command Sequencer for commands which were not
+    returned by preloaded_command_classes.
+    """
+    for commandName1, module_name, class_name in _BUILTIN_COMMANDS:
+        if commandName1 == commandName:
+            command_class = _import_command_class(module_name, class_name)
+            assert command_class.commandName == commandName
+            return command_class
+    return None
 
+# end
@@ -40,6 +40,8 @@ keep that member around in CSDL.
 """
 
 from Numeric import dot, floor
+from Numeric import array, take, nonzero, sqrt, add, Int, Float
+from Numeric import matrixmultiply, logical_and, logical_or
 
 from geometry.VQT import vlen, V
 from OpenGL.GL import glNewList, glEndList, glCallList
@@ -47,6 +49,7 @@ from OpenGL.GL import GL_COMPILE_AND_EXECUTE
 
 from graphics.drawing.drawers import drawCircle
 from graphics.drawing.drawers import genDiam
+from graphics.drawing.drawers import genDiamPairBlocks
 from graphics.drawing.CS_draw_primitives import drawcylinder
 from graphics.drawing.CS_draw_primitives import drawsphere
 from graphics.drawing.CS_draw_primitives import drawline
@@ -102,6 +105,18 @@ class _Circle(simple_shape_2d):
         else:
             return False
 
+    def isin_many(self, pts):
+        """
+        Like isin, but for a Numeric array of N 3d points at once;
+        return an array of N booleans.
+        """
+        p, inside = self.project_2d_many(pts)
+        if self.slab:
+            inside = logical_and(inside, self.slab.isin_many(pts))
+        delta = p - self.cirCenter
+        dist = sqrt(add.reduce(delta * delta, 1))
+        return logical_and(inside, dist <= self.rad)
+
     def _computeBBox(self):
         """
         Construct the 3D bounding box for this volume.
@@ -273,6 +288,50 @@ class CrystalShape(shape):
     def _hashAtomPos(self, pos):
         return int(dot(V(1000000, 1000, 1), floor(pos * 1.2)))
 
+    def _hashAtomPositions(self, positions):
+        """
+        Return a list of the values of self._hashAtomPos for each row of
+        positions, a Numeric array of shape (N, 3).
+        """
+        # note: astype(Int) truncates toward zero, like int()
+        hashes = matrixmultiply(floor(positions * 1.2),
+                                array([1000000, 1000, 1], Float))
+        return hashes.astype(Int).tolist()
+
+    def _lattice_pairs_touching(self, c):
+        """
+        Generate all lattice bond pairs (as in genDiam) near curve c,
+        having at least one end inside c, as tuples
+        (pp, ppInside, pph), where pp is the pair of positions,
+        ppInside says whether each one is inside c, and pph has the
+        _hashAtomPos values of both.
+
+        The positions of each block of lattice pairs are tested by
+        c.isin_many and hashed all at once, so only the pairs
+        touching c are handled one at a time.
+        """
+        bblo, bbhi = c.bbox.data[1], c.bbox.data[0]
+        #Without +(-) 1.6, crystal for lonsdaileite may not be right
+        for p0, p1 in genDiamPairBlocks(bblo - 1.6, bbhi + 1.6,
+                                        self.latticeType):
+            in0 = c.isin_many(p0)
+            in1 = c.isin_many(p1)
+            touching = nonzero(logical_or(in0, in1))
+            if not len(touching):
+                continue
+            p0 = take(p0, touching)
+            p1 = take(p1, touching)
+            in0 = take(in0, touching).tolist()
+            in1 = take(in1, touching).tolist()
+            h0 = self._hashAtomPositions(p0)
+            h1 = self._hashAtomPositions(p1)
+            for k in xrange(len(touching)):
+                yield ( (p0[k], p1[k]),
+                        [not not in0[k], not not in1[k]],
+                        [h0[k], h1[k]] )
+            continue
+        return
+
     def _addCurve(self, layer, c):
         """
         Add curve into its own layer, update the bbox
@@ -352,9 +411,10 @@ class CrystalShape(shape):
         """
         self.havelist = 0
 
-        bblo, bbhi = c.bbox.data[1], c.bbox.data[0]
-        #Without +(-) 1.6, crystal for lonsdaileite may not be right
-        allCells = genDiam(bblo - 1.6, bbhi + 1.6, self.latticeType)
+        # note: lattice pairs with neither end inside c are never needed
+        # below, so we only iterate over the others (found using array
+        # operations on blocks of the lattice, rather than a Python loop
+        # over every cell of genDiam)
         if self.carbonPosDict.has_key(layer):
             carbons = self.carbonPosDict[layer]
         else:
@@ -371,14 +431,8 @@ class CrystalShape(shape):
                 return
             else:
                 bonds = self.bondLayers[layer]
-                for cell in allCells:
-                    for pp in cell:
-                        ppInside = [False, False]
-                        for ii in range(2):
-                            if c.isin(pp[ii]): 
-                                ppInside[ii] = True
-                        if ppInside[0] or ppInside[1]:
-                            self._logic0Bond(carbons, bonds, markedAtoms, hedrons, ppInside, pp)
+                for pp, ppInside, pph in self._lattice_pairs_touching(c):
+                    self._logic0Bond(carbons, bonds, markedAtoms, hedrons, ppInside, pp)
                 self. _removeMarkedAtoms(bonds, markedAtoms, carbons, hedrons)
 
         elif c.selSense == OUTSIDE_SUBTRACT_FROM_SELECTION:
@@ -390,24 +444,23 @@ class CrystalShape(shape):
             newBonds = {}; newCarbons = {}; newHedrons = {}; 
             insideAtoms = {}
             newStorage = (newBonds, newCarbons, newHedrons)
-            for cell in allCells:
-                for pp in cell:
-                    pph = [None, None]
-                    for ii in range(2):
-                        if c.isin(pp[ii]): 
-                            pph[ii] = self._hashAtomPos(pp[ii])
-                            if bonds.has_key(pph[ii]):
-                                insideAtoms[pph[ii]] = pp[ii]
-
-                    if (not pph[0]) and pph[1] and carbons.has_key(pph[1]):
-                        pph[0] = self._hashAtomPos(pp[0])
-                        if bonds.has_key(pph[0]):
-                            newCarbons[pph[1]] = pp[1]
-                            newHedrons[pph[0]] = pp[0]
-                            if not newBonds.has_key(pph[0]):
-                                newBonds[pph[0]] = [(pph[1], 1)]
-                            else:
-                                newBonds[pph[0]] += [(pph[1], 1)]
+            for pp, ppInside, ppHash in self._lattice_pairs_touching(c):
+                pph = [None, None]
+                for ii in range(2):
+                    if ppInside[ii]: 
+                        pph[ii] = ppHash[ii]
+                        if bonds.has_key(pph[ii]):
+                            insideAtoms[pph[ii]] = pp[ii]
+
+                if (not pph[0]) and pph[1] and carbons.has_key(pph[1]):
+                    pph[0] = ppHash[0]
+                    if bonds.has_key(pph[0]):
+                        newCarbons[pph[1]] = pp[1]
+                        newHedrons[pph[0]] = pp[0]
+                        if not newBonds.has_key(pph[0]):
+                            newBonds[pph[0]] = [(pph[1], 1)]
+                        else:
+                            newBonds[pph[0]] += [(pph[1], 1)]
             if insideAtoms:
                 self._logic2Bond(carbons, bonds, hedrons, insideAtoms, newStorage)
             bonds, carbons, hedrons = newStorage
@@ -417,16 +470,8 @@ class CrystalShape(shape):
                 bonds = self.bondLayers[layer]
             else:
                 bonds = {}
-            for cell in allCells:
-                for pp in cell:
-                    pph=[None, None]
-                    ppInside = [False, False]
-                    for ii in range(2):
-                        pph[ii] = self._hashAtomPos(pp[ii]) 
-                        if c.isin(pp[ii]):
-                            ppInside[ii] = True
-                    if ppInside[0] or ppInside[1]:
-                        self._logic1Bond(carbons, hedrons, bonds, pp, pph, ppInside)
+            for pp, ppInside, pph in self._lattice_pairs_touching(c):
+                self._logic1Bond(carbons, hedrons, bonds, pp, pph, ppInside)
 
         elif c.selSense == START_NEW_SELECTION: 
             # Added to make crystal cutter selection behavior 
@@ -435,16 +480,8 @@ class CrystalShape(shape):
             bonds = {}
             hedrons = {}
 
-            for cell in allCells:
-                for pp in cell:
-                    pph = [None, None]
-                    ppInside = [False, False]
-                    for ii in range(2):
-                        pph[ii] = self._hashAtomPos(pp[ii]) 
-                        if c.isin(pp[ii]):
-                            ppInside[ii] = True
-                    if ppInside[0] or ppInside[1]:
-                        self._logic1Bond(carbons, hedrons, bonds, pp, pph, ppInside)     
+            for pp, ppInside, pph in self._lattice_pairs_touching(c):
+                self._logic1Bond(carbons, hedrons, bonds, pp, pph, ppInside)     
 
         self.bondLayers[layer] = bonds
         self.carbonPosDict[layer] = carbons
@@ -32,6 +32,7 @@ from utilities.constants import diINVISIBLE
 
 from commands.Move.Move_Command import Move_Command
 from commands.Fuse.fusechunksMode import fusechunksBase
+from commands.Fuse.fusechunksMode import FusableBondpointIndex
 
 from commands.Fuse.fusechunksMode import fusechunks_lambda_tol_natoms, fusechunks_lambda_tol_nbonds
 
@@ -82,6 +83,8 @@ class FuseChunks_Command(Move_Command, fusechunksBase):
         # considered overlapping
 
     fuse_mode = '' # The Fuse mode, either 'Make Bonds' or 'Fuse Atoms'.
+
+    _bondpoint_index = None # a FusableBondpointIndex, while we're entered
        
 
     def _create_GraphicsMode(self):
@@ -101,6 +104,10 @@ class FuseChunks_Command(Move_Command, fusechunksBase):
         @see: baseCommand.command_entered() for documentation. 
         """
         super(FuseChunks_Command, self).command_entered()
+        self._bondpoint_index = FusableBondpointIndex()
+            # (its index of unselected bondpoints is made when first needed,
+            #  then reused while dragging, while the unselected chunks
+            #  don't change)
         self.change_fuse_mode(str(self.propMgr.fuseComboBox.currentText()))
             # This maintains state of fuse mode when leaving/reentering mode,
             # and syncs the PM and glpane (and does a gl_update).
@@ -108,6 +115,14 @@ class FuseChunks_Command(Move_Command, fusechunksBase):
         if self.o.assy.selmols:
             self.graphicsMode.something_was_picked = True
 
+    def command_will_exit(self):
+        """
+        Extends superclass method.
+        @see: baseCommand.command_will_exit() for documentation.
+        """
+        self._bondpoint_index = None
+        super(FuseChunks_Command, self).command_will_exit()
+
     def command_enter_misc_actions(self):
         self.w.toolsFuseChunksAction.setChecked(1)
             
@@ -209,7 +224,16 @@ class FuseChunks_Command(Move_Command, fusechunksBase):
         enough to bond with any other bondpoints in a list of chunks.
         Hidden chunks are skipped.
         """
-        tol_str = fusechunksBase.find_bondable_pairs(self, chunk_list, None)
+        if chunk_list is None and self._bondpoint_index is not None:
+            # usual case (e.g. on every redraw while dragging) --
+            # find the same pairs much faster, using a spatial index
+            # of the unselected bondpoints
+            self.bondable_pairs, self.ways_of_bonding = \
+                self._bondpoint_index.find_bondable_pairs(
+                    self.o.assy.molecules, self.tol)
+            tol_str = self._bondable_pairs_tolerance_string()
+        else:
+            tol_str = fusechunksBase.find_bondable_pairs(self, chunk_list, None)
         tolerenceLabel = tol_str
         self.propMgr.toleranceSlider.labelWidget.setText(tolerenceLabel)
 
@@ -2,16 +2,20 @@
 """
 fusechunksMode.py - helpers for Fuse Chunks command and related functionality
 
-NOTE: the only class defined herein is fusechunksBase, so this module
-should be renamed.
+NOTE: the main class defined herein is fusechunksBase, so this module
+should be renamed. It also defines FusableBondpointIndex, used by the
+Fuse Chunks command to find bondable pairs quickly while dragging.
 
 @author: Mark
 @version: $Id$
 @copyright: 2004-2009 Nanorex, Inc.  See LICENSE file for details.
 """
 
+from Numeric import concatenate, zeros, Float, compress, less_equal
+
 import foundation.env as env
 from geometry.VQT import vlen
+from geometry.ArrayNeighborhoodGenerator import ArrayNeighborhoodGenerator
 from model.bonds import bond_at_singlets
 from utilities.Log import orangemsg
 from utilities.constants import diINVISIBLE
@@ -148,6 +152,13 @@ class fusechunksBase:
                                 else:
                                     self.ways_of_bonding[s2.key] = 1
 
+        return self._bondable_pairs_tolerance_string()
+
+    def _bondable_pairs_tolerance_string(self):
+        """
+        Return the tolerance slider label for the current
+        self.bondable_pairs and self.ways_of_bonding.
+        """
         # Update tolerance label and status bar msgs.
         nbonds = len(self.bondable_pairs)
         mbonds, singlets_not_bonded, singlet_pairs = self.multibonds()
@@ -283,4 +294,132 @@ class fusechunksBase:
 
     pass # end of class fusechunksBase
 
+# ==
+
+# Pairs are found using a slightly larger radius than tol, then filtered
+# by distance <= tol, to match the test used in find_bondable_pairs.
+_RADIUS_MARGIN = 0.001
+
+# smallest cell size for FusableBondpointIndex (so tol = 0 is ok)
+_MIN_MAXRADIUS = 0.1
+
+def _chunk_is_visible(chunk):
+    return not (chunk.hidden or chunk.display == diINVISIBLE)
+
+class FusableBondpointIndex:
+    """
+    Find the same bondable pairs of bondpoints as
+    fusechunksBase.find_bondable_pairs does (with its default arguments),
+    quickly enough to do it on every redraw while the selected chunks
+    are being dragged.
+
+    The bondpoints of the visible unselected chunks are kept in a spatial
+    index (an ArrayNeighborhoodGenerator), which is only rebuilt when the
+    set of those chunks changes, or one of them moves or changes its atoms
+    (detected by a change in its atpos array). The pairs found for each
+    selected chunk are remembered until it moves, so only the bondpoints
+    of moving chunks are queried again.
+    """
+    def __init__(self):
+        self._chunks_and_atpos = None # (chunk, atpos) for indexed chunks
+        self._bondpoints = [] # the bondpoints in self._generator, in order
+        self._generator = None
+        self._maxradius = 0.0
+        self._tol = None
+        self._pairs_of_chunk = {} # id(chunk) -> (chunk, atpos, pairs)
+        return
+
+    def find_bondable_pairs(self, chunks, tol):
+        """
+        Return (bondable_pairs, ways_of_bonding) for the given chunks and
+        tolerance, as the values of the attrs of those names which
+        fusechunksBase.find_bondable_pairs would set for the same chunk_list
+        (and the current selection).
+        """
+        selected = []
+        unselected = []
+        for chunk in chunks:
+            if not _chunk_is_visible(chunk):
+                continue
+            if chunk.picked:
+                selected.append(chunk)
+            else:
+                unselected.append(chunk)
+        if tol != self._tol:
+            self._tol = tol
+            self._pairs_of_chunk = {}
+        self._update_index(unselected, tol + _RADIUS_MARGIN)
+
+        bondable_pairs = []
+        pairs_of_chunk = {}
+        for chunk in selected:
+            atpos = chunk.atpos
+            cached = self._pairs_of_chunk.get(id(chunk))
+            if cached is not None and cached[0] is chunk and cached[1] is atpos:
+                pairs = cached[2]
+            else:
+                pairs = self._find_pairs_for_chunk(chunk, tol)
+            pairs_of_chunk[id(chunk)] = (chunk, atpos, pairs)
+            bondable_pairs.extend(pairs)
+        self._pairs_of_chunk = pairs_of_chunk
+
+        ways_of_bonding = {}
+        for s1, s2 in bondable_pairs:
+            ways_of_bonding[s1.key] = ways_of_bonding.get(s1.key, 0) + 1
+            ways_of_bonding[s2.key] = ways_of_bonding.get(s2.key, 0) + 1
+        return bondable_pairs, ways_of_bonding
+
+    def _update_index(self, chunks, radius):
+        """
+        Make sure our spatial index contains the current positions of
+        the bondpoints of the given chunks, and supports queries of the
+        given radius.
+        """
+        chunks_and_atpos = [(chunk, chunk.atpos) for chunk in chunks]
+        if self._generator is not None and radius <= self._maxradius:
+            old = self._chunks_and_atpos
+            if len(old) == len(chunks_and_atpos):
+                for (chunk, atpos), (chunk0, atpos0) in \
+                        zip(chunks_and_atpos, old):
+                    if chunk is not chunk0 or atpos is not atpos0:
+                        break
+                else:
+                    return # still valid
+        bondpoints = []
+        positions = []
+        for chunk in chunks:
+            singlets = chunk.singlets
+            if singlets:
+                bondpoints.extend(singlets)
+                positions.append(chunk.singlpos)
+        if positions:
+            positions = concatenate(positions)
+        else:
+            positions = zeros((0, 3), Float)
+        self._chunks_and_atpos = chunks_and_atpos
+        self._bondpoints = bondpoints
+        self._maxradius = max(radius, _MIN_MAXRADIUS)
+        self._generator = ArrayNeighborhoodGenerator(positions,
+                                                     self._maxradius)
+        self._pairs_of_chunk = {}
+        return
+
+    def _find_pairs_for_chunk(self, chunk, tol):
+        """
+        Return a list of pairs (s1, s2) of a bondpoint s1 of chunk and an
+        indexed bondpoint s2 no farther than tol from it.
+        """
+        singlets = chunk.singlets
+        if not singlets or not self._bondpoints:
+            return []
+        p, j, dist = self._generator.neighbors_of_points(
+            chunk.singlpos, min(tol + _RADIUS_MARGIN, self._maxradius))
+        keep = less_equal(dist, tol)
+        found = zip(compress(keep, p), compress(keep, j))
+        found.sort() # be deterministic
+        bondpoints = self._bondpoints
+        return [(singlets[p1], bondpoints[j1]) for p1, j1 in found]
+
+    pass # end of class FusableBondpointIndex
+
 # end
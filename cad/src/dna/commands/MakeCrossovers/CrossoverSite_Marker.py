@@ -37,9 +37,14 @@ import time
 from utilities.constants import black, banana
 from dna.commands.MakeCrossovers.MakeCrossovers_Handle import MakeCrossovers_Handle
 
-from geometry.VQT import orthodist, norm, vlen, angleBetween
-from Numeric import dot
+from geometry.VQT import orthodist, norm, A
+from geometry.BoundingBox import BBox
+from Numeric import dot, add, sqrt, where, minimum, maximum, arccos, pi
+from Numeric import absolute, less_equal, greater_equal, logical_and
+from Numeric import nonzero, ravel, zeros, Float, NewAxis, array
 from model.bonds import bond_direction
+from dna.model.DnaLadderRailChunk import DnaAxisChunk
+from utilities.Comparison import same_vals
 
 
 from graphics.display_styles.DnaCylinderChunks import get_all_available_dna_base_orientation_indicators
@@ -48,6 +53,7 @@ from exprs.Arrow           import Arrow
 from exprs.Highlightable    import Highlightable
 
 from utilities.prefs_constants import makeCrossoversCommand_crossoverSearch_bet_given_segments_only_prefs_key
+from utilities.prefs_constants import dnaBaseIndicatorsAngle_prefs_key
 
 
 MAX_DISTANCE_BETWEEN_CROSSOVER_SITES = 17
@@ -88,6 +94,11 @@ class CrossoverSite_Marker:
         #also have their neighbor atoms in the self._raw_crossover_atoms_dict
         self._raw_crossover_atoms_with_neighbors_dict = {}
         self._final_crossover_atoms_dict = {} 
+        
+        #Maps (id(dnaSegment), id(neighbor)) to (validity_data, candidates) 
+        #for each pair of segments searched by the last update. 
+        #See self._get_crossover_candidates_bet_segment_pair()
+        self._segment_pair_cache = {}
             
     def update(self):
         """
@@ -165,6 +176,7 @@ class CrossoverSite_Marker:
         #also have their neighbor atoms in the self._raw_crossover_atoms_dict
         self._raw_crossover_atoms_with_neighbors_dict = {}
         self._final_crossover_atoms_dict = {}
+        self._segment_pair_cache = {}
         
     def getAllDnaStrandChunks(self):
         allDnaStrandChunkList = []
@@ -220,16 +232,43 @@ class CrossoverSite_Marker:
         
         segments_to_be_searched = self.command.getSegmentList()
         
+        #Only segments whose strand atoms come within 
+        #MAX_DISTANCE_BETWEEN_CROSSOVER_SITES of each other can have crossover
+        #sites between them, so use a bounding box index to skip all other 
+        #pairs of segments. (When drawing the plane normals for debugging, 
+        #search all pairs as before, since those are drawn for far away
+        #segments too.)
+        if self.graphicsMode.DEBUG_DRAW_PLANE_NORMALS:
+            segment_index = None
+        else:
+            segment_index = DnaSegmentBoxIndex(
+                allSegments, 
+                MAX_DISTANCE_BETWEEN_CROSSOVER_SITES)
+        
+        #Crossover candidates of the segment pairs which didn't move since
+        #the last update are reused from this cache (see 
+        #self._get_crossover_candidates_bet_segment_pair). Entries for pairs 
+        #not searched this time are dropped.
+        old_cache = self._segment_pair_cache
+        self._segment_pair_cache = {}
+        position_data_dict = {}
+        
         for dnaSegment in segments_to_be_searched:             
             self._mark_crossoverSites_bet_segment_and_its_neighbors(
                 dnaSegment, 
                 segments_searched_for_neighbors,
-                allSegments )         
+                allSegments, 
+                segment_index = segment_index,
+                old_cache = old_cache,
+                position_data_dict = position_data_dict )         
         
     def _mark_crossoverSites_bet_segment_and_its_neighbors(self, 
                                                            dnaSegment,
                                                            segments_searched_for_neighbors,
-                                                           allSegments):
+                                                           allSegments,
+                                                           segment_index = None,
+                                                           old_cache = {},
+                                                           position_data_dict = None):
         """
         Identify the crossover sites (crossover atom pairs) between the given
         dnaSegment and all its neighbors (which are also DnaSegments) that fall
@@ -241,7 +280,16 @@ class CrossoverSite_Marker:
         @param segments_searched_for_neighbors: A dictinary object that maintains
         a dictionary of all segments being previously searched for their 
         neighbors.  See a comment below that explains its use.
-        @type segments_searched_for_neighbors: dict                            
+        @type segments_searched_for_neighbors: dict   
+        @param segment_index: If not None, a DnaSegmentBoxIndex of allSegments,
+        used to skip the segments which are too far away from dnaSegment to
+        have any crossover sites with it. 
+        @type segment_index: L{DnaSegmentBoxIndex} or None
+        @param old_cache: the segment pair cache from the previous update
+        @type old_cache: dict
+        @param position_data_dict: a dictionary used to compute 
+        L{_dnaSegment_position_data} only once per segment and update
+        @type position_data_dict: dict
         """
         #First mark the current dna segment in the dictionary 
         #segments_searched_for_neighbors for the following purpose:
@@ -260,18 +308,29 @@ class CrossoverSite_Marker:
         segments_searched_for_neighbors[id(dnaSegment)] = dnaSegment
         end1, end2 = dnaSegment.getAxisEndPoints()
         axisVector = norm(end2 - end1)   
+        
+        if position_data_dict is None:
+            position_data_dict = {}
+
+        if segment_index is not None:
+            #Note: these are in the same order as in allSegments, which 
+            #matters since the crossover sites found first are not searched
+            #again for later neighbors (see self._record_crossover_candidates)
+            neighborSegments = segment_index.segments_near(dnaSegment)
+        else:
+            neighborSegments = allSegments
 
-        #search through allSegments (list) to find neighbors of 'dnaSegment'
-        #Also, skip the 'neighbor' that has already been searched for 'its'
-        #neighbors in the toplevel 'for loop' (see explanation in the 
-        #comment above)
+        #search through neighborSegments (list) to find neighbors of 
+        #'dnaSegment'. Also, skip the 'neighbor' that has already been 
+        #searched for 'its' neighbors in the toplevel 'for loop' (see 
+        #explanation in the comment above)
         #strandChunksOfdnaSegment is computed only once,while searching the 
         #eligible neighbor list. 'strandChunksOfdnaSegment' gives a list
         #of all content strand chunks of the 'dnaSegment' currently being
         #searched for the eligible neighbors. 
         strandChunksOfdnaSegment = []       
                     
-        for neighbor in allSegments:  
+        for neighbor in neighborSegments:  
             if not neighbor is dnaSegment and \
                not segments_searched_for_neighbors.has_key(id(neighbor)):
                 
@@ -290,14 +349,15 @@ class CrossoverSite_Marker:
                     if not strandChunksOfdnaSegment:
                         strandChunksOfdnaSegment = dnaSegment.get_content_strand_chunks()
 
-                    _raw_crossover_atoms_1 = self._find_raw_crossover_atoms(strandChunksOfdnaSegment, orthogonal_vector)
-                    _raw_crossover_atoms_2 = self._find_raw_crossover_atoms(neighbor.get_content_strand_chunks(),
-                                                                            orthogonal_vector)
-
-                    self._find_crossover_atompairs_between_atom_dicts(
-                        _raw_crossover_atoms_1,
-                        _raw_crossover_atoms_2, 
-                        orthogonal_vector)
+                    candidates = self._get_crossover_candidates_bet_segment_pair(
+                        dnaSegment, 
+                        strandChunksOfdnaSegment, 
+                        neighbor, 
+                        orthogonal_vector,
+                        old_cache,
+                        position_data_dict)
+                    
+                    self._record_crossover_candidates(candidates)
                                            
      
     def _neighborSegment_ok_for_crossover_search(
@@ -348,51 +408,71 @@ class CrossoverSite_Marker:
 
         return available_raw_crossover_atoms_dict
 
-    def _find_crossover_atompairs_between_atom_dicts(self, 
-                                                     atom_dict_1, 
-                                                     atom_dict_2, 
-                                                     orthogonal_vector
-                                                     ):
+    def _get_crossover_candidates_bet_segment_pair(self, 
+                                                   dnaSegment, 
+                                                   strandChunksOfdnaSegment,
+                                                   neighbor, 
+                                                   orthogonal_vector,
+                                                   old_cache,
+                                                   position_data_dict):
         """
-        @see: self._filter_neighbor_atompairs()
-        """        
-        crossoverPairs = ()
-        #First filter dictionaries so as to include only those atoms whose
-        #neighbor atoms are also present in that atom_dict  
-        new_atom_dict_1, atomPairsList_1 = self._filter_neighbor_atompairs(
-            atom_dict_1)
-        new_atom_dict_2, atomPairsList_2 = self._filter_neighbor_atompairs(
-            atom_dict_2)     
+        Return the potential crossover sites between dnaSegment and 
+        neighbor, as a tuple (atomPairsList_1, atomPairsList_2, near_pairs)
+        (see self._find_near_crossover_atompairs for details).
         
-        if self.graphicsMode.DEBUG_DRAW_ALL_POTENTIAL_CROSSOVER_SITES:
-            self._base_orientation_indicator_dict.update(new_atom_dict_1)
-            self._base_orientation_indicator_dict.update(new_atom_dict_2)
-
-        for atompair in atomPairsList_1:            
-            crossoverPairs =  self._filter_crossover_atompairs(atompair, 
-                                                               atomPairsList_2,
-                                                               orthogonal_vector)
-
-
-    def _filter_neighbor_atompairs(self, atom_dict):
+        These only depend on the atom positions of both segments, so if 
+        neither of them moved since the last update, they are reused from 
+        old_cache rather than recomputed. (This makes partialUpdate
+        fast while dragging a few segments of a large structure.)
+        
+        @see: self._record_crossover_candidates()
+        """
+        for segment in (dnaSegment, neighbor):
+            if not position_data_dict.has_key(id(segment)):
+                position_data_dict[id(segment)] = \
+                                  _dnaSegment_position_data(segment)
+                
+        key = (id(dnaSegment), id(neighbor))
+        validity_data = (orthogonal_vector, 
+                         position_data_dict[id(dnaSegment)],
+                         position_data_dict[id(neighbor)],
+                         env.prefs[dnaBaseIndicatorsAngle_prefs_key])
+        
+        if old_cache.has_key(key) and \
+           same_vals(old_cache[key][0], validity_data):
+            candidates = old_cache[key][1]
+        else:
+            _raw_crossover_atoms_1 = self._find_raw_crossover_atoms(
+                strandChunksOfdnaSegment, 
+                orthogonal_vector)
+            _raw_crossover_atoms_2 = self._find_raw_crossover_atoms(
+                neighbor.get_content_strand_chunks(),
+                orthogonal_vector)
+            
+            atomPairsList_1 = self._find_neighbor_atompairs(
+                _raw_crossover_atoms_1)
+            atomPairsList_2 = self._find_neighbor_atompairs(
+                _raw_crossover_atoms_2)
+            
+            near_pairs = self._find_near_crossover_atompairs(atomPairsList_1,
+                                                             atomPairsList_2,
+                                                             orthogonal_vector)
+            
+            candidates = (atomPairsList_1, atomPairsList_2, near_pairs)
+            
+        self._segment_pair_cache[key] = (validity_data, candidates)
+        return candidates
+    
+    def _find_neighbor_atompairs(self, atom_dict):
         """
-        @see: self._find_crossover_atompairs_between_atom_dicts()
+        Return a list of pairs of bonded atoms which are both in atom_dict.
+        
+        @see: self._get_crossover_candidates_bet_segment_pair()
         """
-        new_atom_dict = {}
         atomPairsList = []
         for atm in atom_dict.values():           
             for neighbor in atm.neighbors():
                 if atom_dict.has_key(id(neighbor)):
-                    if self._final_crossover_atoms_dict.has_key(id(atm)) and \
-                       self._final_crossover_atoms_dict.has_key(id(neighbor)):                  
-                        continue #skip this iteration
-                    
-                    if self.graphicsMode.DEBUG_DRAW_ALL_POTENTIAL_CROSSOVER_SITES:
-                        if not new_atom_dict.has_key(id(neighbor)):
-                            new_atom_dict[id(neighbor)] = neighbor
-                        if not new_atom_dict.has_key(id(atm)):
-                            new_atom_dict[id(atm)] = atm
-
                     #@@BUG: What if both neighbors of atm are in atom_dict_1??
                     #In that case, this code creates two separate tuples with 
                     #'atm' as a common atom in each. 
@@ -407,72 +487,121 @@ class CrossoverSite_Marker:
                     else:
                         atomPairsList.append((atm, neighbor))
 
-        return new_atom_dict, atomPairsList
-
+        return atomPairsList
 
-    def _filter_crossover_atompairs(self, atomPair, 
-                                    otherAtomPairList,
-                                    orthogonal_vector):
+    def _find_near_crossover_atompairs(self, 
+                                       atomPairsList_1, 
+                                       atomPairsList_2, 
+                                       orthogonal_vector):
         """
-        TODO: REVISE THIS
+        Compare every atom pair in atomPairsList_1 with every atom pair in 
+        atomPairsList_2, using array operations on the centers of all of 
+        them at once. 
+        
+        Return a list of tuples (i, j, center_1, center_2, angle_ok), one for
+        each pair of atom pairs whose centers are no more than 
+        MAX_DISTANCE_BETWEEN_CROSSOVER_SITES apart, in the order of the loop
+        'for i ...: for j ...', where i and j are indices into 
+        atomPairsList_1 and atomPairsList_2, and angle_ok tells whether 
+        they're also within the permitted angle to the orthogonal_vector 
+        (in which case they are a potential crossover site).
         """
+        if not atomPairsList_1 or not atomPairsList_2:
+            return []
         
-        for other_pair in otherAtomPairList:
-            mate_found, distance, pairs = self._are_crossover_atompairs(atomPair, 
-                                                                        other_pair,
-                                                                        orthogonal_vector)
-
-        return None
-
-    def _are_crossover_atompairs(self, 
-                                 atomPair1, 
-                                 atomPair2, 
-                                 orthogonal_vector):
+        centers_1 = _atompair_centers(atomPairsList_1)
+        centers_2 = _atompair_centers(atomPairsList_2)
+        
+        #centerVecs[i, j] is center_1 - center_2 for atom pairs i and j
+        centerVecs = centers_1[:, NewAxis, :] - centers_2[NewAxis, :, :]
+        lensq = add.reduce(centerVecs * centerVecs, -1)
+        distances = sqrt(lensq)
+        dots = add.reduce(centerVecs * orthogonal_vector, -1)
+        
+        #Compute angleBetween(orthogonal_vector, centerVec) for all pairs
+        #(including its special cases)
+        TEENY = 1.0e-10
+        lensq_orthogonal_vector = dot(orthogonal_vector, orthogonal_vector)
+        if lensq_orthogonal_vector < TEENY:
+            thetas = zeros(distances.shape, Float)
+        else:
+            denominators = distances * sqrt(lensq_orthogonal_vector)
+            denominators = where(lensq < TEENY, 1.0, denominators)
+            cosines = minimum(maximum(dots / denominators, -1.0), 1.0)
+            thetas = where(lensq < TEENY, 
+                           0.0,
+                           (180.0 / pi) * arccos(cosines))
+            
+        thetas = where(dots < 1, 180.0 - thetas, thetas)
+        
+        angles_ok = less_equal(
+            absolute(thetas),
+            MAX_ANGLE_BET_PLANE_NORMAL_AND_AVG_CENTER_VECTOR_OF_CROSSOVER_PAIRS)
+        
+        near = less_equal(distances, MAX_DISTANCE_BETWEEN_CROSSOVER_SITES)
+        
+        near_pairs = []
+        m = len(atomPairsList_2)
+        for k in nonzero(ravel(near)):
+            i, j = divmod(k, m)
+            near_pairs.append((i, j, centers_1[i], centers_2[j], 
+                               angles_ok[i, j]))
+        return near_pairs
+    
+    def _record_crossover_candidates(self, candidates):
         """
+        Add the potential crossover sites in candidates (as returned by 
+        self._get_crossover_candidates_bet_segment_pair) to 
+        self.final_crossover_pairs_dict and related dicts, skipping the atom 
+        pairs which are already part of a crossover site found earlier.
         """
-        atm1, neighbor1 = atomPair1
-        center_1 = (atm1.posn() + neighbor1.posn())/2.0
-        atm2, neighbor2 = atomPair2
-        center_2 = (atm2.posn() + neighbor2.posn())/2.0
-
-        distance = vlen(center_1 - center_2)
-        if  distance > MAX_DISTANCE_BETWEEN_CROSSOVER_SITES:
-            return False, distance, ()
-
-        #@NOTE: In self._filter_neighbor_atompairs() where we create the 
-        #atompairlists, we make sure that the atoms are ordered in +ve bond_direction
-        #Below, we just check the relative direction of atoms. 
-
-        #@@@@@METHOD TO BE WRITTEN FURTHER
-
-        centerVec = center_1 - center_2
+        atomPairsList_1, atomPairsList_2, near_pairs = candidates
         
-        if self.graphicsMode.DEBUG_DRAW_AVERAGE_CENTER_PAIRS_OF_POTENTIAL_CROSSOVERS:
-            self._DEBUG_avg_center_pairs_of_potential_crossovers.append((center_1, center_2))
-
-        theta = angleBetween(orthogonal_vector, centerVec)
-
-        if dot(centerVec, orthogonal_vector) < 1:
-            theta = 180.0 - theta
-
-        if abs(theta) > MAX_ANGLE_BET_PLANE_NORMAL_AND_AVG_CENTER_VECTOR_OF_CROSSOVER_PAIRS:
-            return False, distance, ()
-
-        crossoverPairs = (atm1, neighbor1, atm2, neighbor2)
-
-        for a in crossoverPairs:
-            if not self._final_crossover_atoms_dict.has_key(id(a)):
-                self._final_crossover_atoms_dict[id(a)] = a
+        #Skip atom pairs whose atoms are both part of a crossover site 
+        #found earlier. (Note: this is determined once, before adding any of 
+        #the crossover sites found here.)
+        skip_1 = map(self._atompair_is_in_final_crossover_atoms, 
+                     atomPairsList_1)
+        skip_2 = map(self._atompair_is_in_final_crossover_atoms, 
+                     atomPairsList_2)
+        
+        if self.graphicsMode.DEBUG_DRAW_ALL_POTENTIAL_CROSSOVER_SITES:
+            for atomPairsList, skip in ((atomPairsList_1, skip_1), 
+                                        (atomPairsList_2, skip_2)):
+                for k in range(len(atomPairsList)):
+                    if not skip[k]:
+                        for atm in atomPairsList[k]:
+                            self._base_orientation_indicator_dict[id(atm)] = atm
+                            
+        for i, j, center_1, center_2, angle_ok in near_pairs:
+            if skip_1[i] or skip_2[j]:
+                continue
+            
+            if self.graphicsMode.DEBUG_DRAW_AVERAGE_CENTER_PAIRS_OF_POTENTIAL_CROSSOVERS:
+                self._DEBUG_avg_center_pairs_of_potential_crossovers.append((center_1, center_2))
                 
-        #important to sort this to create a unique id. Makes sure that same 
-        #crossover pairs are not added to the self.final_crossover_pairs_dict
-        crossoverPairs_id = self._create_crossoverPairs_id(crossoverPairs)       
-
-        if not self.final_crossover_pairs_dict.has_key(crossoverPairs_id):
-            self._final_avg_center_pairs_for_crossovers_dict[crossoverPairs_id] = (center_1, center_2)
-            self.final_crossover_pairs_dict[crossoverPairs_id] = crossoverPairs
-
-        return True, distance, crossoverPairs
+            if angle_ok:
+                atm1, neighbor1 = atomPairsList_1[i]
+                atm2, neighbor2 = atomPairsList_2[j]
+                crossoverPairs = (atm1, neighbor1, atm2, neighbor2)
+                
+                for a in crossoverPairs:
+                    if not self._final_crossover_atoms_dict.has_key(id(a)):
+                        self._final_crossover_atoms_dict[id(a)] = a
+                        
+                #important to sort this to create a unique id. Makes sure that same 
+                #crossover pairs are not added to the self.final_crossover_pairs_dict
+                crossoverPairs_id = self._create_crossoverPairs_id(crossoverPairs)       
+        
+                if not self.final_crossover_pairs_dict.has_key(crossoverPairs_id):
+                    self._final_avg_center_pairs_for_crossovers_dict[crossoverPairs_id] = (center_1, center_2)
+                    self.final_crossover_pairs_dict[crossoverPairs_id] = crossoverPairs
+        return
+    
+    def _atompair_is_in_final_crossover_atoms(self, atomPair):
+        atm, neighbor = atomPair
+        return self._final_crossover_atoms_dict.has_key(id(atm)) and \
+               self._final_crossover_atoms_dict.has_key(id(neighbor))
     
     def _create_crossoverPairs_id(self, crossoverPairs):
         #important to sort this to create a unique id. Makes sure that same 
@@ -552,4 +681,89 @@ class CrossoverSite_Marker:
         return self._final_crossover_atoms_dict
     
     def get_final_crossover_pairs(self):
-        return self.final_crossover_pairs_dict.values()
\ No newline at end of file
+        return self.final_crossover_pairs_dict.values()
+# ==
+
+class DnaSegmentBoxIndex:
+    """
+    Index a list of DnaSegments by the bounding boxes of their content 
+    strand chunks, stored as arrays, so that all the segments which might 
+    have strand atoms within a given distance of another segment's strand 
+    atoms can be found with a few array operations, rather than by 
+    comparing every pair of segments in python.
+    """
+    def __init__(self, segments, padding):
+        """
+        @param segments: the DnaSegments to index
+        @type segments: list
+        @param padding: the distance within which the strand atoms of 
+                        two segments need to be for them to be 
+                        returned by self.segments_near()
+        @type padding: float
+        """
+        self._padding = padding
+        self._segments = []
+        his = []
+        los = []
+        for segment in segments:
+            data = _dnaSegment_bbox_data(segment)
+            if data is not None:
+                self._segments.append(segment)
+                his.append(data[0])
+                los.append(data[1])
+        if self._segments:
+            self._his = A(his)
+            self._los = A(los)
+        return
+    
+    def segments_near(self, segment):
+        """
+        Return a list of the indexed segments whose strand chunk bounding 
+        boxes are within our padding distance of those of segment
+        (possibly including segment itself), in the order in which they
+        were passed to our constructor.
+        """
+        data = _dnaSegment_bbox_data(segment)
+        if data is None or not self._segments:
+            return []
+        hi = data[0] + self._padding
+        lo = data[1] - self._padding
+        overlaps = logical_and( logical_and.reduce(less_equal(self._los, hi), 1),
+                                logical_and.reduce(greater_equal(self._his, lo), 1) )
+        return [self._segments[i] for i in nonzero(overlaps)]
+    
+    pass
+
+def _dnaSegment_bbox_data(segment):
+    """
+    Return the data of a BBox (i.e. (hi, lo) corners) enclosing all the 
+    content strand chunks of segment, or None if it has none.
+    """
+    bbox = BBox()
+    for chunk in segment.get_content_strand_chunks():
+        bbox.merge(chunk.bbox)
+    return bbox.data
+
+def _dnaSegment_position_data(segment):
+    """
+    Return data which will be the same (according to same_vals) when
+    this is called again for segment if and only if the ladders of segment
+    and the atom positions of all their chunks didn't change in between.
+    """
+    res = []
+    for member in segment.members:
+        if isinstance(member, DnaAxisChunk):
+            ladder = member.ladder
+            for chunk in ladder.all_chunks():
+                res.append( (id(chunk), array(chunk.atpos)) )
+    return res
+
+def _atompair_centers(atomPairsList):
+    """
+    Return an array of the centers of the given pairs of atoms.
+    """
+    posns_1 = A([atm.posn() for atm, neighbor in atomPairsList])
+    posns_2 = A([neighbor.posn() for atm, neighbor in atomPairsList])
+    return (posns_1 + posns_2) / 2.0
+
+# end
@@ -18,11 +18,10 @@ import os
 from math    import sin, cos, pi
 from utilities.debug import print_compact_traceback, print_compact_stack
 from platform_dependent.PlatformDependent import find_plugin_dir
-from files.mmp.files_mmp import readmmp
+from dna.generators.base_pair_template_cache import get_base_pair_template
 from geometry.VQT import Q, V, angleBetween, cross, vlen
 from commands.Fuse.fusechunksMode import fusechunksBase
 from utilities.Log      import orangemsg
-from utilities.exception_classes import PluginBug
 from utilities.constants import gensym
 from utilities.prefs_constants import dnaDefaultStrand1Color_prefs_key
 from utilities.prefs_constants import dnaDefaultStrand2Color_prefs_key
@@ -52,7 +51,7 @@ LEFT_HANDED  =  1
 
 from geometry.VQT import V, Q, norm, cross  
 from geometry.VQT import  vlen
-from Numeric import dot
+from Numeric import dot, array, Float
 
 from utilities.debug import print_compact_stack
 from model.bonds import bond_at_singlets
@@ -1005,8 +1004,8 @@ class Dna_Generator:
         for i in range(numberOfBasePairs):
             basefile, zoffset, thetaOffset = self._strandAinfo(i)
 
-            def tfm(v, theta = theta + thetaOffset, z1 = z + zoffset):
-                return self._rotateTranslateXYZ(v, theta, z1)
+            def tfm(xyz, theta = theta + thetaOffset, z1 = z + zoffset):
+                return self._rotateTranslateXYZ_array(xyz, theta, z1)
 
             #Note that self.baseList gets updated in the the following method
             self._insertBaseFromMmp(basefile, 
@@ -1078,8 +1077,10 @@ class Dna_Generator:
         @param subgroup: The part group to add the atoms to.
         @type  subgroup: L{Group}
 
-        @param tfm: Transform applied to all new base atoms.
-        @type  tfm: V
+        @param tfm: Transform applied to the positions of all new base atoms,
+                    all at once.
+        @type  tfm: function from a Numeric array of shape (N, 3)
+                    to another one
 
         @param baseList: A list that maintains the bases inserted into the 
                          model Example self.baseList
@@ -1093,32 +1094,24 @@ class Dna_Generator:
         #@TODO: The argument baselist ACTUALLY MODIFIES self.baseList. Should we 
         #directly use self.baseList instead? Only comments are added for 
         #now. See also self.make()(the caller)
-        try:
-            ok, grouplist = readmmp(self.assy, filename, isInsert = True)
-        except IOError:
-            raise PluginBug("Cannot read file: " + filename)
-        if not grouplist:
-            raise PluginBug("No atoms in DNA base? " + filename)
+        # The file is only parsed the first time it's needed in this session;
+        # after that we make its atoms from a cached template.
+        template = get_base_pair_template(self.assy, filename,
+                                          self.form, self.model)
 
-        viewdata, mainpart, shelf = grouplist
+        xyz = tfm(template.xyz) + position
 
-        for member in mainpart.members:
+        for member in template.make_chunks(self.assy, xyz):
             # 'member' is a chunk containing a full set of 
             # base-pair pseudo atoms.
 
-            for atm in member.atoms.values():                            
-                atm._posn = tfm(atm._posn) + position
-
             member.name = "BasePairChunk"
             subgroup.addchild(member)
 
             #Append the 'member' to the baseList. Note that this actually 
             #modifies self.baseList. Should self.baseList be directly used here?
             baseList.append(member)
-
-        # Clean up.
-        del viewdata                
-        shelf.kill()
+        return
 
     def _rotateTranslateXYZ(self, inXYZ, theta, z):
         """
@@ -1142,6 +1135,23 @@ class Dna_Generator:
         y = -s * inXYZ[0] + c * inXYZ[1]
         return V(x, y, inXYZ[2] + z)
 
+    def _rotateTranslateXYZ_array(self, inXYZ, theta, z):
+        """
+        Like self._rotateTranslateXYZ, but for an entire array of XYZ
+        coordinates at once.
+
+        @param inXYZ: The original XYZ coordinates.
+        @type  inXYZ: Numeric array of shape (N, 3)
+
+        @return: The new XYZ coordinates.
+        @rtype:  Numeric array of shape (N, 3)
+        """
+        c, s = cos(theta), sin(theta)
+        matrix = array([[c,  -s,  0.0],
+                        [s,   c,  0.0],
+                        [0.0, 0.0, 1.0]], Float)
+        return dot(inXYZ, matrix) + array((0.0, 0.0, z), Float)
+
 
     def fuseBasePairChunks(self, baseList, fuseTolerance = 1.5):
         """
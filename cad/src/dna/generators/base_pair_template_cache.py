@@ -0,0 +1,173 @@
+# Copyright 2009 Nanorex, Inc.  See LICENSE file for details.
+"""
+base_pair_template_cache.py -- process-wide cache of the base (or base-pair)
+templates which Dna_Generator reads from the MMP files in cad/plugins/DNA,
+so each file is parsed once per session rather than once per base-pair.
+
+@version: $Id$
+@copyright: 2009 Nanorex, Inc.  See LICENSE file for details.
+
+A template holds everything needed to recreate the chunks, atoms and bonds
+read from one such file, in a form which doesn't refer to any assembly:
+per-chunk copyable attrs, per-atom atomtypes and other state, an (N, 3)
+array of atom coordinates (in the file's frame), and the bonds as atom
+index pairs with bond order and direction. Making a base-pair from it
+only requires transforming its coordinate array (in one bulk operation)
+and creating the atoms and bonds, with no MMP parsing.
+
+Templates are keyed on (form, model, basename, file mtime),
+so editing a base file during a session makes us read it again.
+"""
+
+import os
+
+from Numeric import array, Float
+
+from files.mmp.files_mmp import readmmp
+from model.chem import Atom
+from model.bonds import bond_atoms_faster
+from foundation.state_utils import copy_val
+from utilities.exception_classes import PluginBug
+
+# maps (form, model, basename, mtime) to a BasePairTemplate
+_template_cache = {}
+
+class _ChunkTemplate:
+    """
+    The data needed to recreate one chunk (not including its atoms).
+    """
+    def __init__(self, chunk):
+        self.chunk_class = chunk.__class__
+        self.copyable_attrs = [(attr, copy_val(getattr(chunk, attr)))
+                               for attr in chunk.copyable_attrs]
+        return
+
+    def make_chunk(self, assy):
+        chunk = self.chunk_class(assy, "")
+        for attr, val in self.copyable_attrs:
+            setattr(chunk, attr, copy_val(val))
+        return chunk
+
+    pass
+
+class BasePairTemplate:
+    """
+    The atoms and bonds of all the chunks in one base (or base-pair) MMP file,
+    independent of any assembly.
+
+    @ivar xyz: atom coordinates, in the same order as self.atom_data.
+    @type xyz: Numeric array of shape (N, 3)
+    """
+    def __init__(self, chunks):
+        """
+        @param chunks: the chunks read from the file (not modified).
+        """
+        self.chunk_templates = []
+        self.atom_data = [] # (chunk index, atomtype, display, info, dnaBaseName, ghost) per atom
+        self.bonds = [] # (atom index 1, atom index 2, v6, direction from atom 1)
+        positions = []
+        index_of_key = {}
+        for chunk in chunks:
+            chunkindex = len(self.chunk_templates)
+            self.chunk_templates.append(_ChunkTemplate(chunk))
+            for atom in chunk.atlist: # (in order of atom.key)
+                index_of_key[atom.key] = len(self.atom_data)
+                self.atom_data.append( (chunkindex,
+                                        atom.atomtype,
+                                        atom.display,
+                                        atom.info,
+                                        atom._dnaBaseName,
+                                        atom.ghost ) )
+                positions.append(atom.posn())
+        for chunk in chunks:
+            for atom in chunk.atlist:
+                for bond in atom.bonds:
+                    other = bond.other(atom)
+                    if atom.key < other.key and other.key in index_of_key:
+                        self.bonds.append( (index_of_key[atom.key],
+                                            index_of_key[other.key],
+                                            bond.v6,
+                                            bond.bond_direction_from(atom) ) )
+        self.xyz = array(positions, Float)
+        self.xyz.shape = (-1, 3) # in case there are no atoms
+        return
+
+    def make_chunks(self, assy, xyz):
+        """
+        Create and return new chunks (not yet in any Group) in assy,
+        like the ones this template was made from, but with atom positions
+        taken from the corresponding rows of xyz.
+
+        @param xyz: new atom positions (e.g. self.xyz after a transform).
+        @type xyz: Numeric array of shape (N, 3)
+        """
+        assert len(xyz) == len(self.atom_data)
+        chunks = [chunk_template.make_chunk(assy)
+                  for chunk_template in self.chunk_templates]
+        atoms = []
+        for (chunkindex, atomtype, display, info, dnaBaseName, ghost), pos in \
+                zip(self.atom_data, xyz):
+            atom = Atom(atomtype, pos, chunks[chunkindex])
+            # (the following is like the end of Atom.copy)
+            if display:
+                atom.display = display
+            if info:
+                atom.info = info
+            if dnaBaseName:
+                atom._dnaBaseName = dnaBaseName
+            if ghost:
+                atom.ghost = ghost
+            atoms.append(atom)
+        for i1, i2, v6, direction in self.bonds:
+            bond = bond_atoms_faster(atoms[i1], atoms[i2], v6)
+            if direction and bond.is_directional():
+                bond.set_bond_direction_from(atoms[i1], direction)
+        return chunks
+
+    pass
+
+def get_base_pair_template(assy, filename, form, model):
+    """
+    Return the BasePairTemplate for the given base (or base-pair) MMP file,
+    reading it (using readmmp, into assy, from which the resulting nodes
+    are then removed) only if it's not already in the cache.
+
+    @param form: e.g. "B-DNA" (part of the cache key).
+    @param model: e.g. "PAM3" (part of the cache key).
+    @raise PluginBug: if the file can't be read or has no atoms.
+    """
+    try:
+        mtime = os.path.getmtime(filename)
+    except OSError:
+        raise PluginBug("Cannot read file: " + filename)
+    basename = os.path.splitext(os.path.basename(filename))[0]
+    key = (form, model, basename, mtime)
+    try:
+        return _template_cache[key]
+    except KeyError:
+        pass
+    try:
+        ok, grouplist = readmmp(assy, filename, isInsert = True)
+    except IOError:
+        raise PluginBug("Cannot read file: " + filename)
+    if not grouplist:
+        raise PluginBug("No atoms in DNA base? " + filename)
+    viewdata, mainpart, shelf = grouplist
+    chunks = list(mainpart.members)
+    template = BasePairTemplate(chunks)
+    # Clean up.
+    for chunk in chunks:
+        chunk.kill()
+    del viewdata
+    shelf.kill()
+    _template_cache[key] = template
+    return template
+
+def clear_base_pair_template_cache():
+    """
+    Forget all cached base-pair templates.
+    """
+    _template_cache.clear()
+    return
+
+# end
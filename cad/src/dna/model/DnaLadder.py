@@ -95,6 +95,8 @@ from dna.model.PAM_atom_rules import PAM_atoms_allowed_in_same_ladder
 
 from dna.updater.dna_updater_prefs import pref_per_ladder_colors
 from dna.updater.dna_updater_prefs import pref_permit_bare_axis_atoms
+from dna.updater.dna_updater_prefs import pref_dna_updater_limit_work_near_changes
+from dna.updater.dna_updater_prefs import MAX_LADDER_LENGTH_WHEN_LIMITING_WORK
 
 from dna.updater.dna_updater_globals import _f_ladders_with_up_to_date_baseframes_at_ends
 from dna.updater.dna_updater_globals import _f_atom_to_ladder_location_dict
@@ -758,7 +760,11 @@ class DnaLadder(object, DnaLadder_pam_conversion_methods):
         # other.valid was checked in rail_end_atom_to_ladder
         if other is self:
             return None
-        if len(self) + len(other) > MAX_LADDER_LENGTH:
+        if pref_dna_updater_limit_work_near_changes():
+            max_length = MAX_LADDER_LENGTH_WHEN_LIMITING_WORK
+        else:
+            max_length = MAX_LADDER_LENGTH
+        if len(self) + len(other) > max_length:
             return None
         # Now a merge is possible and allowed, if all ladder-ends are bonded
         # in either orientation of other, AND if the ladders are compatible
@@ -57,6 +57,8 @@ MAX_LADDER_LENGTH = 500     # @@@@ TODO: also use this to split long ladders
     # (resulting in history-dependence of final state) will be rare.
     #
     # [bruce 080314]
+    #
+    # (See also MAX_LADDER_LENGTH_WHEN_LIMITING_WORK in dna_updater_prefs.py.)
     
 
 # end
@@ -376,7 +376,7 @@ class Fake_Pl(object): #bruce 080327
         # (and fixed a rounding bug, described in encode_atom_coordinates)
         xs, ys, zs = mapping.encode_atom_coordinates( posn )
         print_fields = (num_str, eltnum, xs, ys, zs, disp)
-        mapping.write("atom %s (%d) (%s, %s, %s) %s\n" % print_fields)
+        mapping.write_atom_record(print_fields)
 
         if mapping.write_bonds_compactly:
             # no need to worry about how to write bonds, in this case!
@@ -36,6 +36,9 @@ from dna.updater.dna_updater_ladders import make_new_ladders, merge_and_split_la
 
 from dna.updater.dna_updater_prefs import pref_dna_updater_convert_to_PAM3plus5
 
+from dna.updater.dna_updater_timing import end_phase
+from dna.updater.dna_updater_timing import note_count
+
 from utilities.constants import MODEL_PAM3, MODEL_PAM5
 
 # ==
@@ -122,6 +125,7 @@ def update_PAM_chunks( changed_atoms, homeless_markers):
     ignore_new_changes("from moving DnaMarkers")
         # ignore changes caused by adding/removing marker jigs
         # to their atoms, when the jigs die/move/areborn
+    end_phase("move markers")
     
     # make sure invalid DnaLadders are recognized as such in the next step,
     # and dissolved [possible optim: also recorded for later destroy??].
@@ -159,10 +163,12 @@ def update_PAM_chunks( changed_atoms, homeless_markers):
     # small chains about them.)
 
     ignore_new_changes("from dissolve_or_fragment_invalid_ladders", changes_ok = False)
+    end_phase("dissolve ladders")
     
     axis_chains, strand_chains = find_axis_and_strand_chains_or_rings( changed_atoms)
 
     ignore_new_changes("from find_axis_and_strand_chains_or_rings", changes_ok = False )
+    end_phase("find chains")
 
     if debug_flags.DNA_UPDATER_SLOW_ASSERTS:
         assert_unique_chain_baseatoms(axis_chains + strand_chains)
@@ -190,6 +196,8 @@ def update_PAM_chunks( changed_atoms, homeless_markers):
     all_new_unmerged_ladders = new_axis_ladders + new_singlestrand_ladders
     
     ignore_new_changes("from make_new_ladders", changes_ok = False)
+    end_phase("make ladders")
+    note_count("new_ladders", len(all_new_unmerged_ladders))
 
     if debug_flags.DNA_UPDATER_SLOW_ASSERTS:
         assert_unique_ladder_baseatoms( all_new_unmerged_ladders)
@@ -214,6 +222,7 @@ def update_PAM_chunks( changed_atoms, homeless_markers):
     if default_pam or _f_baseatom_wants_pam:
         #bruce 080523 optim: don't always call this
         _do_pam_conversions( default_pam, all_new_unmerged_ladders )
+        end_phase("pam conversions")
     
     if _f_invalid_dna_ladders:
         #bruce 080413
@@ -237,6 +246,7 @@ def update_PAM_chunks( changed_atoms, homeless_markers):
         # or the result of merging new and old ladders.
 
     ignore_new_changes("from merging/splitting axis ladders", changes_ok = False)
+    end_phase("merge ladders")
 
     del new_axis_ladders
 
@@ -248,6 +258,7 @@ def update_PAM_chunks( changed_atoms, homeless_markers):
         # not sure if singlestrand merge is needed; split is useful though
 
     ignore_new_changes("from merging/splitting singlestrand ladders", changes_ok = False)
+    end_phase("merge ladders")
 
     del new_singlestrand_ladders
 
@@ -257,6 +268,7 @@ def update_PAM_chunks( changed_atoms, homeless_markers):
     _f_clear_invalid_dna_ladders()
     
     merged_ladders = merged_axis_ladders + merged_singlestrand_ladders
+    note_count("merged_ladders", len(merged_ladders))
     
     if debug_flags.DNA_UPDATER_SLOW_ASSERTS:
         assert_unique_ladder_baseatoms( merged_ladders)
@@ -282,6 +294,7 @@ def update_PAM_chunks( changed_atoms, homeless_markers):
     ignore_new_changes("from remake_chunks and _f_reposition_baggage", changes_ok = True)
         # (changes are from parent chunk of atoms changing;
         #  _f_reposition_baggage shouldn't cause any [#test, using separate loop])
+    end_phase("remake chunks")
 
     # Now make new wholechains on all merged_ladders,
     # let them own their atoms and markers (validating any markers found,
@@ -409,6 +422,9 @@ def update_PAM_chunks( changed_atoms, homeless_markers):
         # ignore changes caused by adding/removing marker jigs
         # to their atoms, when the jigs die/move/areborn
         # (in this case, they don't move, but they can die or be born)
+    end_phase("make wholechains and own markers")
+    note_count("new_chunks", len(all_new_chunks))
+    note_count("new_wholechains", len(new_wholechains))
 
     # TODO: use wholechains and markers to revise base indices if needed
     # (if this info is cached outside of wholechains)
@@ -29,6 +29,11 @@ from dna.updater.dna_updater_groups import update_DNA_groups
 from dna.updater.dna_updater_debug import debug_prints_as_dna_updater_starts
 from dna.updater.dna_updater_debug import debug_prints_as_dna_updater_ends
 
+from dna.updater.dna_updater_timing import start_phase_timing
+from dna.updater.dna_updater_timing import end_phase
+from dna.updater.dna_updater_timing import note_count
+from dna.updater.dna_updater_timing import print_phase_timing
+
 from dna.model.DnaMarker import _f_are_there_any_homeless_dna_markers
 from dna.model.DnaMarker import _f_get_homeless_dna_markers
 
@@ -61,9 +66,11 @@ def full_dna_update():
     global _runcount
     _runcount += 1
     clear_updater_run_globals()
+    start_phase_timing()
     try:
         _full_dna_update_0( _runcount) # includes debug_prints_as_dna_updater_starts
     finally:
+        print_phase_timing( _runcount)
         debug_prints_as_dna_updater_ends( _runcount)
         clear_updater_run_globals()
     return
@@ -78,6 +85,8 @@ def _full_dna_update_0( _runcount):
     # - these and their baseatom neighbors in our changed atoms, maybe even real .changed_structure
     
     changed_atoms = get_changes_and_clear()
+    end_phase("get changes")
+    note_count("changed_atoms", len(changed_atoms))
 
     debug_prints_as_dna_updater_starts( _runcount, changed_atoms)
         # note: this function should not modify changed_atoms.
@@ -112,12 +121,14 @@ def _full_dna_update_0( _runcount):
 
     if changed_atoms:
         remove_killed_atoms( changed_atoms) # only affects this dict, not the atoms
+        end_phase("remove killed atoms")
 
     if changed_atoms:
         remove_closed_or_disabled_assy_atoms( changed_atoms)
             # This should remove all remaining atoms from closed files.
             # Note: only allowed when no killed atoms are present in changed_atoms;
             # raises exceptions otherwise.
+        end_phase("remove closed atoms")
         
     if changed_atoms:
         update_PAM_atoms_and_bonds( changed_atoms)
@@ -133,6 +144,7 @@ def _full_dna_update_0( _runcount):
             #  wrong too, since the existence of that upcoming step
             #  might be enough reason to not be able to change the policy yet.
             #  [bruce 080529 addendum/Q])
+        end_phase("update atoms and bonds")
     
     if not changed_atoms and not _f_are_there_any_homeless_dna_markers() and not _f_invalid_dna_ladders:
         return # optimization
@@ -160,6 +172,7 @@ def _full_dna_update_0( _runcount):
         # the underlying nodes we need to place are just chunks and jigs. we can ignore old ones...
         # so we need a list of new or moved ones... chunks got made in update_PAM_chunks; jigs, in update_PAM_atoms_and_bonds...
         # maybe pass some dicts into these for them to add things to?
+    end_phase("update groups")
 
     ignore_new_changes("as full_dna_update returns", changes_ok = False )
 
@@ -47,6 +47,9 @@ def initialize_prefs():
 
     pref_fix_after_readmmp_before_updaters()
     pref_fix_after_readmmp_after_updaters()
+
+    pref_dna_updater_limit_work_near_changes()
+    pref_print_dna_updater_phase_timings()
     
     _update_our_debug_flags('arbitrary value')
         # makes them appear in the menu,
@@ -245,6 +248,38 @@ def pref_dna_updater_slow_asserts(): # 080228; note: accessed using debug_flags.
 
 # ==
 
+MAX_LADDER_LENGTH_WHEN_LIMITING_WORK = 40
+    # used instead of MAX_LADDER_LENGTH when merging ladders, if
+    # pref_dna_updater_limit_work_near_changes is set. Any change to a
+    # ladder's atoms dissolves the entire ladder, so the dna updater must
+    # re-follow its chains, make new ladders from them, merge those, and
+    # remake its chunks; shorter ladders bound that work by the size of the
+    # edit rather than of the structure near it, at the cost of more chunks.
+    # We use 40 (about 4 helical turns of B-DNA) since it's twice the value
+    # MAX_LADDER_LENGTH had for a long time (20) without problems from the
+    # resulting number of chunks, while still keeping the work for one edit
+    # (its own ladder and the ones merged with it) to about 100 base pairs.
+
+def pref_dna_updater_limit_work_near_changes():
+    """
+    Should the dna updater keep the DnaLadders it makes by merging
+    short (MAX_LADDER_LENGTH_WHEN_LIMITING_WORK rather than
+    MAX_LADDER_LENGTH), so that a small edit only dissolves, rescans,
+    re-merges and remakes chunks for the short ladders near it?
+    """
+    res = debug_pref("DNA: limit updater work near changes (shorter ladders)?",
+                     Choice_boolean_False,
+                     prefs_key = True )
+    return res
+
+def pref_print_dna_updater_phase_timings():
+    res = debug_pref("DNA: print updater phase timings?",
+                     Choice_boolean_False,
+                     prefs_key = True )
+    return res
+
+# ==
+
 def _changed_dna_updater_behavior_pref(val):
     if val:
         msg = "Note: to apply new DNA prefs value to existing atoms, " \
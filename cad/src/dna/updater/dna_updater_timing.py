@@ -0,0 +1,120 @@
+# Copyright 2009 Nanorex, Inc.  See LICENSE file for details.
+"""
+dna_updater_timing.py -- measure the time taken by each phase
+of one dna updater run
+
+@version: $Id$
+@copyright: 2009 Nanorex, Inc.  See LICENSE file for details.
+
+Usage: full_dna_update calls start_phase_timing at the start of each run,
+and print_phase_timing at its end; the updater code calls end_phase
+(with a short phase name) after each phase, and note_count with the
+numbers of objects it processed. The timings and counts of the last run
+are available from last_phase_timings and last_counts.
+"""
+
+import time
+
+from dna.updater.dna_updater_prefs import pref_print_dna_updater_phase_timings
+
+# ==
+
+_phase_times = [] # list of (phase name, seconds) for the current run
+_last_phase_times = [] # same, for the last complete run
+_phase_start = None # time the current phase started, or None between runs
+_counts = {} # count name -> number, for the current run
+_last_counts = {} # same, for the last complete run
+
+def start_phase_timing():
+    """
+    Start timing the phases of a new dna updater run.
+    """
+    global _phase_times, _phase_start, _counts
+    _phase_times = []
+    _counts = {}
+    _phase_start = time.time()
+    return
+
+def end_phase(phase_name):
+    """
+    Record the time since the last phase ended (or the run started)
+    as the time taken by the phase with the given name.
+    If the same phase name is used more than once in one run,
+    its times are added.
+    """
+    global _phase_start
+    if _phase_start is None:
+        return # not timing this call (e.g. not called from full_dna_update)
+    now = time.time()
+    _phase_times.append( (phase_name, now - _phase_start) )
+    _phase_start = now
+    return
+
+def print_phase_timing(runcount):
+    """
+    Finish timing the phases of the current dna updater run,
+    and print a summary if the relevant debug_pref is set.
+    """
+    global _phase_times, _last_phase_times, _phase_start
+    global _counts, _last_counts
+    if _phase_start is None:
+        return
+    end_phase("other")
+    _phase_start = None
+    _last_phase_times = _phase_times
+    _phase_times = []
+    _last_counts = _counts
+    _counts = {}
+    if pref_print_dna_updater_phase_timings():
+        print "dna updater run %d:" % runcount, phase_timing_summary()
+    return
+
+def note_count(count_name, n):
+    """
+    Record that the current dna updater run processed n objects
+    of the kind described by count_name (e.g. "changed_atoms").
+    Counts noted more than once in one run are added.
+    """
+    if _phase_start is not None:
+        _counts[count_name] = _counts.get(count_name, 0) + n
+    return
+
+def last_counts():
+    """
+    @return: a dict from count name to the number of objects of that kind
+             processed by the last complete dna updater run.
+    """
+    return dict(_last_counts)
+
+def last_phase_timings():
+    """
+    @return: a list of (phase name, seconds) for the phases of the last
+             complete dna updater run, in the order they first ran,
+             with the times of repeated phases added together.
+    """
+    res = []
+    index = {}
+    for phase_name, seconds in _last_phase_times:
+        if phase_name in index:
+            i = index[phase_name]
+            res[i] = (phase_name, res[i][1] + seconds)
+        else:
+            index[phase_name] = len(res)
+            res.append( (phase_name, seconds) )
+        continue
+    return res
+
+def phase_timing_summary():
+    """
+    @return: a one-line summary of last_phase_timings(), in msec.
+    """
+    timings = last_phase_timings()
+    total = 0.0
+    for phase_name, seconds in timings:
+        total += seconds
+    parts = ["%s %.1f" % (phase_name, seconds * 1000.0)
+             for phase_name, seconds in timings
+             if seconds >= 0.00005 ]
+    return "%.1f msec total (%s)" % (total * 1000.0, ", ".join(parts))
+
+# end
@@ -0,0 +1,266 @@
+# Copyright 2009 Nanorex, Inc.  See LICENSE file for details.
+"""
+keyframe_index.py -- sidecar keyframe index for old-format (.dpb) movie files,
+which lets any frame be reached with a bounded number of delta frames.
+
+@version: $Id$
+@copyright: 2009 Nanorex, Inc.  See LICENSE file for details.
+
+Old-format movie files contain only delta frames (one signed byte per atom
+coordinate, in units of 0.01 Angstroms), so without help, reaching frame n
+from the nearest frame whose absolute positions we know costs O(distance)
+file reads. This module keeps, in a small file next to the .dpb file, the
+cumulative sum of all delta frames from frame 0 up to every Nth frame
+(a "keyframe"). Those sums are exact integers (still in units of 0.01
+Angstroms), so they don't depend on the absolute positions (which the
+moviefile doesn't contain) and don't accumulate roundoff error. Given any
+frame m with known absolute positions, frame n is then
+
+    posns(n) = posns(m) + (cumsum(n) - cumsum(m)) * 0.01
+
+and cumsum(k) for any k costs at most N/2 delta frame reads from the
+nearest keyframe.
+
+The index is validated against the movie file's size and mtime, and is
+rebuilt (and rewritten, if possible) whenever it doesn't match. Only its
+header is kept in memory; keyframes are read from it on demand.
+
+Index file format (all integers in native byte order, like the .dpb header):
+
+    a magic line (INDEX_MAGIC)
+    a line of ints: moviefile_size moviefile_mtime natoms nframes interval nkeys
+    nkeys keyframes, each natoms * 3 Int32 values (keyframe j is frame j * interval)
+"""
+
+import os
+
+from Numeric import zeros, fromstring, add, Int8, Int32
+
+from utilities import debug_flags
+from utilities.debug import print_compact_traceback
+
+INDEX_MAGIC = "NE1 dpb keyframe index, version 1\n"
+
+INDEX_FILE_SUFFIX = ".kfi"
+
+DEFAULT_KEYFRAME_INTERVAL = 100
+
+# bound on how many delta frames we convert to Int32 at once while building
+# an index (the converted block needs 12 bytes per atom per frame)
+_BUILD_BLOCK_BYTES = 16 * 1024 * 1024
+
+def keyframe_index_filename(moviefile_name):
+    """
+    Return the name of the sidecar keyframe index file for the given
+    movie file.
+    """
+    return moviefile_name + INDEX_FILE_SUFFIX
+
+def remove_keyframe_index(moviefile_name):
+    """
+    Remove the keyframe index for the given movie file, if it has one.
+    (Stale indexes would be detected and rebuilt anyway, but this avoids
+    leaving them around after their movie file is deleted.)
+    """
+    filename = keyframe_index_filename(moviefile_name)
+    if os.path.exists(filename):
+        try:
+            os.remove(filename)
+        except OSError:
+            if debug_flags.atom_debug:
+                print_compact_traceback("atom_debug: ignoring exception removing %r: " % filename)
+    return
+
+def _moviefile_stamp(moviefile_name):
+    """
+    Return (size, mtime) of the given movie file, as ints.
+    """
+    st = os.stat(moviefile_name)
+    return int(st.st_size), int(st.st_mtime)
+
+class DpbKeyframeIndex:
+    """
+    A keyframe index for one old-format movie file,
+    backed by its sidecar index file.
+
+    Use get_keyframe_index() to load or build one.
+    """
+    def __init__(self, filename, stamp, natoms, nframes, interval, nkeys):
+        self.filename = filename # of the index file, not the movie file
+        self.stamp = stamp # (size, mtime) of the movie file we index
+        self.natoms = natoms
+        self.nframes = nframes
+        self.interval = interval
+        self.nkeys = nkeys
+        self._data_offset = None # file position of keyframe 0
+        self._fileobj = None
+        self._keyframe_cache = {} # keyframe index j -> Int32 array (only the most recent one)
+
+    def _open(self):
+        if not self._fileobj:
+            self._fileobj = open(self.filename, 'rb')
+            self._fileobj.readline() # magic
+            self._fileobj.readline() # header ints
+            self._data_offset = self._fileobj.tell()
+        return self._fileobj
+
+    def close(self):
+        if self._fileobj:
+            self._fileobj.close()
+        self._fileobj = None
+        self._keyframe_cache = {}
+
+    destroy = close
+
+    def keyframe(self, j):
+        """
+        Return cumsum(j * self.interval) as a new Int32 array of shape (natoms, 3).
+        """
+        assert 0 <= j < self.nkeys
+        try:
+            res = self._keyframe_cache[j]
+        except KeyError:
+            f = self._open()
+            nbytes = self.natoms * 3 * 4
+            f.seek(self._data_offset + j * nbytes)
+            bytes = f.read(nbytes)
+            assert len(bytes) == nbytes, "keyframe index %r is truncated" % self.filename
+            res = fromstring(bytes, Int32)
+            res.shape = (-1, 3)
+            self._keyframe_cache = {j: res} # only keep one (they can be big)
+        return + res # copy, since caller may modify it
+
+    def cumulative_delta(self, n, filereader):
+        """
+        Return the sum of delta frames 1 through n (i.e. frame n minus frame 0,
+        in units of 0.01 Angstroms), as a new Int32 array of shape (natoms, 3).
+        This reads one keyframe and at most interval/2 delta frames
+        (using filereader.delta_frame_bytes).
+        """
+        assert 0 <= n <= self.nframes
+        j = (n + self.interval / 2) / self.interval # nearest keyframe
+        j = min(j, self.nkeys - 1)
+        k = j * self.interval
+        res = self.keyframe(j)
+        while k < n:
+            k += 1
+            res += _int_delta_frame(filereader.delta_frame_bytes(k))
+        while k > n:
+            res -= _int_delta_frame(filereader.delta_frame_bytes(k))
+            k -= 1
+        return res
+
+    pass # end of class DpbKeyframeIndex
+
+def _int_delta_frame(bytes):
+    """
+    Convert the bytes of one delta frame to an Int32 array of shape (natoms, 3).
+    """
+    res = fromstring(bytes, Int8).astype(Int32)
+    res.shape = (-1, 3)
+    return res
+
+def _read_index_header(filename):
+    """
+    Return (header ints, file position of keyframe 0) for the given index
+    file, or None if it's not a readable index file.
+    """
+    try:
+        f = open(filename, 'rb')
+        try:
+            if f.readline() != INDEX_MAGIC:
+                return None
+            header = map(int, f.readline().split())
+            return header, f.tell()
+        finally:
+            f.close()
+    except (IOError, ValueError):
+        return None
+    pass
+
+def _load_keyframe_index(moviefile_name, natoms, nframes):
+    """
+    Return the valid existing keyframe index for the given movie file,
+    or None if it has none.
+    """
+    filename = keyframe_index_filename(moviefile_name)
+    if not os.path.exists(filename):
+        return None
+    res = _read_index_header(filename)
+    if not res or len(res[0]) != 6:
+        return None
+    header, data_offset = res
+    size, mtime, index_natoms, index_nframes, interval, nkeys = header
+    if (size, mtime) != _moviefile_stamp(moviefile_name) or \
+       (index_natoms, index_nframes) != (natoms, nframes) or \
+       interval <= 0 or nkeys != nframes / interval + 1:
+        return None
+    if os.path.getsize(filename) != data_offset + nkeys * natoms * 3 * 4:
+        return None # truncated, or still being written
+    return DpbKeyframeIndex(filename, (size, mtime), natoms, nframes, interval, nkeys)
+
+def build_keyframe_index(filereader, interval = DEFAULT_KEYFRAME_INTERVAL):
+    """
+    Scan all delta frames of the movie file read by filereader
+    (an OldFormatMovieFile_startup) and write its keyframe index file.
+    Return the new DpbKeyframeIndex, or None if the index file can't be
+    written (e.g. if the movie file's directory is not writable).
+    """
+    moviefile_name = filereader.filename
+    natoms = filereader.natoms
+    nframes = filereader.totalFramesActual
+    stamp = _moviefile_stamp(moviefile_name)
+    nkeys = nframes / interval + 1
+    filename = keyframe_index_filename(moviefile_name)
+    tmpname = filename + ".tmp"
+    try:
+        f = open(tmpname, 'wb')
+        try:
+            f.write(INDEX_MAGIC)
+            f.write("%d %d %d %d %d %d\n" % (stamp + (natoms, nframes, interval, nkeys)))
+            cumsum = zeros((natoms, 3), Int32)
+            f.write(cumsum.tostring()) # keyframe 0
+            frames_per_block = max(1, min(interval, _BUILD_BLOCK_BYTES / max(1, natoms * 12)))
+            n = 0 # cumsum is the sum of delta frames 1 through n
+            for j in range(1, nkeys):
+                k = j * interval
+                while n < k:
+                    count = min(frames_per_block, k - n)
+                    block = filereader.delta_frames(n + 1, count).astype(Int32)
+                    cumsum += add.reduce(block)
+                    n += count
+                f.write(cumsum.tostring())
+        finally:
+            f.close()
+        if os.path.exists(filename):
+            os.remove(filename) # needed on Windows before rename
+        os.rename(tmpname, filename)
+    except (IOError, OSError):
+        if debug_flags.atom_debug:
+            print_compact_traceback("atom_debug: can't write keyframe index %r: " % filename)
+        if os.path.exists(tmpname):
+            try:
+                os.remove(tmpname)
+            except OSError:
+                pass
+        return None
+    return DpbKeyframeIndex(filename, stamp, natoms, nframes, interval, nkeys)
+
+def get_keyframe_index(filereader, interval = DEFAULT_KEYFRAME_INTERVAL):
+    """
+    Return a valid DpbKeyframeIndex for the movie file read by filereader
+    (an OldFormatMovieFile_startup), loading it from its sidecar file if that
+    matches the movie file, otherwise building (and saving) a new one.
+    Return None if neither is possible.
+    """
+    try:
+        res = _load_keyframe_index(filereader.filename,
+                                   filereader.natoms,
+                                   filereader.totalFramesActual)
+    except OSError:
+        res = None
+    if res is None:
+        res = build_keyframe_index(filereader, interval)
+    return res
+
+# end
@@ -15,12 +15,20 @@ moviefile.py -- classes and other code for interpreting movie files
 
 # these imports are anticipated, perhaps not all needed
 import os, sys
+import mmap
 from struct import unpack # fyi: used for old-format header, no longer for delta frames
 ## from VQT import A
-from Numeric import array, Int8
+from Numeric import array, fromstring, zeros, add, Int8, Int32, Float
 from utilities import debug_flags
 from utilities.debug import print_compact_stack, print_compact_traceback
+from utilities.debug_prefs import debug_pref, Choice_boolean_True
 import foundation.env as env
+from files.dpb_trajectory.keyframe_index import get_keyframe_index
+from files.dpb_trajectory.keyframe_index import DEFAULT_KEYFRAME_INTERVAL
+
+# bound on the temporary memory (in bytes) used for each block of frames
+# in bulk frame operations
+_BULK_BLOCK_BYTES = 16 * 1024 * 1024
 
 def MovieFile(filename): #bruce 050913 removed history arg, since all callers passed env.history
     """
@@ -39,17 +47,28 @@ def MovieFile(filename): #bruce 050913 removed history arg, since all callers pa
        See also the docstring of class OldFormatMovieFile.
     """
     # for now, assume old format, and assume file exists and has reached its final size.
-    reader = OldFormatMovieFile_startup( filename)
+    use_mmap = debug_pref("movie files: use mmap reader?",
+                          Choice_boolean_True,
+                          prefs_key = True)
+    reader = OldFormatMovieFile_startup( filename, use_mmap = use_mmap)
     if reader.open_and_read_header_errQ():
         return None
     return OldFormatMovieFile( reader)
 
 class OldFormatMovieFile_startup:
     #e maybe make these same obj, so easier to recheck header later, and big one needs invalid state anyway
-    def __init__(self, filename): #bruce 050913 removed history arg
+    def __init__(self, filename, use_mmap = False): #bruce 050913 removed history arg
+        """
+        @param use_mmap: if true, read delta frames through a read-only mmap
+                         of the whole file, rather than by seeking and reading
+                         our file object. (Falls back to the latter if the
+                         file can't be mapped.)
+        """
         self.filename = filename
         self.fileobj = None
         self.errcode = None
+        self.use_mmap = use_mmap
+        self.mmapobj = None
     def open_and_read_header_errQ(self):
         # because we assume file is fully written, we can do all this stuff immediately for now:
         #e try/except too?
@@ -59,6 +78,22 @@ class OldFormatMovieFile_startup:
     def open_file(self):
         assert not self.fileobj #e if we relax this, then worry about whether we should seek to start of file
         self.fileobj = open(self.filename,'rb') ###@@@ missing file is possible when we reopen after closing; this is caught below
+    def open_mmap(self):
+        """
+        Make sure self.mmapobj is a read-only mmap of our whole file,
+        if self.use_mmap is set and that's possible. Return it or None.
+        """
+        if self.mmapobj is None and self.use_mmap:
+            if not self.fileobj:
+                self.open_file()
+            try:
+                self.mmapobj = mmap.mmap(self.fileobj.fileno(), 0, access = mmap.ACCESS_READ)
+            except (EnvironmentError, ValueError, OverflowError):
+                # e.g. file too large for our address space; read it the old way
+                if debug_flags.atom_debug:
+                    print_compact_traceback("atom_debug: can't mmap %r, reading it without mmap: " % self.filename)
+                self.use_mmap = False
+        return self.mmapobj
     def read_header(self):
         # assume we're at start of file
         # Read header (4 bytes) from file containing the number of frames in the moviefile.
@@ -88,6 +123,13 @@ class OldFormatMovieFile_startup:
         assert n > 0
         nbytes = self.natoms * 3 # number of bytes in frame (if complete) -- no relation to frame index n
         filepos = ((n-1) * nbytes) + 4
+        if self.open_mmap():
+            res = self.mmapobj[filepos : filepos + nbytes]
+            if len(res) == nbytes:
+                return res
+            # otherwise the file was truncated after we measured it (or the
+            # mapping was made before it was complete) -- let the old code
+            # below deal with that
         try:
             # several things here can fail if file is changing on disk in various ways
             if not self.fileobj:
@@ -103,7 +145,35 @@ class OldFormatMovieFile_startup:
             res = "\x00" * nbytes
             assert len(res) == nbytes, "mistake in python zero-byte syntax" # but I checked it, should be ok
         return res
+    def delta_frame_bytes_range(self, n, count):
+        """
+        return the bytes of the count consecutive delta frames starting with index n
+        (assuming our file is open and all of them are within legal range)
+        """
+        assert n > 0 and count > 0
+        nbytes = self.natoms * 3 * count
+        filepos = ((n-1) * self.natoms * 3) + 4
+        if self.open_mmap():
+            res = self.mmapobj[filepos : filepos + nbytes]
+        else:
+            if not self.fileobj:
+                self.open_file()
+            self.fileobj.seek( filepos)
+            res = self.fileobj.read(nbytes)
+        assert len(res) == nbytes, "movie file %r got shorter while reading it" % self.filename
+        return res
+    def delta_frames(self, n, count):
+        """
+        return the count consecutive delta frames starting with index n,
+        as an Int8 array of shape (count, natoms, 3)
+        """
+        res = fromstring( self.delta_frame_bytes_range(n, count), Int8)
+        res.shape = (count, self.natoms, 3)
+        return res
     def close(self):
+        if self.mmapobj is not None:
+            self.mmapobj.close()
+        self.mmapobj = None
         if self.fileobj:
             self.fileobj.close()
         self.fileobj = None
@@ -160,6 +230,9 @@ class OldFormatMovieFile: #bruce 050426
         self.natoms = filereader.natoms # maybe these should be the same object... not sure
         self.temp_mutable_frames = {}
         self.cached_immutable_frames = {} #e for some callers, store a cached frame 0 here
+        self.keyframe_index = None # a DpbKeyframeIndex, made or loaded when first needed
+        self._keyframe_index_failed = False
+        self._cumulative_deltas = {} # frame index n -> cumulative delta (Int32 array), for immutable cached frames
 
     def get_totalFramesActual(self):
         return self.totalFramesActual
@@ -169,6 +242,10 @@ class OldFormatMovieFile: #bruce 050426
         return self.matches_alist(alist) ###@@@ stub, fails to recheck the file! should verify same header and same or larger nframes.
     def destroy(self):
         self.cached_immutable_frames = self.temp_mutable_frames = None
+        self._cumulative_deltas = None
+        if self.keyframe_index:
+            self.keyframe_index.destroy()
+            self.keyframe_index = None
         self.filereader.destroy()
         self.filereader = None
 
@@ -212,28 +289,26 @@ class OldFormatMovieFile: #bruce 050426
         """
         assert self.frame_index_in_range(n)
         n0 = self.nearest_knownposns_frame_index(n)
+        if abs(n - n0) > self.keyframe_jump_threshold():
+            # a long jump (e.g. from the slider) -- use the keyframe index if we can
+            frame = self.copy_of_frame_using_keyframes(n)
+            if frame is not None:
+                return frame
         frame0 = self.copy_of_known_frame_or_None(n0) # an array of absposns we're allowed to modify, valid for n0
         assert frame0 is not None # don't test it as a boolean -- it might be all 0.0 which in Numeric means it's false!
-        while n0 < n:
-            # move forwards using a delta frame (which is never cached, tho this code doesn't need to know that)
-            # (##e btw it might be faster to read several at once and combine them into one, or add all at once, using Numeric ops!
-            #  I'm not sure, since intermediate states would use 4x the memory, so we might do smaller pieces at a time...)
-            n0 += 1
-            df = self.delta_frame(n0) # array of differences to add to frame n0-1 to get frame n0
-            try:
-                frame0 += df # note: += modifies frame0 in place (if it's a Numeric array, as we hope); that's desired
-            except ValueError: # frames are not aligned -- happens when slider reaches right end
-                print "frames not aligned; shapes:",frame0.shape, df.shape
-                raise
-        while n0 > n:
-            # (this never happens if we just moved forwards, but there's no need to "confirm" or "enforce" that fact)
-            # move backwards using a delta frame
-            # (btw it might be faster to read all dfs forwards to make one big one to subtract all at once...
-            #  or perhaps even to read them all at once into a single Numeric 2d array, and turn them into
-            #  one big one using Numeric ops! ###e)
-            df = self.delta_frame(n0)
-            n0 -= 1 # note: we did this after grabbing the frame, not beforehand as above
-            frame0 -= df
+        # Move forwards or backwards by adding or subtracting the sum of all
+        # the delta frames in between, computed with bulk array ops (see
+        # summed_delta_frames). Summing the deltas as integers before scaling
+        # them also avoids accumulating roundoff error in frame0.
+        try:
+            if n0 < n:
+                frame0 += self.summed_delta_frames(n0, n) * 0.01
+                    # note: += modifies frame0 in place (if it's a Numeric array, as we hope); that's desired
+            elif n0 > n:
+                frame0 -= self.summed_delta_frames(n, n0) * 0.01
+        except ValueError: # frames are not aligned -- happens when slider reaches right end
+            print "frames not aligned; shapes:", frame0.shape, (self.natoms, 3)
+            raise
         #e future:
         #e   If we'd especially like to keep a cached copy for future speed, make one now...
         #e   Or do this inside forward-going loop?
@@ -246,6 +321,126 @@ class OldFormatMovieFile: #bruce 050426
 ##                print "copy_of_frame %d[%d] is" % (n, ii), frame0[ii]
         return frame0
 
+    def _frames_per_block(self):
+        """
+        Return how many delta frames to convert to Int32 at once,
+        to bound the temporary memory used by bulk operations.
+        """
+        return max(1, _BULK_BLOCK_BYTES / max(1, self.natoms * 12))
+
+    def summed_delta_frames(self, n1, n2):
+        """
+        Return the sum of delta frames n1 + 1 through n2 (i.e. frame n2 minus
+        frame n1, in units of 0.01 Angstroms), as a new Int32 array of shape
+        (natoms, 3). Requires n1 <= n2.
+           This does one bulk sum per block of frames, with no per-frame
+        Python code.
+        """
+        assert 0 <= n1 <= n2 <= self.totalFramesActual
+        res = zeros((self.natoms, 3), Int32)
+        block = self._frames_per_block()
+        n = n1
+        while n < n2:
+            count = min(block, n2 - n)
+            res += add.reduce( self.filereader.delta_frames(n + 1, count).astype(Int32) )
+            n += count
+        return res
+
+    def copies_of_frames(self, start, stop, step = 1):
+        """
+        Return a new Float array of shape (nframes, natoms, 3) containing the
+        absolute atom positions of the frames in range(start, stop, step)
+        (which must all be valid frame indices, and step can be negative).
+           After finding the first frame (as copy_of_frame would), this uses
+        only bulk array ops on whole blocks of delta frames: the deltas between
+        consecutive returned frames are summed with one reduce per block,
+        and the running positions are computed with one accumulate per block.
+        This is how to play "every k-th frame" quickly.
+        """
+        frames = range(start, stop, step)
+        assert frames, "no frames in range(%r, %r, %r)" % (start, stop, step)
+        assert self.frame_index_in_range(frames[0]) and self.frame_index_in_range(frames[-1])
+        k = abs(step)
+        res = zeros((len(frames), self.natoms, 3), Float)
+        res[0] = self.copy_of_frame(frames[0])
+        # do up to groups_per_block steps at a time
+        groups_per_block = max(1, self._frames_per_block() / k)
+        i = 0 # res[:i+1] is filled in
+        while i < len(frames) - 1:
+            ngroups = min(groups_per_block, len(frames) - 1 - i)
+            lo = min(frames[i], frames[i + ngroups]) # deltas lo + 1 through lo + ngroups * k are needed
+            deltas = self.filereader.delta_frames(lo + 1, ngroups * k).astype(Int32)
+            deltas.shape = (ngroups, k, self.natoms, 3)
+            sums = add.reduce(deltas, 1) # sums[g] = frame(lo + (g+1)*k) - frame(lo + g*k)
+            if step < 0:
+                sums = - sums[::-1]
+            offsets = add.accumulate(sums) * 0.01
+            res[i + 1 : i + 1 + ngroups] = res[i] + offsets
+            i += ngroups
+        return res
+
+    def iter_frames(self, start, stop, step = 1):
+        """
+        Yield (n, frame) for n in range(start, stop, step), where frame is
+        the absolute atom positions for frame n, computed in blocks by
+        copies_of_frames (so memory use stays bounded). Caller must not keep
+        or modify the yielded frames past the next iteration.
+        """
+        frames = range(start, stop, step)
+        blocksize = max(1, _BULK_BLOCK_BYTES / max(1, self.natoms * 24))
+        for i in range(0, len(frames), blocksize):
+            chunk = frames[i : i + blocksize]
+            block = self.copies_of_frames(chunk[0], chunk[-1] + step, step)
+            for j in range(len(chunk)):
+                yield chunk[j], block[j]
+        return
+
+    def keyframe_jump_threshold(self):
+        """
+        Return the number of delta frames beyond which it's worth using
+        the keyframe index (if there is one) rather than scanning delta frames
+        from the nearest known frame.
+        """
+        if self.keyframe_index:
+            return self.keyframe_index.interval
+        return DEFAULT_KEYFRAME_INTERVAL
+
+    def get_keyframe_index(self):
+        """
+        Return our DpbKeyframeIndex, loading or building it if necessary,
+        or None if that's not possible. (Building it scans the entire file once.)
+        """
+        if self.keyframe_index is None and not self._keyframe_index_failed:
+            try:
+                self.keyframe_index = get_keyframe_index( self.filereader)
+            except:
+                print_compact_traceback("exception in making keyframe index for movie file (ignored): ")
+                self.keyframe_index = None
+            self._keyframe_index_failed = (self.keyframe_index is None)
+        return self.keyframe_index
+
+    def copy_of_frame_using_keyframes(self, n):
+        """
+        Like copy_of_frame, but use our keyframe index, reading at most
+        one keyframe and interval/2 delta frames (or twice that if we also
+        need to locate a cached frame relative to the keyframes).
+        Return None if we have no keyframe index or no suitable cached frame.
+        """
+        if not self.cached_immutable_frames:
+            return None
+        index = self.get_keyframe_index()
+        if index is None:
+            return None
+        # use the cached immutable frame nearest n (not a mutable one, since using that would consume it)
+        m = min( [(abs(n - m), m) for m in self.cached_immutable_frames.keys()] )[1]
+        try:
+            base_cumsum = self._cumulative_deltas[m]
+        except KeyError:
+            base_cumsum = self._cumulative_deltas[m] = index.cumulative_delta(m, self.filereader)
+        cumsum = index.cumulative_delta(n, self.filereader)
+        cumsum -= base_cumsum
+        return self.cached_immutable_frames[m] + cumsum * 0.01
+
     def donate_mutable_known_frame(self, n, frame):
         """
         Caller has a frame of absolute atom positions it no longer needs --
@@ -379,6 +574,8 @@ class OldFormatMovieFile: #bruce 050426
 
     def close_file(self):
         self.filereader.close_file() # but don't forget about it!
+        if self.keyframe_index:
+            self.keyframe_index.close() # it will reopen its file when next needed
     
     pass # end of class MovieFile
 
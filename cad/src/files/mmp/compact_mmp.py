@@ -0,0 +1,561 @@
+# Copyright 2009 Nanorex, Inc.  See LICENSE file for details.
+"""
+compact_mmp.py -- a binary container for mmp files ("compact mmp" files),
+which stores runs of atom and bond records as arrays.
+
+@version: $Id$
+@copyright: 2009 Nanorex, Inc.  See LICENSE file for details.
+
+A compact mmp file holds exactly the same sequence of mmp records as the
+text mmp file it corresponds to (so conversion in either direction is
+lossless), but each run of consecutive atom and bond records (normally
+most of the file) is stored as one binary block of arrays (record kinds,
+atom codes, element numbers, display style indices, integer coordinates
+in units of 0.001 Angstroms, and bonded atom codes) rather than as text.
+Everything else (groups, chunks, jigs, info records, bond_direction
+records, etc) is stored as text, unchanged.
+
+This means the node tree, jigs and info records are read and written
+by the usual mmp code (readmmp_line, writemmp methods), while atoms and
+bonds can be made or written in bulk without formatting or parsing text
+(see _readmmp_state.read_atom_record_block and
+writemmp_mapping.write_atom_record).
+
+File format (all integers little-endian):
+
+    a magic line (COMPACT_MMP_MAGIC)
+    a sequence of blocks, each a one-char block type, an int32 length,
+     and that many bytes of block data:
+        'T': text -- one or more complete lines of the mmp file
+        'A': atom and bond records -- see AtomRecordBlock
+        'E': end of file (no data)
+
+Atom and bond record lines are stored in 'A' blocks only when regenerating
+their text from the arrays would give the identical line; other lines
+(including nonstandard ones written by hand) stay in 'T' blocks.
+"""
+
+import re
+import struct
+import sys
+
+from Numeric import array, fromstring, Int8, Int16, Int32
+
+from model.bond_constants import BOND_VALENCES, BOND_MMPRECORDS
+
+COMPACT_MMP_MAGIC = "NE1 compact mmp, version 1\n"
+
+COMPACT_MMP_EXTENSION = ".cmmp"
+
+_TEXT_BLOCK = 'T'
+_ATOM_BLOCK = 'A'
+_END_BLOCK = 'E'
+
+_BLOCK_HEADER_FORMAT = "<ci"
+_BLOCK_HEADER_SIZE = struct.calcsize(_BLOCK_HEADER_FORMAT)
+
+_ATOM_BLOCK_HEADER_FORMAT = "<6i"
+_ATOM_BLOCK_HEADER_SIZE = struct.calcsize(_ATOM_BLOCK_HEADER_FORMAT)
+
+# maximum number of records in one 'A' block, and number of bytes of text
+# in one 'T' block (these bound the memory needed to read or write a block)
+_MAX_BLOCK_RECORDS = 65536
+_MAX_TEXT_BLOCK_BYTES = 1024 * 1024
+
+# coordinates and atom codes must fit in an Int32
+_MAX_INT32 = 2 ** 31 - 1
+
+# record kind codes, as used in AtomRecordBlock.kinds:
+# 0 for an atom record, or 1 + the index of a bond record name in BOND_MMPRECORDS
+_ATOM_KIND = 0
+_BOND_KIND_OF_RECORDNAME = dict([(recordname, i + 1)
+                                 for i, recordname in enumerate(BOND_MMPRECORDS)])
+_BOND_KIND_OF_VALENCE = dict([(valence, i + 1)
+                              for i, valence in enumerate(BOND_VALENCES)])
+
+# lines which might be storable in an 'A' block
+# (these are only used when converting text, or for text written
+#  by code that doesn't use writemmp_mapping.write_atom_record)
+_atom_line_pat = re.compile(r"atom (\d+) \((\d+)\) \((-?\d+), (-?\d+), (-?\d+)\) (\S*)\n\Z")
+_bond_line_pat = re.compile(r"(bond[123agc]) (\d+(?: \d+)*)\n\Z")
+
+_ATOM_LINE_FORMAT = "atom %s (%d) (%s, %s, %s) %s\n" # as in Atom.writemmp
+
+def is_compact_mmp_filename(filename):
+    """
+    Does filename have the extension we use for compact mmp files?
+    """
+    return filename.lower().endswith(COMPACT_MMP_EXTENSION)
+
+def is_compact_mmp_file(filename):
+    """
+    Is filename the name of a compact mmp file (judging by its contents)?
+    """
+    try:
+        f = open(filename, 'rb')
+        try:
+            return f.read(len(COMPACT_MMP_MAGIC)) == COMPACT_MMP_MAGIC
+        finally:
+            f.close()
+    except IOError:
+        return False
+    pass
+
+def _little_endian_string(a):
+    if sys.byteorder == 'big':
+        a = a.byteswapped()
+    return a.tostring()
+
+def _array_from_little_endian_string(data, typecode):
+    a = fromstring(data, typecode)
+    if sys.byteorder == 'big':
+        a = a.byteswapped()
+    return a
+
+# ==
+
+class AtomRecordBlock:
+    """
+    A run of consecutive atom and bond records from an mmp file,
+    stored as arrays.
+
+    @ivar kinds: the kind of each record (_ATOM_KIND or a bond kind code).
+    @ivar codes: atom code of each atom record.
+    @ivar elements: element number of each atom record.
+    @ivar disps: index in self.disptable of the display style name
+                 of each atom record.
+    @ivar disptable: list of display style names (strings, as written).
+    @ivar coords: Int32 array of shape (natoms, 3); coordinates of each
+                  atom record (in units of 0.001 Angstroms).
+    @ivar bond_counts: number of atom codes in each bond record.
+    @ivar bond_codes: the atom codes in all bond records, concatenated.
+    @ivar nbytes: size of this block in its file (used for progress reports).
+    """
+    nbytes = 0
+
+    def __init__(self, kinds, codes, elements, disps, disptable,
+                 coords, bond_counts, bond_codes):
+        self.kinds = kinds
+        self.codes = codes
+        self.elements = elements
+        self.disps = disps
+        self.disptable = disptable
+        self.coords = coords
+        self.coords.shape = (-1, 3)
+        self.bond_counts = bond_counts
+        self.bond_codes = bond_codes
+        self._record_offsets = None
+        return
+
+    def __len__(self):
+        """
+        Return the number of records in self.
+        """
+        return len(self.kinds)
+
+    def tostring(self):
+        """
+        Return the data for self's 'A' block in a compact mmp file.
+        """
+        disptext = "\n".join(self.disptable)
+        header = struct.pack(_ATOM_BLOCK_HEADER_FORMAT,
+                             len(self.kinds), len(self.codes),
+                             len(self.bond_counts), len(self.bond_codes),
+                             len(self.disptable), len(disptext))
+        return "".join([header, disptext] +
+                       map(_little_endian_string,
+                           [self.kinds, self.codes, self.elements, self.disps,
+                            self.coords, self.bond_counts, self.bond_codes]))
+
+    def _records(self):
+        """
+        [private]
+        Return a list of (kind, index, count) for each record in self,
+        where index is the atom index for atom records, or the index of the
+        first atom code in self.bond_codes for bond records, and count is
+        the number of atom codes in bond records (1 for atom records).
+        """
+        res = []
+        natoms = 0
+        bond_counts = self.bond_counts.tolist()
+        nbonds = 0 # number of bond records so far
+        ncodes = 0 # number of bond atom codes so far
+        for kind in self.kinds.tolist():
+            if kind == _ATOM_KIND:
+                res.append( (kind, natoms, 1) )
+                natoms += 1
+            else:
+                count = bond_counts[nbonds]
+                res.append( (kind, ncodes, count) )
+                ncodes += count
+                nbonds += 1
+        return res
+
+    def records(self, dispname_func):
+        """
+        Return a list of (valence, fields) for each record in self,
+        where valence is None for atom records, whose fields are
+        (atom code, element number, dispname_func(display style name),
+        atom index), or a bond valence for bond records, whose fields are
+        the list of atom codes to bond to.
+        """
+        codes = self.codes.tolist()
+        elements = self.elements.tolist()
+        dispnames = map(dispname_func, self.disptable)
+        disps = self.disps.tolist()
+        bond_codes = self.bond_codes.tolist()
+        res = []
+        for kind, index, count in self._get_record_offsets():
+            if kind == _ATOM_KIND:
+                res.append( (None, (codes[index], elements[index],
+                                    dispnames[disps[index]], index)) )
+            else:
+                res.append( (BOND_VALENCES[kind - 1],
+                             bond_codes[index : index + count]) )
+        return res
+
+    def _get_record_offsets(self):
+        if self._record_offsets is None:
+            self._record_offsets = self._records()
+        return self._record_offsets
+
+    def card(self, i):
+        """
+        Return the text of record i (an mmp file line).
+        """
+        kind, index, count = self._get_record_offsets()[i]
+        if kind == _ATOM_KIND:
+            x, y, z = self.coords[index].tolist()
+            return _ATOM_LINE_FORMAT % (int(self.codes[index]),
+                                        int(self.elements[index]),
+                                        x, y, z,
+                                        self.disptable[int(self.disps[index])])
+        codes = self.bond_codes[index : index + count].tolist()
+        return BOND_MMPRECORDS[kind - 1] + " " + " ".join(map(str, codes)) + "\n"
+
+    def text_lines(self):
+        """
+        Return a list of the text lines of all records in self.
+        """
+        return map(self.card, range(len(self)))
+
+    pass # end of class AtomRecordBlock
+
+def _atom_record_block_from_string(data):
+    """
+    Return an AtomRecordBlock made from the data of an 'A' block.
+    """
+    nrecords, natoms, nbondrecords, nbondcodes, ndisps, ndisptext = \
+              struct.unpack(_ATOM_BLOCK_HEADER_FORMAT, data[:_ATOM_BLOCK_HEADER_SIZE])
+    pos = _ATOM_BLOCK_HEADER_SIZE
+    disptext = data[pos : pos + ndisptext]
+    pos += ndisptext
+    if ndisps:
+        disptable = disptext.split("\n")
+    else:
+        disptable = [] # (not [""])
+    assert len(disptable) == ndisps
+    arrays = []
+    for typecode, itemsize, count in [(Int8, 1, nrecords),
+                                      (Int32, 4, natoms),
+                                      (Int16, 2, natoms),
+                                      (Int16, 2, natoms),
+                                      (Int32, 4, natoms * 3),
+                                      (Int32, 4, nbondrecords),
+                                      (Int32, 4, nbondcodes)]:
+        nbytes = itemsize * count
+        arrays.append( _array_from_little_endian_string(data[pos : pos + nbytes], typecode) )
+        pos += nbytes
+    assert pos == len(data), "bad atom record block in compact mmp file"
+    kinds, codes, elements, disps, coords, bond_counts, bond_codes = arrays
+    return AtomRecordBlock(kinds, codes, elements, disps, disptable,
+                           coords, bond_counts, bond_codes)
+
+class _AtomRecordBlockBuilder:
+    """
+    Accumulate atom and bond records, for making an AtomRecordBlock.
+    """
+    def __init__(self):
+        self.kinds = []
+        self.codes = []
+        self.elements = []
+        self.disps = []
+        self.disptable = []
+        self.dispindex = {} # display style name -> index in self.disptable
+        self.coords = []
+        self.bond_counts = []
+        self.bond_codes = []
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def add_atom(self, code, element, x, y, z, disp):
+        self.kinds.append(_ATOM_KIND)
+        self.codes.append(code)
+        self.elements.append(element)
+        try:
+            index = self.dispindex[disp]
+        except KeyError:
+            index = self.dispindex[disp] = len(self.disptable)
+            self.disptable.append(disp)
+        self.disps.append(index)
+        self.coords.extend((x, y, z))
+
+    def add_bonds(self, kind, codes):
+        self.kinds.append(kind)
+        self.bond_counts.append(len(codes))
+        self.bond_codes.extend(codes)
+
+    def block(self):
+        return AtomRecordBlock(array(self.kinds, Int8),
+                               array(self.codes, Int32),
+                               array(self.elements, Int16),
+                               array(self.disps, Int16),
+                               self.disptable,
+                               array(self.coords, Int32),
+                               array(self.bond_counts, Int32),
+                               array(self.bond_codes, Int32))
+    pass
+
+# ==
+
+class CompactMmpWriter:
+    """
+    A file-like object for writing a compact mmp file.
+
+    Its write method accepts the text of any mmp file lines (so it can
+    be used as the fp of a writemmp_mapping), and stores atom and bond
+    records as arrays. The write_atom_record and write_bond_record methods
+    store those records without making or parsing any text.
+    """
+    def __init__(self, filename):
+        self._fp = open(filename, 'wb')
+        self._fp.write(COMPACT_MMP_MAGIC)
+        self._text = [] # lines not yet written
+        self._textsize = 0
+        self._partial = "" # an incomplete line passed to write
+        self._builder = None # an _AtomRecordBlockBuilder, if we're in a run of atom and bond records
+        return
+
+    def _write_block(self, blocktype, data):
+        self._fp.write(struct.pack(_BLOCK_HEADER_FORMAT, blocktype, len(data)))
+        self._fp.write(data)
+
+    def _flush_text(self):
+        if self._text:
+            self._write_block(_TEXT_BLOCK, "".join(self._text))
+            self._text = []
+            self._textsize = 0
+        return
+
+    def _flush_records(self):
+        if self._builder is not None:
+            self._write_block(_ATOM_BLOCK, self._builder.block().tostring())
+            self._builder = None
+        return
+
+    def _get_builder(self):
+        """
+        Return the builder for the current run of atom and bond records,
+        starting a new run if necessary.
+        """
+        if self._builder is None:
+            self._flush_text()
+            self._builder = _AtomRecordBlockBuilder()
+        elif len(self._builder) >= _MAX_BLOCK_RECORDS:
+            self._flush_records()
+            self._builder = _AtomRecordBlockBuilder()
+        return self._builder
+
+    def write(self, lines):
+        """
+        Write one or more lines of an mmp file (passed as a single string).
+        """
+        lines = (self._partial + lines).split("\n")
+        self._partial = lines.pop() # incomplete last line, or ""
+        for line in lines:
+            self._write_line(line + "\n")
+        return
+
+    def _write_line(self, line):
+        if line.startswith("atom "):
+            m = _atom_line_pat.match(line)
+            if m:
+                fields = m.groups()
+                fields = (fields[0], int(fields[1])) + fields[2:]
+                if _ATOM_LINE_FORMAT % fields == line:
+                    if self._write_atom_fields(fields):
+                        return
+        elif line.startswith("bond"):
+            m = _bond_line_pat.match(line)
+            if m:
+                codes = map(int, m.group(2).split())
+                if " ".join(map(str, codes)) == m.group(2) and \
+                   max(codes) <= _MAX_INT32:
+                    self._get_builder().add_bonds(_BOND_KIND_OF_RECORDNAME[m.group(1)],
+                                                  codes)
+                    return
+        # any other line
+        self._flush_records()
+        self._text.append(line)
+        self._textsize += len(line)
+        if self._textsize >= _MAX_TEXT_BLOCK_BYTES:
+            self._flush_text()
+        return
+
+    def _write_atom_fields(self, (num_str, eltnum, xs, ys, zs, disp)):
+        """
+        [private]
+        Store one atom record in the current run, if the text of its fields
+        can be regenerated exactly from integers; return whether we did.
+        """
+        try:
+            ints = map(int, (num_str, xs, ys, zs))
+        except ValueError:
+            return False
+        if map(str, ints) != [num_str, xs, ys, zs] or \
+           max(map(abs, ints)) > _MAX_INT32 or \
+           not 0 <= eltnum < 2 ** 15 or \
+           "\n" in disp:
+            return False
+        code, x, y, z = ints
+        self._get_builder().add_atom(code, eltnum, x, y, z, disp)
+        return True
+
+    def write_atom_record(self, print_fields):
+        """
+        Write an atom record, given the same print_fields tuple
+        (atom code string, element number, 3 coordinate strings,
+        display style name) which would be formatted to make its text.
+        """
+        assert not self._partial # records must start on a new line
+        if not self._write_atom_fields(print_fields):
+            self._write_line(_ATOM_LINE_FORMAT % print_fields)
+        return
+
+    def write_bond_record(self, valence, atomcodes):
+        """
+        Write a bond record, given its valence and the atom codes (strings)
+        of the atoms bonded to the prior atom.
+        """
+        assert not self._partial
+        kind = _BOND_KIND_OF_VALENCE[valence]
+        try:
+            codes = map(int, atomcodes)
+        except ValueError:
+            codes = None
+        if codes is None or map(str, codes) != list(atomcodes) or \
+           (codes and max(map(abs, codes)) > _MAX_INT32):
+            self._write_line(BOND_MMPRECORDS[kind - 1] + " " +
+                             " ".join(atomcodes) + "\n")
+        else:
+            self._get_builder().add_bonds(kind, codes)
+        return
+
+    def close(self):
+        if self._partial:
+            self._write_line(self._partial)
+            self._partial = ""
+        self._flush_records()
+        self._flush_text()
+        self._write_block(_END_BLOCK, "")
+        self._fp.close()
+        return
+
+    pass # end of class CompactMmpWriter
+
+# ==
+
+class CompactMmpReader:
+    """
+    An iterable over the contents of a compact mmp file:
+    lines of text (strings) and AtomRecordBlocks, in file order.
+    Only one block is in memory at a time.
+    """
+    def __init__(self, filename, universal_newlines = True):
+        """
+        @param universal_newlines: if true (the default), convert "\\r\\n" or
+                                   "\\r" line endings in text lines to "\\n",
+                                   as when reading a text mmp file in "rU" mode.
+        """
+        self._universal_newlines = universal_newlines
+        self._fp = open(filename, 'rb')
+        magic = self._fp.read(len(COMPACT_MMP_MAGIC))
+        if magic != COMPACT_MMP_MAGIC:
+            self._fp.close()
+            raise IOError("not a compact mmp file: %r" % (filename,))
+        return
+
+    def __iter__(self):
+        fp = self._fp
+        while 1:
+            header = fp.read(_BLOCK_HEADER_SIZE)
+            if len(header) < _BLOCK_HEADER_SIZE:
+                raise IOError("compact mmp file %r is truncated" % (fp.name,))
+            blocktype, length = struct.unpack(_BLOCK_HEADER_FORMAT, header)
+            if blocktype == _END_BLOCK:
+                return
+            data = fp.read(length)
+            if len(data) < length:
+                raise IOError("compact mmp file %r is truncated" % (fp.name,))
+            if blocktype == _TEXT_BLOCK:
+                if self._universal_newlines:
+                    data = data.replace("\r\n", "\n").replace("\r", "\n")
+                lines = data.split("\n")
+                last = lines.pop() # "", unless the file didn't end with a newline
+                for line in lines:
+                    yield line + "\n"
+                if last:
+                    yield last
+            elif blocktype == _ATOM_BLOCK:
+                block = _atom_record_block_from_string(data)
+                block.nbytes = _BLOCK_HEADER_SIZE + length
+                yield block
+            else:
+                raise IOError("unknown block type %r in compact mmp file %r" %
+                              (blocktype, fp.name))
+            continue
+        pass
+
+    def close(self):
+        self._fp.close()
+
+    pass # end of class CompactMmpReader
+
+# ==
+
+def convert_mmp_to_compact(mmpfilename, compactfilename):
+    """
+    Write a compact mmp file containing the same records as the given
+    text mmp file.
+    """
+    writer = CompactMmpWriter(compactfilename)
+    f = open(mmpfilename, 'rb')
+    try:
+        for line in f:
+            writer.write(line)
+    finally:
+        f.close()
+        writer.close()
+    return
+
+def convert_compact_to_mmp(compactfilename, mmpfilename):
+    """
+    Write a text mmp file identical to the one the given compact mmp file
+    was made from (or would have been written as, if it was written
+    directly).
+    """
+    reader = CompactMmpReader(compactfilename, universal_newlines = False)
+    out = open(mmpfilename, 'wb')
+    try:
+        for item in reader:
+            if isinstance(item, AtomRecordBlock):
+                out.writelines(item.text_lines())
+            else:
+                out.write(item)
+    finally:
+        reader.close()
+        out.close()
+    return
+
+# end
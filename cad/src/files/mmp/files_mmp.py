@@ -27,7 +27,7 @@ for constructing them (since not everything uses the registration scheme
 or should have to).
 """
 
-import re, time
+import re, time, os
 
 import foundation.env as env
 from utilities import debug_flags
@@ -44,7 +44,7 @@ from analysis.ESP.ESPImage import ESPImage
 from model.jigs_measurements import MeasureAngle
 from model.jigs_measurements import MeasureDihedral
 from geometry.VQT import V, Q, A
-from utilities.Log import redmsg, orangemsg, quote_html
+from utilities.Log import redmsg, orangemsg, greenmsg, quote_html
 from model.elements import PeriodicTable
 from model.elements import Pl5
 from model.bonds import bond_atoms
@@ -55,6 +55,7 @@ from model.NamedView import NamedView # for reading one, and for isinstance
 
 from utilities.debug import print_compact_traceback
 from utilities.debug import print_compact_stack
+from utilities.debug import register_debug_menu_command
 
 from utilities.constants import gensym
 from utilities.constants import SUCCESS, ABORTED, READ_ERROR
@@ -72,6 +73,9 @@ from model.Plane import Plane
 from files.mmp.files_mmp_registration import find_registered_parser_class
 from files.mmp.mmpformat_versions import parse_mmpformat, mmp_date_newer
 from files.mmp.mmp_dispnames import interpret_dispName
+from files.mmp.compact_mmp import is_compact_mmp_file
+from files.mmp.compact_mmp import CompactMmpReader
+from files.mmp.compact_mmp import AtomRecordBlock
 
 # the following imports and the assignment they're used in
 # should be replaced by some registration scheme
@@ -154,6 +158,26 @@ atom1pat = re.compile("atom (\d+) \((\d+)\) \((-?\d+), (-?\d+), (-?\d+)\)")
 ##atom2pat = re.compile("atom \d+ \(\d+\) \(.*\) (\S\S\S)")
 atom2pat = re.compile("atom \d+ \(\d+\) \(.*\) (\w+)") # \w == [a-zA-Z0-9_]
 
+# the display style name in the rest of an atom record after its
+# coordinates field; same as atom2pat's group, which is the word after
+# the last ") " followed by a word (if there is one)
+_ATOM_DISPNAME_PATTERN = "(?:.*\))? (\w+)"
+atomdisppat = re.compile(_ATOM_DISPNAME_PATTERN)
+
+# atom1pat and atom2pat combined, for reading atom records in batches
+# (the last group is None whenever atom2pat would not match)
+atom12pat = re.compile("atom (\d+) \((\d+)\) \((-?\d+), (-?\d+), (-?\d+)\)(?:" +
+                       _ATOM_DISPNAME_PATTERN + ")?")
+
+def atom_record_dispname(text):
+    """
+    Given the rest of an atom record after its coordinates field
+    (e.g. " def"), return its display style name, or None if it has none
+    (which means the atom gets the default display style).
+    """
+    m = atomdisppat.match(text)
+    return m and m.group(1)
+
 # Old Rotary Motor record format: 
 # rmotor (name) (r, g, b) torque speed (cx, cy, cz) (ax, ay, az)
 old_rmotpat = re.compile("rmotor \((.+)\) \((\d+), (\d+), (\d+)\) (-?\d+\.\d+) (-?\d+\.\d+) \((-?\d+), (-?\d+), (-?\d+)\) \((-?\d+), (-?\d+), (-?\d+)\)")
@@ -222,6 +246,23 @@ mdihedralpat = re.compile("mdihedral " + nameRgbFontnameFontsize +
 
 # == reading mmp files
 
+# maps the first 5 characters of each kind of mmp record which
+# _readmmp_state.read_atom_and_bond_records can read
+# to the bond valence for that record (None for atom records)
+_BATCHED_RECORD_VALENCES = {
+    'atom ': None,
+    'bond1': V_SINGLE,
+    'bond2': V_DOUBLE,
+    'bond3': V_TRIPLE,
+    'bonda': V_AROMATIC,
+    'bondg': V_GRAPHITE,
+    'bondc': V_CARBOMERIC,
+ }
+
+# how many consecutive atom and bond records _readmmp passes to
+# read_atom_and_bond_records at once (this bounds the memory used for them)
+_MAX_BATCHED_RECORDS = 2000
+
 _MMP_FORMAT_VERSION_WE_CAN_READ__MOST_CONSERVATIVE = '050920 required; 080321 preferred'
     # ideally, this should be identical to MMP_FORMAT_VERSION_TO_WRITE,
     # and should just be called _MMP_FORMAT_VERSION_WE_CAN_READ,
@@ -295,7 +336,7 @@ class _readmmp_state:
     prevchunk = None # the current Chunk being built, if any [renamed from self.mol, bruce 071023]
     prevmotor = None # the last motor jig read, if any (used by shaft record)
     
-    def __init__(self, assy, isInsert):
+    def __init__(self, assy, isInsert, readInBatches = False):
         self.assy = assy
             #bruce 060117 comment: self.assy is only used to pass to Node constructors (including _MarkerNode),
             # and to set assy.temperature and assy.mmpformat (only done if not isInsert, which looks like only use of isInsert here).
@@ -315,6 +356,8 @@ class _readmmp_state:
             # (replacing attributes of self named by the specific kinds)
         self._registered_parser_objects = {} #bruce 071017
         self.listOfAtomsInFileOrder = []
+        self._may_read_in_batches = readInBatches and \
+                                    self._can_read_records_in_batches()
         return
 
     def destroy(self):
@@ -620,9 +663,9 @@ class _readmmp_state:
         a = Atom(sym, xyz, self.prevchunk) # sets default atomtype for the element [behavior of that was revised by bruce 050707]
         self.listOfAtomsInFileOrder.append(a)
         a.unset_atomtype() # let it guess atomtype later from the bonds read from subsequent mmp records [bruce 050707]
-        disp = atom2pat.match(card)
-        if disp:
-            a.setDisplayStyle(interpret_dispName(disp.group(1))) #bruce 080324 revised
+        dispname = atom_record_dispname(card[m.end():])
+        if dispname:
+            a.setDisplayStyle(interpret_dispName(dispname)) #bruce 080324 revised
         self.ndix[n] = a
         self.prevatom = a
         self.prevcard = card
@@ -656,6 +699,242 @@ class _readmmp_state:
             print card
             #e better error action, like some exception?
 
+    # == reading atom and bond records in batches
+
+    # Most lines of a large mmp file are atom and bond records, and most of
+    # the time spent reading them (by readmmp_line, _read_atom, and
+    # read_bond_record) goes to per-line dispatch, regexps, and per-atom
+    # invalidations in Chunk.addatom. So _readmmp can instead pass runs
+    # of consecutive atom and bond records (which all belong to the same
+    # chunk, since they don't include mol records) to
+    # read_atom_and_bond_records, which parses them all at once and then adds
+    # all their atoms to their chunk at once. The results are the same
+    # as when reading them one line at a time, including atom keys and
+    # the order of bonds on atoms. Records which might need error handling
+    # (e.g. bond records with unknown atom codes, or bond records with no
+    # preceding atom) end a batch and are read by readmmp_line as usual,
+    # so their effects and messages are also the same, except that after
+    # an exception while making bonds, some atoms from later lines in the
+    # same batch will also have been made.
+
+    def can_read_in_batches(self, card):
+        """
+        Could card be read by read_atom_and_bond_records?
+
+        @note: this is called for every line of an mmp file, so it's
+               optimized for speed rather than exactness; a card for which it
+               returns True might still need to be read by readmmp_line
+               (which read_atom_and_bond_records will do if necessary).
+        """
+        key = card[:5]
+        if not self._may_read_in_batches or \
+           not _BATCHED_RECORD_VALENCES.has_key(key):
+            return False
+        # the key 'atom ' already includes the space after the record name,
+        # but the bond record names must be followed by one
+        # (so records with longer names starting with them are not batched)
+        return key == 'atom ' or card[5:6].isspace()
+
+    def _can_read_records_in_batches(self):
+        """
+        [private]
+        Return False if any registered record parser would override
+        the methods we use to read atom and bond records,
+        otherwise True.
+        """
+        for card in _BATCHED_RECORD_VALENCES.keys():
+            recordname = card.strip()
+            if self._find_registered_parser_object(recordname):
+                return False
+        return True
+
+    def read_atom_and_bond_records(self, cards):
+        """
+        Read a list of consecutive atom and bond records (lines of an mmp
+        file for which self.can_read_in_batches returned True)
+        with the same effect as passing each one to self.readmmp_line,
+        but much faster.
+
+        @return: None, or an error message which means that _readmmp
+                 should stop reading (since an exception occurred while
+                 reading one of the lines).
+        """
+        while cards:
+            # parse all the atom records we can, and find the bond record valences
+            records = [] # (valence, fields) per record, as for _read_parsed_records
+            coords = [] # the coordinate strings from the atom records
+            for card in cards:
+                valence = _BATCHED_RECORD_VALENCES[card[:5]]
+                if valence is None:
+                    m = atom12pat.match(card)
+                    if not m:
+                        break # let _read_atom handle (or complain about) this card
+                    records.append( (None, (int(m.group(1)),
+                                            int(m.group(2)),
+                                            m.group(6),
+                                            len(coords) / 3)) )
+                    coords.extend( m.group(3, 4, 5) )
+                else:
+                    records.append( (valence, map(int, re.findall("\d+", card[5:]))) )
+                continue
+            xyzs = A(map(float, coords)) / 1000.0
+                # same values as decode_atom_coordinates would return
+            xyzs.shape = (-1, 3)
+            errmsg = self._read_parsed_records(records, xyzs, cards.__getitem__)
+            if errmsg:
+                return errmsg
+            if len(records) == len(cards):
+                break
+            # we couldn't parse this card here
+            errmsg = _read_mmp_line(self, cards[len(records)])
+            if errmsg:
+                return errmsg
+            cards = cards[len(records) + 1:]
+            continue
+        return None
+
+    def read_atom_record_block(self, block):
+        """
+        Read the records in block, an AtomRecordBlock from a compact mmp file,
+        with the same effect as passing each of the mmp file lines it
+        represents to self.readmmp_line.
+
+        @return: None, or an error message which means that _readmmp
+                 should stop reading.
+        """
+        if not self._may_read_in_batches:
+            for card in block.text_lines():
+                errmsg = _read_mmp_line(self, card)
+                if errmsg:
+                    return errmsg
+            return None
+        records = block.records(self._atom_record_dispname)
+        xyzs = block.coords / 1000.0
+            # same values as decode_atom_coordinates would return
+        return self._read_parsed_records(records, xyzs, block.card)
+
+    def _atom_record_dispname(self, dispname):
+        """
+        [private helper for read_atom_record_block]
+
+        Return the display style name which _read_atom would use
+        for an atom record whose text ends with dispname (after the
+        space following its coordinates field), or None if it would use
+        the default display style.
+        """
+        return atom_record_dispname(" " + dispname)
+
+    def _read_parsed_records(self, records, xyzs, card):
+        """
+        [private helper for read_atom_and_bond_records and
+         read_atom_record_block]
+
+        Read records, a list of parsed atom and bond records. Each one is
+        (None, (atom code, element number, display style name or None,
+        index of position in xyzs)) for an atom record, or (valence, list
+        of atom codes) for a bond record. The function card(i) returns the
+        text of record i (for error messages, or for reading it normally).
+
+        @return: None, or an error message which means that _readmmp
+                 should stop reading.
+        """
+        start = 0
+        while start < len(records):
+            errmsg, count = self._make_atoms_and_bonds(records, start, xyzs, card)
+            if errmsg:
+                return errmsg
+            start += count
+            if start < len(records):
+                # we couldn't read this record in a batch
+                errmsg = _read_mmp_line(self, card(start))
+                if errmsg:
+                    return errmsg
+                start += 1
+            continue
+        return None
+
+    def _make_atoms_and_bonds(self, records, start, xyzs, card):
+        """
+        [private helper for _read_parsed_records]
+
+        Read as many of records[start:] as possible, up to the first one
+        which needs to be read by readmmp_line.
+
+        @return: (errmsg, number of records read)
+        """
+        # make the atoms (not yet in a chunk), and find the atoms to bond
+        chunk = self.prevchunk
+        newatoms = [] # the atoms read from records, in order
+        dispnames = [] # their display style names, or None for default
+        bonds = [] # (atom, atoms to bond it to, valence, index of bond record) per bond record
+        symbols = {} # element number -> element symbol
+        index = start # index of next record to read
+        for valence, fields in records[start:]:
+            if valence is None:
+                atomcode, elementnumber, dispname, xyzindex = fields
+                try:
+                    sym = symbols[elementnumber]
+                except KeyError:
+                    try:
+                        sym = PeriodicTable.getElement(elementnumber).symbol
+                    except:
+                        # (same as in _read_atom)
+                        sym = "C"
+                        errmsg = "unsupported element in this mmp line; using %s: %s" % (sym, card(index),)
+                        self.format_error(errmsg)
+                    else:
+                        symbols[elementnumber] = sym
+                if chunk is None:
+                    # (same as in _read_atom)
+                    self.guess_sim_input('missing_group_or_chunk')
+                    chunk = Chunk(self.assy,  "sim chunk")
+                    self.addmember(chunk)
+                    self.prevchunk = chunk
+                a = Atom(sym, xyzs[xyzindex], None)
+                a.unset_atomtype()
+                newatoms.append(a)
+                dispnames.append(dispname)
+                self.ndix[atomcode] = a
+                self.prevatom = a
+                self.prevcard = card(index)
+            else:
+                if self.prevatom is None:
+                    break # let read_bond_record handle (or fail on) this record
+                try:
+                    atoms = map((lambda n: self.ndix[n]), fields)
+                except KeyError:
+                    # an unknown atom code -- let read_bond_record handle
+                    # this record, so its results and error message are
+                    # exactly the same as when not reading in batches
+                    break
+                bonds.append( (self.prevatom, atoms, valence, index) )
+            index += 1
+            continue
+
+        if newatoms:
+            self.listOfAtomsInFileOrder.extend(newatoms)
+            # inlined chunk.addatom for all the new atoms, with only one
+            # call of chunk.invalidate_atom_lists (as in Chunk.copy_full_in_mapping)
+            chunk_atoms = chunk.atoms
+            for a in newatoms:
+                a.molecule = chunk
+                a.index = -1
+                chunk_atoms[a.key] = a
+                # note: Atom.__init__ already did _changed_parent_Atoms[a.key] = a
+            chunk.invalidate_atom_lists()
+            for a, dispname in zip(newatoms, dispnames):
+                if dispname is not None:
+                    a.setDisplayStyle(interpret_dispName(dispname))
+
+        for atom1, atoms, valence, bondindex in bonds:
+            try:
+                for a in atoms:
+                    bond_atoms( atom1, a, valence, no_corrections = True)
+            except:
+                return _bug_reading_mmp_line(card(bondindex)), index - start
+
+        return None, index - start
+
     def _read_bond_direction(self, card): #bruce 070415
         atomcodes = card.strip().split()[1:] # note: these are strings, but self.ndix needs ints
         assert len(atomcodes) >= 2
@@ -1507,11 +1786,37 @@ def readmmp_info( card, currents, interp ): #bruce 050217; revised 050421, 05051
 
 # ==
 
+def _read_mmp_line(state, card):
+    """
+    Read one line of an mmp file using state (a _readmmp_state),
+    reporting any exception as a bug.
+
+    @return: None, or an error message which means that the caller
+             should stop reading.
+    """
+    try:
+        errmsg = state.readmmp_line( card) # None or an error message
+    except:
+        errmsg = _bug_reading_mmp_line(card)
+    return errmsg
+
+def _bug_reading_mmp_line(card):
+    """
+    Report the exception being handled as a bug while reading card,
+    and return an error message for it.
+    (Only call this from an except clause.)
+    """
+    # note: the following two error messages are similar but not identical
+    errmsg = "bug while reading this mmp line: %s" % (card,) #e include line number; note, two lines might be identical
+    print_compact_traceback("bug while reading this mmp line:\n  %s\n" % (card,) )
+    return errmsg
+
 _readmmp_aborted = False
 
 _reference_to_readmmp_abort_function = None #bruce 080606 precaution
 
-def _readmmp(assy, filename, isInsert = False, showProgressDialog = False): 
+def _readmmp(assy, filename, isInsert = False, showProgressDialog = False,
+             readInBatches = None):
     """
     Read an mmp file, print errors and warnings to history,
     modify assy in various ways (a bad design, see comment in insertmmp)
@@ -1543,6 +1848,11 @@ def _readmmp(assy, filename, isInsert = False, showProgressDialog = False):
                                a file. Default is False.
     @type  showProgressDialog: boolean
 
+    @param readInBatches: if True, read runs of consecutive atom and bond
+                          records in batches (faster, same result);
+                          if None (the default), use a debug_pref to decide.
+    @type  readInBatches: boolean or None
+
     @return: the tuple (ok, grouplist or None, listOfAtomsInFileOrder), where
              ok is one of the string constants named (in utilities.constants)
              SUCCESS, ABORTED, or READ_ERROR. (If ok is not SUCCESS, grouplist
@@ -1554,7 +1864,11 @@ def _readmmp(assy, filename, isInsert = False, showProgressDialog = False):
     #ericm 080409 revised return value to contain listOfAtomsInFileOrder
     #bruce 080502 documented return value; fixed it when file is empty
     
-    state = _readmmp_state( assy, isInsert)
+    if readInBatches is None:
+        from utilities.GlobalPreferences import debug_pref_read_atoms_in_batches
+        readInBatches = debug_pref_read_atoms_in_batches()
+    
+    state = _readmmp_state( assy, isInsert, readInBatches)
     
     # The following code is experimental. It reads an mmp file that is contained
     # within a ZIP file. To test, create a zipfile (i.e. "part.zip") which
@@ -1571,13 +1885,39 @@ def _readmmp(assy, filename, isInsert = False, showProgressDialog = False):
         _zipfile = ZipFile(filename, 'r')
         _bytes = _zipfile.read("main.mmp")
         lines = _bytes.splitlines()
+        filesize = len(_bytes)
     else:
         # The normal way to read an MMP file.
+        # We iterate over the open file rather than using readlines(),
+        # so memory usage doesn't grow with file size.
         try:
-            lines = open(filename,"rU").readlines()
-            # 'U' in filemode is for universal newline support
+            if is_compact_mmp_file(filename):
+                # yields the same lines as the mmp file it was made from,
+                # except for runs of atom and bond records, which it yields
+                # as AtomRecordBlocks
+                lines = CompactMmpReader(filename)
+            else:
+                lines = open(filename,"rU")
+                # 'U' in filemode is for universal newline support
+            filesize = os.path.getsize(filename)
         except:
             return READ_ERROR, None, []
+    try:
+        return _readmmp_lines(state, assy, lines, filesize, showProgressDialog)
+    finally:
+        if hasattr(lines, 'close'):
+            lines.close()
+    pass
+
+def _readmmp_lines(state, assy, lines, filesize, showProgressDialog):
+    """
+    [private helper for _readmmp]
+
+    Read lines (an open mmp file, a list of its lines, or a CompactMmpReader)
+    using state.
+    The file size (in bytes) is only used for the progress dialog.
+    Return values are as for _readmmp.
+    """
     
     # Commented this out since the assy.filename should be (and is) set by 
     # another caller based on success.
@@ -1599,8 +1939,11 @@ def _readmmp(assy, filename, isInsert = False, showProgressDialog = False):
             # see comment about kluge_main_assy elsewhere in this file
             # [bruce 080319]
         assert not kluge_main_assy.assy_valid #bruce 080117
+        _bytesRead = 0
         _progressValue = 0
-        _progressFinishValue = len(lines)
+        _progressFinishValue = filesize / 1024 + 1
+            # in kilobytes, since QProgressDialog needs an int range
+            # and files can be larger than 2 GB
         win = env.mainwindow()
         win.progressDialog.setLabelText("Reading file...")
         win.progressDialog.setRange(0, _progressFinishValue)
@@ -1637,17 +1980,31 @@ def _readmmp(assy, filename, isInsert = False, showProgressDialog = False):
 
         pass
     
+    pending = [] # consecutive atom and bond records not yet read
+    errmsg = None
     for card in lines:
         if _readmmp_aborted: # User aborted while reading the MMP file.
             _readmmp_aborted = False # (precaution, not really needed, since not
                 # sufficient to replace the reset earlier in this function)
             return ABORTED, None, []
-        try:
-            errmsg = state.readmmp_line( card) # None or an error message
-        except:
-            # note: the following two error messages are similar but not identical
-            errmsg = "bug while reading this mmp line: %s" % (card,) #e include line number; note, two lines might be identical
-            print_compact_traceback("bug while reading this mmp line:\n  %s\n" % (card,) )
+        if isinstance(card, AtomRecordBlock):
+            # a run of atom and bond records from a compact mmp file
+            if pending:
+                errmsg = state.read_atom_and_bond_records(pending)
+                pending = []
+            if not errmsg:
+                errmsg = state.read_atom_record_block(card)
+        elif state.can_read_in_batches(card):
+            pending.append(card)
+            if len(pending) >= _MAX_BATCHED_RECORDS:
+                errmsg = state.read_atom_and_bond_records(pending)
+                pending = []
+        else:
+            if pending:
+                errmsg = state.read_atom_and_bond_records(pending)
+                pending = []
+            if not errmsg:
+                errmsg = _read_mmp_line(state, card) # None or an error message
         #e assert errmsg is None or a string
         if errmsg:
             ###e general history msg for stopping early on error
@@ -1655,7 +2012,11 @@ def _readmmp(assy, filename, isInsert = False, showProgressDialog = False):
             break
         
         if showProgressDialog: # Update the progress dialog.
-            _progressValue += 1
+            if isinstance(card, AtomRecordBlock):
+                _bytesRead += card.nbytes
+            else:
+                _bytesRead += len(card)
+            _progressValue = _bytesRead / 1024
             if _progressValue >= _progressFinishValue:
                 win.progressDialog.setLabelText("Building model...")
             elif _progressDialogDisplayed:
@@ -1674,6 +2035,10 @@ def _readmmp(assy, filename, isInsert = False, showProgressDialog = False):
                     # Display progress dialog after 0.25 seconds
                     win.progressDialog.setValue(_progressValue)
                     _progressDialogDisplayed = True
+        continue
+
+    if pending and not errmsg:
+        errmsg = state.read_atom_and_bond_records(pending)
         
     grouplist = state.extract_toplevel_items() # for a normal mmp file this has 3 Groups, whose roles are viewdata, tree, shelf
 
@@ -1727,7 +2092,8 @@ def readmmp(assy,
             filename,
             isInsert = False,
             showProgressDialog = False,
-            returnListOfAtoms = False):
+            returnListOfAtoms = False,
+            readInBatches = None):
     """
     Read an mmp file to create a new model (including a new
     Clipboard).  Returns a tuple described below, which
@@ -1763,6 +2129,8 @@ def readmmp(assy,
                               return value contains the group list.
                               See return value doc for details.
     @type  returnListOfAtoms: boolean
+
+    @param readInBatches: passed to _readmmp (see its docstring).
     
     @return: the tuple (ok, grouplist) or (ok, listOfAtoms)
              (depending on the returnListOfAtoms option)
@@ -1789,7 +2157,7 @@ def readmmp(assy,
     # always in the same format (ok, grouplist, listOfAtoms)
     # (just like _readmmp does now). [bruce 080606 suggestion]
 
-    kluge_main_assy = env.mainwindow().assy
+    kluge_main_assy = env.main_assy()
         # use this instead of assy to fix logic bug in use of assy_valid flag
         # (explained where it's used in master_model_updater)
         # which would be a potential bug during partlib mmpread
@@ -1801,7 +2169,8 @@ def readmmp(assy,
         ok, grouplist, listOfAtomsInFileOrder = _readmmp(assy,
                                                          filename,
                                                          isInsert,
-                                                         showProgressDialog)
+                                                         showProgressDialog,
+                                                         readInBatches)
             # warning: can show a dialog, which can cause paintGL calls.
     finally:
         kluge_main_assy.assy_valid = True
@@ -1949,7 +2318,7 @@ def insertmmp(assy, filename):
     
     # Note: this is a normal user operation, so there is no need
     # to refrain from setting assy's modified flag.
-    kluge_main_assy = env.mainwindow().assy
+    kluge_main_assy = env.main_assy()
         # use this instead of assy to fix logic bug in use of assy_valid flag
         # (explained where it's used in master_model_updater)
         # which would be a potential bug during partlib mmpread
@@ -2035,4 +2404,45 @@ def fix_assy_and_glpane_views_after_readmmp( assy, glpane):
         ## done by that: glpane._setInitialViewFromPart( mainpart)
     return
 
+# ==
+
+def _debug_check_reading_in_batches(widget):
+    """
+    [debug menu command]
+
+    Read the current model's mmp file twice, with and without reading atom
+    and bond records in batches, write each result with writemmpfile_assy,
+    and report whether the two written files are identical.
+    """
+    from model.assembly import Assembly
+    import filecmp, tempfile
+    win = env.mainwindow()
+    filename = win.assy.filename
+    if not filename or not os.path.isfile(filename):
+        env.history.message(redmsg("Save the model in an mmp file first."))
+        return
+    tmpdir = tempfile.mkdtemp()
+    outfiles = []
+    for readInBatches in (False, True):
+        assy = Assembly(win, "mmp reading check", run_updaters = True)
+        assy.set_glpane(win.glpane) # sets its .o and .glpane
+        ok, grouplist = readmmp(assy, filename, readInBatches = readInBatches)
+        if ok != SUCCESS:
+            env.history.message(redmsg("Can't read %s." % quote_html(filename)))
+            return
+        outfile = os.path.join(tmpdir, "batches_%s.mmp" % (readInBatches,))
+        assy.writemmpfile(outfile)
+        outfiles.append(outfile)
+        assy.deinit()
+    if filecmp.cmp(outfiles[0], outfiles[1], shallow = False):
+        env.history.message(greenmsg("Reading %s in batches gives the same result." %
+                                     quote_html(filename)))
+    else:
+        env.history.message(redmsg("Reading %s in batches gives a different result; "
+                                   "compare %s and %s." %
+                                   tuple(map(quote_html, [filename] + outfiles))))
+    return
+
+register_debug_menu_command("check mmp reading in batches", _debug_check_reading_in_batches)
+
 # end
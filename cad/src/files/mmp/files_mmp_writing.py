@@ -30,6 +30,9 @@ from files.mmp.mmpformat_versions import MMP_FORMAT_VERSION_TO_WRITE__WITH_NEW_D
 from files.mmp.mmpformat_versions import MMP_FORMAT_VERSION_TO_WRITE__WITH_COMPACT_BONDS_AND_NEW_DISPLAY_NAMES # temporary definition
 
 from files.mmp.mmp_dispnames import get_dispName_for_writemmp
+from files.mmp.compact_mmp import CompactMmpWriter, is_compact_mmp_filename
+
+from model.bonds import bonds_mmprecord
 
 from utilities import debug_flags
 
@@ -52,6 +55,7 @@ class writemmp_mapping: #bruce 050322, to help with minimize selection and other
     the unwritten jigs they refer to until they're written at the end.
     """
     fp = None
+    _compact_fp = None # fp, if it's a CompactMmpWriter
 
     def __init__(self, assy, **options):
         """
@@ -99,6 +103,10 @@ class writemmp_mapping: #bruce 050322, to help with minimize selection and other
         set file pointer to write to (don't forget to call write_header after this!)
         """
         self.fp = fp
+        if isinstance(fp, CompactMmpWriter):
+            self._compact_fp = fp
+        else:
+            self._compact_fp = None
         return
     
     def write(self, lines):
@@ -109,6 +117,30 @@ class writemmp_mapping: #bruce 050322, to help with minimize selection and other
         self.fp.write(lines)
         return
     
+    def write_atom_record(self, print_fields):
+        """
+        write an atom record, given the tuple of values
+        (atom code, element number, x, y, z, display style name)
+        to format into its text (as strings, except for element number)
+        """
+        if self._compact_fp is not None:
+            # store it in arrays, without making its text
+            self._compact_fp.write_atom_record(print_fields)
+        else:
+            self.fp.write("atom %s (%d) (%s, %s, %s) %s\n" % print_fields)
+        return
+
+    def write_bond_record(self, valence, atomcodes):
+        """
+        write a bond record for bonds of the given valence
+        from the prior atom to each of the atoms with the given atomcodes
+        """
+        if self._compact_fp is not None:
+            self._compact_fp.write_bond_record(valence, atomcodes)
+        else:
+            self.fp.write( bonds_mmprecord( valence, atomcodes ) + "\n")
+        return
+
     def encode_name(self, name): #bruce 050618 to fix part of bug 474 (by supporting ')' in node names)
         """
         encode name suitable for being terminated by ')', as it is in the current mmp format
@@ -394,6 +426,22 @@ class writemmp_mapping: #bruce 050322, to help with minimize selection and other
 
 # ==
 
+def _open_mmp_file_for_writing(filename, mapping_options):
+    """
+    [private helper for writemmpfile_assy and writemmpfile_part]
+
+    Return a file-like object for writing a new mmp file of the given
+    filename: a CompactMmpWriter if mapping_options contains compact = True
+    (which is removed from it), or if it doesn't say and filename has the
+    compact mmp extension; otherwise an ordinary text file.
+    """
+    compact = mapping_options.pop('compact', None)
+    if compact is None:
+        compact = is_compact_mmp_filename(filename)
+    if compact:
+        return CompactMmpWriter(filename)
+    return open(filename, "w")
+
 def writemmpfile_assy(assy, filename, addshelf = True, **mapping_options):
     """
     Write everything in this assy (chunks, jigs, Groups,
@@ -402,6 +450,10 @@ def writemmpfile_assy(assy, filename, addshelf = True, **mapping_options):
     Should be called via the assy method writemmpfile.
     Should properly save entire file regardless of current part
     and without changing current part.
+
+    If mapping_options contains compact = True, or filename ends with
+    COMPACT_MMP_EXTENSION (and compact is not given), write a compact
+    mmp file (see compact_mmp.py).
     """
     #e maybe: should merge with writemmpfile_part
 
@@ -410,11 +462,12 @@ def writemmpfile_assy(assy, filename, addshelf = True, **mapping_options):
     
     ##Huaicai 1/27/05, save the last view before mmp file saving
     #bruce 050419 revised to save into glpane's current part
-    assy.o.saveLastView()
+    if assy.o is not None: # None in headless batch runs
+        assy.o.saveLastView()
 
     assy.update_parts() #bruce 050325 precaution
     
-    fp = open(filename, "w")
+    fp = _open_mmp_file_for_writing(filename, mapping_options)
 
     mapping = writemmp_mapping(assy, **mapping_options)
         ###e should pass sim or min options when used that way...
@@ -450,8 +503,9 @@ def writemmpfile_part(part, filename, **mapping_options):
     #bruce 051209 added mapping_options
     # as of 050412 this didn't yet turn singlets into H;
     # but as of long before 051115 it does (for all calls -- so it would not be good to use for Save Selection!)
-    part.assy.o.saveLastView() ###e should change to part.glpane? not sure... [bruce 050419 comment]
-        # this updates assy.part namedView records, but we don't currently write them out below
+    if part.assy.o is not None: # None in headless batch runs
+        part.assy.o.saveLastView() ###e should change to part.glpane? not sure... [bruce 050419 comment]
+            # this updates assy.part namedView records, but we don't currently write them out below
     node = part.topnode
     assert part is node.part
     part.assy.update_parts() #bruce 050325 precaution
@@ -460,7 +514,7 @@ def writemmpfile_part(part, filename, **mapping_options):
     part = node.part
     assy = part.assy
     #e assert node is tree or shelf member? is there a method for that already? is_topnode?
-    fp = open(filename, "w")
+    fp = _open_mmp_file_for_writing(filename, mapping_options)
     mapping = writemmp_mapping(assy, **mapping_options)
     mapping.set_fp(fp)
     try:
@@ -115,6 +115,11 @@ _dictname_for_dictid = {} # maps id(dict) to its name;
     # it's ok for multiple dicts to have the same name;
     # never cleared (memory leak is ok since it's small)
 
+_related_attrs_for_dictid = {} # maps id(dict) to the tuple of attrs whose
+    # changes it records (as passed to register_changedict);
+    # directly referenced in undo_archive._archive_meet_class
+    # [added for incremental undo checkpoints]
+
 _cdproc_for_dictid = {} # maps id(dict) to its changedict_processor;
     # not sure if leak is ok, and/or if this could be used to provide names too
     # WARNING: the name says it's private, but it's directly referenced in
@@ -127,14 +132,15 @@ def register_changedict( changedict, its_name, related_attrs ):
     #bruce 060329 not yet well defined what it should do ###@@@
     #e does it need to know the involved class?
     cdp = changedict_processor( changedict, its_name )
-    del related_attrs # not sure these should come from an arg at all,
-        # vs per-class decls... or if we even need them...
-    #stub?
+    # not sure related_attrs should come from an arg at all,
+    # vs per-class decls... but incremental undo checkpoints use them
+    # to find the changedicts which only record position changes.
     dictid = id(changedict)
     ## assert not _dictname_for_dictid.has_key(dictid)
         # this is not valid to assert, since ids can be recycled if dicts are freed
     _dictname_for_dictid[dictid] = its_name
     _cdproc_for_dictid[dictid] = cdp
+    _related_attrs_for_dictid[dictid] = tuple(related_attrs)
     return
 
 _changedicts_for_classid = {} # maps id(class) to map from dictname to dict
@@ -72,6 +72,8 @@ per-assy.
 
 _mainWindow = None
 
+_headless_main_assy = None
+
 
 # Initialize the 'prefs' value. It is redefined in preference.py
 # see preferences.init_prefs_table for details. 
@@ -108,6 +110,28 @@ def mainwindow(): #bruce 051209
 mainWindow = mainwindow # alias which should become the new name of
     # that function [bruce 080605]
 
+def set_headless_main_assy(assy):
+    """
+    In a process with no main window (see ne1_startup/headless_batch.py),
+    set the Assembly which will be returned by env.main_assy().
+    """
+    global _headless_main_assy
+    assert _mainWindow is None, "can't set a headless main assy " \
+           "when there is a main window"
+    _headless_main_assy = assy
+
+def main_assy():
+    """
+    Return the main Assembly, i.e. env.mainwindow().assy, or in a process
+    with no main window, the one set by set_headless_main_assy.
+
+    Code which controls the model updaters for all Assemblies (see
+    kluge_main_assy in master_model_updater.py) should use this.
+    """
+    if _headless_main_assy is not None:
+        return _headless_main_assy
+    return mainwindow().assy
+
 def debug(): #bruce 060222
     """
     Should debug checks be run, and debug messages be printed, and debug
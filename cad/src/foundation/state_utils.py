@@ -1593,13 +1593,20 @@ def diffdicts(d1, d2, dflt = None, whatret = 0, val_diff_func = None):
 ##            print "one place we can make a %s priorstate like %r is: %s" % (what, priorstate, stack)
 ##    return
 
-def diff_and_copy_state(archive, assy, priorstate): #060228 (#e maybe this is really an archive method? 060408 comment & revised docstring)
+def diff_and_copy_state(archive, assy, priorstate, node_layer_unchanged = False, check_node_layer = False): #060228 (#e maybe this is really an archive method? 060408 comment & revised docstring)
     """
     Figure out how the current actual model state (of assy) differs from the last model state we archived (in archive/priorstate).
     Return a new StatePlace (representing a logically immutable snapshot of the current model state)
     which presently owns a complete copy of that state (a mutable StateSnapshot which always tracks our most recent snapshot
     of the actual state), but is willing to give that up (and redefine itself (equivalently) as a diff from a changed version of that)
     when this function is next called.
+
+    If node_layer_unchanged is true, the caller promises that nothing outside the 'atoms layer' has changed
+    since priorstate was made. Then (if priorstate's snapshot still knows which child objects were live)
+    we skip the full scan of non-atoms-layer state, and only look at the atoms and bonds in the archive's
+    changedicts, so our runtime depends on how much changed rather than on the size of the model.
+    In that case, if check_node_layer is also true, we do the full scan anyway and report a bug
+    (and use its results) if the caller's promise was false.
     """
     # background: we keep a mutable snapshot of the last checkpointed state. right now it's inside priorstate (and defines
     # that immutable-state-object's state), but we're going to grab it out of there and modify it to equal actual current state
@@ -1612,21 +1619,44 @@ def diff_and_copy_state(archive, assy, priorstate): #060228 (#e maybe this is re
     new = StatePlace() # will be given stewardship of our maintained copy of almost-current state, and returned
     # diffobj is not yet needed now, just returned from diff_snapshots_oneway:
     ## diffobj = DiffObj() # will record diff from new back to priorstate (one-way diff is ok, if traversing it also reverses it)
+    childobj_dict = None
+    if node_layer_unchanged:
+        # (this must be grabbed before steal_lastsnap discards it;
+        #  it's None unless lastsnap is still exactly what the last scan found)
+        childobj_dict = getattr(priorstate.lastsnap, '_childobj_dict', None)
     steal_lastsnap_method = priorstate.steal_lastsnap
     lastsnap = steal_lastsnap_method( ) # and we promise to replace it with (new, diffobj) later, so priorstate is again defined
     assert isinstance(lastsnap, StateSnapshot) # remove when works, eventually ###@@@
     # now we own lastsnap, and we'll modify it to agree with actual current state, and record the changes required to undo this...
     # 060329: this (to end of function) is where we have to do things differently when we only want to scan changed objects.
     # So we do the old full scan for most kinds of things, but not for the 'atoms layer' (atoms, bonds, Chunk.atoms attr).
-    import foundation.undo_archive as undo_archive #e later, we'll inline this until we reach a function in this file
-    cursnap = undo_archive.current_state(archive, assy, use_060213_format = True, exclude_layers = ('atoms',)) # cur state of child objs
     lastsnap_diffscan_layers = lastsnap.extract_layers( ('atoms',) ) # prior state of atoms & bonds, leaving only childobjs in lastsnap
-    diffobj = diff_snapshots_oneway( cursnap, lastsnap ) # valid for everything except the 'atoms layer' (atoms & bonds)
-    ## lastsnap.become_copy_of(cursnap) -- nevermind, just use cursnap
-    lastsnap = cursnap
-    del cursnap
-
-    modify_and_diff_snap_for_changed_objects( archive, lastsnap_diffscan_layers, ('atoms',), diffobj, lastsnap._childobj_dict ) #060404
+    if childobj_dict is not None:
+        # incremental case: lastsnap (minus its atoms layer) is still current
+        diffobj = DiffObj()
+        if check_node_layer:
+            import foundation.undo_archive as undo_archive
+            cursnap = undo_archive.current_state(archive, assy, use_060213_format = True, exclude_layers = ('atoms',))
+            checkdiff = diff_snapshots_oneway( cursnap, lastsnap )
+            if checkdiff.nonempty():
+                print "bug: incremental undo checkpoint would miss %d changes outside the atoms layer;" \
+                      " using a full scan instead" % checkdiff.size()
+                diffobj = checkdiff
+                lastsnap = cursnap
+                childobj_dict = cursnap._childobj_dict
+            del cursnap, checkdiff
+        modify_and_diff_snap_for_changed_objects( archive, lastsnap_diffscan_layers, ('atoms',), diffobj, childobj_dict,
+                                                  posn_atoms_separately = True )
+        lastsnap._childobj_dict = childobj_dict # still valid, since no child objects were added or removed
+    else:
+        import foundation.undo_archive as undo_archive #e later, we'll inline this until we reach a function in this file
+        cursnap = undo_archive.current_state(archive, assy, use_060213_format = True, exclude_layers = ('atoms',)) # cur state of child objs
+        diffobj = diff_snapshots_oneway( cursnap, lastsnap ) # valid for everything except the 'atoms layer' (atoms & bonds)
+        ## lastsnap.become_copy_of(cursnap) -- nevermind, just use cursnap
+        lastsnap = cursnap
+        del cursnap
+
+        modify_and_diff_snap_for_changed_objects( archive, lastsnap_diffscan_layers, ('atoms',), diffobj, lastsnap._childobj_dict ) #060404
     
     lastsnap.insert_layers(lastsnap_diffscan_layers)
     new.own_this_lastsnap(lastsnap)
@@ -1634,7 +1664,8 @@ def diff_and_copy_state(archive, assy, priorstate): #060228 (#e maybe this is re
     new.really_changed = not not diffobj.nonempty() # remains correct even when new's definitional content changes
     return new
 
-def modify_and_diff_snap_for_changed_objects( archive, lastsnap_diffscan_layers, layers, diffobj, childobj_dict ): #060404
+def modify_and_diff_snap_for_changed_objects( archive, lastsnap_diffscan_layers, layers, diffobj, childobj_dict,
+                                              posn_atoms_separately = False ): #060404
     #e rename lastsnap_diffscan_layers
     """
     [this might become a method of the undo_archive; it will certainly be generalized, as its API suggests]
@@ -1642,6 +1673,9 @@ def modify_and_diff_snap_for_changed_objects( archive, lastsnap_diffscan_layers,
     - Use those to modify lastsnap_diffscan_layers to cover changes tracked
       in the layers specified (for now only 'atoms' is supported),
     - and record the diffs from that into diffobj.
+
+    If posn_atoms_separately is true, only the position attrs are compared
+    for live atoms which were only recorded as having changed position.
     """
     assert len(layers) == 1 and layers[0] == 'atoms' # this is all that's supported for now
     # Get the sets of possibly changed objects... for now, this is hardcoded as 2 dicts, for atoms and bonds,
@@ -1653,9 +1687,14 @@ def modify_and_diff_snap_for_changed_objects( archive, lastsnap_diffscan_layers,
     #  and does that get recorded somehow in this lastsnap_diffscan_layers object,
     #  which knows the attrs it contains? yes, that would be good... for some pseudocode
     #  related to this, see commented-out method xxx, just below.]
-    chgd_atoms, chgd_bonds = archive.get_and_clear_changed_objs()
+    if posn_atoms_separately:
+        chgd_atoms, chgd_bonds, chgd_posn_atoms = archive.get_and_clear_changed_objs( separate_posn_Atoms = True)
+    else:
+        chgd_atoms, chgd_bonds = archive.get_and_clear_changed_objs()
+        chgd_posn_atoms = {}
     if (env.debug() or DEBUG_PYREX_ATOMS):
-        print "\nchanged objects: %d atoms, %d bonds" % (len(chgd_atoms), len(chgd_bonds))
+        print "\nchanged objects: %d atoms, %d bonds, %d atoms with only position changes" % \
+              (len(chgd_atoms), len(chgd_bonds), len(chgd_posn_atoms))
     # discard wrong assy atoms... can we tell by having an objkey? ... imitate collect_s_children and (mainly) collect_state
     keyknower = archive.objkey_allocator
     _key4obj = keyknower._key4obj
@@ -1684,6 +1723,17 @@ def modify_and_diff_snap_for_changed_objects( archive, lastsnap_diffscan_layers,
                 changed_live[id(obj)] = obj
             else:
                 changed_dead[id(obj)] = obj
+    posn_changed_live = {} # live atoms whose positions (but nothing else) might have changed
+    for akey_unused, obj in chgd_posn_atoms.iteritems():
+        key = _key4obj.get(id(obj))
+        if key is None:
+            if archive.new_Atom_oursQ(obj):
+                key = 1
+        if key:
+            if archive.trackedobj_liveQ(obj):
+                posn_changed_live[id(obj)] = obj
+            else:
+                changed_dead[id(obj)] = obj
     archive._childobj_dict = None
     ## print "changed_live = %s, changed_dead = %s" % (changed_live,changed_dead)
     key4obj = keyknower.key4obj_maybe_new
@@ -1740,6 +1790,32 @@ def modify_and_diff_snap_for_changed_objects( archive, lastsnap_diffscan_layers,
                 diff_attrdict[key] = oldval #k if this fails, just use setdefault with {} 
         attrcode = None
         del attrcode
+    posn_pairs_for_clas = {} # maps id(clas) to its (attrcode, dflt) pairs for '_posn'
+    for idobj, obj in posn_changed_live.iteritems():
+        # like the changed_live loop above, but only for position attrs
+        key = key4obj(obj)
+        clas = ci(obj)
+        pairs = posn_pairs_for_clas.get(id(clas))
+        if pairs is None:
+            pairs = [(attrcode, dflt) for attrcode, dflt in clas.attrcode_dflt_pairs
+                     if attrcode[0] == '_posn'] + \
+                    [(attrcode, _Bugval) for attrcode in clas.attrcodes_with_no_dflt
+                     if attrcode[0] == '_posn']
+            posn_pairs_for_clas[id(clas)] = pairs
+        for attrcode, dflt in pairs:
+            attr, acode_unused = attrcode
+            state_attrdict = state_attrdicts[attrcode]
+            val = getattr(obj, attr, dflt)
+            if val is dflt and dflt is not _Bugval:
+                val = _UNSET_
+            oldval = state_attrdict.get(key, _UNSET_)
+            if not same_vals(oldval, val):
+                if val is _UNSET_:
+                    state_attrdict.pop(key, None)
+                else:
+                    state_attrdict[key] = copy_val(val)
+                diff_attrdicts[attrcode][key] = oldval
+        continue
     for idobj, obj in changed_dead.iteritems():
         #e if we assumed these all have same clas, we could invert loop order and heavily optimize
         key = key4obj(obj)
@@ -1757,7 +1833,7 @@ def modify_and_diff_snap_for_changed_objects( archive, lastsnap_diffscan_layers,
     if 1:
         from foundation.undo_archive import _undo_debug_obj, _undo_debug_message
         obj = _undo_debug_obj
-        if id(obj) in changed_dead or id(obj) in changed_live:
+        if id(obj) in changed_dead or id(obj) in changed_live or id(obj) in posn_changed_live:
             # this means obj is not None, so it's ok to take time and print things
             key = _key4obj.get(id(obj))
             if key is not None:
@@ -1858,13 +1934,33 @@ class StatePlace:
         self.get_snap_back_to_self(accum_diffobj = accum_diffobj)
         return accum_diffobj.attrdicts #e might be better to get more methods into diffobj and then return diffobj here
     
+    def discard_diff_from(self, place):
+        """
+        If self is defined by a diff from place (another StatePlace),
+        discard that diff (leaving self undefined) and return True;
+        otherwise do nothing and return False.
+        Only legal when nothing will ask for self's state again.
+        """
+        if self.diff_and_place is not None and self.diff_and_place[1] is place:
+            self.diff_and_place = None
+            return True
+        return False
+    
     def _relative_RAM(self, priorplace): #060323
         """
         Return a guess about the RAM requirement of retaining the diff data to let this state
         be converted (by Undo) into the state represented by priorplace, also a StatePlace (??).
         Temporary kluge: this must only be called at certain times, soon after self finalized... not sure of details.
+        [Return 0 if neither place is defined directly by a diff from the other.]
         """
-        return 18 # stub
+        # the diff can be stored in either place, depending on which of them
+        # is closer to the place which presently owns the lastsnap [060323 stub, implemented later]
+        for place1, place2 in ((self, priorplace), (priorplace, self)):
+            if place1.diff_and_place is not None:
+                diff, place = place1.diff_and_place
+                if place is place2:
+                    return diff.RAM_usage_guess()
+        return 0
     pass # end of class StatePlace
 
 def apply_and_reverse_diff(diff, snap):
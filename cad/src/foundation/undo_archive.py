@@ -28,6 +28,7 @@ from foundation.state_constants import UNDO_SPECIALCASE_ATOM, UNDO_SPECIALCASE_B
 from foundation.state_constants import ATOM_CHUNK_ATTRIBUTE_NAME
 
 from utilities.prefs_constants import historyMsgSerialNumber_prefs_key
+from utilities.prefs_constants import undoStackMemoryLimit_prefs_key
 from foundation.changes import register_postinit_object
 import foundation.changedicts as changedicts # warning: very similar to some local variable names
 
@@ -908,6 +909,7 @@ class Checkpoint:
         ## self.ver = 'ver-' + `_cp_counter` # this also helps sort Redos
         self.ver = None # not yet known (??)
         self.complete = False # public for get and set
+        self.nonposition_change_indicators = None # set by fill_checkpoint
         if debug_undo2:
             print "debug_undo2: made cp:", self
         return
@@ -1296,6 +1298,7 @@ def make_empty_checkpoint(assy, cptype = None):
         # makes up cp.ver -- would we ideally do that here, or not?
     cp.cptype = cptype #e put this inside constructor? (i think it's always None or 'initial', here)
     cp.assy_change_indicators = None # None means they're not yet known
+    cp.nonposition_change_indicators = None
     return cp
 
 def current_state(archive, assy, **options):
@@ -1339,6 +1342,8 @@ def fill_checkpoint(cp, state, assy): #e later replace calls to this with cp met
     # Each of them is used in more than one place in this file, I think (i.e. 4 uses in all, 2 for each).
     # This ought to be fixed but I'm not sure how is best, so leaving both places active for now. [bruce 060227]
     cp.assy_change_indicators = assy.all_change_indicators() #060121, revised to use all_ 060227
+    cp.nonposition_change_indicators = _nonposition_change_indicators(assy)
+        # used by incremental checkpoints, see AssyUndoArchive._node_layer_unchanged_since_last_cp
     cp.metainfo = checkpoint_metainfo(assy) # also stores redundant assy.all_change_indicators() [see comment above]
         # this is only the right time for this info if the checkpoint is filled at the right time.
         # We'll assume we fill one for begin and end of every command and every entry/exit into recursive event processing
@@ -1347,6 +1352,15 @@ def fill_checkpoint(cp, state, assy): #e later replace calls to this with cp met
         # if we need this someday, consider "internal checkpoints" instead, since we might need to split the diffsequence too.
     return
 
+def _nonposition_change_indicators(assy):
+    """
+    Return a tuple of assy's change indicators which don't change
+    when only atom positions change, but do change (like
+    assy.all_change_indicators()) for all other undoable changes
+    outside the atoms layer.
+    """
+    return assy.nonposition_change_indicator(), assy.selection_change_indicator()
+
 # ==
 
 class checkpoint_metainfo:
@@ -1473,6 +1487,11 @@ class AssyUndoArchive: # modified from UndoArchive_older and AssyUndoArchive_old
             # so all applicable diffs will be found when you look for varid_ver pairs representing current state.
             # (Not sure if that system will be good enough for permitting enough out-of-order list-modification ops.)
 
+        self._undo_stack_entries = [] # [redo_diff, undo_diff, RAM guess] for each pair of stored ops, oldest first;
+            # used to enforce undoStackMemoryLimit_prefs_key
+        self._undo_stack_RAM = 0 # sum of the RAM guesses in self._undo_stack_entries
+        self._reported_undo_stack_RAM_limit = False
+
         self.subbing_to_changedicts_now = False # whether this was initially False or True wouldn't matter much, I think...
         self._changedicts = [] # this gets extended in self._archive_meet_class;
             #060404 made this a list of (changedict, ourdict) pairs, not just a list of changedicts
@@ -1482,7 +1501,10 @@ class AssyUndoArchive: # modified from UndoArchive_older and AssyUndoArchive_old
         ## self.all_changed_objs = {} # this one dict subscribes to all changes on all attrs of all classes of object (for now)
         self.all_changed_Atoms = {} # atom.key -> atom, for all changed Atoms (all attrs lumped together; this could be changed)
         self.all_changed_Bonds = {} # id(bond) -> bond, for all changed Bonds (all attrs)
-        self.ourdicts = (self.all_changed_Atoms, self.all_changed_Bonds,) #e use this more
+        self.all_changed_posn_Atoms = {} # atom.key -> atom, for Atoms whose _posn changed
+            # (kept separate from all_changed_Atoms so incremental checkpoints can diff only _posn
+            #  for atoms which appear only here; see get_and_clear_changed_objs)
+        self.ourdicts = (self.all_changed_Atoms, self.all_changed_Bonds, self.all_changed_posn_Atoms,) #e use this more
         # rest of init is done later, by self.initial_checkpoint, when caller is more ready [060223]
         ###e not sure were really initialized enough to return... we'll see
         return
@@ -1535,6 +1557,8 @@ class AssyUndoArchive: # modified from UndoArchive_older and AssyUndoArchive_old
         self.current_diff = None
         self.next_cp = None
         self.stored_ops = {}
+        self._undo_stack_entries = []
+        self._undo_stack_RAM = 0
         self.objkey_allocator.clear() # after this, all existing keys (in diffs or checkpoints) are nonsense...
         # ... so we'd better get rid of them (above and here):
         self._undo_archive_initialized = False
@@ -1638,14 +1662,15 @@ class AssyUndoArchive: # modified from UndoArchive_older and AssyUndoArchive_old
         
         ourdict = ourdicts[specialcase_type]
         for cd in changedicts_list:
-            self._changedicts.append( (cd, ourdict) )
+            self._changedicts.append( (cd, self._ourdict_for_changedict(cd, ourdict)) )
             # no reason to ever forget about changedicts, I think
             # (if this gets inefficient, it's only for developers who often
             #  reload code modules -- I think; review this someday ##k)
         if self.subbing_to_changedicts_now:
             for name, changedict in changedicts0.items():
                 del name
-                self.sub_or_unsub_to_one_changedict(True, changedict, ourdict)
+                self.sub_or_unsub_to_one_changedict(True, changedict,
+                                    self._ourdict_for_changedict(changedict, ourdict))
                     #e Someday, also pass its name, so sub-implem can know what
                     # we think about changes in it? Maybe; but more likely,
                     # ourdict already was chosen using the name, if name needs
@@ -1665,6 +1690,17 @@ class AssyUndoArchive: # modified from UndoArchive_older and AssyUndoArchive_old
         
         return
 
+    def _ourdict_for_changedict(self, changedict, ourdict):
+        """
+        [private helper for _archive_meet_class]
+        Return the dict of ours which should subscribe to changedict,
+        given ourdict, the one for all changes to instances of its class.
+        """
+        if ourdict is self.all_changed_Atoms and \
+           changedicts._related_attrs_for_dictid.get(id(changedict)) == ('_posn',):
+            return self.all_changed_posn_Atoms
+        return ourdict
+
     def childobj_oursQ(self, obj):
         """
         Is the given object (allowed to be an arbitrary Python object,
@@ -1807,20 +1843,34 @@ class AssyUndoArchive: # modified from UndoArchive_older and AssyUndoArchive_old
             print_compact_traceback( msg)
             return False
         
-    def get_and_clear_changed_objs(self, want_retval = True):
+    def get_and_clear_changed_objs(self, want_retval = True, separate_posn_Atoms = False):
         """
         Clear, and (unless want_retval is false) return copies of,
         the changed-atoms dict (key -> atom) and changed-bonds dict (id -> bond).
+
+        If separate_posn_Atoms is true, also return a third dict
+        (key -> atom) of the atoms whose only recorded changes were to
+        their positions; those atoms are then not in the changed-atoms dict.
         """
         for changedict, ourdict_junk in self._changedicts:
             cdp = changedicts._cdproc_for_dictid[id(changedict)]
             cdp.process_changes() # this is needed to add the latest changes to our own local changedict(s)
         if want_retval:
-            res = dict(self.all_changed_Atoms), dict(self.all_changed_Bonds) #e should generalize to a definite-order list, or name->dict
+            atoms = dict(self.all_changed_Atoms)
+            if separate_posn_Atoms:
+                posn_atoms = {}
+                for key, atom in self.all_changed_posn_Atoms.iteritems():
+                    if not atoms.has_key(key):
+                        posn_atoms[key] = atom
+                res = atoms, dict(self.all_changed_Bonds), posn_atoms
+            else:
+                atoms.update(self.all_changed_posn_Atoms)
+                res = atoms, dict(self.all_changed_Bonds) #e should generalize to a definite-order list, or name->dict
         else:
             res = None
         self.all_changed_Atoms.clear()
         self.all_changed_Bonds.clear()
+        self.all_changed_posn_Atoms.clear()
         return res
     
     def destroy(self): #060126 precaution
@@ -1938,6 +1988,40 @@ class AssyUndoArchive: # modified from UndoArchive_older and AssyUndoArchive_old
                          prefs_key = "_debug_pref_key:" + "undo/report all checkpoints")
         return res
 
+    _incremental_checkpoints = None # if not None, overrides pref_incremental_checkpoints (used by the benchmark below)
+    
+    def pref_incremental_checkpoints(self):
+        """
+        whether checkpoints which follow only atom position changes
+        should skip rescanning state outside the atoms layer
+        """
+        if self._incremental_checkpoints is not None:
+            return self._incremental_checkpoints
+        res = debug_pref("undo: incremental checkpoints?", Choice_boolean_False,
+                         prefs_key = True)
+        return res
+
+    def pref_check_incremental_checkpoints(self):
+        """
+        whether incremental checkpoints should rescan anyway,
+        and report a bug if that finds a change they would have missed
+        """
+        res = debug_pref("undo: check incremental checkpoints?", Choice_boolean_False,
+                         prefs_key = True)
+        return res
+
+    def _node_layer_unchanged_since_last_cp(self):
+        """
+        Return True if incremental checkpoints are enabled and our assy's
+        change indicators show no undoable changes since self.last_cp
+        except (perhaps) to atom positions.
+        """
+        if not self.pref_incremental_checkpoints():
+            return False
+        last_indicators = self.last_cp.nonposition_change_indicators
+        return last_indicators is not None and \
+               last_indicators == _nonposition_change_indicators(self.assy)
+
     def debug_histmessage(self, msg):
         env.history.message(msg, quote_html = True, color = 'gray')
 
@@ -2107,7 +2191,11 @@ class AssyUndoArchive: # modified from UndoArchive_older and AssyUndoArchive_old
                 else:
                     #060228
                     assert self.format_options == dict(use_060213_format = True), "nim for mmp kluge code" #e in fact, remove that code when new bugs gone
-                    state = diff_and_copy_state(self, self.assy, self.last_cp.state)
+                    node_layer_unchanged = self._node_layer_unchanged_since_last_cp()
+                    state = diff_and_copy_state(self, self.assy, self.last_cp.state,
+                                    node_layer_unchanged = node_layer_unchanged,
+                                    check_node_layer = node_layer_unchanged and \
+                                                       self.pref_check_incremental_checkpoints() )
 #obs, it's fixed now [060301]
 ##                        # note: last_cp.state is no longer current after an Undo!
 ##                        # so this has a problem when we're doing the end-cmd checkpoint after an Undo command.
@@ -2181,6 +2269,9 @@ class AssyUndoArchive: # modified from UndoArchive_older and AssyUndoArchive_old
                 undo_diff = redo_diff.reverse_order()
                 self.store_op(redo_diff)
                 self.store_op(undo_diff)
+                ram = undo_diff.RAM_guess_when_finalized()
+                self._undo_stack_entries.append( [redo_diff, undo_diff, ram] )
+                self._undo_stack_RAM += ram
                 # note, we stored those whether or not this was a begin or end checkpoint;
                 # figuring out which ones to offer, merging them, etc, might take care of that, or we might change this policy
                 # and only store them in certain cases, probably if this diff is begin-to-end or the like;
@@ -2193,6 +2284,7 @@ class AssyUndoArchive: # modified from UndoArchive_older and AssyUndoArchive_old
     ##        self.last_cp_arrival_reason = cptype # affects semantics of Undo/Redo user-level ops
     ##            # (this is not redundant, since it might differ if we later revisit same cp as self.last_cp)
             self._setup_next_cp() # sets self.next_cp and self.current_diff
+            self._enforce_undo_stack_RAM_limit()
         return
 
     def clear_redo_stack( self, from_cp = None, except_diff = None ): #060309 (untested)
@@ -2237,12 +2329,15 @@ class AssyUndoArchive: # modified from UndoArchive_older and AssyUndoArchive_old
             if env.debug():
                 print "debug: clear_redo_stack found %d diffs to destroy" % ndiffs
             for diff in diffs_to_destroy.values():
+                self._unstore_op(diff)
                 diff.destroy() #k did I implem this fully?? I hope so, since clear_undo_stack probably uses it too...
                 # the thing to check is whether they remove themselves from stored_ops....
+                # [they don't, so _unstore_op does that now]
+            self._forget_destroyed_undo_stack_entries()
             diffs_to_destroy = None # refdecr them too, before saying we're done (since the timing of that is why we say it)
             toscan = state_version_start = from_cp = None
             len2 = len(self.stored_ops)
-            savings = len1 - len2 # always 0 for now, since we don't yet remove them, so don't print non-debug msg when 0 (for now)
+            savings = len1 - len2 # (before _unstore_op existed this was always 0)
             if ndiffs and (savings < 0 or env.debug()):
                 print "  debug: clear_redo_stack finished; removed %d entries from self.stored_ops" % (savings,) ###k bug if 0 (always is)
         else:
@@ -2411,6 +2506,93 @@ class AssyUndoArchive: # modified from UndoArchive_older and AssyUndoArchive_old
             ops.append(op)
         return
 
+    def _unstore_op(self, op):
+        """
+        Remove op from self.stored_ops (if it's there).
+        Must be called before op is destroyed.
+        """
+        for varver in op.varid_vers():
+            ops = self.stored_ops.get(varver)
+            if ops and op in ops:
+                ops.remove(op)
+                if not ops:
+                    del self.stored_ops[varver]
+        return
+
+    def _forget_destroyed_undo_stack_entries(self):
+        """
+        [private helper for clear_redo_stack]
+        Remove entries for destroyed redo diffs from self._undo_stack_entries,
+        and destroy their undo diffs, which can no longer be reached
+        (they lead back from the abandoned redo branch).
+        """
+        entries = []
+        for entry in self._undo_stack_entries:
+            redo_diff, undo_diff, ram = entry
+            if redo_diff.destroyed:
+                if not undo_diff.destroyed:
+                    self._unstore_op(undo_diff)
+                    undo_diff.destroy()
+                self._undo_stack_RAM -= ram
+            else:
+                entries.append(entry)
+        self._undo_stack_entries = entries
+        return
+
+    def undo_stack_RAM_usage_guess(self):
+        """
+        Return a rough guess of the RAM (in bytes) used by the diffs
+        which let us Undo or Redo the operations on our undo stack.
+        """
+        return self._undo_stack_RAM
+
+    def _enforce_undo_stack_RAM_limit(self):
+        """
+        If the undo stack is using more RAM than the user's Undo stack
+        memory limit (in MB; 0 means no limit), discard its oldest operations
+        (always keeping the newest one) until it isn't, or until the oldest
+        one can't be discarded.
+        """
+        limit = env.prefs[undoStackMemoryLimit_prefs_key] * 1024 * 1024
+        if limit <= 0 or self._undo_stack_RAM <= limit:
+            return
+        ndiscarded = 0
+        while self._undo_stack_RAM > limit and len(self._undo_stack_entries) > 1:
+            if not self._discard_oldest_undo_stack_entry():
+                break
+            ndiscarded += 1
+        if ndiscarded:
+            if env.debug():
+                print "debug: discarded %d oldest undoable operations; undo stack RAM guess is now %d bytes" % \
+                      (ndiscarded, self._undo_stack_RAM)
+            if not self._reported_undo_stack_RAM_limit:
+                self._reported_undo_stack_RAM_limit = True
+                from utilities.Log import orangemsg
+                env.history.message(orangemsg(
+                    "Undo stack reached its memory limit (%d MB, set in Preferences); "
+                    "discarding the oldest undoable operations." %
+                    env.prefs[undoStackMemoryLimit_prefs_key] ))
+        return
+
+    def _discard_oldest_undo_stack_entry(self):
+        """
+        [private helper for _enforce_undo_stack_RAM_limit]
+        Discard the oldest operation on the undo stack (both its undo and
+        redo diffs) and the diff data which implements it, and return True;
+        or return False if that's not possible since the current state
+        is defined relative to that data (e.g. after Undo back to there).
+        """
+        redo_diff, undo_diff, ram = self._undo_stack_entries[0]
+        cp0, cp1 = redo_diff.cps
+        if not cp0.state.discard_diff_from(cp1.state):
+            return False
+        del self._undo_stack_entries[0]
+        self._undo_stack_RAM -= ram
+        for op in (redo_diff, undo_diff):
+            self._unstore_op(op)
+            op.destroy()
+        return True
+
     def _n_stored_vals(self): #060309, unfinished, CALL IT as primitive ram estimate #e add args for variants of what it measures ####@@@@
         res = 0
         for oplist in self.stored_ops.itervalues():
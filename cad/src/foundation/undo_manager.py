@@ -13,6 +13,7 @@ into a reasonable form for supporting a UI.
 """
 
 from utilities.debug import register_debug_menu_command_maker
+from utilities.debug import register_debug_menu_command
 from utilities.debug import print_compact_traceback, print_compact_stack
 
 from utilities import debug_flags
@@ -463,7 +464,12 @@ class AssyUndoManager(UndoManager):
         #060304 also disable/enable Clear Undo Stack
         action = win.editClearUndoStackAction
         text = "Clear Undo Stack" + '...' # workaround missing '...' (remove this when the .ui file is fixed)
-        #e future: add an estimate of RAM to be cleared
+        ram = self.archive.undo_stack_RAM_usage_guess() # an estimate of RAM to be cleared
+        if ram:
+            if ram >= 1024 * 1024:
+                text = "Clear Undo Stack (%.1f MB)..." % (ram / (1024.0 * 1024.0))
+            else:
+                text = "Clear Undo Stack (%d KB)..." % ((ram + 1023) / 1024)
         action.setText(text)
         fix_tooltip(action, text)
         enable_it = not not (undos or redos)
@@ -608,6 +614,60 @@ def undo_cmds_maker(widget):
 register_debug_menu_command_maker( "undo_cmds", undo_cmds_maker)
     # fyi: this runs once when the first assy is being created, but undo_cmds_maker runs every time the debug menu is put up.
 
+def _debug_measure_undo_checkpoint_cost(widget):
+    """
+    [debug menu command]
+
+    Measure how long an undo checkpoint takes after moving 1, 10, 100, ...
+    atoms of the current part, with and without incremental checkpoints,
+    and report the times in the history. Afterwards the atoms are moved back
+    and the undo stack is cleared.
+    """
+    from geometry.VQT import V
+    win = env.mainwindow()
+    assy = win.assy
+    mgr = assy.undo_manager
+    if mgr is None:
+        env.history.message(redmsg("This model has no undo manager."))
+        return
+    archive = mgr.archive
+    atoms = []
+    for mol in assy.molecules:
+        atoms.extend(mol.atoms.itervalues())
+    if not atoms:
+        env.history.message(redmsg("The current part has no atoms to move."))
+        return
+    counts = [n for n in (1, 10, 100, 1000, 10000, 100000) if n < len(atoms)]
+    counts.append(len(atoms))
+    offset = V(0.1, 0, 0)
+    results = []
+    try:
+        archive.checkpoint( cptype = 'manual', merge_with_future = False )
+        for n in counts:
+            movers = atoms[:n]
+            times = []
+            for incremental in (False, True):
+                archive._incremental_checkpoints = incremental
+                for atom in movers:
+                    atom.setposn(atom.posn() + offset)
+                t1 = time.time()
+                archive.checkpoint( cptype = 'manual', merge_with_future = False )
+                times.append(time.time() - t1)
+                for atom in movers:
+                    atom.setposn(atom.posn() - offset)
+                archive.checkpoint( cptype = 'manual', merge_with_future = False )
+            results.append( (n, times[0], times[1]) )
+    finally:
+        archive._incremental_checkpoints = None
+        mgr.clear_undo_stack()
+    env.history.message(greenmsg("Undo checkpoint cost for %d atoms:" % len(atoms)))
+    for n, full_time, incremental_time in results:
+        env.history.message("after moving %d atoms: %.4f sec (full), %.4f sec (incremental)" %
+                            (n, full_time, incremental_time))
+    return
+
+register_debug_menu_command("measure undo checkpoint cost", _debug_measure_undo_checkpoint_cost)
+
 # ==
 
 # some global private state (which probably ought to be undo manager instance vars)
@@ -0,0 +1,348 @@
+# Copyright 2009 Nanorex, Inc.  See LICENSE file for details.
+"""
+ArrayNeighborhoodGenerator.py -- find nearby points (e.g. atom positions)
+using a sorted cell list built from an (N, 3) array of positions,
+with batched queries.
+
+@version: $Id$
+@copyright: 2009 Nanorex, Inc.  See LICENSE file for details.
+
+This is a sibling of NeighborhoodGenerator, for use when there are many
+points or many queries. Rather than putting atoms into a dict of
+buckets and answering one region() query at a time in Python, it sorts
+integer codes for the grid cells of all the points, and answers whole
+batches of queries ("all pairs closer than r", "points near each of
+these M points") using bulk Numeric operations (27 searchsorted passes
+over the sorted cell codes, one per neighboring cell offset).
+
+Points can be moved or added after the cell list is built. Such points
+are kept out of the main sorted cell list (in a smaller one of their own)
+until there are enough of them to make it worth rebuilding the main one,
+so a few moves don't cost O(N log N) each.
+
+Like NeighborhoodGenerator, this is purely geometric; the optional
+objects associated with the points (e.g. atoms) are only used by
+region() and atom_moved().
+"""
+
+from Numeric import array, zeros, ones, take, compress, repeat, arange
+from Numeric import argsort, searchsorted, concatenate
+from Numeric import floor, sqrt, add, minimum, maximum, where
+from Numeric import less, greater_equal, logical_and, logical_not, alltrue
+from Numeric import Int, Float
+
+_NEIGHBOR_CELL_OFFSETS = [(dx, dy, dz)
+                          for dx in (-1, 0, 1)
+                          for dy in (-1, 0, 1)
+                          for dz in (-1, 0, 1)]
+
+def _empty_int_array():
+    return zeros((0,), Int)
+
+def _concatenate_or_empty(arrays):
+    if not arrays:
+        return _empty_int_array()
+    if len(arrays) == 1:
+        return arrays[0]
+    return concatenate(arrays)
+
+class ArrayNeighborhoodGenerator:
+    """
+    Given an (N, 3) array of positions and a radius, be able to quickly
+    find all pairs of points within that radius of each other,
+    or all points within that radius of each of a batch of other points.
+
+    Building the cell list takes O(N log N) time (in compiled code);
+    each batched query takes time proportional to the number of points
+    in the cells adjacent to the query points.
+
+    Points are referred to by their index (their row in the positions
+    array given to the constructor, or the order in which they were
+    added later).
+    """
+    # rebuild the cell list when more than this fraction of the points
+    # (or this many, if more) have been moved or added since it was built
+    _rebuild_fraction = 1.0 / 32
+    _rebuild_min = 64
+
+    def __init__(self, positions, maxradius, objects = None):
+        """
+        @param positions: the initial points (copied).
+        @type positions: sequence of N 3-vectors, or Numeric array of shape (N, 3)
+
+        @param maxradius: the largest radius which can be used in queries
+                          (also the size of the cells).
+
+        @param objects: optional list of N objects (e.g. atoms) corresponding
+                        to positions, returned by region() and used by
+                        atom_moved().
+        """
+        self._maxradius = 1.0 * maxradius
+        positions = array(positions, Float)
+        positions.shape = (-1, 3)
+        self._n = len(positions)
+        self._positions = positions # capacity might exceed self._n, after add()
+        self._stale = zeros((self._n,), Int) # 1 for points not correctly in the sorted cell list
+        self._pending = [] # indices of stale points
+        if objects is not None:
+            objects = list(objects)
+            assert len(objects) == self._n
+        self._objects = objects
+        self._index_of_key = None # only made if atom_moved is called
+        self._build()
+        return
+
+    def __len__(self):
+        return self._n
+
+    def positions(self):
+        """
+        Return an (N, 3) array of the current positions of all our points.
+        Caller must not modify it.
+        """
+        return self._positions[:self._n]
+
+    def objects(self):
+        """
+        Return the list of objects corresponding to our points (or None if
+        we were not given any). Caller must not modify it.
+        """
+        return self._objects
+
+    def maxradius(self):
+        return self._maxradius
+
+    # == building and updating
+
+    def _build(self):
+        """
+        (Re)build the sorted cell list from all current positions.
+        """
+        n = self._n
+        positions = self._positions[:n]
+        if n:
+            cells = floor(positions / self._maxradius).astype(Int)
+            self._origin = minimum.reduce(cells) - 1
+                # so cells adjacent to any point have all coordinates >= 0
+            cells = cells - self._origin
+            self._dims = maximum.reduce(cells) + 2
+            codes = self._cell_codes(cells)
+            self._order = argsort(codes)
+            self._sorted_codes = take(codes, self._order)
+        else:
+            self._origin = zeros((3,), Int)
+            self._dims = ones((3,), Int)
+            self._order = _empty_int_array()
+            self._sorted_codes = _empty_int_array()
+        self._stale = zeros((len(self._positions),), Int)
+        self._pending = []
+        self._pending_generator = None
+        return
+
+    def _cell_codes(self, cells):
+        dims = self._dims
+        return (cells[:,0] * dims[1] + cells[:,1]) * dims[2] + cells[:,2]
+
+    def _rebuild_if_worthwhile(self):
+        if len(self._pending) > max(self._rebuild_min, self._n * self._rebuild_fraction):
+            self._build()
+        return
+
+    def move(self, index, newpos):
+        """
+        Change the position of point index to newpos.
+        """
+        assert 0 <= index < self._n
+        self._positions[index] = newpos
+        if not self._stale[index]:
+            self._stale[index] = 1
+            self._pending.append(index)
+        self._pending_generator = None
+        return
+
+    def add(self, positions, objects = None):
+        """
+        Add more points (given as an array of shape (M, 3)),
+        and (only if we were given objects when constructed)
+        their corresponding objects. Return the index of the first one.
+        """
+        positions = array(positions, Float)
+        positions.shape = (-1, 3)
+        m = len(positions)
+        first = self._n
+        if self._objects is not None:
+            assert objects is not None and len(objects) == m
+            self._objects.extend(objects)
+            if self._index_of_key is not None:
+                for i in range(m):
+                    self._index_of_key[objects[i].key] = first + i
+        if first + m > len(self._positions):
+            # grow our arrays, doubling their capacity to make repeated adds cheap
+            capacity = max(first + m, 2 * len(self._positions))
+            newpositions = zeros((capacity, 3), Float)
+            newpositions[:first] = self._positions[:first]
+            self._positions = newpositions
+            newstale = zeros((capacity,), Int)
+            newstale[:first] = self._stale[:first]
+            self._stale = newstale
+        self._positions[first : first + m] = positions
+        self._stale[first : first + m] = 1
+        self._pending.extend(range(first, first + m))
+        self._pending_generator = None
+        self._n = first + m
+        return first
+
+    def atom_moved(self, atom):
+        """
+        If an atom (one of the objects given to the constructor or to add)
+        is later moved, this method must be called to refresh our position
+        information (like NeighborhoodGenerator.atom_moved).
+        """
+        if self._index_of_key is None:
+            self._index_of_key = dict([(obj.key, i) for i, obj in enumerate(self._objects)])
+        self.move(self._index_of_key[atom.key], atom.posn())
+        return
+
+    # == queries
+
+    def _grid_candidates(self, points):
+        """
+        Return Int arrays (p, j) listing all pairs of a query point index p
+        and a non-stale point index j, for which the cells of points[p]
+        and point j are the same or adjacent.
+        """
+        m = len(points)
+        if not m or not len(self._sorted_codes):
+            return _empty_int_array(), _empty_int_array()
+        cells = floor(points / self._maxradius).astype(Int) - self._origin
+        codes = self._cell_codes(cells)
+        dims = self._dims
+        sorted_codes = self._sorted_codes
+        indices = arange(m)
+        plist = []
+        jlist = []
+        for offset in _NEIGHBOR_CELL_OFFSETS:
+            ncells = cells + array(offset)
+            # query points far from all our points might have neighbor
+            # cells outside our grid, whose codes would alias other cells
+            inside = logical_and(alltrue(greater_equal(ncells, 0), 1),
+                                 alltrue(less(ncells, dims), 1))
+            target = where(inside, self._cell_codes(ncells), -1) # (no code is -1)
+            lo = searchsorted(sorted_codes, target)
+            counts = searchsorted(sorted_codes, target + 1) - lo
+            total = add.reduce(counts)
+            if not total:
+                continue
+            # expand each p into counts[p] pairs (p, order[lo[p] + k]) for k in range(counts[p])
+            starts = add.accumulate(counts) - counts
+            plist.append( repeat(indices, counts) )
+            jlist.append( take(self._order, arange(total) + repeat(lo - starts, counts)) )
+        p = _concatenate_or_empty(plist)
+        j = _concatenate_or_empty(jlist)
+        if self._pending:
+            keep = logical_not(take(self._stale, j))
+            p = compress(keep, p)
+            j = compress(keep, j)
+        return p, j
+
+    def _radius(self, radius):
+        if radius is None:
+            return self._maxradius
+        assert radius <= self._maxradius, \
+               "radius %r exceeds maxradius %r" % (radius, self._maxradius)
+        return radius
+
+    def _get_pending_generator(self):
+        """
+        Return an ArrayNeighborhoodGenerator (with no objects) for the current
+        positions of our stale points (whose indices are in self._pending,
+        in the same order), making it if necessary.
+        """
+        if self._pending_generator is None:
+            self._pending_array = array(self._pending, Int)
+            self._pending_generator = ArrayNeighborhoodGenerator(
+                take(self._positions, self._pending_array), self._maxradius )
+        return self._pending_generator
+
+    def _grid_neighbors(self, points, radius):
+        """
+        Like neighbors_of_points, but only for non-stale points j.
+        """
+        p, j = self._grid_candidates(points)
+        delta = take(points, p) - take(self._positions, j)
+        dist = sqrt(add.reduce(delta * delta, 1))
+        keep = less(dist, radius)
+        return compress(keep, p), compress(keep, j), compress(keep, dist)
+
+    def neighbors_of_points(self, points, radius = None):
+        """
+        Return three arrays (p, j, dist) listing every pair of a query point
+        index p (a row of points, an array of shape (M, 3)) and one of our
+        points j for which the distance dist between them is less than
+        radius (default maxradius). The pairs are in no particular order.
+        """
+        radius = self._radius(radius)
+        self._rebuild_if_worthwhile()
+        points = array(points, Float)
+        points.shape = (-1, 3)
+        p, j, dist = self._grid_neighbors(points, radius)
+        if not self._pending:
+            return p, j, dist
+        # points moved or added since the cell list was built
+        p2, k, dist2 = self._get_pending_generator().neighbors_of_points(points, radius)
+        return ( concatenate([p, p2]),
+                 concatenate([j, take(self._pending_array, k)]),
+                 concatenate([dist, dist2]) )
+
+    def pairs_within(self, radius = None):
+        """
+        Return three arrays (i, j, dist) listing every pair of our points
+        i < j whose distance dist is less than radius (default maxradius).
+        The pairs are in no particular order.
+        """
+        radius = self._radius(radius)
+        self._rebuild_if_worthwhile()
+        positions = self._positions[:self._n]
+        # pairs of non-stale points
+        i, j = self._grid_candidates(positions)
+        keep = less(i, j)
+        if self._pending:
+            keep = keep * logical_not(take(self._stale[:self._n], i))
+        i = compress(keep, i)
+        j = compress(keep, j)
+        delta = take(positions, i) - take(positions, j)
+        dist = sqrt(add.reduce(delta * delta, 1))
+        keep = less(dist, radius)
+        i = compress(keep, i)
+        j = compress(keep, j)
+        dist = compress(keep, dist)
+        if not self._pending:
+            return i, j, dist
+        pending_generator = self._get_pending_generator()
+        pending = self._pending_array
+        # pairs of a stale point and a non-stale point
+        p, k, dist2 = self._grid_neighbors(pending_generator.positions(), radius)
+        k1 = take(pending, p)
+        # pairs of stale points
+        i3, j3, dist3 = pending_generator.pairs_within(radius)
+        i3 = take(pending, i3)
+        j3 = take(pending, j3)
+        return ( concatenate([i, minimum(k1, k), minimum(i3, j3)]),
+                 concatenate([j, maximum(k1, k), maximum(i3, j3)]),
+                 concatenate([dist, dist2, dist3]) )
+
+    def region(self, center):
+        """
+        Given a position in space, return the list of objects (or of point
+        indices, if we have no objects) that are within maxradius of that
+        position (like NeighborhoodGenerator.region).
+        """
+        p, j, dist = self.neighbors_of_points([center])
+        if self._objects is None:
+            return list(j)
+        objects = self._objects
+        return [objects[index] for index in j]
+
+    pass # end of class ArrayNeighborhoodGenerator
+
+# end
@@ -11,7 +11,7 @@ Module classification: geometry
 Note: bruce 071215 split class Slab our of shape.py into its own module.
 """
 
-from Numeric import dot
+from Numeric import dot, logical_and
 
 from geometry.VQT import norm
 
@@ -28,6 +28,14 @@ class Slab:
         d = dot(point - self.point, self.normal)
         return d >= 0 and d <= self.thickness
 
+    def isin_many(self, points):
+        """
+        Like isin, but for a Numeric array of points;
+        return an array of booleans.
+        """
+        d = dot(points - self.point, self.normal)
+        return logical_and(d >= 0, d <= self.thickness)
+
     def __str__(self):
         return '<slab of '+`self.thickness`+' at '+`self.point`+'>'
 
@@ -29,6 +29,9 @@ I'd be more confident that a package import cycle was unlikely.)
 """
 
 from Numeric import array, zeros, maximum, minimum, ceil, dot, floor
+from Numeric import Int, Float, nonzero, take, put, ravel
+from Numeric import logical_and, logical_not, where
+from Numeric import arange, argsort, add, clip
 
 from geometry.VQT import A, vlen, V
 
@@ -74,48 +77,69 @@ def get_selCurve_color(selSense, bgcolor = white):
     
     return env.prefs[DarkBackgroundContrastColor_prefs_key]
 
-def fill(mat, p, dir): # TODO: rename (less generic so searchable), and perhaps make private
+def _rasterize_polyline(mat, pt2d, base):
     """
-    [helper for class curve; unknown whether it has other uses]
-    
-    Fill a curve drawn in matrix mat, as 1's over a background of 0's, with 1's.
-    p is V(i, j) of a point to fill from. dir is 1 or -1 for the
-    standard recursive fill algorithm.
-
-    Here is an explanation of how this is used and how it works then, by Huaicai:
-    This function is used to fill the area between the rectangle bounding box and the boundary
-    of the curve with 1's. The bounding box is extended by (lower left corner -2, right top corner + 2). 
-    The curve boundary is filled with 1's. So mat[1,:] = 0, mat[-1,:] = 0, mat[:, 1] = 0;
-    mat[:, -1]=0, which means the area is connected. If we start from mat[1, 1], dir = 1, then we scan the 
-    first line from left to right. If it's 0, fill it as 1 until we touch 1. For each element in the line, we also 
-    check it's neighbor above and below. For the neighbor elements, if the neighbor touches 1 but 
-    previous neighbor is 0, then scan the neighbor line in the reverse order. I think this algorithm is better
-    than the simple recursive flood filling algorithm. The seed mat[1, 1] is always inside the area, and 
-    most probably this filling area is smaller than that inside the curve. I think it also reduces repeated 
-    checking/filling of the classical algorithm.
+    [private helper for class curve]
+
+    Set to 1 each element of the Int matrix mat (whose element [0, 0]
+    corresponds to the 2d point base / 8.0) which is touched by the polyline
+    through the 2d points in pt2d, sampled 8 times per angstrom.
     """
-    if mat[p]:
-        return
-    up = dn = 0
-    o1 = array([1, 0])
-    od = array([0, dir])
-    while not mat[p - od]: p -= od
-    while not mat[p]:
-        mat[p] = 1
-        if mat[p - o1]:
-            if up:
-                fill(mat, p - [1, dir], -dir)
-                up = 0
-        else: up = 1
-        if mat[p + o1]:
-            if dn:
-                fill(mat, p + [1, -dir], -dir)
-                dn = 0
-        else: dn = 1
-        p += od
-    fill(mat, p - od + o1, -dir)
-    fill(mat, p - od - o1, -dir) # note: we have (probably) seen recursion limit errors from this line. [bruce 070605 comment]
+    ni, nj = mat.shape
+    flat = ravel(mat) # (a reference to mat's data, since zeros() is contiguous)
+    pt0 = pt2d[0]
+    for pt in pt2d[1:]:
+        l = ceil(vlen(pt - pt0)*8)
+        if l < 0.01:
+            continue
+        v = (pt - pt0)/l
+        steps = arange(1 + int(l)) * 1.0
+        ii = floor((pt0[0] + v[0] * steps) * 8 - base[0]).astype(Int)
+        jj = floor((pt0[1] + v[1] * steps) * 8 - base[1]).astype(Int)
+        put(flat, clip(ii, 0, ni - 1) * nj + clip(jj, 0, nj - 1), 1)
+        pt0 = pt
+    return
+
+def _fill_polygon(mat, pt2d, base):
+    """
+    [private helper for class curve]
+
+    Set to 1 each element of the Int matrix mat (whose element [i, j]
+    has its center at the 2d point (V(i, j) + base + 0.5) / 8.0) which is
+    inside the closed polygon with vertices pt2d, by the nonzero winding rule.
 
+    This is a scanline fill which handles one matrix row (constant i) at a
+    time, with array operations over all polygon edges. (It replaces a
+    recursive flood fill of the outside region, which was much slower and
+    could hit the recursion limit for large curves.)
+    """
+    ni, nj = mat.shape
+    pts = array(pt2d) * 8.0 - base - 0.5 # now cell [i, j] is centered at V(i, j)
+    x0 = pts[:, 0]
+    y0 = pts[:, 1]
+    # edge k goes from point k to point k+1, and the last edge closes the curve
+    x1 = array(list(x0[1:]) + [x0[0]], Float)
+    y1 = array(list(y0[1:]) + [y0[0]], Float)
+    up = (x1 > x0) * 2 - 1 # direction of each edge, for the winding number
+    dx = where(x1 == x0, 1.0, x1 - x0)
+    slope = (y1 - y0) / dx
+    for i in range(ni):
+        crosses = logical_not( (x0 <= i) == (x1 <= i) )
+        edges = nonzero(crosses)
+        if not len(edges):
+            continue
+        ys = take(y0, edges) + (i - take(x0, edges)) * take(slope, edges)
+        order = argsort(ys)
+        ys = take(ys, order)
+        winding = add.accumulate(take(take(up, edges), order))
+        for k in range(len(ys) - 1):
+            if winding[k]:
+                jlo = max(0, int(ceil(ys[k])))
+                jhi = min(nj - 1, int(floor(ys[k+1])))
+                if jlo <= jhi:
+                    mat[i, jlo:jhi+1] = 1
+        continue
+    return
 
 #bruce 041214 made a common superclass for curve and rectangle classes,
 # so I can fix some bugs in a single place, and since there's a
@@ -235,6 +259,81 @@ class simple_shape_2d:
         return p[0]>=self.bboxlo[0] and p[1]>=self.bboxlo[1] \
             and p[0]<=self.bboxhi[0] and p[1]<=self.bboxhi[1]
 
+    def project_2d_many(self, pts):
+        """
+        Like project_2d, but for a Numeric array of N 3d points at once.
+
+        @return: (p, ok), where p is an Nx2 array of the projected points and
+                 ok is an array of N booleans, false where project_2d would
+                 have returned None (those elements of p are meaningless).
+        """
+        x, y = self.right, self.up
+        px = dot(pts, x)
+        py = dot(pts, y)
+        ok = px * 0 + 1
+        if self.eyeball:
+            pfix = self.project_2d_noeyeball(self.org)
+            depth = dot(pts - self.eyeball, self.normal) / self.eye2Pov
+            ok = depth != 0
+                # point is too close to eyeball for in-ness to be determined
+            depth = where(ok, depth, 1.0)
+            px = (px - pfix[0]) / depth + pfix[0]
+            py = (py - pfix[1]) / depth + pfix[1]
+        p = zeros((len(px), 2), Float)
+        p[:, 0] = px
+        p[:, 1] = py
+        return p, ok
+
+    def isin_bbox_many(self, pts):
+        """
+        Like isin_bbox, but for a Numeric array of N 3d points at once.
+
+        @return: (inside, p), where inside is an array of N booleans
+                 and p is the array of projected points (see project_2d_many).
+        """
+        p, inside = self.project_2d_many(pts)
+        if self.slab:
+            inside = logical_and(inside, self.slab.isin_many(pts))
+        lo, hi = self.bboxlo, self.bboxhi
+        for k in (0, 1):
+            inside = logical_and(inside,
+                                 logical_and(p[:, k] >= lo[k], p[:, k] <= hi[k]))
+        return inside, p
+
+    def isin_many(self, pts):
+        """
+        Like isin, but for a Numeric array of N 3d points at once;
+        return an array of N booleans.
+        """
+        return self.isin_bbox_many(pts)[0]
+
+    def may_overlap_bbox(self, bbox):
+        """
+        Return False if no point inside the given 3d BBox can be in this
+        shape (ignoring any slab), or True if some might be.
+        This is meant as a cheap pre-cull before calling isin_many
+        on lots of points inside bbox.
+        """
+        if bbox.data is None:
+            return False
+        hi, lo = bbox.data
+        corners = array([[x, y, z] for x in (lo[0], hi[0])
+                                   for y in (lo[1], hi[1])
+                                   for z in (lo[2], hi[2])], Float)
+        p, ok = self.project_2d_many(corners)
+        if not logical_and.reduce(ok):
+            return True # can't tell
+        if self.eyeball:
+            depth = dot(corners - self.eyeball, self.normal)
+            if minimum.reduce(depth) * maximum.reduce(depth) <= 0:
+                # bbox straddles the eyeball's plane, so the corners'
+                # projections don't bound those of the points inside it
+                return True
+        plo = minimum.reduce(p)
+        phi = maximum.reduce(p)
+        return plo[0] <= self.bboxhi[0] and plo[1] <= self.bboxhi[1] \
+           and phi[0] >= self.bboxlo[0] and phi[1] >= self.bboxlo[1]
+
     pass # end of class simple_shape_2d
 
 
@@ -278,28 +377,14 @@ class curve(simple_shape_2d): # bruce 041214 factored out simple_shape_2d
         # draw the curve in these matrices and fill it
         # [bruce 041214 adds this comment: this might be correct but it's very
         # inefficient -- we should do it geometrically someday. #e]
-        mat = zeros(ibbhi - ibblo)
-        mat1 = zeros(ibbhi - ibblo)
-        mat1[0,:] = 1
-        mat1[-1,:] = 1
-        mat1[:,0] = 1
-        mat1[:,-1] = 1
-        pt2d = self.pt2d
-        pt0 = pt2d[0]
-        for pt in pt2d[1:]:
-            l = ceil(vlen(pt - pt0)*8)
-            if l<0.01: continue
-            v=(pt - pt0)/l
-            for i in range(1 + int(l)):
-                ij = 2 + array(map(int, floor((pt0 + v * i - bboxlo)*8)))
-                mat[ij]=1
-            pt0 = pt
-        mat1 += mat
-        
-        fill(mat1, array([1, 1]),1)
-        mat1 -= mat #Which means boundary line is counted as inside the shape.
+        # (The rasterization and fill now use array operations, rather than
+        #  per-pixel Python loops and a recursive flood fill.)
+        mat = zeros(ibbhi - ibblo, Int)
+        _rasterize_polyline(mat, self.pt2d, ibblo)
+        _fill_polygon(mat, self.pt2d, ibblo)
+            #Which means boundary line is counted as inside the shape.
         # boolean raster of filled-in shape
-        self.matrix = mat1  ## For any element inside the matrix, if it is 0, then it's inside.
+        self.matrix = 1 - mat ## For any element inside the matrix, if it is 0, then it's inside.
         # where matrix[0, 0] is in x, y space
         self.matbase = ibblo
 
@@ -327,6 +412,19 @@ class curve(simple_shape_2d): # bruce 041214 factored out simple_shape_2d
         ij = map(int, p * 8)-self.matbase
         return not self.matrix[ij]
 
+    def isin_many(self, pts):
+        """
+        Like isin, but for a Numeric array of N 3d points at once;
+        return an array of N booleans.
+        """
+        inside, p = self.isin_bbox_many(pts)
+        ni, nj = self.matrix.shape
+        # note: astype(Int) truncates toward zero, like int() in isin
+        ii = clip((p[:, 0] * 8).astype(Int) - self.matbase[0], 0, ni - 1)
+        jj = clip((p[:, 1] * 8).astype(Int) - self.matbase[1], 0, nj - 1)
+        outside = take(ravel(self.matrix), ii * nj + jj)
+        return logical_and(inside, logical_not(outside))
+
     def xdraw(self):
         """
         draw the actual grid of the matrix in 3-space.
@@ -452,6 +550,30 @@ class SelectionShape(shape): # review: split this into its own file? [bruce 0712
 ##                    assy.unpickatoms() # Fixed bug 1598. Mark 060303.
             self._atomsSelect(assy)   
     
+    def _atoms_inside(self, mol, disp, first_only = False):
+        """
+        Return a list of the atoms of mol which are inside self.curve
+        and visible (using display style disp), in the order of mol.atlist.
+        
+        @param first_only: if true, stop after finding one such atom.
+        """
+        # Note: this projects all of mol's atom positions at once
+        # (using mol.atpos and curve.isin_many), after rejecting mol
+        # entirely if its bbox can't overlap the curve. This is much
+        # faster than calling curve.isin on each atom's posn().
+        c = self.curve
+        if not mol.atoms or not c.may_overlap_bbox(mol.bbox):
+            return []
+        atlist = mol.atlist
+        res = []
+        for i in nonzero(c.isin_many(mol.atpos)):
+            a = atlist[i]
+            if a.visible(disp):
+                res.append(a)
+                if first_only:
+                    break
+        return res
+
     def _atomsSelect(self, assy):
         """
         Select all atoms inside the shape according to its selection selSense.
@@ -462,36 +584,40 @@ class SelectionShape(shape): # review: split this into its own file? [bruce 0712
                 if mol.hidden:
                     continue
                 disp = mol.get_dispdef()
-                for a in mol.atoms.itervalues():
-                    if c.isin(a.posn()) and a.visible(disp):
-                        a.pick()
+                for a in self._atoms_inside(mol, disp):
+                    a.pick()
         elif c.selSense == START_NEW_SELECTION:
             for mol in assy.molecules:
                 if mol.hidden:
                     continue
                 disp = mol.get_dispdef()
+                inside = self._atoms_inside(mol, disp)
+                picked = {}
+                for a in inside:
+                    a.pick()
+                    picked[a.key] = a
                 for a in mol.atoms.itervalues():
-                    if c.isin(a.posn()) and a.visible(disp):
-                        a.pick()
-                    else:
+                    if a.picked and not picked.has_key(a.key):
                         a.unpick()
         elif c.selSense == SUBTRACT_FROM_SELECTION:
-            for a in assy.selatoms.values():
-                if a.molecule.hidden:
-                    continue #bruce 041214
-                if c.isin(a.posn()) and a.visible():
-                    a.unpick()
+            atoms = [a for a in assy.selatoms.values()
+                     if not a.molecule.hidden] #bruce 041214
+            if atoms:
+                posns = A([a.posn() for a in atoms])
+                for i in nonzero(c.isin_many(posns)):
+                    a = atoms[i]
+                    if a.visible():
+                        a.unpick()
         elif c.selSense == DELETE_SELECTION:
             todo = []
             for mol in assy.molecules:
                 if mol.hidden:
                     continue
                 disp = mol.get_dispdef()
-                for a in mol.atoms.itervalues():
-                    if c.isin(a.posn()) and a.visible(disp):
-                        if a.is_singlet():
-                            continue
-                        todo.append(a)
+                for a in self._atoms_inside(mol, disp):
+                    if a.is_singlet():
+                        continue
+                    todo.append(a)
             for a in todo[:]:
                 if a.filtered():
                     continue
@@ -520,20 +646,16 @@ class SelectionShape(shape): # review: split this into its own file? [bruce 0712
                 if mol.hidden:
                     continue
                 disp = mol.get_dispdef()
-                for a in mol.atoms.itervalues():
-                    if c.isin(a.posn()) and a.visible(disp):
-                        a.molecule.pick()
-                        break
+                if self._atoms_inside(mol, disp, first_only = True):
+                    mol.pick()
 
         if c.selSense == SUBTRACT_FROM_SELECTION:
             for m in assy.selmols[:]:
                 if m.hidden:
                     continue #bruce 041214
                 disp = m.get_dispdef()
-                for a in m.atoms.itervalues():
-                    if c.isin(a.posn()) and a.visible(disp):
-                        m.unpick()
-                        break   
+                if self._atoms_inside(m, disp, first_only = True):
+                    m.unpick()
                                 
         if c.selSense == DELETE_SELECTION: # mark 060220.
             todo = []
@@ -541,16 +663,8 @@ class SelectionShape(shape): # review: split this into its own file? [bruce 0712
                 if mol.hidden:
                     continue
                 disp = mol.get_dispdef()
-                for a in mol.atoms.itervalues():
-                    #bruce 060405 comment/bugfix: this use of itervalues looked dangerous (since mol was killed inside the loop),
-                    # but since the iterator is not continued after that, I suppose it was safe (purely a guess).
-                    # It would be safer (or more obviously safe) to build up a todo list of mols to kill after the loop.
-                    # More importantly, assy.molecules was not copied in the outer loop -- that could be a serious bug,
-                    # if it's incrementally modified. I'm fixing that now, using the todo list.
-                    if c.isin(a.posn()) and a.visible(disp):
-                        ## a.molecule.kill()
-                        todo.append(mol) #bruce 060405 bugfix
-                        break
+                if self._atoms_inside(mol, disp, first_only = True):
+                    todo.append(mol) #bruce 060405 bugfix (don't kill mol inside the loop)
             for mol in todo:
                 mol.kill()
         return
@@ -561,27 +675,19 @@ class SelectionShape(shape): # review: split this into its own file? [bruce 0712
         """
         rst = []
         
-        c = self.curve
-        
         if assy.selwhat: ##Chunks
-           rstMol = {} 
-           for mol in assy.molecules:
+            for mol in assy.molecules:
                 if mol.hidden:
                     continue
                 disp = mol.get_dispdef()
-                for a in mol.atoms.itervalues():
-                    if c.isin(a.posn()) and a.visible(disp):
-                            rstMol[id(a.molecule)] = a.molecule
-                            break 
-           rst.extend(rstMol.itervalues())
+                if self._atoms_inside(mol, disp, first_only = True):
+                    rst.append(mol)
         else: ##Atoms
-           for mol in assy.molecules:
+            for mol in assy.molecules:
                 if mol.hidden:
                     continue
                 disp = mol.get_dispdef()
-                for a in mol.atoms.itervalues():
-                   if c.isin(a.posn()) and a.visible(disp):
-                     rst += [a] 
+                rst.extend(self._atoms_inside(mol, disp))
         return rst
     
     pass # end of class SelectionShape
@@ -54,6 +54,8 @@ from math import sin, cos, pi
 from Numeric import dot, argmax, argmin, sqrt
 
 from graphics.display_styles.displaymodes import ChunkDisplayMode
+from graphics.display_styles.MemoDiskCache import MemoDiskCache
+from graphics.display_styles.MemoDiskCache import model_is_changing_interactively
 
 from geometry.VQT import V, Q, norm, cross, angleBetween
 
@@ -166,6 +168,10 @@ from model.chunk import Chunk
 
 chunkHighlightColor_prefs_key = atomHighlightColor_prefs_key # initial kluge
 
+# persistent cache for spline computations; increase the version number
+# whenever _make_curved_strand or _compute_spline is changed
+_memo_cache = MemoDiskCache("DnaCylinderChunks", 1)
+
 # piotr 080519: made this method a global function
 # it needs to be moved to a more appropriate location
 def get_dna_base_orientation_indicators(chunk, normal):
@@ -2202,10 +2208,14 @@ class DnaCylinderChunks(ChunkDisplayMode):
                     # strand shape is a tube
                     positions, \
                     colors, \
-                    radii = self._make_curved_strand( 
+                    radii = _memo_cache.lookup_or_compute(
+                        "curved_strand",
+                        self._make_curved_strand,
                         positions, 
                         colors, 
-                        radii )
+                        radii,
+                        persist = not model_is_changing_interactively(
+                            chunk.assy.o) )
     
                 # Create a list of external bonds.
                 # Moved drawing to draw_realtime, otherwise the struts are not
@@ -0,0 +1,330 @@
+# Copyright 2009 Nanorex, Inc.  See LICENSE file for details.
+"""
+MemoDiskCache.py -- a persistent, content-hashed cache for the results of
+expensive pure computations done by whole-chunk display styles
+(e.g. spline interpolation of DNA strands or protein backbones).
+
+@version: $Id$
+@copyright: 2009 Nanorex, Inc.  See LICENSE file for details.
+
+A result is stored under an md5 digest of the computation's name, a version
+number (which must be increased whenever the computation changes), and all
+of its input data (positions, colors, radii, and any parameters derived from
+display style prefs). So when a file is reopened unchanged, or a display list
+is remade without changes to the data a style computes from, the result can
+be reused instead of recomputed.
+
+Results are kept in memory (for recent ones) and in files under
+~/Nanorex/MemoCache/<cache name>, so they survive across sessions.
+Results computed while the model is being changed interactively (during
+mouse drags, movie playback, or simulator runs), or for highlighted
+drawing, are only kept in memory, since they are unlikely to be needed
+again; callers tell lookup_or_compute this by passing persist = False,
+usually as persist = not model_is_changing_interactively(glpane).
+The files are pruned (oldest first) to at most _MAX_FILES files and
+_MAX_BYTES bytes, when first written in each session and then after
+every _PRUNE_INTERVAL_WRITES writes or _PRUNE_INTERVAL_BYTES bytes.
+
+The inputs and results must be made of Numeric arrays, lists, tuples,
+numbers, strings and None (no model objects).
+
+This is off by default (see the debug_pref in MemoDiskCache.enabled),
+since it only caches the spline computations, not the rest of the memos
+made by the display styles' compute_memo methods, and its effect on
+whole-memo remake times hasn't yet been measured in NE1.
+"""
+
+import os
+import md5
+import cPickle
+import time
+
+from platform_dependent.PlatformDependent import find_or_make_Nanorex_subdir
+
+from utilities import debug_flags
+from utilities.debug import print_compact_traceback
+from utilities.debug_prefs import debug_pref
+from utilities.debug_prefs import Choice_boolean_False
+
+# max number of results kept in memory, and in files, per cache
+_MAX_MEMORY_ENTRIES = 2000
+_MAX_FILES = 20000
+
+# max total size of the files of one cache
+_MAX_BYTES = 200 * 1024 * 1024
+
+# how often to prune the files (each one of these limits causes a prune)
+_PRUNE_INTERVAL_WRITES = 500
+_PRUNE_INTERVAL_BYTES = 20 * 1024 * 1024
+
+# ==
+
+def _digest_update(digest, data):
+    """
+    Update an md5 object with a canonical description of data,
+    which may contain Numeric arrays, lists, tuples, numbers,
+    strings, and None.
+    """
+    if hasattr(data, 'tostring') and hasattr(data, 'shape'):
+        # a Numeric array
+        digest.update("A%s%r" % (data.typecode(), data.shape))
+        digest.update(data.tostring())
+    elif isinstance(data, (list, tuple)):
+        digest.update("L%d(" % len(data))
+        for item in data:
+            _digest_update(digest, item)
+        digest.update(")")
+    else:
+        # note: repr of a float has enough digits to distinguish it
+        digest.update("%s:%r," % (type(data).__name__, data))
+    return
+
+def model_is_changing_interactively(glpane):
+    """
+    Is the model in glpane being changed continuously right now (by a mouse
+    drag, movie playback, or a simulator run), so that results computed
+    from its atom positions are unlikely to be needed again?
+    """
+    if getattr(glpane, 'in_drag', False): # (not defined in ThumbView)
+        return True
+    win = getattr(glpane, 'win', None)
+    if win is not None:
+        if getattr(win, 'movie_is_playing', False) or \
+           getattr(win, 'sim_is_running', False):
+            return True
+    return False
+
+def _print_timings():
+    return debug_pref("Display styles: print spline cache timings?",
+                      Choice_boolean_False,
+                      prefs_key = True )
+
+class MemoDiskCache(object):
+    """
+    A persistent, content-hashed cache of results of pure computations.
+    """
+    def __init__(self, name, version):
+        """
+        @param name: name of this cache, used for its subdirectory.
+
+        @param version: version of the cached computations; results from
+                        other versions are never used.
+        """
+        self._name = name
+        self._version = version
+        self._dir = None # made on demand
+        self._memory = {} # digest -> pickled result, for recent results
+        self._memory_order = [] # digests in self._memory, oldest first
+        self._writes_since_prune = None # None means never pruned
+        self._bytes_since_prune = 0
+        return
+
+    def enabled(self):
+        """
+        Should this cache be used now?
+        """
+        return debug_pref("Display styles: cache spline computations on disk?",
+                          Choice_boolean_False,
+                          prefs_key = True )
+
+    def digest(self, computation_name, *data):
+        """
+        Return a key (a hex string) for the result of the given named
+        computation on the given input data.
+        """
+        digest = md5.new()
+        digest.update("%s:%s:%r;" %
+                      (self._name, computation_name, self._version))
+        _digest_update(digest, data)
+        return digest.hexdigest()
+
+    def get(self, key):
+        """
+        Return a new copy of the result stored under key,
+        or None if there is none.
+        """
+        # note: we keep results pickled even in memory, so callers can
+        # modify what we return without modifying what we store
+        data = self._memory.get(key)
+        if data is None:
+            data = self._read(key)
+            if data is None:
+                return None
+        try:
+            res = cPickle.loads(data)
+        except:
+            # e.g. a file truncated by a crash, or made by an incompatible
+            # version of Python or Numeric; forget it and recompute
+            print_compact_traceback("ignoring bad memo cache data for %r: " %
+                                    key)
+            self._memory.pop(key, None)
+            path = self._path(key)
+            if path:
+                self._remove(path)
+            return None
+        self._remember(key, data)
+        return res
+
+    def put(self, key, result, persist = True):
+        """
+        Store a copy of result under key (only in memory unless persist
+        is true).
+        """
+        data = cPickle.dumps(result, cPickle.HIGHEST_PROTOCOL)
+        self._remember(key, data)
+        if persist:
+            self._write(key, data)
+        return
+
+    def lookup_or_compute(self, computation_name, func, *args, **opts):
+        """
+        Return func(*args), using a stored result computed by the same
+        named computation from equal args if there is one, and otherwise
+        storing the result for future use.
+
+        @param persist: (keyword option, default True) if False, a newly
+                        computed result is only kept in memory, not written
+                        to a file (see model_is_changing_interactively).
+        """
+        persist = opts.pop('persist', True)
+        assert not opts, "unknown options: %r" % (opts,)
+        if not self.enabled():
+            return func(*args)
+        t0 = time.time()
+        key = self.digest(computation_name, *args)
+        res = self.get(key)
+        if res is None:
+            t1 = time.time()
+            res = func(*args)
+            t2 = time.time()
+            self.put(key, res, persist)
+            if _print_timings():
+                print "%s %s: miss, computed in %.2f msec, " \
+                      "lookup and store took %.2f msec" % \
+                      (self._name, computation_name, (t2 - t1) * 1000.0,
+                       (time.time() - t2 + t1 - t0) * 1000.0)
+        elif _print_timings():
+            print "%s %s: hit in %.2f msec" % \
+                  (self._name, computation_name, (time.time() - t0) * 1000.0)
+        return res
+
+    # == private helpers
+
+    def _remember(self, key, data):
+        if key not in self._memory:
+            self._memory_order.append(key)
+            if len(self._memory_order) > _MAX_MEMORY_ENTRIES:
+                self._memory.pop(self._memory_order.pop(0), None)
+        self._memory[key] = data
+        return
+
+    def _read(self, key):
+        """
+        Return the pickled data in the file for key, or None.
+        """
+        path = self._path(key)
+        if path is None or not os.path.isfile(path):
+            return None
+        try:
+            file = open(path, "rb")
+            try:
+                return file.read()
+            finally:
+                file.close()
+        except:
+            print_compact_traceback("can't read memo cache file %r: " % path)
+            return None
+        pass
+
+    def _write(self, key, data):
+        """
+        Write pickled data into the file for key.
+        """
+        path = self._path(key)
+        if path is None:
+            return
+        if self._writes_since_prune is None or \
+           self._writes_since_prune >= _PRUNE_INTERVAL_WRITES or \
+           self._bytes_since_prune >= _PRUNE_INTERVAL_BYTES:
+            self._prune()
+            self._writes_since_prune = 0
+            self._bytes_since_prune = 0
+        self._writes_since_prune += 1
+        self._bytes_since_prune += len(data)
+        tmp_path = "%s.%d.tmp" % (path, os.getpid())
+        try:
+            file = open(tmp_path, "wb")
+            try:
+                file.write(data)
+            finally:
+                file.close()
+            if os.path.exists(path):
+                # needed on Windows, where rename won't replace a file
+                self._remove(path)
+            os.rename(tmp_path, path)
+        except:
+            print_compact_traceback("can't write memo cache file %r: " % path)
+            self._remove(tmp_path)
+        return
+
+    def _path(self, key):
+        """
+        Return the pathname of the file for key, or None if the directory
+        for our files can't be made.
+        """
+        if self._dir is None:
+            self._dir = find_or_make_Nanorex_subdir("MemoCache/" + self._name)
+            if self._dir is None:
+                self._dir = "" # don't try again
+        if not self._dir:
+            return None
+        return os.path.join(self._dir, key)
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except:
+            pass
+        return
+
+    def _prune(self):
+        """
+        If our files are too many or too large in total, remove the least
+        recently written ones, down to 3/4 of those limits.
+        """
+        if not self._dir:
+            return
+        try:
+            t0 = time.time()
+            files = []
+            total_bytes = 0
+            for name in os.listdir(self._dir):
+                path = os.path.join(self._dir, name)
+                size = os.path.getsize(path)
+                files.append( (os.path.getmtime(path), size, path) )
+                total_bytes += size
+            if len(files) <= _MAX_FILES and total_bytes <= _MAX_BYTES:
+                return
+            files.sort()
+            nfiles = len(files)
+            nremoved = 0
+            for mtime, size, path in files:
+                if nfiles <= _MAX_FILES * 3 / 4 and \
+                   total_bytes <= _MAX_BYTES * 3 / 4:
+                    break
+                self._remove(path)
+                nfiles -= 1
+                total_bytes -= size
+                nremoved += 1
+            if debug_flags.atom_debug:
+                print "atom_debug: pruned %d files from memo cache %r " \
+                      "in %.2f seconds" % \
+                      (nremoved, self._name, time.time() - t0)
+        except:
+            print_compact_traceback("exception in pruning memo cache %r: " %
+                                    self._name)
+        return
+
+    pass
+
+# end
@@ -31,6 +31,8 @@ import foundation.env as env
 from geometry.VQT import V, norm, cross
 
 from graphics.display_styles.displaymodes import ChunkDisplayMode
+from graphics.display_styles.MemoDiskCache import MemoDiskCache
+from graphics.display_styles.MemoDiskCache import model_is_changing_interactively
 
 from graphics.drawing.CS_draw_primitives import drawcylinder
 from graphics.drawing.CS_draw_primitives import drawpolycone_multicolor
@@ -229,6 +231,10 @@ def compute_spline(data, idx, t):
                  t3 * (-x0 + 3.0 * x1 - 3.0 * x2 + x3))
     return res
 
+# persistent cache for make_tube results; increase the version number
+# whenever make_tube or compute_spline is changed
+_memo_cache = MemoDiskCache("ProteinChunks", 1)
+
 def make_tube(points, colors, radii, dpos, resolution=3):
     """
     Converts a polycylinder tube into a smooth, curved tube using spline 
@@ -655,12 +661,17 @@ class ProteinChunks(ChunkDisplayMode):
 
                     if secondary != 1 or \
                        style != PROTEIN_STYLE_SIMPLE_CARTOONS:
-                        tube_pos, tube_col, tube_rad, tube_dpos = make_tube(
-                            tube_pos, 
-                            tube_col, 
-                            tube_rad, 
-                            tube_dpos, 
-                            resolution=resolution)
+                        tube_pos, tube_col, tube_rad, tube_dpos = \
+                            _memo_cache.lookup_or_compute(
+                                "make_tube",
+                                make_tube,
+                                tube_pos, 
+                                tube_col, 
+                                tube_rad, 
+                                tube_dpos, 
+                                resolution,
+                                persist = not highlighted and \
+                                    not model_is_changing_interactively(glpane))
 
                         if style == PROTEIN_STYLE_ZIGZAG or \
                            style == PROTEIN_STYLE_FLAT_RIBBON or \
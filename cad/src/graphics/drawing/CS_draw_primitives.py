@@ -63,6 +63,15 @@ def drawsphere(color, pos, radius, detailLevel,
         opacity = opacity,
         testloop = testloop )
 
+def drawspheres(colors, centers, radii, detailLevel, glnames):
+    """
+    Schedule a batch of spheres, each with its own color, radius and glname,
+    for rendering whenever ColorSorter thinks is appropriate.
+
+    @see: drawsphere
+    """
+    ColorSorter.schedule_spheres(colors, centers, radii, detailLevel, glnames)
+
 def drawwiresphere(color, pos, radius, detailLevel = 1):
     """
     Schedule a wireframe sphere for rendering whenever ColorSorter thinks is
@@ -100,6 +109,17 @@ def drawcylinder(color, pos1, pos2, radius, capped = 0, opacity = 1.0):
     ColorSorter.schedule_cylinder(color, pos1, pos2, radius, 
                                   capped = capped, opacity = opacity)
 
+def drawcylinders(colors, endpts, radii, glnames):
+    """
+    Schedule a batch of untapered, uncapped cylinders, each with its own
+    color, (pos1, pos2) endpoints, radius and glname, for rendering
+    whenever ColorSorter thinks is appropriate.
+
+    @see: drawcylinder (unlike which, this doesn't skip almost-zero-length
+          cylinders; the caller should do that if needed)
+    """
+    ColorSorter.schedule_cylinders(colors, endpts, radii, glnames)
+
 def drawcylinder_wireframe(color, end1, end2, radius): #bruce 060608
     """
     Draw a wireframe cylinder (not too pretty, definitely could look nicer, but
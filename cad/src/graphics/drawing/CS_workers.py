@@ -391,3 +391,47 @@ def drawtriangle_strip_worker(params):
 
     return
 
+
+# ==
+
+def glname_as_color(glname):
+    """
+    Return the RGB color (components 0.0 to 1.0) which encodes glname
+    for glnames-as-color (mouseover picking) drawing.
+
+    @note: this must agree with the glname_color vertex attributes stored
+        by GLSphereBuffer and GLCylinderBuffer, and with how GLPane
+        decodes the color it reads back. Only the low 24 bits are used,
+        since the alpha byte always comes back 255 on Windows.
+    """
+    return [(glname >> bits & 0xff) / 255.0 for bits in range(16, -1, -8)]
+
+def draw_worker_as_glname_color(func, params, glname):
+    """
+    Call the ColorSorter draw worker func with params, but draw it in
+    the color which encodes glname (black for a glname of 0, i.e. no
+    object, so it still obscures what's behind it), for drawing into
+    a glname-color ID buffer.
+
+    The caller must disable lighting and blending around a series of
+    these calls.
+    """
+    glColor3fv(glname_as_color(glname))
+    if func == drawpolycone_multicolor_worker:
+        # ignore the per-vertex colors (as in ColorSortedDisplayList.finish)
+        pos_array, color_array_junk, rad_array = params
+        drawpolycone_worker((pos_array, rad_array))
+    elif func == drawtriangle_strip_worker:
+        pos_array, normal_array, color_array_junk = params
+        drawtriangle_strip_worker((pos_array, normal_array, None))
+    elif func == drawwiresphere_worker:
+        # this worker sets its own color, and turns lighting back on
+        color_junk, pos, radius, detailLevel = params
+        drawwiresphere_worker((glname_as_color(glname),
+                               pos, radius, detailLevel))
+        glDisable(GL_LIGHTING)
+    else:
+        func(params)
+    return
+
+# end
@@ -57,6 +57,7 @@ import foundation.env as env
 from graphics.drawing.CS_workers import drawpolycone_multicolor_worker
 from graphics.drawing.CS_workers import drawpolycone_worker
 from graphics.drawing.CS_workers import drawtriangle_strip_worker
+from graphics.drawing.CS_workers import draw_worker_as_glname_color
 
 from graphics.drawing.patterned_drawing import isPatternedDrawing
 from graphics.drawing.patterned_drawing import startPatternedDrawing
@@ -438,6 +439,21 @@ class ColorSortedDisplayList:    #Russ 080225: Added.
             # Reset from patterning drawing mode.
             endPatternedDrawing(select = True)
         glEndList()
+
+        # A fourth DL draws each primitive in the color which encodes its
+        # glname, for the glname-color ID buffer used for mouseover picking
+        # (see GLPane._draw_glname_colors). It can't call the per-color
+        # sublists, since those have one color per sublist, not per glname.
+        glname_color_dl = self.glname_color_dl = glGenLists(1)
+        glNewList(glname_color_dl, GL_COMPILE)
+        glDisable(GL_LIGHTING) # Don't forget to re-enable it!
+        for color, funcs in sorted_by_color.iteritems():
+            for func, params, name in funcs:
+                draw_worker_as_glname_color(func, params, name)
+                continue
+            continue
+        glEnable(GL_LIGHTING)
+        glEndList()
         pass
 
     # ==
@@ -488,6 +504,32 @@ class ColorSortedDisplayList:    #Russ 080225: Added.
         self._clear_derived_primitive_caches()
         return
 
+    def addSpheres(self, centers, radii, colors, glnames):
+        """
+        Like addSphere, but for a batch of spheres, added with one call
+        of the primitive buffer's addSpheres.
+
+        . centers is a list of VQT points.
+        . radii, colors and glnames are lists of the same length,
+          or single values to use for every sphere.
+        """
+        self.spheres += drawing_globals.sphereShaderGlobals.primitiveBuffer.addSpheres(
+            centers, radii, colors, self.transform_id(), glnames)
+        self._clear_derived_primitive_caches()
+        return
+
+    def addCylinders(self, endpts, radii, colors, glnames):
+        """
+        Like addCylinder, but for a batch of cylinders.
+        See addSpheres docstring for details.
+
+        . endpts is a list of tuples of two VQT points.
+        """
+        self.cylinders += drawing_globals.cylinderShaderGlobals.primitiveBuffer.addCylinders(
+            endpts, radii, colors, self.transform_id(), glnames)
+        self._clear_derived_primitive_caches()
+        return
+
     # ==
 
     def clear_drawing_funcs(self):
@@ -721,15 +763,29 @@ class ColorSortedDisplayList:    #Russ 080225: Added.
                 glPopMatrix()
             pass
 
+        if drawing_phase == "glselect_glname_color":
+            # Draw everything with glnames as colors, ignoring our
+            # drawing-style args. (The shaders are in glnames-as-color mode
+            # during this phase, so the shader primitives take care of
+            # themselves.)
+            if prims_to_do:
+                self.draw_shader_primitives()
+            if self.has_nonempty_DLs():
+                if self.transformControl and transform_nonshaders:
+                    self._callList_inside_transformControl(
+                        self.glname_color_dl)
+                else:
+                    glCallList(self.glname_color_dl)
+                pass
+            return
+
         # Normal or selected drawing are done before a patterned highlight
         # overlay, and also when not highlighting at all.  You'd think that when
         # we're drawing a solid highlight appearance, there'd be no need to draw
         # the normal appearance first, because it will be obscured by the
         # highlight.  But halo selection extends beyond the object and is only
         # obscured by halo highlighting.  [russ 080610]
-        # Russ 081208: Skip DLs when drawing shader-prims with glnames-as-color.
-        DLs_to_do = (drawing_phase != "glselect_glname_color"
-                     and self.has_nonempty_DLs())
+        DLs_to_do = self.has_nonempty_DLs()
 
         # the following might be changed, then are used repeatedly below;
         # this simplifies the various ways we can handle transforms [bruce 090224]
@@ -893,7 +949,8 @@ class ColorSortedDisplayList:    #Russ 080225: Added.
         #bruce 090224 rewrote to make no assumptions about which DLs
         # are currently allocated or overlapping -- just delete all valid ones.
         DLs = {}
-        for dl in [self.dl, self.color_dl, self.nocolor_dl, self.selected_dl]:
+        for dl in [self.dl, self.color_dl, self.nocolor_dl, self.selected_dl,
+                   self.glname_color_dl]:
             DLs[dl] = dl
         # piotr 080420: The second level dl's are 2-element lists of DL ids 
         # rather than just a list of ids. The second DL is used in case
@@ -926,6 +983,7 @@ class ColorSortedDisplayList:    #Russ 080225: Added.
         self.color_dl = 0       # DL to set colors, call each lower level list.
         self.selected_dl = 0    # DL with a single (selected) over-ride color.
         self.nocolor_dl = 0     # DL of lower-level calls for color over-rides.
+        self.glname_color_dl = 0 # DL drawing each primitive as its glname color.
         self._per_color_dls = [] # Lower level, per-color primitive sublists.
         self._clearPrimitives()
         return
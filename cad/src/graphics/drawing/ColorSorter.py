@@ -101,6 +101,7 @@ from graphics.drawing.CS_workers import drawsphere_worker_loop
 from graphics.drawing.CS_workers import drawsurface_worker
 from graphics.drawing.CS_workers import drawwiresphere_worker
 from graphics.drawing.CS_workers import drawtriangle_strip_worker
+from graphics.drawing.CS_workers import draw_worker_as_glname_color
 
 from graphics.drawing.gl_lighting import apply_material
 
@@ -379,6 +380,13 @@ class ColorSorter:
 
             ColorSorter._immediate += 1 # for benchmark/debug stats, mostly
 
+            if drawing_globals.drawing_phase == "glselect_glname_color":
+                glDisable(GL_LIGHTING)
+                draw_worker_as_glname_color(
+                    func, params, ColorSorter._gl_name_stack[-1])
+                glEnable(GL_LIGHTING)
+                return
+
             # 20060216 We know we can do this here because the stack is
             # only ever one element deep
             name = ColorSorter._gl_name_stack[-1]
@@ -671,6 +679,91 @@ class ColorSorter:
     _schedule_tapered_cylinder = staticmethod(_schedule_tapered_cylinder)
 
 
+    def _can_batch_into_parent_csdl(shaderType): # staticmethod
+        """
+        [private helper for schedule_spheres and schedule_cylinders]
+
+        Return True if shader primitives of the given type
+        ('sphere' or 'cylinder') scheduled now would be added directly
+        to ColorSorter._parent_csdl (with no transform of their positions),
+        so that a whole batch of them can be added with one call.
+        """
+        if not (ColorSorter._parent_csdl and ColorSorter.sorting):
+            return False
+        if ColorSorter._parent_csdl.reentrant:
+            return False # positions would need _transform_point
+        glprefs = ColorSorter.glpane.glprefs
+        if glprefs.use_c_renderer:
+            return False
+        if not ColorSorter._permit_shaders:
+            return False
+        if shaderType == 'sphere':
+            return ( glprefs.sphereShader_desired() and
+                     drawing_globals.sphereShader_available() )
+        return ( glprefs.cylinderShader_desired() and
+                 drawing_globals.cylinderShader_available() )
+
+    _can_batch_into_parent_csdl = staticmethod(_can_batch_into_parent_csdl)
+
+
+    def schedule_spheres(colors, centers, radii, detailLevel, glnames):
+        """
+        Schedule a batch of spheres for rendering whenever ColorSorter thinks
+        is appropriate. This is equivalent to calling schedule_sphere for each
+        one (with its glname pushed), but when shader spheres are being
+        collected into a CSDL, it adds them all to it with one call.
+
+        @param colors: list of colors (3 or 4 components), one per sphere
+        @param centers: list or Numeric array of sphere centers
+        @param radii: list of radii, one per sphere
+        @param glnames: list of glnames (nonzero ints), one per sphere
+        """
+        if not len(centers):
+            return
+        if ColorSorter._can_batch_into_parent_csdl('sphere'):
+            ColorSorter._parent_csdl.addSpheres(
+                list(centers), list(radii), list(colors), list(glnames))
+            return
+        for color, center, radius, glname in \
+                zip(colors, centers, radii, glnames):
+            ColorSorter.pushName(glname)
+            try:
+                ColorSorter.schedule_sphere(color, center, radius, detailLevel)
+            finally:
+                ColorSorter.popName()
+            continue
+        return
+
+    schedule_spheres = staticmethod(schedule_spheres)
+
+
+    def schedule_cylinders(colors, endpts, radii, glnames):
+        """
+        Like schedule_spheres, but for a batch of untapered cylinders.
+
+        @param endpts: list of (pos1, pos2) tuples, one per cylinder
+        @param radii: list of radii (single numbers), one per cylinder
+        """
+        if not len(endpts):
+            return
+        if ColorSorter._can_batch_into_parent_csdl('cylinder'):
+            ColorSorter._parent_csdl.addCylinders(
+                list(endpts), [(float(r), float(r)) for r in radii],
+                list(colors), list(glnames))
+            return
+        for color, (pos1, pos2), radius, glname in \
+                zip(colors, endpts, radii, glnames):
+            ColorSorter.pushName(glname)
+            try:
+                ColorSorter.schedule_cylinder(color, pos1, pos2, radius)
+            finally:
+                ColorSorter.popName()
+            continue
+        return
+
+    schedule_cylinders = staticmethod(schedule_cylinders)
+
+
     def schedule_polycone(color, pos_array, rad_array,
                           capped = 0, opacity = 1.0):
         """
@@ -966,6 +1059,17 @@ class ColorSorter:
         # parent_csdl.finish? If so, has this been maintained as that's been
         # modified? [bruce 090224 questions]
         
+        if drawing_globals.drawing_phase == "glselect_glname_color":
+            # (see the same case in ColorSortedDisplayList.finish)
+            glDisable(GL_LIGHTING)
+            for color, funcs in sorted_by_color.iteritems():
+                for func, params, name in funcs:
+                    draw_worker_as_glname_color(func, params, name)
+                    continue
+                continue
+            glEnable(GL_LIGHTING)
+            return
+
         glEnable(GL_LIGHTING)
 
         for color, funcs in sorted_by_color.iteritems():
@@ -97,7 +97,7 @@ class GLCylinderBuffer(GLPrimitiveBuffer):
         
         if type(colors) == type([]):
             assert len(colors) == nCylinders
-            colors = [self.color4(colors) for color in colors]
+            colors = [self.color4(color) for color in colors]
         else:
             colors = nCylinders * [self.color4(colors)]
             pass
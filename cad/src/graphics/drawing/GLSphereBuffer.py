@@ -78,7 +78,7 @@ class GLSphereBuffer(GLPrimitiveBuffer):
         
         if type(colors) == type([]):
             assert len(colors) == nSpheres
-            colors = [self.color4(colors) for color in colors]
+            colors = [self.color4(color) for color in colors]
         else:
             colors = nSpheres * [self.color4(colors)]
             pass
@@ -711,6 +711,58 @@ def genDiam(bblo, bbhi, latticeType):
                     allCells += [drawing_globals.lonsEdges + off]
     return allCells  
 
+# max number of bond pairs in each block yielded by genDiamPairBlocks
+# (about 10 MB of positions)
+_MAX_PAIRS_PER_BLOCK = 200000
+
+def genDiamPairBlocks(bblo, bbhi, latticeType,
+                      max_pairs = _MAX_PAIRS_PER_BLOCK):
+    """
+    Generate the same lattice bond pairs as genDiam, in the same order,
+    but as a series of blocks of at most max_pairs pairs (unless one slab
+    of cells has more), each given as two Numeric arrays (p0, p1) of
+    shape (N, 3), so that callers can test and hash the positions of all
+    the pairs in a block at once, without ever holding the whole lattice.
+    """
+    if latticeType == 'DIAMOND':
+        cell = drawing_globals.digrid
+        cellX = cellY = cellZ = drawing_globals.DiGridSp
+    elif latticeType == 'LONSDALEITE':
+        cell = drawing_globals.lonsEdges
+        cellX = drawing_globals.XLen
+        cellY = drawing_globals.YLen
+        cellZ = drawing_globals.ZLen
+    cell = Numeric.array(cell, Numeric.Float) # shape (npairs, 2, 3)
+    npairs = len(cell)
+
+    ivals = range(int(floor(bblo[0]/cellX)), int(ceil(bbhi[0]/cellX)))
+    jvals = range(int(floor(bblo[1]/cellY)), int(ceil(bbhi[1]/cellY)))
+    kvals = range(int(floor(bblo[2]/cellZ)), int(ceil(bbhi[2]/cellZ)))
+    nj = len(jvals)
+    nk = len(kvals)
+    if not ivals or not nj or not nk or not npairs:
+        return
+
+    # cell offsets for one slab of cells (fixed i), in genDiam's order
+    slab = Numeric.zeros((nj * nk, 3), Numeric.Float)
+    slab[:, 1] = Numeric.repeat(Numeric.array(jvals, Numeric.Float) * cellY,
+                                [nk] * nj)
+    slab[:, 2] = Numeric.resize(Numeric.array(kvals, Numeric.Float) * cellZ,
+                                (nj * nk,))
+
+    slabs_per_block = max(1, max_pairs / (nj * nk * npairs))
+    for start in range(0, len(ivals), slabs_per_block):
+        block_ivals = ivals[start : start + slabs_per_block]
+        ni = len(block_ivals)
+        offsets = Numeric.resize(slab, (ni * nj * nk, 3))
+        offsets[:, 0] = Numeric.repeat(
+            Numeric.array(block_ivals, Numeric.Float) * cellX, [nj * nk] * ni)
+        pairs = cell[Numeric.NewAxis, :, :, :] + \
+                offsets[:, Numeric.NewAxis, Numeric.NewAxis, :]
+        pairs = Numeric.reshape(pairs, (-1, 2, 3))
+        yield Numeric.array(pairs[:, 0]), Numeric.array(pairs[:, 1])
+    return
+
 
 def drawGrid(scale, center, latticeType):
     """
@@ -0,0 +1,313 @@
+# Copyright 2009 Nanorex, Inc.  See LICENSE file for details.
+"""
+ChunkBVH.py -- a bounding volume hierarchy of the chunks in a Part,
+used to frustum cull them and choose their detail levels once per frame.
+
+@version: $Id$
+@copyright: 2009 Nanorex, Inc.  See LICENSE file for details.
+
+The hierarchy is a binary tree of bounding spheres, built by splitting
+the chunks' bounding sphere centers at the median of their longest extent.
+Its topology is rebuilt only when the set of chunks changes; its spheres
+are refit (bottom up) on each frame, since any chunk might have moved.
+
+Culling traverses the tree from the top, keeping track of which frustum
+planes are known to contain each node entirely, so that whole subtrees
+are culled (or accepted) with one test, and so that deeper nodes only
+need to be tested against the remaining planes. The result for each leaf
+is the same as testing that chunk's bounding sphere with
+GLPane.is_sphere_visible.
+
+For each visible chunk, a sphere detail level (drawLevel) is also chosen
+from its projected size on the screen (measured in pixels per Angstrom at
+its nearest point), never more than the Part's overall drawLevel.
+"""
+
+import math
+import time
+
+# LOD thresholds, in pixels per Angstrom at the nearest point of a chunk's
+# bounding sphere: below the first one, use drawLevel 0; below the second,
+# at most 1; otherwise the part's drawLevel.
+_LOD_0_MAX_PIXELS_PER_ANGSTROM = 2.0
+_LOD_1_MAX_PIXELS_PER_ANGSTROM = 6.0
+
+# the value ChunkBVH.cull returns for culled chunks
+CULLED = -1
+
+# ==
+
+def _enclosing_sphere( sphere1, sphere2 ):
+    """
+    Return the smallest sphere (center, radius) enclosing two spheres
+    given in the same form. Centers are tuples of 3 floats.
+    """
+    c1, r1 = sphere1
+    c2, r2 = sphere2
+    dx = c2[0] - c1[0]
+    dy = c2[1] - c1[1]
+    dz = c2[2] - c1[2]
+    d = math.sqrt(dx * dx + dy * dy + dz * dz)
+    if d + r2 <= r1:
+        return c1, r1
+    if d + r1 <= r2:
+        return c2, r2
+    r = (d + r1 + r2) / 2.0
+    f = (r - r1) / d # d > 0 here
+    return (c1[0] + dx * f, c1[1] + dy * f, c1[2] + dz * f), r
+
+def pixels_per_angstrom_func(glpane):
+    """
+    Return a function which takes a sphere (center tuple, radius) and
+    returns the number of screen pixels per Angstrom at the nearest
+    point of that sphere, in glpane's current view.
+    """
+    scale = glpane.scale * glpane.zoomFactor
+    height = float(glpane.height)
+    if glpane.ortho:
+        ppa = height / (2.0 * scale)
+        return lambda center, radius: ppa
+    # In perspective, the visible half-height at eye distance d is
+    # scale * d / vdist (see GLPane_minimal._setup_projection).
+    vdist = glpane.vdist
+    eye = glpane.eyeball()
+    eye = (eye[0], eye[1], eye[2])
+    out = glpane.out
+    out = (out[0], out[1], out[2])
+    min_distance = vdist * glpane.near
+    def func(center, radius):
+        d = (eye[0] - center[0]) * out[0] + \
+            (eye[1] - center[1]) * out[1] + \
+            (eye[2] - center[2]) * out[2] - radius
+        d = max(d, min_distance)
+        return height * vdist / (2.0 * scale * d)
+    return func
+
+class ChunkBVH(object):
+    """
+    A bounding volume hierarchy of bounding spheres of a list of chunks.
+
+    Nodes are numbered in preorder, so each node's subtree is the range
+    of nodes [node, self._subtree_end[node]), and its leaves are the
+    chunks self._leaf_chunks[self._first_leaf[node]:self._end_leaf[node]].
+    """
+    def __init__(self):
+        self._chunk_ids = None # ids of the chunks in the current topology
+        self._leaf_chunks = []
+        self.last_stats = None # for a debug display; see self.cull()
+        return
+
+    # == building and refitting
+
+    def _rebuild(self, chunks, spheres):
+        """
+        Rebuild our topology for the given chunks, whose bounding spheres
+        (as (center tuple, radius)) are given in the same order.
+        """
+        self._chunk_ids = [id(chunk) for chunk in chunks]
+        self._leaf_chunks = []
+        self._leaf_of_node = [] # leaf index for leaf nodes, else -1
+        self._left = [] # left child node, or -1 for leaf nodes
+        self._right = []
+        self._subtree_end = []
+        self._first_leaf = []
+        self._end_leaf = []
+        self._node_of_leaf = [] # node index of each leaf
+        if chunks:
+            self._build_subtree( range(len(chunks)), chunks, spheres )
+        self._spheres = [None] * len(self._left)
+        return
+
+    def _build_subtree(self, indices, chunks, spheres):
+        """
+        Add nodes (in preorder) for the chunks with the given indices
+        into chunks and spheres; return the root node of their subtree.
+        """
+        node = len(self._left)
+        self._left.append(-1)
+        self._right.append(-1)
+        self._leaf_of_node.append(-1)
+        self._subtree_end.append(None)
+        self._first_leaf.append(len(self._leaf_chunks))
+        self._end_leaf.append(None)
+        if len(indices) == 1:
+            i = indices[0]
+            self._leaf_of_node[node] = len(self._leaf_chunks)
+            self._leaf_chunks.append(chunks[i])
+            self._node_of_leaf.append(node)
+        else:
+            # split at the median along the axis of largest extent
+            # of the sphere centers
+            best_axis = 0
+            best_extent = -1.0
+            for axis in (0, 1, 2):
+                values = [spheres[i][0][axis] for i in indices]
+                extent = max(values) - min(values)
+                if extent > best_extent:
+                    best_axis = axis
+                    best_extent = extent
+            indices = list(indices)
+            indices.sort( lambda i, j, axis = best_axis:
+                          cmp(spheres[i][0][axis], spheres[j][0][axis]) )
+            half = len(indices) / 2
+            self._left[node] = self._build_subtree( indices[:half],
+                                                    chunks, spheres )
+            self._right[node] = self._build_subtree( indices[half:],
+                                                     chunks, spheres )
+        self._subtree_end[node] = len(self._left)
+        self._end_leaf[node] = len(self._leaf_chunks)
+        return node
+
+    def update(self, chunks):
+        """
+        Make self describe the given chunks at their current positions,
+        rebuilding our topology if the set of chunks (or their order)
+        changed since our last update, but otherwise just refitting our
+        bounding spheres.
+        """
+        spheres = []
+        for chunk in chunks:
+            center, radius = chunk.bounding_sphere()
+            spheres.append( ((center[0], center[1], center[2]), radius) )
+        if self._chunk_ids is None or \
+           len(chunks) != len(self._chunk_ids) or \
+           [id(chunk) for chunk in chunks] != self._chunk_ids:
+            self._rebuild(chunks, spheres)
+        # refit, children before parents (i.e. in reverse preorder);
+        # _build_subtree permuted the chunks into leaf order, so look up
+        # leaf spheres by chunk id
+        sphere_of_chunk = {}
+        for i in range(len(chunks)):
+            sphere_of_chunk[id(chunks[i])] = spheres[i]
+        left = self._left
+        right = self._right
+        leaf_of_node = self._leaf_of_node
+        leaf_chunks = self._leaf_chunks
+        node_spheres = self._spheres
+        for node in range(len(left) - 1, -1, -1):
+            if left[node] < 0:
+                chunk = leaf_chunks[leaf_of_node[node]]
+                node_spheres[node] = sphere_of_chunk[id(chunk)]
+            else:
+                node_spheres[node] = _enclosing_sphere(
+                    node_spheres[left[node]], node_spheres[right[node]] )
+            continue
+        return
+
+    # == culling
+
+    def cull(self, glpane, frustum_planes, max_drawLevel, choose_drawLevels):
+        """
+        Determine which of our chunks are visible in glpane,
+        whose frustum is described by frustum_planes (as returned by
+        glpane.get_frustum_planes()), and if choose_drawLevels is true,
+        choose their sphere detail levels (at most max_drawLevel).
+
+        @return: a dict from id(chunk) to CULLED for culled chunks,
+                 or for visible chunks, to their drawLevel
+                 (always max_drawLevel if not choose_drawLevels).
+
+        @note: also sets self.last_stats.
+        """
+        t0 = time.time()
+        res = {}
+        planes_tested = 0
+        nodes_visited = 0
+        left = self._left
+        spheres = self._spheres
+        subtree_end = self._subtree_end
+        leaf_chunks = self._leaf_chunks
+        first_leaf = self._first_leaf
+        end_leaf = self._end_leaf
+        visible_leaves = [] # leaf indices of visible chunks
+
+        if left:
+            stack = [(0, range(len(frustum_planes)))]
+        else:
+            stack = []
+        while stack:
+            node, planes = stack.pop()
+            nodes_visited += 1
+            (c0, c1, c2), radius = spheres[node]
+            remaining_planes = []
+            culled = False
+            for p in planes:
+                fp = frustum_planes[p]
+                planes_tested += 1
+                dist = fp[0] * c0 + fp[1] * c1 + fp[2] * c2 + fp[3]
+                if dist < - radius:
+                    culled = True
+                    break
+                if dist < radius:
+                    # sphere intersects the plane; children need this test
+                    remaining_planes.append(p)
+                continue
+            if culled:
+                for leaf in range(first_leaf[node], end_leaf[node]):
+                    res[id(leaf_chunks[leaf])] = CULLED
+            elif not remaining_planes or left[node] < 0:
+                # (note: a leaf with remaining planes is still visible,
+                #  as when tested by GLPane.is_sphere_visible)
+                visible_leaves.extend( range(first_leaf[node], end_leaf[node]) )
+            else:
+                stack.append( (self._right[node], remaining_planes) )
+                stack.append( (left[node], remaining_planes) )
+            continue
+
+        t1 = time.time()
+
+        level_counts = {}
+        if not choose_drawLevels:
+            for leaf in visible_leaves:
+                res[id(leaf_chunks[leaf])] = max_drawLevel
+        else:
+            node_of_leaf = self._node_of_leaf
+            pixels_per_angstrom = pixels_per_angstrom_func(glpane)
+            for leaf in visible_leaves:
+                center, radius = spheres[node_of_leaf[leaf]]
+                ppa = pixels_per_angstrom(center, radius)
+                if ppa < _LOD_0_MAX_PIXELS_PER_ANGSTROM:
+                    level = 0
+                elif ppa < _LOD_1_MAX_PIXELS_PER_ANGSTROM:
+                    level = 1
+                else:
+                    level = 2
+                level = min(level, max_drawLevel)
+                level_counts[level] = level_counts.get(level, 0) + 1
+                res[id(leaf_chunks[leaf])] = level
+                continue
+            pass
+
+        t2 = time.time()
+
+        self.last_stats = dict( chunks = len(leaf_chunks),
+                                visible = len(visible_leaves),
+                                nodes_visited = nodes_visited,
+                                planes_tested = planes_tested,
+                                level_counts = level_counts,
+                                cull_time = t1 - t0,
+                                lod_time = t2 - t1 )
+        return res
+
+    def stats_text(self):
+        """
+        Return a short text summary of self.last_stats, for a debug display,
+        or "" if we have not culled anything yet.
+        """
+        stats = self.last_stats
+        if not stats:
+            return ""
+        levels = stats['level_counts'].items()
+        levels.sort()
+        levels = ", ".join(["LOD %d: %d" % item for item in levels])
+        return "chunks: %d visible of %d (%d BVH nodes, %d plane tests, " \
+               "%.2f msec); %s (%.2f msec)" % \
+               ( stats['visible'], stats['chunks'],
+                 stats['nodes_visited'], stats['planes_tested'],
+                 stats['cull_time'] * 1000.0,
+                 levels or "LOD not used",
+                 stats['lod_time'] * 1000.0 )
+
+    pass
+
+# end
@@ -44,8 +44,10 @@ from OpenGL.GL import glPopMatrix
 from OpenGL.GL import glPushName
 from OpenGL.GL import glPopName
 
+from Numeric import take, sqrt, add
 
 from utilities.constants import diBALL
+from utilities.constants import diDEFAULT
 from utilities.constants import diDNACYLINDER
 from utilities.constants import diLINES
 from utilities.constants import diTUBES
@@ -62,6 +64,7 @@ from utilities.Log import graymsg
 
 from utilities.prefs_constants import bondpointHotspotColor_prefs_key
 from utilities.prefs_constants import selectionColor_prefs_key
+from utilities.prefs_constants import showValenceErrors_prefs_key
 
 
 import foundation.env as env
@@ -70,6 +73,9 @@ import foundation.env as env
 from graphics.display_styles.displaymodes import get_display_mode_handler
 
 from graphics.drawing.ColorSorter import ColorSorter
+from graphics.drawing.CS_draw_primitives import drawspheres
+
+from graphics.model_drawing.bond_drawer import draw_plain_bonds_batched
 
 ##from drawer import drawlinelist
 
@@ -79,6 +85,12 @@ from graphics.model_drawing.special_drawing import SpecialDrawing_ExtraChunkDisp
 from graphics.model_drawing.special_drawing import Chunk_SpecialDrawingHandler
 
 from graphics.model_drawing.TransformedDisplayListsDrawer import TransformedDisplayListsDrawer
+from graphics.model_drawing.ChunkBVH import CULLED
+
+from geometry.ArrayNeighborhoodGenerator import ArrayNeighborhoodGenerator
+
+from model.elements import Singlet
+from model.bond_constants import V_SINGLE
 
 # ==
 
@@ -151,7 +163,7 @@ class ChunkDrawer(TransformedDisplayListsDrawer):
         # display lists, whether or not that's the current style.
         if not self.glpane or \
            self._chunk.get_dispdef(self.glpane) == style:
-            self.invalidate_display_lists()
+            self._invalidate_display_lists_for_appearance()
         return
 
         #### REVIEW: all comments about track_inval, havelist, changeapp,
@@ -183,12 +195,30 @@ class ChunkDrawer(TransformedDisplayListsDrawer):
     # == drawing methods which are mostly specific to Chunk, though they have
     # == plenty of more general aspects which ought to be factored out
 
+    def _get_culling_result(self):
+        """
+        Return the result of culling all of our Part's chunks at once
+        (done by Part._cull_chunks) for self's chunk in the current drawing
+        frame: CULLED, or the drawLevel to use for self. Return None if
+        that wasn't done (e.g. if our chunk was not in the culled chunks,
+        or if we're not being drawn as part of Part.draw).
+        """
+        drawing_frame = self.get_part_drawing_frame()
+        if drawing_frame:
+            chunk_drawLevels = drawing_frame.chunk_drawLevels
+            if chunk_drawLevels is not None:
+                return chunk_drawLevels.get(id(self._chunk))
+        return None
+
     def is_visible(self, glpane):
         """
         Is self visible in the given glpane?
 
         Use a fast test; false positives are ok.
         """
+        res = self._get_culling_result()
+        if res is not None:
+            return res != CULLED
         center, radius = self._chunk.bounding_sphere()
         return glpane.is_sphere_visible( center, radius )
 
@@ -196,6 +226,10 @@ class ChunkDrawer(TransformedDisplayListsDrawer):
         """
         Get the sphere drawLevel (detail level) to use when drawing self.
         """
+        res = self._get_culling_result()
+        if res is not None and res != CULLED:
+            # a per-chunk drawLevel, based on our size on the screen
+            return res
         return glpane.get_drawLevel(self._chunk.assy)
 
     def draw(self, glpane, highlight_color = None):
@@ -455,8 +489,11 @@ class ChunkDrawer(TransformedDisplayListsDrawer):
                 #  change (eg bug 452 items 12-A, 12-B).]
 
                 elt_mat_prefs = glpane._general_appearance_change_indicator
-                havelist_data = (disp, elt_mat_prefs)
+                havelist_data = (disp, elt_mat_prefs, drawLevel)
                     # note: havelist_data must be boolean true
+                    # note: drawLevel can differ from the one in
+                    # elt_mat_prefs when it's chosen per-chunk
+                    # (see Part._cull_chunks)
 
                 wantlist = glpane._remake_display_lists #bruce 090224
                     # We'll only remake invalid displists when this is true;
@@ -495,6 +532,15 @@ class ChunkDrawer(TransformedDisplayListsDrawer):
                     # separately below.
                     draw_outside += [self.displist]
                     pass
+                elif wantlist and \
+                     self._should_defer_remake( drawing_frame,
+                                                *self._chunk.bounding_sphere() ):
+                    # self.displist is out of date only in appearance, and
+                    # our Part's remake scheduler says to remake it in a
+                    # later frame; until then, draw it (and our extra
+                    # displists, below) as is.
+                    draw_outside += [self.displist]
+                    pass
                 else:
                     # our main display list (and all extra lists) needs to be remade
                     
@@ -552,6 +598,7 @@ class ChunkDrawer(TransformedDisplayListsDrawer):
 
                         self.end_tracking_usage( match_checking_code, self.invalidate_display_lists )
                         self.havelist = havelist_data
+                        self._remake_finished(drawing_frame)
                             # we always set self.havelist, even if an exception
                             # happened, so it doesn't keep happening with every
                             # redraw of this Chunk. (Someday: it might be better
@@ -944,29 +991,46 @@ class ChunkDrawer(TransformedDisplayListsDrawer):
         if not model_draw_frame:
             return
         neighborhoodGenerator = model_draw_frame._f_state_for_indicate_overlapping_atoms
-        if not neighborhoodGenerator:
+        if neighborhoodGenerator is None:
+            # (note: don't test it as a boolean, since it's false when empty)
             # precaution after refactoring, probably can't happen [bruce 090218]
             return
-        for atom in self._chunk.atoms.itervalues():
-            pos = atom.posn()
-            prior_atoms_too_close = neighborhoodGenerator.region(pos)
-            if prior_atoms_too_close:
-                # This atom overlaps the prior atoms.
-                # Draw an indicator around it,
-                # and around the prior ones if they don't have one yet.
-                # (That can be true even if there is more than one of them,
-                #  if the prior ones were not too close to each other,
-                #  so for now, just draw it on the prior ones too, even
-                #  though this means drawing it twice for each atom.)
-                #
-                # Pass an arg which indicates the atoms for which one or more
-                # was too close. See draw_overlap_indicator docstring for more
-                # about how that can be used, given our semi-symmetrical calls.
-                for prior_atom in prior_atoms_too_close:
-                    prior_atom.draw_overlap_indicator((atom,))
-                atom.draw_overlap_indicator(prior_atoms_too_close)
-            neighborhoodGenerator.add(atom)
+        # Find all the too-close pairs involving our atoms at once, using
+        # bulk queries (atoms of prior chunks are in neighborhoodGenerator;
+        # our own atoms are checked against each other by a temporary one).
+        # This is equivalent to checking each atom (in atlist order) against
+        # all atoms scanned before it, one at a time.
+        atoms = self._chunk.atlist
+        positions = self._chunk.atpos
+        prior_atoms_too_close = {} # maps index in atoms to list of prior atoms
+        p, j, dist = neighborhoodGenerator.neighbors_of_points(positions)
+        scanned_atoms = neighborhoodGenerator.objects()
+        for index, prior_index in zip(p, j):
+            prior_atoms_too_close.setdefault(index, []).append(scanned_atoms[prior_index])
+        if len(atoms) > 1:
+            own_atoms = ArrayNeighborhoodGenerator(positions,
+                                                   neighborhoodGenerator.maxradius())
+            i, j, dist = own_atoms.pairs_within()
+            for prior_index, index in zip(i, j): # prior_index < index
+                prior_atoms_too_close.setdefault(index, []).append(atoms[prior_index])
+        for index, prior_atoms in prior_atoms_too_close.iteritems():
+            # This atom overlaps the prior atoms.
+            # Draw an indicator around it,
+            # and around the prior ones if they don't have one yet.
+            # (That can be true even if there is more than one of them,
+            #  if the prior ones were not too close to each other,
+            #  so for now, just draw it on the prior ones too, even
+            #  though this means drawing it twice for each atom.)
+            #
+            # Pass an arg which indicates the atoms for which one or more
+            # was too close. See draw_overlap_indicator docstring for more
+            # about how that can be used, given our semi-symmetrical calls.
+            atom = atoms[index]
+            for prior_atom in prior_atoms:
+                prior_atom.draw_overlap_indicator((atom,))
+            atom.draw_overlap_indicator(prior_atoms)
             continue
+        neighborhoodGenerator.add(positions, atoms)
         return
 
     def _draw_for_main_display_list(self, glpane, disp0, hd_info, wantlist):
@@ -1117,6 +1181,14 @@ class ChunkDrawer(TransformedDisplayListsDrawer):
 
         bondcolor = atomcolor # never changed below
 
+        if _colorfunc is None and _dispfunc is None and \
+           disp0 in (diBALL, diTrueCPK, diTUBES, diLINES) and \
+           debug_pref("batched atom and bond drawing?",
+                      Choice_boolean_True,
+                      prefs_key = True ):
+            self._batched_draw_atoms(glpane, disp0, atomcolor, drawLevel)
+            return
+
         for atom in self._chunk.atoms.itervalues(): 
             #bruce 050513 using itervalues here (probably safe, speed is needed)
             try:
@@ -1204,6 +1276,185 @@ class ChunkDrawer(TransformedDisplayListsDrawer):
                     print "Source of current atom:", atom_source
         return # from _standard_draw_atoms (submethod of _draw_for_main_display_list)
 
+    def _batched_draw_atoms(self, glpane, disp0, atomcolor, drawLevel):
+        """
+        [private helper for _standard_draw_atoms]
+
+        Draw the same things as _standard_draw_atoms would, for a chunk
+        with no _colorfunc or _dispfunc, whose display style disp0 is
+        diBALL, diTrueCPK, diTUBES or diLINES, but draw the "plain" atoms
+        and the plain single bonds between them in batches, using one
+        drawspheres and (at most) one drawcylinders call, rather than
+        calling Atom.draw and Bond.draw for each one.
+
+        An atom is plain if Atom.draw would draw it as nothing more than a
+        sphere of its element's radius and color: it has no display style
+        of its own, is not a bondpoint, PAM, or directional-bond atom, has
+        no dna updater error, and needs no selection or valence error
+        wireframe. All other atoms, and all bonds touching them, are drawn
+        individually as before.
+        """
+        chunk = self._chunk
+        atlist = chunk.atlist
+        basepos = chunk.basepos
+        special_drawing_handler = self.special_drawing_handler
+        bondcolor = atomcolor
+
+        check_valence = glpane.should_draw_valence_errors() and \
+                        env.prefs[showValenceErrors_prefs_key]
+
+        radius_for_element = {} # element -> drawing radius in disp0
+
+        plain = [False] * len(atlist) # indexed by atom.index
+        sphere_indices = []
+        sphere_colors = []
+        sphere_radii = []
+        sphere_glnames = []
+        other_atoms = []
+
+        for atom in atlist:
+            element = atom.element
+            if atom.display != diDEFAULT or \
+               element is Singlet or \
+               element.pam or \
+               element.bonds_can_be_directional or \
+               atom.picked or \
+               atom._dna_updater__error or \
+               (check_valence and atom.bad_valence(external = False)):
+                other_atoms.append(atom)
+                continue
+            plain[atom.index] = True
+            if disp0 == diLINES:
+                continue # atom is not drawn
+            try:
+                radius = radius_for_element[element]
+            except KeyError:
+                radius = radius_for_element[element] = atom.howdraw(disp0)[1]
+            sphere_indices.append(atom.index)
+            sphere_colors.append(atomcolor or element.color)
+            sphere_radii.append(radius)
+            sphere_glnames.append(atom.get_glname(glpane))
+            continue
+
+        if sphere_indices:
+            try:
+                drawspheres(sphere_colors,
+                            take(basepos, sphere_indices),
+                            sphere_radii,
+                            drawLevel,
+                            sphere_glnames)
+            except:
+                print_compact_traceback("exception in drawing %d atoms of %r ignored: " %
+                                        (len(sphere_indices), chunk))
+            pass
+
+        # Draw non-plain atoms and the internal bonds between them
+        # exactly as _standard_draw_atoms does, collecting the bonds
+        # which touch plain atoms for the batched code below.
+        drawn = {}
+        for atom in other_atoms:
+            try:
+                atomdisp = atom.draw(
+                    glpane, disp0, atomcolor, drawLevel,
+                    special_drawing_handler = special_drawing_handler
+                 )
+                if atomdisp in (diBALL, diLINES, diTUBES, diTrueCPK, diDNACYLINDER):
+                    for bond in atom.bonds:
+                        if id(bond) not in drawn:
+                            if bond.atom1.molecule is not chunk or \
+                               bond.atom2.molecule is not chunk:
+                                pass
+                            elif plain[bond.atom1.index] or plain[bond.atom2.index]:
+                                pass # drawn below
+                            else:
+                                drawn[id(bond)] = bond
+                                bond.draw(glpane, disp0, bondcolor, drawLevel,
+                                          special_drawing_handler = special_drawing_handler
+                                          )
+            except:
+                print_compact_traceback("exception in drawing one atom or bond ignored: ")
+                try:
+                    print "current atom was:", atom
+                except:
+                    print "current atom was... exception when printing it, discarded"
+            continue
+
+        # Find the internal bonds touching plain atoms, in one pass, as
+        # arrays of the indices of their atoms. (These can't be cached
+        # across display list remakes, since nothing tells us when a bond
+        # was added, removed, or changed in order.)
+        plain_bonds = []
+        index1 = []
+        index2 = []
+        other_bonds = []
+        for atom in atlist:
+            if not plain[atom.index]:
+                continue
+            for bond in atom.bonds:
+                atom1 = bond.atom1
+                atom2 = bond.atom2
+                if atom1.molecule is not chunk or atom2.molecule is not chunk:
+                    continue # external bond
+                if atom1 is atom:
+                    other = atom2
+                else:
+                    other = atom1
+                if plain[other.index] and atom.index > other.index:
+                    continue # this bond was seen from the other atom
+                if plain[other.index] and bond.v6 == V_SINGLE and \
+                   not bond._direction:
+                    plain_bonds.append(bond)
+                    index1.append(atom1.index)
+                    index2.append(atom2.index)
+                elif id(bond) not in drawn:
+                    drawn[id(bond)] = bond
+                    other_bonds.append(bond)
+                continue
+            continue
+
+        try:
+            if plain_bonds:
+                a1pos = take(basepos, index1)
+                a2pos = take(basepos, index2)
+                if disp0 == diTrueCPK:
+                    # as in bond_draw_in_CPK (no rung bonds between plain atoms)
+                    radii = [0.0] * len(atlist)
+                    for i in range(len(sphere_indices)):
+                        radii[sphere_indices[i]] = sphere_radii[i]
+                    vec = a2pos - a1pos
+                    dist = sqrt(add.reduce(vec * vec, 1))
+                    limit = take(radii, index1) + take(radii, index2)
+                    for i in range(len(plain_bonds)):
+                        if dist[i] > limit[i]:
+                            other_bonds.append(plain_bonds[i])
+                        continue
+                    pass
+                else:
+                    colors1 = []
+                    colors2 = []
+                    glnames = []
+                    for bond in plain_bonds:
+                        colors1.append(atomcolor or bond.atom1.element.color)
+                        colors2.append(atomcolor or bond.atom2.element.color)
+                        glnames.append(bond.glname)
+                    draw_plain_bonds_batched(plain_bonds, a1pos, a2pos,
+                                             colors1, colors2,
+                                             disp0, bondcolor, glnames)
+                pass
+        except:
+            print_compact_traceback("exception in drawing %d bonds of %r ignored: " %
+                                    (len(plain_bonds), chunk))
+
+        for bond in other_bonds:
+            try:
+                bond.draw(glpane, disp0, bondcolor, drawLevel,
+                          special_drawing_handler = special_drawing_handler
+                          )
+            except:
+                print_compact_traceback("exception in drawing bond %r ignored: " % bond)
+            continue
+        return # from _batched_draw_atoms
+
     def overdraw_hotspot(self, glpane, disp): #bruce 050131
         #### REVIEW: ok if this remains outside any CSDL?
         # A possible issue is whether it's big enough (as a polyhedral sphere)
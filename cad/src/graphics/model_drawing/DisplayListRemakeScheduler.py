@@ -0,0 +1,128 @@
+# Copyright 2009 Nanorex, Inc.  See LICENSE file for details.
+"""
+DisplayListRemakeScheduler.py -- spread the remaking of many out of date
+display lists over several frames, most visible ones first.
+
+@version: $Id$
+@copyright: 2009 Nanorex, Inc.  See LICENSE file for details.
+
+After a global display style or color change, the main display lists
+(CSDLs) of all chunks and ExternalBondSets become invalid at once.
+Remaking them all in the next frame can freeze the UI for seconds on
+large parts. But their old contents can still be drawn, since only the
+appearance of the same atoms and bonds changed, so we let drawers keep
+drawing them until they can be remade within a time budget per frame.
+
+Within each frame, drawers ask whether to remake (when their display
+list is out of date but still drawable) in model tree order, which says
+nothing about what the user can see best. So the drawers we defer in one
+frame are given remake permission in the next frame in order of their
+size on the screen (in pixels), as many as our estimate of the time per
+remake says will fit in the budget.
+
+Drawers whose display lists are invalid for other reasons (e.g. changes
+to atoms or bonds) don't ask us, and are remade immediately as before.
+"""
+
+import time
+
+from graphics.model_drawing.ChunkBVH import pixels_per_angstrom_func
+
+# seconds of remaking we permit per frame, when we can defer some remakes
+_TIME_BUDGET = 0.05
+
+# ==
+
+class DisplayListRemakeScheduler(object):
+    """
+    Decide which out of date but still drawable display lists to remake
+    in each frame. One of these is kept by each Part.
+
+    Drawers are identified by id(drawer), and are expected to call
+    may_remake_now(drawer, center, radius) before remaking such a display
+    list, and remake_finished(drawer) after doing so.
+    """
+    def __init__(self):
+        self._granted = {} # ids of drawers we'll let remake in this frame
+        self._deferred = [] # (priority, id) for drawers deferred this frame
+        self._time_per_remake = None # running estimate, in seconds
+        self._pixels_per_angstrom = None
+        self._elapsed = 0.0
+        self._current = None
+        return
+
+    def begin_frame(self, glpane):
+        """
+        Prepare to make remake decisions while drawing one frame
+        in glpane.
+        """
+        deferred = self._deferred
+        self._granted = {}
+        if deferred:
+            deferred.sort()
+            deferred.reverse() # largest on the screen first
+            if self._time_per_remake:
+                n = int(_TIME_BUDGET / self._time_per_remake)
+            else:
+                n = 1
+            for priority, key in deferred[:max(1, n)]:
+                self._granted[key] = True
+        self._deferred = []
+        self._pixels_per_angstrom = pixels_per_angstrom_func(glpane)
+        self._elapsed = 0.0
+        self._current = None
+        return
+
+    def end_frame(self):
+        """
+        Finish the current frame.
+
+        @return: whether any remakes were deferred, in which case the
+                 caller should arrange for another frame to be drawn.
+        """
+        self._pixels_per_angstrom = None
+        self._current = None
+        return not not self._deferred
+
+    def may_remake_now(self, drawer, center, radius):
+        """
+        Drawer's main display list is out of date, but could still be
+        drawn as is, and would be drawn at the given bounding sphere
+        (in absolute model coordinates). Return True if drawer should remake
+        it now (and then call self.remake_finished(drawer)), or False if it
+        should draw it as is for now.
+        """
+        key = id(drawer)
+        if self._granted:
+            # Permit only the drawers chosen at the start of this frame,
+            # even if others turn up first, so the ones largest on the
+            # screen are remade first.
+            ok = key in self._granted
+        else:
+            ok = self._elapsed < _TIME_BUDGET
+        if ok:
+            self._current = (key, time.time())
+        else:
+            center = (center[0], center[1], center[2])
+            priority = radius * self._pixels_per_angstrom(center, radius)
+            self._deferred.append( (priority, key) )
+        return ok
+
+    def remake_finished(self, drawer):
+        """
+        Drawer finished remaking a display list which we told it to remake.
+        """
+        if self._current is not None and self._current[0] == id(drawer):
+            duration = time.time() - self._current[1]
+            self._current = None
+            self._elapsed += duration
+            if self._time_per_remake is None:
+                self._time_per_remake = duration
+            else:
+                self._time_per_remake = \
+                    0.75 * self._time_per_remake + 0.25 * duration
+        return
+
+    pass
+
+# end
@@ -69,7 +69,7 @@ class ExternalBondSetDrawer(TransformedDisplayListsDrawer):
         if not self.glpane or \
            c1.get_dispdef(self.glpane) == style or \
            c2.get_dispdef(self.glpane) == style:
-            self.invalidate_display_lists()
+            self._invalidate_display_lists_for_appearance()
         return
 
     def draw(self, glpane, drawLevel, highlight_color):
@@ -211,9 +211,18 @@ class ExternalBondSetDrawer(TransformedDisplayListsDrawer):
 
         draw_outside = [] # csdls to draw
         
+        wantlist = glpane._remake_display_lists
+        drawing_frame = c1.part and c1.part.drawing_frame
+
         if self.havelist == havelist_data:
             # self.displist is still valid -- use it
             draw_outside += [self.displist]
+        elif wantlist and \
+             self._should_defer_remake( drawing_frame,
+                                        *ebset.bounding_sphere() ):
+            # self.displist is out of date only in appearance; draw it
+            # as is until our Part's remake scheduler lets us remake it
+            draw_outside += [self.displist]
         else:
             # self.displist needs to be remade (and then drawn, or also drawn)
             if _DEBUG_DL_REMAKES:
@@ -224,7 +233,6 @@ class ExternalBondSetDrawer(TransformedDisplayListsDrawer):
                 # (probably not needed in this class, but needed in chunk,
                 #  so would be in common superclass draw method if we had that)
             self.havelist = 0
-            wantlist = glpane._remake_display_lists
             if wantlist:
                 # print "Regenerating display list for %r (%d)" % \
                 #       (self, env.redraw_counter)
@@ -249,6 +257,7 @@ class ExternalBondSetDrawer(TransformedDisplayListsDrawer):
                 draw_outside += [self.displist]
                 self.end_tracking_usage( match_checking_code, self.invalidate_display_lists )
                 self.havelist = havelist_data
+                self._remake_finished(drawing_frame)
                 
                 # always set the self.havelist flag, even if exception happened,
                 # so it doesn't keep happening with every redraw of this Chunk.
@@ -71,6 +71,11 @@ class TransformedDisplayListsDrawer(object,
 
     havelist = 0
 
+    # whether self.displist, though invalid (self.havelist == 0), still has
+    # the contents it had before a style or appearance change, so it could
+    # be drawn as is until remade (see _should_defer_remake)
+    _displist_still_drawable = False
+
     def __init__(self):
         # note: self.displist is allocated on demand by __get_displist 
         # [bruce 070523]
@@ -95,7 +100,19 @@ class TransformedDisplayListsDrawer(object,
         [this is a conservative implementation; many subclasses
          will want to override this as an optimization]
         """
+        self._invalidate_display_lists_for_appearance()
+        return
+
+    def _invalidate_display_lists_for_appearance(self):
+        """
+        Invalidate our display lists because the display style or
+        other appearance of our contents changed (but not the contents
+        themselves), so our main display list could still be drawn,
+        though out of date, until it's remade.
+        """
+        still_drawable = not not self.havelist
         self.invalidate_display_lists()
+        self._displist_still_drawable = still_drawable
         return
 
     # ======
@@ -118,6 +135,7 @@ class TransformedDisplayListsDrawer(object,
         ## self.changeapp(0) # that now tells self.glpane to update, if necessary
         # but I think the correct code should have been more like this, all along:
         self.havelist = 0
+        self._displist_still_drawable = False
         self.track_inval()
         #### REVIEW: all comments about track_inval, havelist, changeapp,
         # and whether the old code did indeed do changeapp and thus gl_update_something.
@@ -130,6 +148,40 @@ class TransformedDisplayListsDrawer(object,
         
         return
 
+    def _should_defer_remake(self, drawing_frame, center, radius):
+        """
+        Our main display list needs remaking, and the caller would like
+        to remake it now. If its old contents can still be drawn (since
+        only the style or appearance of what it draws has changed), ask
+        our Part's remake scheduler whether to remake it now or later.
+
+        @param drawing_frame: the current Part_drawing_frame, or None.
+
+        @param center, radius: a bounding sphere of what we draw,
+                               in absolute model coordinates.
+
+        @return: whether to draw self.displist as is, for now, rather than
+                 remaking it. If False, caller must remake it, then call
+                 self._remake_finished(drawing_frame).
+        """
+        scheduler = drawing_frame and drawing_frame.remake_scheduler
+        if scheduler is None:
+            return False
+        if not self._has_displist() or \
+           not (self.havelist or self._displist_still_drawable):
+            return False
+        return not scheduler.may_remake_now(self, center, radius)
+
+    def _remake_finished(self, drawing_frame):
+        """
+        Tell our Part's remake scheduler (if any) that we finished remaking
+        our main display list, in case it told us to remake it.
+        """
+        scheduler = drawing_frame and drawing_frame.remake_scheduler
+        if scheduler is not None:
+            scheduler.remake_finished(self)
+        return
+
     # == Methods relating to our main OpenGL display list (or CSDL),
     #    self.displist [revised, bruce 090212]
     
@@ -247,6 +299,7 @@ class TransformedDisplayListsDrawer(object,
                 # this del is necessary, so __get_displist will allocate another
                 # display list when next called (e.g. if a killed chunk is revived by Undo)
             self.havelist = 0
+            self._displist_still_drawable = False
             self._havelist_inval_counter += 1 # precaution, need not analyzed
             
             ## REVIEWED: this self.glpane = None seems suspicious,
@@ -23,13 +23,16 @@ from OpenGL.GL import glEnable
 
 from PyQt4.Qt import QFont, QString, QColor
 
-from geometry.VQT import V
+from geometry.VQT import V, A
 from geometry.VQT import norm, vlen
 
 from graphics.drawing.ColorSorter import ColorSorter
 from graphics.drawing.CS_draw_primitives import drawline
 from graphics.drawing.CS_draw_primitives import drawcylinder
 from graphics.drawing.CS_draw_primitives import drawsphere
+from graphics.drawing.CS_draw_primitives import drawcylinders
+
+from Numeric import sqrt, add, where, NewAxis
 
 from graphics.model_drawing.special_drawing import USE_CURRENT
 from graphics.model_drawing.special_drawing import SPECIAL_DRAWING_STRAND_END
@@ -72,6 +75,7 @@ from model.bond_constants import bond_letter_from_v6
 from model.bond_constants import V_AROMATIC
 from model.bond_constants import V_GRAPHITE
 from model.bond_constants import V_CARBOMERIC
+from model.bond_constants import bond_params
 
 ## not yet in prefs db?
 from utilities.prefs_constants import _default_toolong_hicolor
@@ -766,6 +770,113 @@ def draw_bond_main(self,
         pass
     return # from draw_bond_main
 
+def draw_plain_bonds_batched(bonds, a1pos, a2pos, colors1, colors2,
+                             disp, col, glnames):
+    """
+    Draw a batch of "plain" internal bonds of one chunk, in the display style
+    disp (diBALL, diTUBES or diLINES), with the same appearance as
+    draw_bond would give them, but computing their geometry with array
+    operations and drawing their cylinders with one call.
+
+    This is only correct for bonds which draw_bond would draw in the
+    simplest way: single bonds (V_SINGLE) with no bond direction, between
+    two non-bondpoint, non-PAM atoms with default display style, neither
+    of which has a dna updater error. The caller must check that.
+
+    @param a1pos, a2pos: Numeric arrays of the bonds' atom1 and atom2
+                         positions (in the chunk's coordinate system)
+    @param colors1, colors2: lists of atom1 and atom2 drawing colors
+    @param col: the chunk's drawing color, or None
+    @param glnames: list of the bonds' glnames
+    """
+    if not bonds:
+        return
+    vec = a2pos - a1pos
+    leng = sqrt(add.reduce(vec * vec, 1))
+    
+    if disp == diBALL:
+        bondcolor = col or env.prefs.get(diBALL_bondcolor_prefs_key)
+        radius = diBALL_SigmaBondRadius * \
+                 env.prefs[diBALL_BondCylinderRadius_prefs_key]
+        colors = []
+        endpts = []
+        names = []
+        for i in range(len(bonds)):
+            if leng[i] >= 0.0001: # as in drawcylinder
+                colors.append(bondcolor)
+                endpts.append((a1pos[i], a2pos[i]))
+                names.append(glnames[i])
+        drawcylinders(colors, endpts, [radius] * len(endpts), names)
+        return
+
+    # diTUBES and diLINES need c1, c2, center and toolong, as computed by
+    # Bond.geom_from_posns
+    rcov = [bond_params(bond.atom1.atomtype, bond.atom2.atomtype, V_SINGLE)
+            for bond in bonds]
+    rcov1 = A([r1 for (r1, r2) in rcov])
+    rcov2 = A([r2 for (r1, r2) in rcov])
+    unit = vec / where(leng > 0, leng, 1.0)[:, NewAxis]
+    c1 = a1pos + unit * rcov1[:, NewAxis]
+    c2 = a2pos - unit * rcov2[:, NewAxis]
+    center = (c1 + c2) / 2.0
+    if env.prefs[showBondStretchIndicators_prefs_key]:
+        toolong = 0.98 * leng > rcov1 + rcov2
+    else:
+        toolong = [False] * len(bonds)
+    toolong_color = None # only looked up if needed
+
+    if disp == diLINES:
+        width = env.prefs[linesDisplayModeThickness_prefs_key]
+        if width <= 0:
+            width = 1
+        for i in range(len(bonds)):
+            ColorSorter.pushName(glnames[i])
+            glPushName(glnames[i])
+            try:
+                if not toolong[i]:
+                    drawline(colors1[i], a1pos[i], center[i], width = width)
+                    drawline(colors2[i], a2pos[i], center[i], width = width)
+                else:
+                    if toolong_color is None:
+                        toolong_color = env.prefs.get(bondStretchColor_prefs_key)
+                    drawline(colors1[i], a1pos[i], c1[i], width = width)
+                    drawline(colors2[i], a2pos[i], c2[i], width = width)
+                    drawline(toolong_color, c1[i], c2[i], width = width)
+            finally:
+                glPopName()
+                ColorSorter.popName()
+        return
+
+    assert disp == diTUBES
+    colors = []
+    endpts = []
+    names = []
+    def add_cyl(color, pos1, pos2, glname):
+        if vlen(pos1 - pos2) >= 0.0001: # as in drawcylinder
+            colors.append(color)
+            endpts.append((pos1, pos2))
+            names.append(glname)
+        return
+    for i in range(len(bonds)):
+        color1 = colors1[i]
+        color2 = colors2[i]
+        glname = glnames[i]
+        if not toolong[i]:
+            if tuple(color1) == tuple(color2):
+                add_cyl(color1, a1pos[i], a2pos[i], glname)
+            else:
+                add_cyl(color1, a1pos[i], center[i], glname)
+                add_cyl(color2, center[i], a2pos[i], glname)
+        else:
+            if toolong_color is None:
+                toolong_color = env.prefs.get(bondStretchColor_prefs_key)
+            add_cyl(toolong_color, c1[i], c2[i], glname)
+            add_cyl(color1, a1pos[i], c1[i], glname)
+            add_cyl(color2, c2[i], a2pos[i], glname)
+        continue
+    drawcylinders(colors, endpts, [TubeRadius] * len(endpts), names)
+    return
+
 def multicyl_pvecs(howmany, a2py, a2pz):
     if howmany == 2:
         # note, for proper double-bond alignment, this has to be a2py, not a2pz!
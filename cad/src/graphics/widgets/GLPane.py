@@ -864,6 +864,15 @@ class GLPane(
         # used/modified in both this class and GLPane_rendering_methods
         # (see also wants_gl_update)
 
+    _model_or_view_change_counter = 0
+        # incremented by gl_update, but not by gl_update_highlight or
+        # gl_update_for_glselect, so it changes for every redraw in which
+        # the model or view might look different -- including when only
+        # atom positions change within one operation (e.g. during a drag,
+        # realtime simulation, or movie playing), which
+        # assy.all_change_indicators() doesn't notice. Used to invalidate
+        # the glname-color ID buffer in GLPane_highlighting_methods.
+
     def gl_update(self): #bruce 050127
         """
         External code should call this when it thinks the GLPane needs
@@ -879,6 +888,7 @@ class GLPane(
 
         @see: gl_update_duration (defined in superclass GLPane_view_change_methods)
         """
+        self._model_or_view_change_counter += 1
         self._needs_repaint = True
         # (To restore the pre-050127 behavior, it would be sufficient to
         # change the next line from "self.update()" to "self.paintGL()".)
@@ -909,8 +919,11 @@ class GLPane(
         the highlighting alone may be redrawn faster by using a saved color/depth image of
         everything except highlighting, rather than by redrawing everything else.
         [That optim is NIM as of 070626.]
+
+        Unlike gl_update, this doesn't invalidate the cached glname-color
+        ID buffer used for mouseover picking.
         """
-        self.gl_update() # stub for now
+        self._gl_update_for_highlighting()
         return
 
     def gl_update_for_glselect(self): #bruce 070626
@@ -918,8 +931,22 @@ class GLPane(
         External code should call this instead of gl_update when the only reason
         it would have called that is to make us notice self.glselect_wanted and use it to
         update self.selobj. [That optim is NIM as of 070626.]
+
+        Unlike gl_update, this doesn't invalidate the cached glname-color
+        ID buffer used for mouseover picking.
         """
-        self.gl_update() # stub for now
+        self._gl_update_for_highlighting()
+        return
+
+    def _gl_update_for_highlighting(self):
+        """
+        [private helper for gl_update_highlight and gl_update_for_glselect]
+
+        Do what gl_update does, except for incrementing
+        self._model_or_view_change_counter.
+        """
+        self._needs_repaint = True
+        self.update()
         return
 
     def gl_update_confcorner(self): #bruce 070627
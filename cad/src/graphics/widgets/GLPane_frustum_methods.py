@@ -170,6 +170,21 @@ class GLPane_frustum_methods(object):
 
         return
 
+    def get_frustum_planes(self):
+        """
+        Return the six frustum planes computed by the last call of
+        _compute_frustum_planes (as lists [a, b, c, d], with normals
+        pointing into the frustum), or None if they're not available.
+
+        The same warning about GL matrices as for is_sphere_visible
+        applies to uses of these planes.
+
+        [overrides GLPane_minimal method]
+        """
+        if self._frustum_planes_available:
+            return self.fplanes
+        return None
+
     def is_sphere_visible(self, center, radius): # Piotr 080331
         """
         Perform a simple frustum culling test against a spherical object
@@ -12,6 +12,8 @@ Russ added some shader-related code.
 """
 
 from OpenGL.GL import GL_ALWAYS
+from OpenGL.GL import GL_COLOR_BUFFER_BIT
+from OpenGL.GL import GL_COLOR_CLEAR_VALUE
 from OpenGL.GL import GL_DEPTH_BUFFER_BIT
 from OpenGL.GL import GL_DEPTH_COMPONENT
 from OpenGL.GL import GL_DEPTH_FUNC
@@ -29,6 +31,7 @@ from OpenGL.GL import GL_TRUE
 from OpenGL.GL import GL_UNSIGNED_BYTE
 from OpenGL.GL import GL_VIEWPORT
 from OpenGL.GL import glClear
+from OpenGL.GL import glClearColor
 from OpenGL.GL import glColorMask
 from OpenGL.GL import glDepthMask
 from OpenGL.GL import glDepthFunc
@@ -37,6 +40,7 @@ from OpenGL.GL import glDrawPixels
 from OpenGL.GL import glEnable
 from OpenGL.GL import glFinish
 from OpenGL.GL import glFlush
+from OpenGL.GL import glGetFloatv
 from OpenGL.GL import glGetInteger
 from OpenGL.GL import glGetIntegerv
 from OpenGL.GL import glInitNames
@@ -50,6 +54,8 @@ from OpenGL.GL import glStencilFunc
 from OpenGL.GL import glStencilOp
 from OpenGL.GL import glViewport
 
+from PyQt4.QtOpenGL import QGLFramebufferObject
+
 from utilities import debug_flags
 from utilities.debug import print_compact_traceback
 import foundation.env as env
@@ -58,12 +64,39 @@ from utilities.constants import white, orange
 
 from utilities.debug_prefs import debug_pref
 from utilities.debug_prefs import Choice_boolean_False
+from utilities.debug_prefs import Choice_boolean_True
+
+from utilities.Comparison import same_vals
 
 # suspicious imports [should not really be needed, according to bruce 070919]
 from model.bonds import Bond # used only for selobj ordering
 
 # ==
 
+_x_major = {} # maps GL_RGBA or GL_DEPTH_COMPONENT to a boolean
+
+def _glReadPixels_is_x_major(gl_format):
+    """
+    Return True if the images returned by our glReadPixels calls for
+    gl_format (GL_RGBA or GL_DEPTH_COMPONENT) are indexed as image[x][y],
+    or False if they are indexed as image[y][x]. (This depends on the
+    PyOpenGL version.)
+
+    The first call for each format must be made while some GL context
+    is current, and does a small glReadPixels call.
+    """
+    if not _x_major.has_key(gl_format):
+        # read a region whose width and height differ, so the shape
+        # of the result tells us its indexing order
+        if gl_format == GL_DEPTH_COMPONENT:
+            image = glReadPixelsf( 0, 0, 3, 2, GL_DEPTH_COMPONENT )
+        else:
+            image = glReadPixels( 0, 0, 3, 2, gl_format, GL_UNSIGNED_BYTE )
+        _x_major[gl_format] = (len(image) == 3)
+    return _x_major[gl_format]
+
+# ==
+
 class GLPane_highlighting_methods(object):
     """
     private mixin for providing highlighting/hit-test methods to class GLPane
@@ -135,98 +168,10 @@ class GLPane_highlighting_methods(object):
                 # stack in shaders. Instead, for mouseover, draw shader
                 # primitives with glnames as colors in glRenderMode(GL_RENDER),
                 # then read back the pixel color (glname) and depth value.
-                
-                # Temporarily replace the full-size viewport with a little one
-                # at the mouse location, matching the pick matrix location.
-                # Otherwise, we will draw a closeup of that area into the whole
-                # window, rather than a few pixels. (This wasn't needed when we
-                # only used GL_SELECT rendering mode here, because that doesn't
-                # modify the frame buffer -- it just returns hits by graphics 
-                # primitives when they are inside the clipping boundaries.)
-                #
-                # (Don't set the viewport *before* _setup_projection(), since
-                #  that method needs to read the current whole-window viewport
-                #  to set up glselect. See explanation in its docstring.)                
-                
-                savedViewport = glGetIntegerv(GL_VIEWPORT)
-                glViewport(wX, wY, pwSize, pwSize) # Same as current_glselect.
-                
-                # First, clear the pixel RGBA to zeros and a depth of 1.0 (far),
-                # so we won't confuse a color with a glname if there are
-                # no shader primitives drawn over this pixel.
-                saveDepthFunc = glGetInteger(GL_DEPTH_FUNC)
-                glDepthFunc(GL_ALWAYS)
-                glWindowPos3i(wX, wY, 1) # Note the Z coord.
-                gl_format, gl_type = GL_RGBA, GL_UNSIGNED_BYTE
-                glDrawPixels(pwSize, pwSize, gl_format, gl_type, (0, 0, 0, 0))
-                glDepthFunc(saveDepthFunc) # needed, though we'll change it again
-                
-                # We must be in glRenderMode(GL_RENDER) (as usual) when this is called.
-                # Note: _setup_projection leaves the matrix mode as GL_PROJECTION.
-                glMatrixMode(GL_MODELVIEW)
-                shaders = self.enabled_shaders()
-                try:
-                    # Set flags so that we will use glnames-as-color mode 
-                    # in shaders, and draw only shader primitives.
-                    # (Ideally we would also draw all non-shader primitives
-                    #  as some other color, unequal to all glname colors
-                    #  (or derived from a fake glname for that purpose),
-                    #  in order to obscure shader primitives where appropriate.
-                    #  This is intended to be done but is not yet implemented.
-                    #  [bruce 090105 addendum])
-                    for shader in shaders:                        
-                        shader.setPicking(True)
-                    self.set_drawing_phase("glselect_glname_color")
-                    
-                    for stereo_image in self.stereo_images_to_draw:
-                        self._enable_stereo(stereo_image)
-                        try:
-                            self._do_graphicsMode_Draw(for_mouseover_highlighting = True)
-                                # note: we can't disable depth writing here, 
-                                # since we need it to make sure the correct 
-                                # shader object comes out on top, or is
-                                # obscured by a DL object. Instead, we'll
-                                # clear the depth buffer again (at this pixel)
-                                # below. [bruce 090105]
-                        finally:
-                            self._disable_stereo()
-                except:
-                    print_compact_traceback(
-                        "exception in or around _do_graphicsMode_Draw() during glname_color;"
-                        "drawing ignored; restoring modelview matrix: ")
-                        # REVIEW: what does "drawing ignored" mean, in that message? [bruce 090105 question]
-                    glMatrixMode(GL_MODELVIEW)
-                    self._setup_modelview( ) ### REVIEW: correctness of this is unreviewed!
-                    # now it's important to continue, at least enough to restore other gl state
-                    pass
-                for shader in shaders:                        
-                    shader.setPicking(False)
-                self.set_drawing_phase('?')
-                
-                # Restore the viewport.
-                glViewport(savedViewport[0], savedViewport[1], 
-                           savedViewport[2], savedViewport[3])
-                
-                # Read pixel value from the back buffer and re-assemble glname.
-                glFinish() # Make sure the drawing has completed.
-                    # REVIEW: is this glFinish needed? [bruce 090105 comment]
-                rgba = glReadPixels( wX, wY, 1, 1, gl_format, gl_type )[0][0]
-                pixZ = glReadPixelsf( wX, wY, 1, 1, GL_DEPTH_COMPONENT)[0][0]
-                
-                # Clear our depth pixel to 1.0 (far), so we won't mess up the
-                # subsequent call of preDraw_glselect_dict.
-                # (The following is not the most direct way, but it ought to work.
-                #  Note that we also clear the color pixel, since (being a glname)
-                #  it has no purpose remaining in the color buffer -- either it's 
-                #  changed later, or, if not, that's a bug, but we'd rather have
-                #  it black than a random color.) [bruce 090105 bugfix]
-                glDepthFunc(GL_ALWAYS)
-                glWindowPos3i(wX, wY, 1) # Note the Z coord.
-                glColorMask(GL_FALSE, GL_FALSE, GL_FALSE, GL_FALSE)
-                gl_format, gl_type = GL_RGBA, GL_UNSIGNED_BYTE
-                glDrawPixels(pwSize, pwSize, gl_format, gl_type, (0, 0, 0, 0))
-                glColorMask(GL_TRUE, GL_TRUE, GL_TRUE, GL_TRUE)
-                glDepthFunc(saveDepthFunc)
+                if self._use_glname_color_id_buffer():
+                    rgba, pixZ = self._glname_color_id_buffer_lookup(wX, wY, pwSize)
+                else:
+                    rgba, pixZ = self._glname_color_pick_one_pixel(wX, wY, pwSize)
 
                 # Comes back sign-wrapped, in spite of specifying UNSIGNED_BYTE.
                 def us(b):
@@ -421,7 +366,269 @@ class GLPane_highlighting_methods(object):
             # [I think we do this now...]
             
         return # from do_glselect_if_wanted
-    
+
+    def _draw_glname_colors(self):
+        """
+        [private helper for the glname-color picking methods]
+
+        Draw all shader primitives, and all primitives drawn by the
+        ColorSorter (whether into a ColorSortedDisplayList or not),
+        with their glnames as colors, into the current viewport,
+        using the current projection matrix.
+
+        @note: other OpenGL drawing (e.g. a CSDL's drawing_funcs, or direct
+            OpenGL calls in graphicsModes or jigs) is not drawn with glname
+            colors, which is why do_glselect_if_wanted still does its
+            GL_SELECT pass after looking up the glname color.
+        """
+        # We must be in glRenderMode(GL_RENDER) (as usual) when this is called.
+        # Note: _setup_projection leaves the matrix mode as GL_PROJECTION.
+        glMatrixMode(GL_MODELVIEW)
+        shaders = self.enabled_shaders()
+        try:
+            # Set flags so that we will use glnames-as-color mode
+            # in shaders, and in ColorSorter and ColorSortedDisplayList
+            # (which draw their primitives without a glname in the color
+            # for glname 0, so they still obscure shader primitives
+            # where appropriate).
+            for shader in shaders:
+                shader.setPicking(True)
+            self.set_drawing_phase("glselect_glname_color")
+
+            for stereo_image in self.stereo_images_to_draw:
+                self._enable_stereo(stereo_image)
+                try:
+                    self._do_graphicsMode_Draw(for_mouseover_highlighting = True)
+                        # note: we can't disable depth writing here,
+                        # since we need it to make sure the correct
+                        # shader object comes out on top, or is
+                        # obscured by a DL object. Instead, our callers
+                        # clear the depth buffer again afterwards.
+                        # [bruce 090105]
+                finally:
+                    self._disable_stereo()
+        except:
+            print_compact_traceback(
+                "exception in or around _do_graphicsMode_Draw() during glname_color;"
+                "drawing ignored; restoring modelview matrix: ")
+                # REVIEW: what does "drawing ignored" mean, in that message? [bruce 090105 question]
+            glMatrixMode(GL_MODELVIEW)
+            self._setup_modelview( ) ### REVIEW: correctness of this is unreviewed!
+            # now it's important to continue, at least enough to restore other gl state
+            pass
+        for shader in shaders:
+            shader.setPicking(False)
+        self.set_drawing_phase('?')
+        return
+
+    def _glname_color_pick_one_pixel(self, wX, wY, pwSize):
+        """
+        [private helper for do_glselect_if_wanted]
+
+        Draw shader primitives as glname colors into the single pixel
+        at wX, wY (using the pick matrix already set up by our caller),
+        read back that pixel's color and depth, then restore the pixel.
+
+        @return: (rgba, pixZ), where rgba is the pixel's color bytes
+                 (perhaps sign-wrapped) and pixZ is its depth.
+        """
+        # Temporarily replace the full-size viewport with a little one
+        # at the mouse location, matching the pick matrix location.
+        # Otherwise, we will draw a closeup of that area into the whole
+        # window, rather than a few pixels. (This wasn't needed when we
+        # only used GL_SELECT rendering mode here, because that doesn't
+        # modify the frame buffer -- it just returns hits by graphics
+        # primitives when they are inside the clipping boundaries.)
+        #
+        # (Don't set the viewport *before* _setup_projection(), since
+        #  that method needs to read the current whole-window viewport
+        #  to set up glselect. See explanation in its docstring.)
+
+        savedViewport = glGetIntegerv(GL_VIEWPORT)
+        glViewport(wX, wY, pwSize, pwSize) # Same as current_glselect.
+
+        # First, clear the pixel RGBA to zeros and a depth of 1.0 (far),
+        # so we won't confuse a color with a glname if there are
+        # no shader primitives drawn over this pixel.
+        saveDepthFunc = glGetInteger(GL_DEPTH_FUNC)
+        glDepthFunc(GL_ALWAYS)
+        glWindowPos3i(wX, wY, 1) # Note the Z coord.
+        gl_format, gl_type = GL_RGBA, GL_UNSIGNED_BYTE
+        glDrawPixels(pwSize, pwSize, gl_format, gl_type, (0, 0, 0, 0))
+        glDepthFunc(saveDepthFunc) # needed, though we'll change it again
+
+        self._draw_glname_colors()
+
+        # Restore the viewport.
+        glViewport(savedViewport[0], savedViewport[1],
+                   savedViewport[2], savedViewport[3])
+
+        # Read pixel value from the back buffer and re-assemble glname.
+        glFinish() # Make sure the drawing has completed.
+            # REVIEW: is this glFinish needed? [bruce 090105 comment]
+        rgba = glReadPixels( wX, wY, 1, 1, gl_format, gl_type )[0][0]
+        pixZ = glReadPixelsf( wX, wY, 1, 1, GL_DEPTH_COMPONENT)[0][0]
+
+        # Clear our depth pixel to 1.0 (far), so we won't mess up the
+        # subsequent call of preDraw_glselect_dict.
+        # (The following is not the most direct way, but it ought to work.
+        #  Note that we also clear the color pixel, since (being a glname)
+        #  it has no purpose remaining in the color buffer -- either it's
+        #  changed later, or, if not, that's a bug, but we'd rather have
+        #  it black than a random color.) [bruce 090105 bugfix]
+        glDepthFunc(GL_ALWAYS)
+        glWindowPos3i(wX, wY, 1) # Note the Z coord.
+        glColorMask(GL_FALSE, GL_FALSE, GL_FALSE, GL_FALSE)
+        glDrawPixels(pwSize, pwSize, gl_format, gl_type, (0, 0, 0, 0))
+        glColorMask(GL_TRUE, GL_TRUE, GL_TRUE, GL_TRUE)
+        glDepthFunc(saveDepthFunc)
+
+        return rgba, pixZ
+
+    # == glname-color ID buffer
+    #
+    # Rather than redrawing all shader and ColorSorter primitives (into one
+    # pixel) for every mouse motion, we can draw them once as glname colors
+    # into an offscreen framebuffer object the size of the window, read back
+    # its entire color and depth buffers (the "ID buffer"), and answer later
+    # mouseover queries by looking up one pixel in those arrays, until
+    # something changes which might affect what's drawn where. That is a big
+    # speedup when the user moves the mouse over a large model without
+    # changing it or the view.
+    #
+    # Other OpenGL drawing (see _draw_glname_colors) has no glname-color
+    # drawing mode, so the GL_SELECT pass still runs for every query.
+    # (Skipping it whenever the ID buffer finds an object would be safe only
+    # once all drawing which can be a selobj goes through the ColorSorter
+    # or shaders.)
+
+    _glname_color_id_buffer_data = None
+        # comparison data for the cached ID buffer, or None if it's invalid
+    _glname_color_id_buffer_color = None
+    _glname_color_id_buffer_depth = None
+    _glname_color_id_buffer_size = (0, 0)
+    _glname_color_id_fbo = None
+        # the QGLFramebufferObject we render the ID buffer into
+    _glname_color_id_fbo_failed = False
+        # set if we couldn't make one, so we'll stop trying
+
+    def _use_glname_color_id_buffer(self):
+        if self._glname_color_id_fbo_failed:
+            return False
+        if not debug_pref("GLPane: cache glname-color picking buffer?",
+                          Choice_boolean_True, prefs_key = True ):
+            return False
+        return QGLFramebufferObject.hasOpenGLFramebufferObjects()
+
+    def _get_glname_color_id_buffer_comparison_data(self):
+        """
+        Return data which, when it changes (according to same_vals),
+        means our cached glname-color ID buffer is no longer valid.
+        """
+        return ( self._model_or_view_change_counter,
+                 # (changes on every gl_update except the ones only for
+                 #  highlighting, so it also covers atoms moving within one
+                 #  operation, as in drags, realtime simulation, or movie
+                 #  playing, which all_change_indicators doesn't)
+                 self._get_bg_image_comparison_data(),
+                 # (covers model changes made during this redraw, e.g. by
+                 #  the updaters, and window size, display style and
+                 #  graphicsMode)
+                 self.assy.command_stack_change_indicator(),
+                 self._general_appearance_change_indicator,
+                 self.stereo_images_to_draw,
+                 self.enabled_shaders(),
+                )
+
+    def _glname_color_id_buffer_lookup(self, wX, wY, pwSize):
+        """
+        [private helper for do_glselect_if_wanted]
+
+        Like _glname_color_pick_one_pixel, but use (and if necessary
+        first render) the glname-color ID buffer for the whole window.
+
+        @return: (rgba, pixZ), as for _glname_color_pick_one_pixel.
+        """
+        data = self._get_glname_color_id_buffer_comparison_data()
+        if self._glname_color_id_buffer_data is None or \
+           not same_vals( data, self._glname_color_id_buffer_data):
+            self._glname_color_id_buffer_data = None # in case of exceptions
+            if not self._render_glname_color_id_buffer():
+                return self._glname_color_pick_one_pixel(wX, wY, pwSize)
+            self._glname_color_id_buffer_data = data
+        # Note: the ID buffer covers the framebuffer from its origin
+        # (not just the viewport), so it's indexed by window coordinates.
+        w, h = self._glname_color_id_buffer_size
+        if not (0 <= wX < w and 0 <= wY < h):
+            return (0, 0, 0, 0), 1.0
+        color_image = self._glname_color_id_buffer_color
+        depth_image = self._glname_color_id_buffer_depth
+        if _glReadPixels_is_x_major(GL_RGBA):
+            rgba = color_image[wX][wY]
+        else:
+            rgba = color_image[wY][wX]
+        if _glReadPixels_is_x_major(GL_DEPTH_COMPONENT):
+            pixZ = depth_image[wX][wY]
+        else:
+            pixZ = depth_image[wY][wX]
+        return rgba, pixZ
+
+    def _render_glname_color_id_buffer(self):
+        """
+        [private helper for _glname_color_id_buffer_lookup]
+
+        Draw all shader primitives as glname colors into an offscreen
+        framebuffer object covering the whole window, using the usual
+        projection matrix, and save the resulting color and depth buffer
+        contents in self. Then restore the pick matrix our caller had set
+        up. The window's own color and depth buffers are not touched.
+
+        @return: whether we succeeded (if not, our caller should use
+                 _glname_color_pick_one_pixel instead).
+        """
+        if debug_flags.atom_debug:
+            print "%d: rendering glname-color ID buffer" % env.redraw_counter
+        x, y, w, h = [int(v) for v in glGetIntegerv(GL_VIEWPORT)]
+        size = (x + w, y + h) # so pixels have the same coordinates as in the window
+        fbo = self._glname_color_id_fbo
+        if fbo is None or (fbo.width(), fbo.height()) != size:
+            self._glname_color_id_fbo = None
+            try:
+                fbo = QGLFramebufferObject( size[0], size[1],
+                                            QGLFramebufferObject.Depth )
+                if not fbo.isValid():
+                    raise Exception("invalid QGLFramebufferObject")
+            except:
+                print_compact_traceback(
+                    "can't make framebuffer object for glname-color picking; "
+                    "using slower one-pixel picking instead: ")
+                self._glname_color_id_fbo_failed = True
+                return False
+            self._glname_color_id_fbo = fbo
+        
+        fbo.bind()
+        try:
+            self._setup_projection() # the usual projection, not the pick matrix
+            # Clear to RGBA zeros and a depth of 1.0 (far), so we won't
+            # confuse a color with a glname where no shader primitives are
+            # drawn. (The clear color is shared with the window, so restore it.)
+            saveClearColor = glGetFloatv(GL_COLOR_CLEAR_VALUE)
+            glClearColor(0.0, 0.0, 0.0, 0.0)
+            glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+            glClearColor(*saveClearColor)
+            self._draw_glname_colors()
+            self._glname_color_id_buffer_color = \
+                glReadPixels( 0, 0, size[0], size[1], GL_RGBA, GL_UNSIGNED_BYTE )
+            self._glname_color_id_buffer_depth = \
+                glReadPixelsf( 0, 0, size[0], size[1], GL_DEPTH_COMPONENT )
+            self._glname_color_id_buffer_size = size
+            _glReadPixels_is_x_major(GL_RGBA) # find out now, while fbo is bound
+            _glReadPixels_is_x_major(GL_DEPTH_COMPONENT)
+        finally:
+            fbo.release() # back to the window's framebuffer
+            self._setup_projection( glselect = self.current_glselect )
+        return True
+
     def object_for_glselect_name(self, glname): #bruce 080220
         """
         """
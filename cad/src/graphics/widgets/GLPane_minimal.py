@@ -602,6 +602,25 @@ class GLPane_minimal(QGLWidget, GLPane_drawingset_methods, object): #bruce 07091
         """
         return False
 
+    def drawLevel_is_unused(self):
+        """
+        Return True if sphere drawLevels don't affect drawing in self,
+        since spheres are drawn by shaders.
+        """
+        return self.permit_shaders and \
+               self.glprefs.sphereShader_desired() and \
+               drawing_globals.sphereShader_available()
+
+    def get_frustum_planes(self):
+        """
+        Return the frustum planes to use for culling, in the form
+        described in GLPane_frustum_methods, or None if culling is
+        not supported or not currently possible.
+
+        Subclasses which support frustum culling should override this.
+        """
+        return None
+
     def get_drawLevel(self, assy_or_part):
         """
         Get the recommended sphere drawingLevel to use for drawing
@@ -611,9 +630,7 @@ class GLPane_minimal(QGLWidget, GLPane_drawingset_methods, object): #bruce 07091
         """
         #bruce 090306 split out of ChunkDrawer, optimized for shaders
         #bruce 090309 revised
-        if self.permit_shaders and \
-           self.glprefs.sphereShader_desired() and \
-           drawing_globals.sphereShader_available():
+        if self.drawLevel_is_unused():
             # drawLevel doesn't matter (not used by shaders),
             # so return a constant value to avoid accessing assy.drawLevel,
             # and therefore (I hope) avoid recomputing the number of atoms
@@ -890,6 +890,15 @@ class GLPane_rendering_methods(GLPane_image_methods):
                 print "bug: exception in self.graphicsMode.draw_glpane_label; use ATOM_DEBUG to see details"
         self.set_drawing_phase('?')
 
+        # optionally show the cost and results of culling chunks
+        # and choosing their detail levels (see Part._cull_chunks)
+        if debug_pref("GLPane: show chunk culling and LOD stats?",
+                      Choice_boolean_False,
+                      prefs_key = True ):
+            text = self.part.chunk_culling_stats_text()
+            if text:
+                self.draw_glpane_debug_text(text)
+
         # draw the compass (coordinate-orientation arrows) in chosen corner
         if env.prefs[displayCompass_prefs_key]:
             self.drawcompass()
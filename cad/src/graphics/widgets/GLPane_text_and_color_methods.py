@@ -150,6 +150,20 @@ class GLPane_text_and_color_methods(object):
         glEnable(GL_LIGHTING)
         return
 
+    def draw_glpane_debug_text(self, text):
+        """
+        Draw a one-line text message about drawing performance or other
+        debugging info, in small print near the lower left corner of self.
+        """
+        glDisable(GL_LIGHTING)
+        glDisable(GL_DEPTH_TEST)
+        font = QFont(QString("Helvetica"), 10)
+        self.qglColor(Qt.gray)
+        self.renderText(10, self.height - 10, QString(text), font)
+        glEnable(GL_DEPTH_TEST)
+        glEnable(GL_LIGHTING)
+        return
+
     def renderTextAtPosition(self,
                              position,
                              textString,
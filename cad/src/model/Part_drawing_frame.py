@@ -25,7 +25,7 @@ Bruce 090219 moved everything related to DrawingSets elsewhere.
 from utilities.debug import print_compact_stack
 from utilities.prefs_constants import indicateOverlappingAtoms_prefs_key
 
-from geometry.NeighborhoodGenerator import NeighborhoodGenerator
+from geometry.ArrayNeighborhoodGenerator import ArrayNeighborhoodGenerator
 
 import foundation.env as env
 
@@ -46,6 +46,17 @@ class _Part_drawing_frame_superclass:
     # draw methods.
     repeated_bonds_dict = None
 
+    # chunk_drawLevels maps id(chunk) to CULLED (see ChunkBVH.py) or to the
+    # drawLevel to use for that chunk, for all chunks culled at once (using
+    # a bounding volume hierarchy) by Part._cull_chunks at the start of
+    # Part.draw. It's None if that was not done.
+    chunk_drawLevels = None
+
+    # remake_scheduler is the Part's DisplayListRemakeScheduler during
+    # Part.draw, if display list remakes may be spread over several frames,
+    # or None otherwise.
+    remake_scheduler = None
+
     # These are for implementing optional indicators about overlapping atoms.
     _f_state_for_indicate_overlapping_atoms = None
     indicate_overlapping_atoms = False
@@ -89,7 +100,9 @@ class Part_drawing_frame(_Part_drawing_frame_superclass):
                 # of atoms, and the code that uses this NeighborhoodGenerator
                 # should do more filtering on the results. [bruce 080411]
             self._f_state_for_indicate_overlapping_atoms = \
-                NeighborhoodGenerator( [], TOO_CLOSE, include_singlets = True )
+                ArrayNeighborhoodGenerator( [], TOO_CLOSE, objects = [] )
+                # (this is given each chunk's atoms all at once, by
+                #  ChunkDrawer.draw_overlap_indicators_if_needed)
             pass
         
         return
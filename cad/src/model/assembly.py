@@ -175,6 +175,13 @@ class Assembly( StateMixin, Assembly_API):
         # (or diffs which prevent them but take time), which this would fix
         # [bruce 080808 comment]
 
+    _nonposition_change_indicator = 0 # like _model_change_indicator, but not
+        # altered by self.changed(atom_posns_only = True); lets incremental
+        # undo checkpoints skip rescanning everything but atoms when only
+        # atom positions changed. Deliberately not restored by
+        # reset_changed_for_undo (so it can only err on the side of
+        # being changed).
+
     _selection_change_indicator = 0
     
     _view_change_indicator = 0 # also includes changing current part, glpane display mode
@@ -231,6 +238,20 @@ class Assembly( StateMixin, Assembly_API):
         # todo: ensure it's up to date
         return self._model_change_indicator
 
+    def nonposition_change_indicator(self):
+        """
+        Return a change indicator which is like model_change_indicator,
+        except that it doesn't change when the only model changes are
+        to atom positions (reported by self.changed(atom_posns_only = True)).
+
+        @note: this is not included in the value of
+               self.all_change_indicators(), and it's not reset by
+               self.reset_changed_for_undo().
+
+        @see: all_change_indicators
+        """
+        return self._nonposition_change_indicator
+
     def selection_change_indicator(self): #bruce 080731
         """
         @see: all_change_indicators
@@ -1369,7 +1390,8 @@ class Assembly( StateMixin, Assembly_API):
         didany = self.root.unpick_all_except( sg )
 
         # notify observers of changes to our current selgroup (after the side effect of the unpick!)
-        self.o.set_part( self.part)
+        if self.o is not None: # None in headless batch runs
+            self.o.set_part( self.part)
         ## done by that: self.o.gl_update()
         
         # print a history message about a new current Part, if possible #####@@@@@ not when initing to self.tree!
@@ -1515,7 +1537,7 @@ class Assembly( StateMixin, Assembly_API):
         """
         return self._modified
     
-    def changed(self): # by analogy with other methods this would be called changed_model(), but we won't rename it [060227]
+    def changed(self, atom_posns_only = False): # by analogy with other methods this would be called changed_model(), but we won't rename it [060227]
         """
         Record the fact that this Assembly (or something it contains)
         has been changed, in the sense that saving it into a file would
@@ -1531,6 +1553,9 @@ class Assembly( StateMixin, Assembly_API):
         prior code set self.modified = 1. In the future, this will be called
         from lower-level methods than it is now, making complete coverage
         easier. #e]
+           Pass atom_posns_only = True if the only change was to the
+        positions of some atoms (e.g. when dragging or rotating chunks);
+        this leaves self.nonposition_change_indicator() unchanged.
            See also: changed_selection, changed_view.
         """
         # bruce 050107 added this method; as of now, all method names (in all
@@ -1555,6 +1580,8 @@ class Assembly( StateMixin, Assembly_API):
             pass
         
         self._model_change_indicator = newc
+        if not atom_posns_only:
+            self._nonposition_change_indicator = newc
             ###e should optimize by feeding new value from changed children (mainly Nodes) only when needed
             ##e will also change this in some other routine which is run for changes that are undoable but won't set _modified flag
 
@@ -73,7 +73,7 @@ from model.bond_constants import min_max_valences_from_v6
 from model.bond_constants import valence_to_v6
 from model.bond_constants import ideal_bond_length
 
-from model.bonds import bonds_mmprecord, bond_copied_atoms, bond_atoms
+from model.bonds import bond_copied_atoms, bond_atoms
 
 import model.global_model_changedicts as global_model_changedicts
 
@@ -349,6 +349,8 @@ register_changedict( _changed_parent_Atoms, '_changed_parent_Atoms', ('__killed'
     #k or must we say _Atom__killed?? (It depends on whether that routine
     #knows how to mangle it itself.) (As of long before 071018 that arg of
     #register_changedict (related_attrs) is not yet used.)
+    # [bruce comment is obsolete: related_attrs is now used to find
+    #  _changed_posn_Atoms for incremental undo checkpoints]
 
 
 from model.global_model_changedicts import _changed_structure_Atoms
@@ -2876,7 +2878,7 @@ class Atom( PAM_Atom_methods, AtomBase, InvalMixin, StateMixin, Selobj_API):
         # (and fixed a rounding bug, described in encode_atom_coordinates)
         xs, ys, zs = mapping.encode_atom_coordinates( posn )
         print_fields = (num_str, eltnum, xs, ys, zs, disp)
-        mapping.write("atom %s (%d) (%s, %s, %s) %s\n" % print_fields)
+        mapping.write_atom_record(print_fields)
         
         if self.key not in dont_write_bonds_for_these_atoms:
             # write dnaBaseName info record [mark 2007-08-16]
@@ -2951,7 +2953,7 @@ class Atom( PAM_Atom_methods, AtomBase, InvalMixin, StateMixin, Selobj_API):
         bondrecords.sort() # by valence
         for valence, atomcodes in bondrecords:
             assert len(atomcodes) > 0
-            mapping.write( bonds_mmprecord( valence, atomcodes ) + "\n")
+            mapping.write_bond_record(valence, atomcodes)
         for bond in bonds_with_direction:
             #bruce 070415
             mapping.write( bond.mmprecord_bond_direction(self, mapping) + "\n") 
@@ -1325,12 +1325,23 @@ class Chunk(Chunk_Dna_methods, Chunk_mmp_methods,
         # recode in a new Pyrex ChunkBase. Some code is copied from
         # now-obsolete setatomposn; some of its comments might apply here as
         # well.
-        self.changed()
+        self._changed_atom_posns()
         self._drawer.invalidate_display_lists()
         self.invalidate_attr('atpos') #e should optim this 
             ##k verify this also invals basepos, or add that to the arg of this call
         return
 
+    def _changed_atom_posns(self):
+        """
+        Like self.changed(), but tell our assy that only atom positions
+        changed, so incremental undo checkpoints needn't rescan the
+        model tree.
+        """
+        if self.part is not None:
+            self.part.changed(atom_posns_only = True)
+                # (Part delegates changed to assy)
+        return
+
     # for __getattr__, validate_attr, invalidate_attr, etc, see InvalMixin
 
     # [bruce 041111 says:]
@@ -1897,7 +1908,7 @@ class Chunk(Chunk_Dna_methods, Chunk_mmp_methods,
         #  note that traditionally these calls have been left up to the
         #  user event handlers, so most of the Node changing methods that
         #  ought to do them probably don't do them.]
-        self.changed() # Node method
+        self._changed_atom_posns() # like Node.changed
 
         # imitate the recomputes done by _recompute_atpos
         self.atpos = self.basecenter + self.quat.rot(self.basepos) # inlines base_to_abs
@@ -1932,6 +1943,59 @@ class Chunk(Chunk_Dna_methods, Chunk_mmp_methods,
             atlist[i]._f_setposn_no_chunk_or_bond_invals( atpos[i] )
         return
 
+    def _f_set_atom_posns_in_bulk(self, posns, indices = None): #2009
+        """
+        [friend method for move_atoms_and_normalize_bondpoints]
+
+        Move some or all of our atoms to new absolute positions, doing the
+        needed invals (of our own attrs, display lists and bonds) once for
+        the whole chunk, rather than once per atom as Atom.setposn would.
+
+        @param posns: a Numeric array of new positions. If indices is None,
+                      it has one position for each atom in self.atlist,
+                      in the same order; otherwise it has one for each
+                      index in indices.
+
+        @param indices: None, or a sequence of indices into self.atlist
+                        of the atoms to move.
+
+        @note: unlike Atom.setposn, this doesn't correct bondpoint positions;
+               callers should do that first, since we make their final
+               positions part of our new atpos and basepos.
+        """
+        atlist = self.atlist
+        if indices is None:
+            assert len(posns) == len(atlist)
+            self.basepos # make sure basecenter and quat are valid
+            atpos = array(posns, Numeric.Float) # a copy we own
+            for i in xrange(len(atlist)):
+                atlist[i]._f_setposn_no_chunk_or_bond_invals( atpos[i] )
+        else:
+            assert len(posns) == len(indices)
+            atpos = array(self.atpos, Numeric.Float) # a copy we own
+            flat_indices = []
+            for i in indices:
+                flat_indices.extend( (3 * i, 3 * i + 1, 3 * i + 2) )
+            Numeric.put(atpos, flat_indices, Numeric.ravel(posns))
+            for i in indices:
+                atlist[i]._f_setposn_no_chunk_or_bond_invals( atpos[i] )
+        # do the invals which changed_atom_posn and Bond.setup_invalidate
+        # would do, except that we keep the new atpos, and a basepos in our
+        # existing local coordinates, rather than recomputing them later
+        # from our atoms' positions
+        self._changed_atom_posns()
+        self._drawer.invalidate_display_lists()
+        self.atpos = atpos
+        self.basepos = self.quat.vunrot(atpos - self.basecenter)
+        self.changed_attrs(['atpos', 'basepos'])
+        self._invalidate_internal_bonds()
+        for bond in self.externs:
+            bond.setup_invalidate()
+        for atom in atlist:
+            if atom._f_checks_neighbor_geom and atom._f_valid_neighbor_geom:
+                atom._f_invalidate_neighbor_geom()
+        return
+
     def applyToPoint(self, point): #bruce 090223
         """
         Considering self as a transform (namely, the transform used
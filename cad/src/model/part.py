@@ -40,6 +40,7 @@ to avoid __getattr__ on __xxx__ attrs in python objects.
 from utilities import debug_flags
 
 from utilities.debug import print_compact_traceback, print_compact_stack
+from utilities.debug_prefs import debug_pref, Choice_boolean_True
 from utilities.Log import redmsg
 
 from utilities.constants import diINVISIBLE
@@ -72,6 +73,9 @@ from model.jigs import Jig
 from model.Part_drawing_frame import Part_drawing_frame
 from model.Part_drawing_frame import fake_Part_drawing_frame
 
+from graphics.model_drawing.ChunkBVH import ChunkBVH
+from graphics.model_drawing.DisplayListRemakeScheduler import DisplayListRemakeScheduler
+
 from model.elements import PeriodicTable
 
 from operations.jigmakers_Mixin import jigmakers_Mixin
@@ -277,7 +281,8 @@ class Part( jigmakers_Mixin, InvalMixin, StateMixin,
         """
         update whatever glpane is showing this part (more than one, if necessary)
         """
-        self.assy.o.gl_update()
+        if self.assy.o is not None: # None in headless batch runs
+            self.assy.o.gl_update()
 
     # == membership maintenance
 
@@ -1076,13 +1081,99 @@ class Part( jigmakers_Mixin, InvalMixin, StateMixin,
         self.before_drawing_model()
         error = True
         try:
+            self._cull_chunks(glpane)
+            self._begin_scheduling_remakes(glpane)
             # draw all visible model objects in self
             self.topnode.draw(glpane, glpane.displayMode)
+            self._end_scheduling_remakes(glpane)
             error = False
         finally:
             self.after_drawing_model(error)
         return
 
+    _remake_scheduler = None # a DisplayListRemakeScheduler, allocated on demand
+
+    def _begin_scheduling_remakes(self, glpane):
+        """
+        [private helper for self.draw]
+
+        If desired, let the chunks and ExternalBondSets drawn by self.draw
+        defer remaking display lists which are out of date only in
+        appearance (e.g. after a global display style or color change),
+        so those remakes can be spread over several frames.
+        """
+        if not glpane._remake_display_lists:
+            return
+        if not debug_pref("GLPane: spread display list remakes over frames?",
+                          Choice_boolean_True,
+                          prefs_key = True ):
+            return
+        if self._remake_scheduler is None:
+            self._remake_scheduler = DisplayListRemakeScheduler()
+        self._remake_scheduler.begin_frame(glpane)
+        self.drawing_frame.remake_scheduler = self._remake_scheduler
+        return
+
+    def _end_scheduling_remakes(self, glpane):
+        """
+        [private helper for self.draw]
+
+        If any display list remakes were deferred, arrange for glpane
+        to be redrawn again soon.
+        """
+        scheduler = self.drawing_frame.remake_scheduler
+        if scheduler is not None and scheduler.end_frame():
+            glpane.gl_update()
+        return
+
+    _chunk_bvh = None # a ChunkBVH for our chunks, allocated on demand
+
+    def _cull_chunks(self, glpane):
+        """
+        [private helper for self.draw]
+
+        If possible, frustum cull all our chunks at once for drawing in
+        glpane, and choose their sphere drawLevels from their size on the
+        screen, using a bounding volume hierarchy of their bounding spheres
+        (self._chunk_bvh). Record the results in
+        self.drawing_frame.chunk_drawLevels for use by ChunkDrawer.
+
+        If not possible, chunks will be culled individually when drawn,
+        and will use the same drawLevel, as before.
+        """
+        if not debug_pref("GLPane: cull chunks using bounding volume hierarchy?",
+                          Choice_boolean_True,
+                          prefs_key = True ):
+            return
+        planes = glpane.get_frustum_planes()
+        if planes is None:
+            return
+        try:
+            if self._chunk_bvh is None:
+                self._chunk_bvh = ChunkBVH()
+            self._chunk_bvh.update(self.molecules)
+            choose_drawLevels = not glpane.drawLevel_is_unused() and \
+                debug_pref("GLPane: choose drawLevel per chunk?",
+                           Choice_boolean_True,
+                           prefs_key = True )
+            self.drawing_frame.chunk_drawLevels = \
+                self._chunk_bvh.cull( glpane,
+                                      planes,
+                                      glpane.get_drawLevel(self),
+                                      choose_drawLevels )
+        except:
+            print_compact_traceback("ignoring exception in culling chunks: ")
+        return
+
+    def chunk_culling_stats_text(self):
+        """
+        Return a text summary of the last culling of our chunks
+        by self._cull_chunks, or "" if there was none.
+        """
+        if self._chunk_bvh is None:
+            return ""
+        return self._chunk_bvh.stats_text()
+
     def general_appearance_prefs_summary(self, glpane): #bruce 090306
         """
         Summarize the prefs values that affect the appearance of most or all
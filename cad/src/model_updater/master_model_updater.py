@@ -40,8 +40,13 @@ bruce 071108 split this out of bond_updater.py, in preparation for adding
 DNA-specific code in other specific updater modules, for this to also call.
 
 bruce 080305 added _autodelete_empty_groups.
+
+2009: optionally record the time taken by each updater phase
+(see updater_profiling.py).
 """
 
+import time
+
 from model.global_model_changedicts import changed_structure_atoms
 from model.global_model_changedicts import changed_bond_types
 
@@ -61,6 +66,9 @@ from utilities.debug import print_compact_stack, print_compact_traceback
 from model_updater.bond_updater import update_bonds_after_each_event
 from model_updater.bond_updater import process_changed_bond_types
 
+from model_updater.updater_profiling import profiling_enabled
+from model_updater.updater_profiling import record_phase
+
 # ==
 
 def _master_model_updater( warn_if_needed = False ):
@@ -98,7 +106,7 @@ def _master_model_updater( warn_if_needed = False ):
         # assy. I don't yet know if this is needed. [bruce 080117]
         #update 080319: just in case, I'm fixing the mmpread code
         # to also use the global assy to store this.
-        kluge_main_assy = env.mainwindow().assy
+        kluge_main_assy = env.main_assy()
         if not kluge_main_assy.assy_valid:
             global_model_changedicts.status_of_last_dna_updater_run = LAST_RUN_DIDNT_HAPPEN
             msg = "deferring _master_model_updater(warn_if_needed = %r) " \
@@ -107,22 +115,58 @@ def _master_model_updater( warn_if_needed = False ):
             return
         pass
 
+    profiling = profiling_enabled()
+    if profiling:
+        t0 = time.time()
+
     env.history.emit_all_deferred_summary_messages() #bruce 080212 (3 places)
 
     _run_dna_updater()
 
+    if profiling:
+        t1 = time.time()
+        _record_dna_updater_phases( t1 - t0)
+        bond_updater_counts = dict(
+            changed_structure_atoms = len(changed_structure_atoms),
+            changed_bond_types = len(changed_bond_types) )
+
     env.history.emit_all_deferred_summary_messages()
 
     _run_bond_updater( warn_if_needed = warn_if_needed)
 
+    if profiling:
+        t2 = time.time()
+        record_phase("bond updater", t2 - t1, **bond_updater_counts)
+
     env.history.emit_all_deferred_summary_messages()
 
     _autodelete_empty_groups(kluge_main_assy)
 
     env.history.emit_all_deferred_summary_messages()
 
+    if profiling:
+        t3 = time.time()
+        record_phase("autodelete empty groups", t3 - t2)
+        record_phase("total", t3 - t0)
+
     return # from _master_model_updater
 
+def _record_dna_updater_phases(seconds):
+    """
+    [private helper for _master_model_updater, when profiling]
+
+    Record the time taken by the dna updater (if it ran), and by each of
+    its phases, with the counts of objects it processed.
+    """
+    if not dna_updater_is_enabled():
+        return
+    from dna.updater.dna_updater_timing import last_phase_timings
+    from dna.updater.dna_updater_timing import last_counts
+    record_phase("dna updater", seconds, **last_counts())
+    for phase_name, phase_seconds in last_phase_timings():
+        record_phase("dna updater: " + phase_name, phase_seconds)
+    return
+
 # ==
 
 def _run_dna_updater(): #bruce 080210 split this out
@@ -210,6 +254,9 @@ def _autodelete_empty_groups(assy): #bruce 080305
     Safely call currentCommand.autodelete_empty_groups( part.topnode)
     (if a debug_pref permits) for currentCommand and current part found via assy
     """
+    if assy.w is None:
+        # no main window (headless batch run), so no current command
+        return
     if debug_pref_autodelete_empty_groups():
         try:
             part = assy.part
@@ -0,0 +1,300 @@
+# Copyright 2009 Nanorex, Inc.  See LICENSE file for details.
+"""
+updater_profiling.py -- record where _master_model_updater spends its time
+
+@version: $Id$
+@copyright: 2009 Nanorex, Inc.  See LICENSE file for details.
+
+When the debug_pref "Updaters: profile model updater phases?" is set,
+_master_model_updater records, for each phase it runs (the dna updater
+and each of its own phases, the bond updater, autodeleting empty groups),
+the wall time it took, and counts of the objects it processed (changed
+atoms, ladders, chunks, etc).
+
+For each phase we keep call counts, totals, and the times of its most
+recent calls, which are summarized as a histogram. Debug menu commands
+show a report in the history widget, clear the data, or save it as CSV
+and JSON files under ~/Nanorex/UpdaterProfiles, for comparing the update
+latency of different versions on the same models.
+"""
+
+import os
+import time
+
+import foundation.env as env
+
+from platform_dependent.PlatformDependent import find_or_make_Nanorex_subdir
+
+from utilities.Log import greenmsg, redmsg, quote_html
+from utilities.debug import register_debug_menu_command
+from utilities.debug import print_compact_traceback
+from utilities.debug_prefs import debug_pref, Choice_boolean_False
+
+# number of recent calls of each phase kept for its histogram
+_HISTORY_LENGTH = 500
+
+# upper limits (in msec) of the histogram buckets
+# (the last bucket has no upper limit)
+_BUCKET_LIMITS_MSEC = (0.1, 0.3, 1, 3, 10, 30, 100, 300, 1000, 3000)
+
+# ==
+
+def profiling_enabled():
+    """
+    Should _master_model_updater record the times of its phases?
+    """
+    res = debug_pref("Updaters: profile model updater phases?",
+                     Choice_boolean_False,
+                     prefs_key = True )
+    return res
+
+class _PhaseStats(object):
+    """
+    Statistics about the calls of one updater phase.
+    """
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.recent_times = [] # at most _HISTORY_LENGTH, oldest first
+        self.total_counts = {} # count name -> sum over all calls
+        self.last_counts = {} # count name -> value in most recent call
+        return
+
+    def record(self, seconds, counts):
+        self.calls += 1
+        self.total_time += seconds
+        self.max_time = max(self.max_time, seconds)
+        self.recent_times.append(seconds)
+        if len(self.recent_times) > _HISTORY_LENGTH:
+            del self.recent_times[0]
+        for count_name, value in counts.iteritems():
+            self.total_counts[count_name] = \
+                self.total_counts.get(count_name, 0) + value
+        self.last_counts = dict(counts)
+        return
+
+    def histogram(self):
+        """
+        Return a list of the number of recent calls in each bucket
+        defined by _BUCKET_LIMITS_MSEC (with one more bucket at the end).
+        """
+        res = [0] * (len(_BUCKET_LIMITS_MSEC) + 1)
+        for seconds in self.recent_times:
+            msec = seconds * 1000.0
+            i = 0
+            while i < len(_BUCKET_LIMITS_MSEC) and msec > _BUCKET_LIMITS_MSEC[i]:
+                i += 1
+            res[i] += 1
+        return res
+
+    def recent_median(self):
+        """
+        Return the median time of recent calls, in seconds.
+        """
+        if not self.recent_times:
+            return 0.0
+        times = list(self.recent_times)
+        times.sort()
+        return times[len(times) / 2]
+
+    def as_dict(self):
+        """
+        Return our data as a dict of numbers, strings, lists and dicts,
+        for saving.
+        """
+        return dict( name = self.name,
+                     calls = self.calls,
+                     total_msec = self.total_time * 1000.0,
+                     max_msec = self.max_time * 1000.0,
+                     recent_median_msec = self.recent_median() * 1000.0,
+                     recent_msec = [seconds * 1000.0
+                                    for seconds in self.recent_times],
+                     histogram = self.histogram(),
+                     total_counts = self.total_counts,
+                     last_counts = self.last_counts )
+    pass
+
+# ==
+
+_phases = {} # phase name -> _PhaseStats
+_phase_order = [] # phase names, in the order they were first recorded
+
+def record_phase(phase_name, seconds, **counts):
+    """
+    Record one call of the named updater phase, which took the given
+    wall time, and processed the numbers of objects given by counts
+    (e.g. changed_atoms = 12).
+    """
+    stats = _phases.get(phase_name)
+    if stats is None:
+        stats = _phases[phase_name] = _PhaseStats(phase_name)
+        _phase_order.append(phase_name)
+    stats.record(seconds, counts)
+    return
+
+def clear_phase_stats():
+    """
+    Forget everything recorded so far.
+    """
+    _phases.clear()
+    del _phase_order[:]
+    return
+
+def phase_stats_report():
+    """
+    Return a multiline text report of the recorded phase statistics.
+    """
+    if not _phase_order:
+        return "no model updater phases recorded " \
+               "(is the debug_pref \"Updaters: profile model updater " \
+               "phases?\" set?)"
+    lines = []
+    labels = ["<=%gms" % limit for limit in _BUCKET_LIMITS_MSEC] + \
+             [">%gms" % _BUCKET_LIMITS_MSEC[-1]]
+    lines.append("histogram buckets: %s" % " ".join(labels))
+    for phase_name in _phase_order:
+        stats = _phases[phase_name]
+        line = "%s: %d calls, %.1f msec total, %.2f msec median (recent), " \
+               "%.1f msec max" % \
+               ( phase_name, stats.calls, stats.total_time * 1000.0,
+                 stats.recent_median() * 1000.0, stats.max_time * 1000.0 )
+        if stats.total_counts:
+            items = stats.total_counts.items()
+            items.sort()
+            line += "; total " + ", ".join(["%s %d" % item for item in items])
+        lines.append(line)
+        lines.append("    histogram: %s" %
+                     " ".join([str(n) for n in stats.histogram()]))
+        continue
+    return "\n".join(lines)
+
+# == saving
+
+def _json_text(data):
+    """
+    Return JSON text for data, which must be made of dicts (with string
+    keys), lists, tuples, strings, numbers, booleans and None.
+    """
+    # (we don't depend on the json module, which is new in Python 2.6)
+    if data is None:
+        return "null"
+    if data is True:
+        return "true"
+    if data is False:
+        return "false"
+    if isinstance(data, (int, long)):
+        return str(data)
+    if isinstance(data, float):
+        return repr(data)
+    if isinstance(data, basestring):
+        res = data.replace("\\", "\\\\").replace('"', '\\"')
+        res = res.replace("\n", "\\n").replace("\t", "\\t")
+        return '"%s"' % res
+    if isinstance(data, dict):
+        items = data.items()
+        items.sort()
+        return "{%s}" % ", ".join(["%s: %s" % (_json_text(str(key)),
+                                               _json_text(value))
+                                   for key, value in items])
+    if isinstance(data, (list, tuple)):
+        return "[%s]" % ", ".join([_json_text(item) for item in data])
+    assert 0, "can't convert %r to JSON" % (data,)
+
+def save_phase_stats(basename):
+    """
+    Save the recorded phase statistics as basename + ".csv" (one row
+    per phase, with its totals and histogram) and basename + ".json"
+    (which also includes the times of recent calls).
+
+    @return: the list of pathnames written.
+    """
+    all_count_names = {}
+    for stats in _phases.itervalues():
+        for count_name in stats.total_counts.iterkeys():
+            all_count_names[count_name] = True
+    count_names = all_count_names.keys()
+    count_names.sort()
+
+    header = ["phase", "calls", "total_msec", "recent_median_msec",
+              "max_msec"]
+    header += ["total_" + count_name for count_name in count_names]
+    header += ["hist_le_%gms" % limit for limit in _BUCKET_LIMITS_MSEC]
+    header += ["hist_gt_%gms" % _BUCKET_LIMITS_MSEC[-1]]
+    rows = [header]
+    for phase_name in _phase_order:
+        stats = _phases[phase_name]
+        row = [ phase_name, stats.calls, "%.3f" % (stats.total_time * 1000.0),
+                "%.3f" % (stats.recent_median() * 1000.0),
+                "%.3f" % (stats.max_time * 1000.0) ]
+        row += [stats.total_counts.get(count_name, 0)
+                for count_name in count_names]
+        row += stats.histogram()
+        rows.append(row)
+
+    csv_path = basename + ".csv"
+    file = open(csv_path, "w")
+    try:
+        for row in rows:
+            # (phase names don't contain commas or quotes)
+            file.write(",".join([str(item) for item in row]) + "\n")
+    finally:
+        file.close()
+
+    json_path = basename + ".json"
+    data = dict( time = time.strftime("%Y-%m-%d %H:%M:%S"),
+                 bucket_limits_msec = list(_BUCKET_LIMITS_MSEC),
+                 phases = [_phases[phase_name].as_dict()
+                           for phase_name in _phase_order] )
+    file = open(json_path, "w")
+    try:
+        file.write(_json_text(data) + "\n")
+    finally:
+        file.close()
+
+    return [csv_path, json_path]
+
+# == debug menu commands
+
+def _show_phase_stats_command(widget):
+    report = phase_stats_report()
+    print report
+    env.history.message("<pre>%s</pre>" % quote_html(report))
+    return
+
+def _clear_phase_stats_command(widget):
+    clear_phase_stats()
+    env.history.message(greenmsg("Cleared model updater phase statistics."))
+    return
+
+def _save_phase_stats_command(widget):
+    if not _phase_order:
+        env.history.message(redmsg("No model updater phases recorded."))
+        return
+    directory = find_or_make_Nanorex_subdir("UpdaterProfiles")
+    if not directory:
+        env.history.message(redmsg("Can't make ~/Nanorex/UpdaterProfiles."))
+        return
+    basename = os.path.join(directory,
+                            time.strftime("updater-%Y%m%d-%H%M%S"))
+    try:
+        paths = save_phase_stats(basename)
+    except:
+        print_compact_traceback("exception in save_phase_stats: ")
+        env.history.message(redmsg("Error saving model updater phase "
+                                   "statistics (see console for details)."))
+        return
+    env.history.message(greenmsg("Saved model updater phase statistics "
+                                 "to: ") +
+                        quote_html(", ".join(paths)))
+    return
+
+register_debug_menu_command( "Model updater: show phase statistics",
+                             _show_phase_stats_command )
+register_debug_menu_command( "Model updater: clear phase statistics",
+                             _clear_phase_stats_command )
+register_debug_menu_command( "Model updater: save phase statistics",
+                             _save_phase_stats_command )
+
+# end
@@ -0,0 +1,464 @@
+# Copyright 2009 Nanorex, Inc.  See LICENSE file for details.
+"""
+headless_batch.py -- process many model files without a main window,
+GLPane or Qt application object, in several worker processes.
+
+@version: $Id$
+@copyright: 2009 Nanorex, Inc.  See LICENSE file for details.
+
+Usage (from cad/src, or with cad/src as the working directory):
+
+  python ne1_startup/headless_batch.py -o OUTDIR [options] FILE ...
+
+Each input file (mmp or pdb) is read into a new Assembly which has no
+main window or GLPane, the model updaters (including the dna updater) are
+run on it, it is optionally minimized using the standalone ND-1 simulator
+executable, and then it is written into OUTDIR in each requested format.
+Run with --help for the options.
+
+Files are divided among --jobs worker processes (each of which runs this
+script with --worker), since the model code is not thread-safe. Each
+worker writes one result line per input file into a results file, which
+the parent process summarizes when all workers are done; the exit status
+is nonzero if any file failed. (If a worker process dies, the file it was
+processing is reported as failed, as are the files it didn't get to.)
+
+Note: we still import the model modules, which import PyQt4 (and some
+import OpenGL), but we never create widgets, so no display is needed.
+The code paths used here must tolerate an Assembly whose win and
+glpane (.w, .o) are None, and use env.main_assy() rather than
+env.mainwindow().assy.
+"""
+
+import sys
+import os
+import re
+import time
+import tempfile
+import subprocess
+from optparse import OptionParser
+
+if __name__ == '__main__':
+    # make the modules in cad/src importable
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_RESULTS_SEPARATOR = "\t"
+
+_STARTED = "STARTED" # results file status for a file being processed
+
+# ==
+
+class _ConsoleHistory(object):
+    """
+    A replacement for the History widget (env.history) which prints
+    messages (without HTML markup) to stdout, prefixed by the name of
+    the file being processed.
+    """
+    def __init__(self):
+        self.prefix = ""
+        self._deferred_summary_messages = {}
+        return
+
+    def message(self, msg, **options):
+        self.emit_all_deferred_summary_messages()
+        if msg:
+            print "%s%s" % (self.prefix, _strip_html(msg))
+        return
+
+    message_no_html = redmsg = orangemsg = greenmsg = graymsg = message
+
+    def statusbar_msg(self, msg_text, repaint = False):
+        return
+
+    def progress_msg(self, msg_text):
+        return
+
+    def deferred_summary_message(self, format, count = 1):
+        assert count >= 0
+        self._deferred_summary_messages.setdefault( format, 0)
+        self._deferred_summary_messages[ format] += count
+        return
+
+    def emit_all_deferred_summary_messages(self):
+        from platform_dependent.PlatformDependent import fix_plurals
+        items = self._deferred_summary_messages.items()
+        self._deferred_summary_messages = {}
+        items.sort()
+        for format, count in items:
+            msg = fix_plurals( format.replace("[N]", "%s" % count), between = 3)
+            self.message(msg)
+        return
+
+    pass
+
+def _strip_html(text):
+    text = re.sub(r"<[^>]*>", "", text)
+    return text.replace("&lt;", "<").replace("&gt;", ">").replace("&amp;", "&")
+
+# ==
+
+_app = None # our QCoreApplication, once created
+
+def _initialize_headless():
+    """
+    Do the parts of NE1 startup needed to create and process models
+    (see main_startup.startup_script), but none which need a display.
+    """
+    # A non-GUI application object, for code which uses qApp or Qt timers
+    # (a QApplication would need a display).
+    global _app
+    from PyQt4.QtCore import QCoreApplication
+    _app = QCoreApplication(sys.argv)
+
+    import foundation.env as env
+    env.history = _ConsoleHistory()
+
+    import utilities.EndUser as EndUser
+    EndUser.setAlternateSourcePath(None)
+    EndUser.setDeveloperFeatures(False)
+
+    sys.setrecursionlimit(5000)
+
+    # Do only the model-side part of
+    # startup_misc.call_module_init_functions, since the rest of it
+    # (GroupButtonMixin.initialize) makes QPixmaps, which would abort
+    # this process with no QApplication.
+    import model_updater.master_model_updater as master_model_updater
+    master_model_updater.initialize()
+
+    import model.assembly
+    model.assembly.Assembly.initialize()
+
+    from ne1_startup import startup_misc
+    startup_misc.register_MMP_RecordParsers()
+    return
+
+def _read_file(assy, filename):
+    """
+    Read the mmp or pdb file filename into assy.
+
+    @return: None, or an error message.
+    """
+    from utilities.constants import SUCCESS
+    ext = os.path.splitext(filename)[1].lower()
+    if ext == ".mmp":
+        from files.mmp.files_mmp import readmmp
+        ok, grouplist = readmmp(assy, filename)
+        if ok != SUCCESS:
+            return "error reading mmp file"
+    elif ext == ".pdb":
+        from files.pdb.files_pdb import readpdb
+        readpdb(assy, filename)
+    else:
+        return "unrecognized file type %r" % ext
+    assy.name = os.path.splitext(os.path.basename(filename))[0]
+    assy.filename = filename
+    return None
+
+def _simulator_program():
+    """
+    Return the pathname of the standalone ND-1 simulator executable,
+    found as SimRunner.sim_bin_dir_path does when NE1 is run by main.py.
+    """
+    main_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    if sys.platform == 'win32':
+        name = 'simulator.exe'
+    else:
+        name = 'simulator'
+    return os.path.normpath(os.path.join(main_dir, '..', 'bin', name))
+
+def _minimize(assy, program, tmp_prefix):
+    """
+    Minimize the main part of assy by running the standalone simulator
+    program, and move its atoms to the resulting positions.
+
+    @return: None, or an error message.
+    """
+    from platform_dependent.PlatformDependent import find_plugin_dir
+    from simulation.read_coordinate_arrays import read_xyz_positions
+    from operations.move_atoms_and_normalize_bondpoints import \
+         move_atoms_and_normalize_bondpoints
+
+    if not os.path.exists(program):
+        return "simulator program %r is missing" % program
+    ok, nd1_plugin_path = find_plugin_dir("NanoDynamics-1")
+    if not ok:
+        return nd1_plugin_path # an error message
+    system_parameters_file = os.path.join(nd1_plugin_path, "sim-params.txt")
+
+    part = assy.tree.part
+    # (as in Movie.set_alist_from_entire_part)
+    part.alist = None
+    del part.alist
+    alist = part.alist # the order in which atoms will be written
+
+    infile = tmp_prefix + ".mmp"
+    outfile = tmp_prefix + ".xyz"
+    part.writemmpfile( infile,
+                       leave_out_sim_disabled_nodes = True,
+                       sim = True )
+    args = [ program, '-m', '-x', '-o' + outfile,
+             '--enable-electrostatic=0',
+             infile,
+             "--system-parameters", system_parameters_file ]
+    try:
+        status = subprocess.call(args)
+        if status != 0 or not os.path.exists(outfile):
+            return "simulator failed (exit status %r)" % (status,)
+        newPositions = read_xyz_positions( outfile, alist )
+        if type(newPositions) == type(""):
+            return newPositions # an error message
+        move_atoms_and_normalize_bondpoints( alist, newPositions)
+        part.changed()
+    finally:
+        for filename in (infile, outfile):
+            if os.path.exists(filename):
+                os.remove(filename)
+    return None
+
+def process_file(filename, options):
+    """
+    Read, update, optionally minimize, and write one file,
+    as specified by options (from our OptionParser).
+
+    @return: None, or an error message.
+    """
+    import foundation.env as env
+    from model.assembly import Assembly
+
+    assy = Assembly(None, run_updaters = True)
+    assy.set_glpane(None) # sets .o and .glpane
+    env.set_headless_main_assy(assy)
+
+    error = _read_file(assy, filename)
+    if error:
+        return error
+
+    # run the model updaters, including the dna updater
+    # (readmmp also does this, but readpdb doesn't)
+    assy.update_parts()
+
+    basename = os.path.splitext(os.path.basename(filename))[0]
+
+    if options.minimize:
+        tmp_prefix = os.path.join( options.output_dir,
+                                   "%s-minimize-pid%d" % (basename,
+                                                          os.getpid()) )
+        error = _minimize(assy, options.simulator, tmp_prefix)
+        if error:
+            return "minimize: " + error
+        assy.update_parts()
+
+    for format in options.formats:
+        outfile = os.path.join(options.output_dir, basename + "." + format)
+        if format == "mmp":
+            assy.writemmpfile(outfile)
+        else:
+            from files.pdb.files_pdb import writepdb
+            writepdb(assy.tree.part, outfile)
+        continue
+
+    assy.close_assy()
+    return None
+
+# ==
+
+def _worker_main(options, filenames):
+    """
+    Process filenames in this process, writing one result line per file
+    into options.results_file (preceded by a line saying we started it).
+    """
+    from utilities.debug import print_compact_traceback
+    _initialize_headless()
+    import foundation.env as env
+    results = open(options.results_file, "w")
+    try:
+        for filename in filenames:
+            # record that we started this file, so if this process dies
+            # while processing it, the parent can tell which file did that
+            results.write( _RESULTS_SEPARATOR.join(
+                [_STARTED, "", filename, ""] ) + "\n" )
+            results.flush()
+            env.history.prefix = "%s: " % os.path.basename(filename)
+            t0 = time.time()
+            try:
+                error = process_file(filename, options)
+            except:
+                print_compact_traceback("exception processing %r: " %
+                                        filename)
+                error = "exception: %s" % (sys.exc_info()[1],)
+            env.history.emit_all_deferred_summary_messages()
+            env.history.prefix = ""
+            if error:
+                status = "FAILED"
+                error = error.replace("\n", " ").replace(_RESULTS_SEPARATOR,
+                                                         " ")
+            else:
+                status = "OK"
+                error = ""
+            results.write( _RESULTS_SEPARATOR.join(
+                [status, "%.2f" % (time.time() - t0), filename, error] ) +
+                "\n" )
+            results.flush()
+            continue
+    finally:
+        results.close()
+    return 0
+
+def _cpu_count():
+    try:
+        import multiprocessing # Python 2.6 or later
+        return multiprocessing.cpu_count()
+    except (ImportError, NotImplementedError):
+        pass
+    try:
+        return max(1, int(os.sysconf('SC_NPROCESSORS_ONLN')))
+    except (AttributeError, ValueError, OSError):
+        pass
+    try:
+        return max(1, int(os.environ['NUMBER_OF_PROCESSORS'])) # Windows
+    except (KeyError, ValueError):
+        pass
+    return 1
+
+def _parent_main(options, filenames):
+    """
+    Divide filenames among worker processes, wait for them all,
+    and summarize their results.
+    """
+    # give each worker about the same total amount of input,
+    # largest files first
+    sized = []
+    for filename in filenames:
+        try:
+            size = os.path.getsize(filename)
+        except OSError:
+            size = 0
+        sized.append( (size, filename) )
+    sized.sort()
+    sized.reverse()
+    njobs = max(1, min(options.jobs, len(filenames)))
+    groups = [[] for i in range(njobs)]
+    totals = [0] * njobs
+    for size, filename in sized:
+        i = totals.index(min(totals))
+        groups[i].append(filename)
+        totals[i] += size
+
+    tmpdir = tempfile.mkdtemp(prefix = "ne1-batch-")
+    script = os.path.abspath(__file__)
+    if script.endswith(".pyc") or script.endswith(".pyo"):
+        script = script[:-1]
+    workers = []
+    for i in range(njobs):
+        results_file = os.path.join(tmpdir, "results-%d.txt" % i)
+        args = [ sys.executable, script, "--worker",
+                 "--results-file", results_file,
+                 "--output-dir", options.output_dir,
+                 "--formats", ",".join(options.formats),
+                 "--simulator", options.simulator ]
+        if options.minimize:
+            args.append("--minimize")
+        args += groups[i]
+        workers.append( (subprocess.Popen(args), results_file, groups[i]) )
+
+    nok = nfailed = 0
+    for process, results_file, group in workers:
+        process.wait()
+        started = {}
+        done = {}
+        if os.path.exists(results_file):
+            for line in open(results_file, "rU").readlines():
+                fields = line.rstrip("\n").split(_RESULTS_SEPARATOR, 3)
+                if len(fields) != 4:
+                    continue # partly written when the worker died
+                status, seconds, filename, error = fields
+                if status == _STARTED:
+                    started[filename] = True
+                    continue
+                done[filename] = True
+                if status == "OK":
+                    nok += 1
+                else:
+                    nfailed += 1
+                    print "FAILED: %s: %s" % (filename, error)
+            os.remove(results_file)
+        for filename in group:
+            if filename in done:
+                continue
+            nfailed += 1
+            if filename in started:
+                print "FAILED: %s: worker process exited with status %r " \
+                      "while processing it" % (filename, process.returncode)
+            else:
+                print "FAILED: %s: not processed, since its worker process " \
+                      "exited early" % (filename,)
+        continue
+    os.rmdir(tmpdir)
+
+    print "headless batch: %d file(s) processed successfully, %d failed" % \
+          (nok, nfailed)
+    return not not nfailed
+
+def main(argv):
+    parser = OptionParser(usage = "%prog -o OUTDIR [options] FILE ...")
+    parser.add_option("-o", "--output-dir", dest = "output_dir",
+                      help = "directory in which to write output files")
+    parser.add_option("-f", "--formats", dest = "formats", default = "mmp",
+                      help = "comma-separated output formats "
+                             "(mmp, pdb; default mmp)")
+    parser.add_option("-m", "--minimize", dest = "minimize",
+                      action = "store_true", default = False,
+                      help = "minimize each model using the ND-1 simulator")
+    parser.add_option("--simulator", dest = "simulator",
+                      default = _simulator_program(),
+                      help = "pathname of the ND-1 simulator executable "
+                             "(default %default)")
+    parser.add_option("-j", "--jobs", dest = "jobs", type = "int",
+                      default = _cpu_count(),
+                      help = "number of worker processes "
+                             "(default: number of CPUs, %default)")
+    parser.add_option("--worker", dest = "worker",
+                      action = "store_true", default = False,
+                      help = "(internal) process files in this process")
+    parser.add_option("--results-file", dest = "results_file",
+                      help = "(internal) where a worker writes its results")
+    options, filenames = parser.parse_args(argv[1:])
+
+    if not filenames:
+        parser.error("no input files")
+    if not options.output_dir:
+        parser.error("--output-dir is required")
+    options.output_dir = os.path.abspath(options.output_dir)
+    if not os.path.isdir(options.output_dir):
+        os.makedirs(options.output_dir)
+    options.formats = [format.strip().lower()
+                       for format in options.formats.split(",")]
+    for format in options.formats:
+        if format not in ("mmp", "pdb"):
+            parser.error("unsupported output format %r" % format)
+    filenames = [os.path.abspath(filename) for filename in filenames]
+    basenames = {}
+    for filename in filenames:
+        if not os.path.isfile(filename):
+            parser.error("no such file: %s" % filename)
+        # each input file's output files are named after it, in one
+        # directory, so inputs must not share a basename (ignoring case,
+        # for case-insensitive filesystems)
+        basename = os.path.splitext(os.path.basename(filename))[0].lower()
+        if basenames.has_key(basename):
+            parser.error("input files %s and %s would have the same "
+                         "output file names" %
+                         (basenames[basename], filename))
+        basenames[basename] = filename
+
+    if options.worker:
+        if not options.results_file:
+            parser.error("--worker requires --results-file")
+        return _worker_main(options, filenames)
+    return _parent_main(options, filenames)
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
+
+# end
@@ -0,0 +1,189 @@
+# Copyright 2009 Nanorex, Inc.  See LICENSE file for details.
+"""
+import_profiler.py -- measure how much of NE1's startup time is spent
+importing each module.
+
+@version: $Id$
+@copyright: 2009 Nanorex, Inc.  See LICENSE file for details.
+
+If the environment variable NE1_PROFILE_IMPORTS is set (to anything but
+"0" or ""), startup_script installs this module's import hook before doing
+any other imports. For each module imported for the first time, it records
+the inclusive time (including the modules it imports in turn) and the
+exclusive time (not including them) of that import. startup_script also
+calls mark at a few milestones (e.g. "main window created"), and writes a
+report when NE1 is ready for user input, into a text file and a CSV file
+under ~/Nanorex/StartupProfiles.
+
+This module must not import any NE1 modules at toplevel, since it is
+imported before startup_before_most_imports has run.
+"""
+
+import os
+import sys
+import time
+import __builtin__
+
+_ENVIRONMENT_VARIABLE = "NE1_PROFILE_IMPORTS"
+
+# number of modules listed in each section of the text report
+_REPORT_LENGTH = 60
+
+# ==
+
+_original_import = None # the __import__ we replaced, while installed
+_start_time = None
+_stack = [] # [module name, start time, time in nested imports] per import
+_records = [] # (module name, inclusive seconds, exclusive seconds, depth)
+_marks = [] # (label, seconds since install)
+
+def requested():
+    """
+    Did the user ask for import profiling, using the environment variable?
+    """
+    return os.environ.get(_ENVIRONMENT_VARIABLE, "0") not in ("0", "")
+
+def installed():
+    return _original_import is not None
+
+def install():
+    """
+    Start recording the time taken by each import of a new module.
+    """
+    global _original_import, _start_time
+    if installed():
+        return
+    _start_time = time.time()
+    _original_import = __builtin__.__import__
+    __builtin__.__import__ = _profiling_import
+    return
+
+def uninstall():
+    """
+    Stop recording imports (but keep what was recorded).
+    """
+    global _original_import
+    if installed():
+        __builtin__.__import__ = _original_import
+        _original_import = None
+    return
+
+def _profiling_import(name, *args):
+    # Only record imports which load some new module; imports of modules
+    # which are already loaded are quick and would clutter the report.
+    # (Implicit relative imports from inside packages are recorded under
+    #  the name that was asked for.)
+    if name in sys.modules:
+        return _original_import(name, *args)
+    frame = [name, time.time(), 0.0]
+    n_modules = len(sys.modules)
+    _stack.append(frame)
+    try:
+        return _original_import(name, *args)
+    finally:
+        _stack.pop()
+        if len(sys.modules) > n_modules:
+            inclusive = time.time() - frame[1]
+            exclusive = inclusive - frame[2]
+            if _stack:
+                _stack[-1][2] += inclusive
+            _records.append( (name, inclusive, exclusive, len(_stack)) )
+    pass
+
+def mark(label):
+    """
+    Record that startup reached the milestone described by label.
+    """
+    if installed():
+        _marks.append( (label, time.time() - _start_time) )
+    return
+
+# ==
+
+def _sorted_records(index):
+    res = [(record[index], record) for record in _records]
+    res.sort()
+    res.reverse()
+    return [record for key, record in res]
+
+def report_text():
+    """
+    Return a multiline text report of the recorded imports and milestones.
+    """
+    lines = []
+    lines.append("NE1 startup import profile, %s" %
+                 time.strftime("%Y-%m-%d %H:%M:%S"))
+    lines.append("")
+    lines.append("milestones (seconds since profiling started):")
+    for label, seconds in _marks:
+        lines.append("%8.3f  %s" % (seconds, label))
+    total_toplevel = 0.0
+    for name, inclusive, exclusive, depth in _records:
+        if depth == 0:
+            total_toplevel += inclusive
+    lines.append("")
+    lines.append("%d modules imported, taking %.3f seconds" %
+                 (len(_records), total_toplevel))
+    for title, index in [("inclusive", 1), ("exclusive", 2)]:
+        lines.append("")
+        lines.append("slowest %d imports by %s time (msec):" %
+                     (_REPORT_LENGTH, title))
+        for name, inclusive, exclusive, depth in \
+                _sorted_records(index)[:_REPORT_LENGTH]:
+            lines.append("%9.1f %9.1f  %s" %
+                         (inclusive * 1000.0, exclusive * 1000.0, name))
+        continue
+    return "\n".join(lines)
+
+def write_report():
+    """
+    Write the recorded data into a text report and a CSV file (one row per
+    import, in the order they finished) under ~/Nanorex/StartupProfiles.
+
+    @return: the list of pathnames written, or [] if none could be.
+    """
+    from platform_dependent.PlatformDependent import find_or_make_Nanorex_subdir
+    directory = find_or_make_Nanorex_subdir("StartupProfiles")
+    if not directory:
+        return []
+    basename = os.path.join(directory,
+                            time.strftime("startup-%Y%m%d-%H%M%S"))
+    txt_path = basename + ".txt"
+    file = open(txt_path, "w")
+    try:
+        file.write(report_text() + "\n")
+    finally:
+        file.close()
+    csv_path = basename + ".csv"
+    file = open(csv_path, "w")
+    try:
+        file.write("module,inclusive_msec,exclusive_msec,depth\n")
+        for name, inclusive, exclusive, depth in _records:
+            file.write("%s,%.3f,%.3f,%d\n" %
+                       (name, inclusive * 1000.0, exclusive * 1000.0, depth))
+    finally:
+        file.close()
+    return [txt_path, csv_path]
+
+def finish():
+    """
+    Stop recording imports, write the report, and say where it is.
+    """
+    if not installed():
+        return
+    mark("import profiling finished")
+    uninstall()
+    try:
+        paths = write_report()
+    except:
+        from utilities.debug import print_compact_traceback
+        print_compact_traceback("exception writing startup import profile: ")
+        return
+    if paths:
+        print "startup import profile was saved into %s" % ", ".join(paths)
+    else:
+        print "can't make ~/Nanorex/StartupProfiles; " \
+              "startup import profile not saved"
+    return
+
+# end
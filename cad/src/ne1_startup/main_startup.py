@@ -1,9 +1,9 @@
-# Copyright 2004-2008 Nanorex, Inc.  See LICENSE file for details. 
+# Copyright 2004-2009 Nanorex, Inc.  See LICENSE file for details. 
 """
 main_startup.py -- provides the startup_script function called by main.py
 
 @version: $Id$
-@copyright: 2004-2008 Nanorex, Inc.  See LICENSE file for details. 
+@copyright: 2004-2009 Nanorex, Inc.  See LICENSE file for details. 
 
 History:
 
@@ -20,6 +20,12 @@ import sys
 import time
 import os
 
+# If requested, record the time taken by all later imports
+# (see import_profiler.py for details).
+from ne1_startup import import_profiler
+if import_profiler.requested():
+    import_profiler.install()
+
 import NE1_Build_Constants
 
 # Note -- Logic in startup_before_most_imports depends on its load location.
@@ -123,6 +129,8 @@ def startup_script( main_globals):
     # "Do things that should be done before most imports occur."
     
     startup_before_most_imports.before_most_imports( main_globals )
+
+    import_profiler.mark("before_most_imports done")
     
     
     from PyQt4.Qt import QApplication, QSplashScreen
@@ -153,6 +161,8 @@ def startup_script( main_globals):
     global app
     app = QApplication(sys.argv)
 
+    import_profiler.mark("QApplication created")
+
 
     # Put up the splashscreen (if its image file can be found in cad/images).
     #    
@@ -188,6 +198,8 @@ def startup_script( main_globals):
 
     from ne1_ui.MWsemantics import MWsemantics 
 
+    import_profiler.mark("MWsemantics imported")
+
 
     # initialize modules and data structures
 
@@ -204,6 +216,8 @@ def startup_script( main_globals):
     
     foo = MWsemantics() # This does a lot of initialization (in MainWindow.__init__)
 
+    import_profiler.mark("main window created")
+
     import __main__
     __main__.foo = foo
         # developers often access the main window object using __main__.foo when debugging,
@@ -250,6 +264,8 @@ def startup_script( main_globals):
     
     foo.show() 
 
+    import_profiler.mark("main window shown")
+
     # for developers: run a hook function that .atom-debug-rc might have defined
     # in this module's global namespace, for doing things *after* showing the
     # main window.
@@ -385,6 +401,10 @@ def startup_script( main_globals):
     # Do other post-startup, pre-event-loop, non-profiled things, if any
     # (such as run optional startup commands for debugging).
     startup_misc.just_before_event_loop()
+
+    # if requested, stop profiling imports, and save the results
+    # (imports done later, e.g. of lazily loaded commands, are not included)
+    import_profiler.finish()
     
     if os.environ.has_key('WINGDB_ACTIVE'):
         # Hack to burn some Python bytecode periodically so Wing's
@@ -291,6 +291,9 @@ def _init_miscellaneous_commands():
 
     import operations.ops_debug as ops_debug
     ops_debug.initialize() #bruce 080722
+
+    import processes.JobScheduler as JobScheduler
+    JobScheduler.initialize()
     
     return
 
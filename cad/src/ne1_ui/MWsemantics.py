@@ -377,6 +377,10 @@ class MWsemantics(QMainWindow,
         # the (re)building of display lists for each frame of the movie.
         self.movie_is_playing = False
 
+        # 'sim_is_running' is True while a simulator (or other plugin) run
+        # is in progress (see disable_QActions_for_sim).
+        self.sim_is_running = False
+
         # Current Working Directory (CWD).
         # When NE1 starts, the CWD is set to the Working Directory (WD)
         # preference from the user prefs db. Every time the user opens or
@@ -2015,6 +2019,7 @@ class MWsemantics(QMainWindow,
         Disables actions items in the main window during simulations
         (and minimize).
         """
+        self.sim_is_running = disableFlag
         self.disable_QActions_for_movieMode(disableFlag)
         self.simMoviePlayerAction.setEnabled(not disableFlag)
         return
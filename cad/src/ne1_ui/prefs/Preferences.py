@@ -1279,6 +1279,8 @@ class Preferences(QDialog, Ui_PreferencesDialog):
         """
         Setup the "Undo" page.
         """
+        self.undo_stack_memory_limit_spinbox.setValue(env.prefs[undoStackMemoryLimit_prefs_key])
+        
         # Connections for "Undo" page.
         self.connect(self.undo_stack_memory_limit_spinbox, SIGNAL("valueChanged(int)"), self.change_undo_stack_memory_limit)
         self.connect(self.update_number_spinbox, SIGNAL("valueChanged(int)"), self.update_number_spinbox_valueChanged)
@@ -22,9 +22,9 @@ TODO: make this directly accessible as one or more user operations.
 # Translation into Python of Lisp code contributed by Dr. K. Eric Drexler.
 # Some comments are from contributed code, perhaps paraphrased.
 
-#e Plans: for efficiency, we'll further translate this into Pyrex or C, and/or combine
-# with atom-position hashtable rather than scanning all pairs of atoms.
-# This implem is just for testing and experimentation.
+#e Plans: for efficiency, we'll further translate this into Pyrex or C.
+# (list_potential_bonds already finds nearby atom pairs using a grid of
+#  atom positions and bulk array operations, rather than scanning all pairs of atoms.)
 
 # This code does not yet consider the possibility of non-sp3 atomtypes,
 # and will need changes to properly handle those.
@@ -32,6 +32,11 @@ TODO: make this directly accessible as one or more user operations.
 # perhaps plus some extra too-long bonds at the end, if permitted by valence.
 
 import math
+from heapq import heapify, heappush, heappop
+
+from Numeric import array, take, compress, less, where
+from Numeric import logical_or, logical_not
+from Numeric import Int, Float
 
 from geometry.VQT import vlen
 from geometry.VQT import atom_angle_radians
@@ -40,6 +45,7 @@ import foundation.env as env
 
 from model.bonds import bond_atoms_faster
 from geometry.NeighborhoodGenerator import NeighborhoodGenerator
+from geometry.ArrayNeighborhoodGenerator import ArrayNeighborhoodGenerator
 
 from model.bond_constants import atoms_are_bonded # was: from bonds import bonded
 from model.bond_constants import V_SINGLE
@@ -321,7 +327,7 @@ def bond_cost(atm1, atm2):
     ec = bond_element_cost(atm1, atm2)
     return ac + dc + ec
 
-def list_potential_bonds(atmlist0):
+def list_potential_bonds_unbatched(atmlist0):
     """
     Given a list of atoms, return a list of triples (cost, atm1, atm2) for all bondable pairs of atoms in the list.
     Each pair of atoms is considered separately, as if only it would be bonded, in addition to all existing bonds.
@@ -330,6 +336,8 @@ def list_potential_bonds(atmlist0):
        Warning: the current implementation takes quadratic time in len(atmlist0). The return value will have reasonable
     size for physically realistic atmlists, but could be quadratic in size for unrealistic ones (e.g. if all atom
     positions were compressed into a small region of space).
+       [This is the original implementation, which handles one atom at a time;
+    list_potential_bonds should give the same result much faster for large atmlists.]
     """
     atmlist = filter( bondable_atm, atmlist0 )
     lst = []
@@ -346,7 +354,71 @@ def list_potential_bonds(atmlist0):
                 cost = bond_cost(atm1, atm2)
                 if cost is not None:
                     lst.append((cost, atm1, atm2))
-    lst.sort() # least cost first
+    lst.sort(key = _potential_bond_sort_key) # least cost first
+    return lst
+
+def _potential_bond_sort_key(triple):
+    # (note: before this was used, ties in cost were broken by comparing
+    #  atom objects, i.e. in an order which depended on their addresses)
+    cost, atm1, atm2 = triple
+    return (cost, atm1.key, atm2.key)
+
+def list_potential_bonds(atmlist0):
+    """
+    Given a list of atoms, return a list of triples (cost, atm1, atm2) for all bondable pairs of atoms in the list.
+    Each pair of atoms is considered separately, as if only it would be bonded, in addition to all existing bonds.
+    In other words, the returned bonds can't necessarily all be made (due to atom valence), but any one alone can be made,
+    in addition to whatever bonds the atoms currently have.
+       This gives the same result as list_potential_bonds_unbatched, but finds nearby atom pairs
+    (using ArrayNeighborhoodGenerator) and filters them by distance using bulk operations
+    on arrays of atom positions, elements and keys,
+    so that only pairs which pass the distance filters are considered one at a time (by bond_cost).
+    """
+    atmlist = filter( bondable_atm, atmlist0 )
+    if not atmlist:
+        return []
+    maxBondLength = 2.0
+    n = len(atmlist)
+    positions = array([atm.posn() for atm in atmlist], Float)
+    positions.shape = (n, 3)
+    keys = array([atm.key for atm in atmlist], Int)
+    singlets = array([atm.is_singlet() for atm in atmlist], Int)
+    hungry = array([len(atm.realNeighbors()) < min_atom_bonds(atm) for atm in atmlist], Int)
+    # element indices, and a table of idealBondLength for each pair of elements
+    elements = []
+    element_index = {}
+    eltcodes = []
+    for atm in atmlist:
+        elt = atm.element
+        if elt not in element_index:
+            element_index[elt] = len(elements)
+            elements.append(atm)
+        eltcodes.append(element_index[elt])
+    eltcodes = array(eltcodes, Int)
+    nelts = len(elements)
+    ideal_table = array([idealBondLength(atm1, atm2) for atm1 in elements for atm2 in elements], Float)
+    # candidate pairs (i, j): as in the unbatched version, atm1 = atmlist[i],
+    # atm2 = atmlist[j] must have a lower key and not be a singlet
+    # (since NeighborhoodGenerator excludes singlets by default)
+    i, j, bondLen = ArrayNeighborhoodGenerator(positions, maxBondLength).pairs_within()
+    swap = less(take(keys, i), take(keys, j))
+    i, j = where(swap, j, i), where(swap, i, j)
+    keep = logical_not(take(singlets, j))
+    i = compress(keep, i)
+    j = compress(keep, j)
+    bondLen = compress(keep, bondLen)
+    idealBondLen = take(ideal_table, take(eltcodes, i) * nelts + take(eltcodes, j))
+    max_ratio = where(logical_or(take(hungry, i), take(hungry, j)),
+                      MAX_DIST_RATIO_HUNGRY, MAX_DIST_RATIO_NON_HUNGRY)
+    keep = less(bondLen, max_ratio * idealBondLen)
+    lst = []
+    for ii, jj in zip(compress(keep, i), compress(keep, j)):
+        atm1 = atmlist[ii]
+        atm2 = atmlist[jj]
+        cost = bond_cost(atm1, atm2)
+        if cost is not None:
+            lst.append((cost, atm1, atm2))
+    lst.sort(key = _potential_bond_sort_key) # least cost first
     return lst
 
 def make_bonds(atmlist, bondtyp = V_SINGLE):
@@ -360,38 +432,32 @@ def make_bonds(atmlist, bondtyp = V_SINGLE):
     and adding a bond can add new terms but doesn't change the value of any existing terms.)
        Return the number of bonds created.
     """
-    # Implementation note: the only way I know of to do this efficiently is to use a linked list
-    # (as the Lisp code did), even though this is less natural in Python.
+    # Implementation note: the potential bonds are kept in a heap ordered by
+    # (cost, seq). Initial entries have seq >= 0 in their sorted order; each
+    # entry whose cost has increased is pushed back with a new, decreasing,
+    # negative seq, so it comes before all other entries of equal cost.
+    # This makes the same bonds in the same order as the Lisp-style linked
+    # list used originally (which inserted a moved entry just before the
+    # first entry whose cost was no better), but reinsertion takes
+    # O(log n) rather than O(n) time.
     bondlst0 = list_potential_bonds(atmlist) # a list of triples (cost, atm1, atm2)
-    bondlst = linked_list(bondlst0, list) # arg2 (list) is a function to turn the triple (cost, atm1, atm2) into a list.
-        # value is a list [[cost, atm1, atm2], next]; needs to be mutable in next and cost elements
-        # (Note: Lisp code used a Lisp linked list of triples, (cost atm1 atm2 . next), but all Lisp lists are mutable.)
+    heap = [(cost, seq, atm1, atm2) for seq, (cost, atm1, atm2) in enumerate(bondlst0)]
+    heapify(heap)
+    del bondlst0
+    next_seq = -1
     res = 0
-    while bondlst:
-        entry, bondlst = bondlst
-            # original code assumed this was too early to change bondlst -- we might insert a new element right after entry;
-            # but I think that's not possible, so we can move forward now [bruce 050906]
-        oldcostjunk, atm1, atm2 = entry
+    while heap:
+        oldcostjunk, seqjunk, atm1, atm2 = heappop(heap)
         cost = bond_cost(atm1, atm2) # might be different than last recorded cost
-            #e optim: could invalidate changed costs, avoid recomputing some of them, incrementally adjust others
         if cost is not None:
-            if (bondlst is None) or bondlst[0][0] >= cost:
+            if (not heap) or heap[0][0] >= cost:
                 # if there's no next-best bond, or its cost is no better than this one's, make this bond
                 bond_atoms_faster(atm1, atm2, bondtyp) # optimized bond_atoms, and doesn't make any open bonds
                 res += 1
             else:
-                # cost has increased beyond next bond in list -- update entry and move it down list
-                entry[0] = cost
-                curr = bondlst # loop variable - next possible list element after which we might insert entry
-                while 1:
-                    # (at this point, we know curr is not None, and we already compared cost to curr[0][0])
-                    junk, next = curr
-                    if (next is None) or next[0][0] >= cost:
-                        break # found insertion point: right after curr, before next (next might be None)
-                    curr = next
-                assert curr[1] is next #e remove when works
-                # insert entry after curr, before next
-                curr[1] = [entry, next]
+                # cost has increased beyond next bond -- put it back with its new cost
+                heappush(heap, (cost, next_seq, atm1, atm2))
+                next_seq -= 1
             pass
         pass
     return res
@@ -404,23 +470,13 @@ def inferBonds(mol): # [probably by Will; TODO: needs docstring]
     
     #bruce 071030 moved this from bonds.py to bonds_from_atoms.py
     
-    # not sure how big a margin we should have for "coincident"
-    maxBondLength = 2.0
-    # first remove any coincident singlets
-    singlets = filter(lambda a: a.is_singlet(), mol.atoms.values())
-    removable = { }
-    sngen = NeighborhoodGenerator(singlets, maxBondLength)
-    for sing1 in singlets:
-        key1 = sing1.key
-        pos1 = sing1.posn()
-        for sing2 in sngen.region(pos1):
-            key2 = sing2.key
-            dist = vlen(pos1 - sing2.posn())
-            if key1 != key2:
-                removable[key1] = sing1
-                removable[key2] = sing2
-    for badGuy in removable.values():
-        badGuy.kill()
+    # Note: this used to start by trying to remove "coincident" singlets,
+    # using a NeighborhoodGenerator of mol's singlets with a radius of 2.0.
+    # But NeighborhoodGenerator excludes singlets by default, so it never
+    # found any, and that step had no effect. It's been removed rather than
+    # "fixed", since a radius of 2.0 would also remove the singlets of any
+    # one atom (about 1.2 to 1.6 Angstroms apart), and any real fix would
+    # change the results of readpdb, insertpdb and PeptideGenerator.
     from operations.bonds_from_atoms import make_bonds
     make_bonds(mol.atoms.values())
     return
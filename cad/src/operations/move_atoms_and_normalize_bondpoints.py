@@ -10,8 +10,24 @@ History:
 
 090112 renamed from move_alist_and_snuggle, moved into new file from chem.py
 
+2009: added AtomListPositionSetter, which does the same thing much faster
+for repeated calls on the same atoms (e.g. movie frames), by grouping the
+atoms by chunk once, correcting bondpoint positions using Numeric, and then
+setting each chunk's atom positions with one set of invals per chunk.
+
 """
 
+from Numeric import Float
+from Numeric import array
+from Numeric import take
+from Numeric import put
+from Numeric import ravel
+from Numeric import concatenate
+from Numeric import sqrt
+from Numeric import add
+from Numeric import where
+from Numeric import NewAxis
+
 from geometry.VQT import A
 
 def move_atoms_and_normalize_bondpoints(alist, newPositions): 
@@ -26,12 +42,24 @@ def move_atoms_and_normalize_bondpoints(alist, newPositions):
               (see snuggle docstring for details, re bug 1239).
 
     @warning: I'm not sure this does all required invals; doesn't do gl_update.
+
+    @see: AtomListPositionSetter, which is faster when called repeatedly
+          for the same alist.
     """
     #bruce 051221 split this out of class Movie so its bug1239 fix can be used
     # in jig_Gamess. [later: Those callers have duplicated code which should be
     # cleaned up.]
     #bruce 090112 renamed from move_alist_and_snuggle
-    #todo: refile into a new file in operations package
+    AtomListPositionSetter(alist).set_posns(newPositions)
+    return
+
+def _move_atoms_and_snuggle_one_at_a_time(alist, newPositions):
+    """
+    [private helper for AtomListPositionSetter]
+
+    Do what move_atoms_and_normalize_bondpoints does, one atom at a time
+    (for atoms which are not in any chunk, e.g. killed atoms).
+    """
     assert len(alist) == len(newPositions)
     singlets = []
     for a, newPos in zip(alist, newPositions):
@@ -54,4 +82,179 @@ def move_atoms_and_normalize_bondpoints(alist, newPositions):
         a.snuggle() # includes a.setposn
     return
 
+# ==
+
+class AtomListPositionSetter(object):
+    """
+    Set the positions of a fixed list of atoms from arrays of new positions
+    (e.g. frames of a movie or of a running simulation), correcting
+    bondpoint positions like Atom.snuggle does.
+
+    The atoms are grouped by chunk when first needed, and regrouped when
+    the chunks' atom lists or the model structure change. Each call then
+    corrects all bondpoint positions at once using Numeric, and gives each
+    chunk its new atom positions with one set of invals.
+    """
+    def __init__(self, alist):
+        self.alist = list(alist)
+        self._groups = None # list of (chunk, chunk.atlist, alist indices,
+            # atlist indices or None if the chunk's atoms are all moved
+            # and are already in atlist order), or None if not yet made
+        self._assys_and_indicators = None
+        return
+
+    # == grouping
+
+    def _groups_are_valid(self):
+        if self._groups is None:
+            return False
+        for chunk, atlist, alist_indices, atlist_indices in self._groups:
+            if chunk.__dict__.get('atlist') is not atlist:
+                # our atoms might have been killed, or moved to other chunks,
+                # or other atoms were added to this chunk
+                return False
+        for assy, indicator in self._assys_and_indicators:
+            if assy.nonposition_change_indicator() != indicator:
+                # bonds or atomtypes might have changed
+                return False
+        return True
+
+    def _make_groups(self):
+        """
+        Group our atoms by chunk (putting atoms not in a chunk into
+        self._loose_indices), and record what we need for correcting
+        the positions of our bondpoints.
+        """
+        alist = self.alist
+        natoms = len(alist)
+        chunk_indices = {} # id(chunk) -> [chunk, list of our indices]
+        chunk_order = []
+        loose_indices = []
+        alist_index_of_key = {}
+        for i in xrange(natoms):
+            atom = alist[i]
+            alist_index_of_key[atom.key] = i
+            chunk = atom.molecule
+            if chunk is None or chunk.assy is None or \
+               chunk.atoms.get(atom.key) is not atom:
+                loose_indices.append(i)
+                continue
+            entry = chunk_indices.get(id(chunk))
+            if entry is None:
+                entry = chunk_indices[id(chunk)] = [chunk, []]
+                chunk_order.append(id(chunk))
+            entry[1].append(i)
+            continue
+
+        groups = []
+        assys = {}
+        for key in chunk_order:
+            chunk, alist_indices = chunk_indices[key]
+            atlist = chunk.atlist # (also sets atom.index)
+            atlist_indices = [alist[i].index for i in alist_indices]
+            if atlist_indices == range(len(atlist)):
+                atlist_indices = None # optimize the usual case
+            groups.append( (chunk, atlist, alist_indices, atlist_indices) )
+            assys[id(chunk.assy)] = chunk.assy
+        self._groups = groups
+        self._loose_indices = loose_indices
+        self._assys_and_indicators = [ (assy,
+                                        assy.nonposition_change_indicator())
+                                       for assy in assys.values() ]
+
+        # bondpoints (in chunks) to correct, and their base atoms
+        loose = dict([(i, True) for i in loose_indices])
+        bondpoint_indices = []
+        base_indices = [] # index into alist, or -1 - index into outside_bases
+        rcovalents = []
+        outside_bases = [] # base atoms not in alist
+        pam_bases = {}
+        for i in xrange(natoms):
+            atom = alist[i]
+            if i in loose or not atom.is_singlet() or not atom.bonds:
+                continue
+            other = atom.bonds[0].other(atom)
+            bondpoint_indices.append(i)
+            j = alist_index_of_key.get(other.key)
+            if j is None or alist[j] is not other:
+                outside_bases.append(other)
+                j = -len(outside_bases)
+            base_indices.append(j)
+            rcovalents.append(other.atomtype.rcovalent)
+            if other.element.pam:
+                pam_bases[other.key] = other
+            continue
+        self._bondpoint_indices = bondpoint_indices
+        # (convert indices of outside base atoms to their indices in the
+        #  array made by concatenating our positions and theirs)
+        for k in xrange(len(base_indices)):
+            if base_indices[k] < 0:
+                base_indices[k] = natoms - 1 - base_indices[k]
+        self._base_indices = base_indices
+        self._rcovalents = array(rcovalents, Float)
+        self._outside_bases = outside_bases
+        self._pam_bases = pam_bases.values()
+        return
+
+    # == moving atoms
+
+    def set_posns(self, newPositions):
+        """
+        Move our atoms to the new positions in the given array or sequence
+        (which must have the same length as our atom list), correcting
+        bondpoint positions, and doing all needed invals (but no gl_update).
+        """
+        assert len(newPositions) == len(self.alist)
+        if not self.alist:
+            return
+        if not self._groups_are_valid():
+            self._make_groups()
+        posns = array(newPositions, Float) # a copy we can modify
+        if self._bondpoint_indices:
+            self._correct_bondpoint_posns(posns)
+        for chunk, atlist, alist_indices, atlist_indices in self._groups:
+            if atlist_indices is None:
+                chunk._f_set_atom_posns_in_bulk( take(posns, alist_indices))
+            else:
+                chunk._f_set_atom_posns_in_bulk( take(posns, alist_indices),
+                                                 atlist_indices )
+            continue
+        if self._loose_indices:
+            _move_atoms_and_snuggle_one_at_a_time(
+                [self.alist[i] for i in self._loose_indices],
+                take(newPositions, self._loose_indices) )
+        for other in self._pam_bases:
+            # as in Atom.snuggle [bruce 080501]
+            other.reposition_baggage_using_DnaLadder( dont_use_ladder = True,
+                                                      only_bondpoints = True )
+        return
+
+    def _correct_bondpoint_posns(self, posns):
+        """
+        Correct the positions of our bondpoints in posns (a Numeric array
+        of positions of self.alist, which we modify) as Atom.snuggle would
+        after all our atoms were moved there: put each one at the covalent
+        radius of its base atom, in the direction it has from that atom.
+        """
+        if self._outside_bases:
+            outside_posns = A([atom.posn() for atom in self._outside_bases])
+            all_posns = concatenate((posns, outside_posns))
+        else:
+            all_posns = posns
+        bondpoint_indices = self._bondpoint_indices
+        sp = take(posns, bondpoint_indices)
+        op = take(all_posns, self._base_indices)
+        delta = sp - op
+        lengths = sqrt(add.reduce(delta * delta, 1))
+        # (like norm, leave a bondpoint on its base atom if it's exactly there)
+        factors = self._rcovalents / where(lengths > 0, lengths, 1.0)
+        new_sp = op + delta * factors[:, NewAxis]
+        flat_indices = []
+        for i in bondpoint_indices:
+            flat_indices.extend( (3 * i, 3 * i + 1, 3 * i + 2) )
+        put(posns, flat_indices, ravel(new_sp))
+        return
+
+    pass
+
 # end
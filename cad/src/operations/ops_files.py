@@ -39,11 +39,12 @@ from platform_dependent.PlatformDependent import find_or_make_Nanorex_subdir
 from model.assembly import Assembly
 from operations.move_atoms_and_normalize_bondpoints import move_atoms_and_normalize_bondpoints
 
-from simulation.runSim import readGromacsCoordinates
+from simulation.read_coordinate_arrays import read_gromacs_positions
 
 from files.pdb.files_pdb import insertpdb, writepdb
 from files.pdb.files_pdb import EXCLUDE_BONDPOINTS, EXCLUDE_HIDDEN_ATOMS
 from files.mmp.files_mmp import readmmp, insertmmp, fix_assy_and_glpane_views_after_readmmp
+from files.mmp.compact_mmp import COMPACT_MMP_EXTENSION
 from files.amber_in.files_in import insertin
 from files.ios.files_ios import exportToIOSFormat,importFromIOSFile
 
@@ -1200,8 +1201,8 @@ class fileSlotsMixin: #bruce 050907 moved these methods out of class MWsemantics
                 isMMPFile = True
                 if ok == SUCCESS and (gromacsCoordinateFile):
                     #bruce 080606 added condition ok == SUCCESS (likely bugfix) 
-                    newPositions = readGromacsCoordinates(gromacsCoordinateFile, listOfAtoms)
-                    if (type(newPositions) == type([])):
+                    newPositions = read_gromacs_positions(gromacsCoordinateFile, listOfAtoms)
+                    if (type(newPositions) != type("")):
                         move_atoms_and_normalize_bondpoints(listOfAtoms, newPositions)
                     else:
                         env.history.message(redmsg(newPositions))
@@ -1551,7 +1552,7 @@ class fileSlotsMixin: #bruce 050907 moved these methods out of class MWsemantics
         dir, fil, ext = _fileparse(safile)
             #e only ext needed in most cases here, could replace with os.path.split [bruce 050907 comment]
                     
-        if ext == ".mmp" : # Write MMP file.
+        if ext in (".mmp", COMPACT_MMP_EXTENSION): # Write MMP file.
             self.save_mmp_file(safile, brag = brag, savePartFiles = savePartFiles)
             self.setCurrentWorkingDirectory() # Update the CWD.
                 
@@ -1642,7 +1643,7 @@ class fileSlotsMixin: #bruce 050907 moved these methods out of class MWsemantics
         If we are saving a part (assy) that already exists and it has an (old) Part Files directory, 
         copy those files to the new Part Files directory (i.e. '<safile> Files').
         """
-        dir, fil, extjunk = _fileparse(safile)
+        dir, fil, ext = _fileparse(safile)
 
         from dna.updater.dna_updater_prefs import pref_mmp_save_convert_to_PAM5
         from utilities.constants import MODEL_PAM5
@@ -1663,6 +1664,10 @@ class fileSlotsMixin: #bruce 050907 moved these methods out of class MWsemantics
                 env.history.message( orangemsg( "Warning: your bond_chain reading code is presently turned off"))
             options.update(dict(write_bonds_compactly = True))
             pass
+        if ext == COMPACT_MMP_EXTENSION:
+            # (needed since we write it under a temporary name)
+            options.update(dict(compact = True))
+            pass
         
         tmpname = "" # in case of exceptions
         try:
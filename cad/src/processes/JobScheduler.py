@@ -0,0 +1,380 @@
+# Copyright 2009 Nanorex, Inc.  See LICENSE file for details.
+"""
+JobScheduler.py -- run many independent external jobs (e.g. ROSETTA runs
+with different seeds, or GAMESS runs) concurrently, without blocking the UI
+
+@version: $Id$
+@copyright: 2009 Nanorex, Inc.  See LICENSE file for details.
+
+Usage:
+
+    scheduler = JobScheduler(max_running = 4) # default: one per processor
+    for seed in seeds:
+        scheduler.submit( Job( "rosetta-%d" % seed, program,
+                               args + ["-constant_seed", "-jran", str(seed)],
+                               working_dir = dir,
+                               stdout_path = ...,
+                               on_done = my_callback ))
+
+Each Job is 'Queued' until the scheduler starts it (as soon as fewer than
+max_running jobs are running), then 'Running', and then 'Completed'
+(exit code 0), 'Failed' or 'Aborted'. Jobs run in Process objects
+(QProcesses), whose finished signals come from the Qt event loop, so the
+on_done callbacks (and the scheduler's own on_all_done callback) run in
+NE1's main thread while the UI stays responsive. (Callers who do want to
+block, e.g. scripts, can call wait_for_all_jobs.)
+
+When all jobs are done, their results (status, exit code, output file
+paths) can be collected using scheduler.jobs or scheduler.results().
+
+This is not yet used by the ROSETTA, GAMESS or GROMACS runners, which still
+run one process at a time in the foreground, since what they do before
+and after each run (writing input files, reading results into the model)
+would also need to be split up per job.
+"""
+
+import sys
+import time
+
+from PyQt4.Qt import QProcess, QThread, SIGNAL
+
+import foundation.env as env
+
+from processes.Process import Process
+
+import utilities.EndUser as EndUser
+from utilities.debug import print_compact_traceback
+from utilities.debug import register_debug_menu_command
+from utilities.Log import greenmsg, redmsg
+
+# job statuses (the first four are the ones used by SimJob and JobManager)
+QUEUED = 'Queued'
+RUNNING = 'Running'
+COMPLETED = 'Completed'
+FAILED = 'Failed'
+ABORTED = 'Aborted'
+
+_DONE_STATUSES = (COMPLETED, FAILED, ABORTED)
+
+def default_max_running():
+    """
+    Return the default number of jobs to run at once (the number of
+    processors, if Qt can tell us that).
+    """
+    try:
+        res = QThread.idealThreadCount() # new in Qt 4.3
+    except:
+        res = 1
+    return max(1, res)
+
+# ==
+
+class Job(object):
+    """
+    One external program run, to be run by a JobScheduler.
+
+    Public attributes (which should not be modified once submitted):
+    name, program, args, working_dir, stdout_path, stderr_path, on_done,
+    and data (for the caller's use).
+
+    Public attributes set by the scheduler: status, exit_code (None until
+    done; -2 if the process crashed, or was aborted or never started),
+    error_message (or None), start_time and end_time.
+    """
+    def __init__(self, name, program, args = None,
+                 working_dir = None,
+                 stdout_path = None,
+                 stderr_path = None,
+                 on_done = None,
+                 data = None):
+        """
+        @param name: name for the job, used in messages.
+
+        @param program: the path of the program to run.
+
+        @param args: a list of its arguments.
+
+        @param working_dir: directory to run it in (default: NE1's).
+
+        @param stdout_path, stderr_path: files to write its stdout and
+                                         stderr to (default: discard them).
+
+        @param on_done: if provided, called with this job as its argument
+                        (in NE1's main thread) when it is done.
+
+        @param data: anything the caller wants to keep with this job.
+        """
+        self.name = name
+        self.program = program
+        if args is None:
+            args = []
+        self.args = list(args)
+        self.working_dir = working_dir
+        self.stdout_path = stdout_path
+        self.stderr_path = stderr_path
+        self.on_done = on_done
+        self.data = data
+
+        self.status = QUEUED
+        self.exit_code = None
+        self.error_message = None
+        self.start_time = None
+        self.end_time = None
+        self._process = None
+        return
+
+    def is_done(self):
+        return self.status in _DONE_STATUSES
+
+    def succeeded(self):
+        return self.status == COMPLETED
+
+    def elapsed_time(self):
+        """
+        Return the number of seconds this job has been running (so far,
+        if it's still running), or None if it was never started.
+        """
+        if self.start_time is None:
+            return None
+        end_time = self.end_time
+        if end_time is None:
+            end_time = time.time()
+        return end_time - self.start_time
+
+    def __repr__(self):
+        return "<%s %r (%s) at %#x>" % (self.__class__.__name__,
+                                        self.name, self.status, id(self))
+    pass
+
+# ==
+
+class JobScheduler(object):
+    """
+    Run submitted Jobs as separate processes, at most max_running at once,
+    in the order they were submitted.
+    """
+    def __init__(self, max_running = None, on_all_done = None):
+        """
+        @param max_running: the most jobs to run at once (default: the
+                            number of processors).
+
+        @param on_all_done: if provided, called with this scheduler as its
+                            argument whenever its last unfinished job is done.
+        """
+        if max_running is None:
+            max_running = default_max_running()
+        assert max_running >= 1
+        self.max_running = max_running
+        self.on_all_done = on_all_done
+        self.jobs = [] # all submitted jobs, in order
+        self._queue = [] # queued jobs, in order
+        self._running = [] # running jobs
+        return
+
+    def submit(self, job):
+        """
+        Add job to our queue, and start it if there is room.
+        """
+        assert job.status == QUEUED and job not in self.jobs
+        self.jobs.append(job)
+        self._queue.append(job)
+        self._start_queued_jobs()
+        return job
+
+    def _start_queued_jobs(self):
+        while self._queue and len(self._running) < self.max_running:
+            job = self._queue.pop(0)
+            self._start_job(job)
+        return
+
+    def _start_job(self, job):
+        process = Process()
+        process.setProcessName(job.name)
+        if job.working_dir:
+            process.setWorkingDirectory(job.working_dir)
+        if job.stdout_path:
+            process.redirect_stdout_to_file(job.stdout_path)
+        if job.stderr_path:
+            process.redirect_stderr_to_file(job.stderr_path)
+        process.connect( process, SIGNAL('finished(int)'),
+                         lambda exitcode, job = job: self._job_finished(job) )
+        job._process = process
+        job.start_time = time.time()
+        job.status = RUNNING
+        self._running.append(job)
+        process.start(job.program, job.args)
+        if not process.waitForStarted():
+            # (this returns as soon as the process is started,
+            #  or fails to start; finished will never be emitted for it)
+            process.set_stdout(None) # closes the files we opened
+            process.set_stderr(None)
+            self._job_done(job, FAILED, -2,
+                           "can't start %s" % job.program)
+        return
+
+    def _job_finished(self, job):
+        """
+        [slot method for the finished signal of job's process]
+        """
+        process = job._process
+        if job.status == ABORTED:
+            job.error_message = "aborted"
+            code = -2
+        elif process.exitStatus() != QProcess.NormalExit:
+            job.status = FAILED
+            job.error_message = "%s crashed" % job.program
+            code = -2
+        else:
+            code = process.exitCode()
+            if code == 0:
+                job.status = COMPLETED
+            else:
+                job.status = FAILED
+                job.error_message = "%s returned %d" % (job.program, code)
+        self._job_done(job, job.status, code, job.error_message)
+        return
+
+    def _job_done(self, job, status, exit_code, error_message):
+        if job in self._running:
+            self._running.remove(job)
+        elif job in self._queue:
+            self._queue.remove(job)
+        job.status = status
+        job.exit_code = exit_code
+        job.error_message = error_message
+        job.end_time = time.time()
+        # Note: we keep job._process until clear_done_jobs, since it's not
+        # safe to destroy it while it's emitting the signal that got us here.
+        if job.on_done:
+            try:
+                job.on_done(job)
+            except:
+                print_compact_traceback("exception in on_done for %r: " % job)
+        if self._queue:
+            self._start_queued_jobs()
+        elif not self._running and self.on_all_done:
+            try:
+                self.on_all_done(self)
+            except:
+                print_compact_traceback("exception in on_all_done for %r: " %
+                                        self)
+        return
+
+    # == status and results
+
+    def queued_jobs(self):
+        return list(self._queue)
+
+    def running_jobs(self):
+        return list(self._running)
+
+    def done_jobs(self):
+        return [job for job in self.jobs if job.is_done()]
+
+    def all_done(self):
+        return not self._queue and not self._running
+
+    def results(self):
+        """
+        Return a list of (job, status, exit_code) for our done jobs,
+        in the order they were submitted.
+        """
+        return [(job, job.status, job.exit_code) for job in self.done_jobs()]
+
+    def clear_done_jobs(self):
+        """
+        Forget our done jobs (after the caller has collected their results).
+        """
+        for job in self.done_jobs():
+            job._process = None
+        self.jobs = [job for job in self.jobs if not job.is_done()]
+        return
+
+    # == stopping, and waiting
+
+    def abort_all(self):
+        """
+        Remove all queued jobs, and kill all running ones. (Their statuses
+        become 'Aborted', and their on_done callbacks are called, when
+        each one has actually exited.)
+        """
+        queued = self._queue
+        self._queue = [] # so _job_done won't start them
+        for job in self._running:
+            job.status = ABORTED
+            job._process.kill()
+        for job in queued:
+            self._job_done(job, ABORTED, -2, "aborted")
+        return
+
+    def wait_for_all_jobs(self, abortHandler = None):
+        """
+        Process Qt events (sleeping by 0.05 seconds in a loop, like
+        Process.wait_for_exit) until all our jobs are done,
+        or abort them all if the abort button of abortHandler is pressed.
+
+        @return: self.results()
+        """
+        aborted = False
+        while not self.all_done():
+            if abortHandler and not aborted and \
+               abortHandler.getPressCount() > 0:
+                aborted = True
+                self.abort_all()
+            env.call_qApp_processEvents()
+            time.sleep(0.05)
+        if abortHandler:
+            abortHandler.finish()
+        return self.results()
+
+    def __repr__(self):
+        return "<%s: %d queued, %d running, %d done at %#x>" % \
+               ( self.__class__.__name__, len(self._queue),
+                 len(self._running), len(self.jobs) - len(self._queue) -
+                 len(self._running), id(self) )
+    pass
+
+# == debug menu command, to test the scheduler with a stand-in program
+
+_test_scheduler = None
+
+def _run_test_jobs_cmd(widget):
+    """
+    Run some copies of a stand-in program (this Python, sleeping for
+    two seconds), twice as many as the number of jobs we run at once.
+    If they run concurrently, all of them finish in about four seconds.
+    """
+    global _test_scheduler
+    if _test_scheduler is not None and not _test_scheduler.all_done():
+        env.history.message(redmsg("Job scheduler test is already running."))
+        return
+    start_time = time.time()
+    def job_done(job):
+        msg = "job scheduler test: %s %s after %.2f seconds" % \
+              (job.name, job.status, job.elapsed_time())
+        if job.succeeded():
+            env.history.message(msg)
+        else:
+            env.history.message(redmsg(msg + " (%s)" % job.error_message))
+        return
+    def all_done(scheduler):
+        env.history.message(greenmsg(
+            "job scheduler test: %d jobs done in %.2f seconds, "
+            "%d at a time" % (len(scheduler.jobs), time.time() - start_time,
+                              scheduler.max_running )))
+        return
+    _test_scheduler = JobScheduler(on_all_done = all_done)
+    for i in range(2 * _test_scheduler.max_running):
+        _test_scheduler.submit( Job( "test job %d" % (i + 1),
+                                     sys.executable,
+                                     ["-c", "import time; time.sleep(2)"],
+                                     on_done = job_done ))
+    return
+
+def initialize(): # called from startup_misc.py
+    if EndUser.enableDeveloperFeatures():
+        register_debug_menu_command( "Job scheduler: run test jobs",
+                                     _run_test_jobs_cmd )
+    return
+
+# end
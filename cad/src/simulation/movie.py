@@ -19,7 +19,7 @@ from PyQt4.Qt import Qt, qApp, QApplication, QCursor, SIGNAL
 from utilities.Log import redmsg, orangemsg, greenmsg
 from geometry.VQT import A
 from foundation.state_utils import IdentityCopyMixin
-from operations.move_atoms_and_normalize_bondpoints import move_atoms_and_normalize_bondpoints
+from operations.move_atoms_and_normalize_bondpoints import AtomListPositionSetter
 from utilities import debug_flags
 from platform_dependent.PlatformDependent import fix_plurals
 from utilities.debug import print_compact_stack, print_compact_traceback
@@ -236,6 +236,7 @@ class Movie(IdentityCopyMixin): #bruce 080321 bugfix: added IdentityCopyMixin
         # bruce 050324 added these:
         self.alist = None # list of atoms for which this movie was made, if this has yet been defined
         self.alist_and_moviefile = None #bruce 050427: hold checked correspondence between alist and moviefile, if we have one
+        self._alist_and_position_setter = (None, None) # for moveAtoms (2009)
         self.debug_dump("end of init")
         return
 
@@ -305,6 +306,7 @@ class Movie(IdentityCopyMixin): #bruce 080321 bugfix: added IdentityCopyMixin
         # it should be revised to work either way and _close if necessary.
         # for now, just break cycles.
         self.win = self.assy = self.part = self.alist = self.fileobj = None
+        self._alist_and_position_setter = (None, None)
         del self.fileobj # obs attrname
         del self.part
 
@@ -662,10 +664,10 @@ class Movie(IdentityCopyMixin): #bruce 080321 bugfix: added IdentityCopyMixin
         # Writes the POV-Ray series starting at the current frame until the last frame, 
         # skipping frames if "Skip" (on the dashboard) is != 0.  Mark 050908
         nfiles = 0
-        for i in range(self.currentFrame, 
-                       self.totalFramesActual+1, 
-                       self.propMgr.frameSkipSpinBox.value()):
-            self.alist_and_moviefile.play_frame(i)
+        for i in self.alist_and_moviefile.play_frames(
+                self.currentFrame, 
+                self.totalFramesActual+1, 
+                self.propMgr.frameSkipSpinBox.value()):
             filename = "%s.%06d.pov" % (name,i)
             # For 100s of files, printing a history message for each file is undesired. 
             # Instead, I include a summary message below. Fixes bug 953.  Mark 051119.
@@ -1096,9 +1098,9 @@ class Movie(IdentityCopyMixin): #bruce 080321 bugfix: added IdentityCopyMixin
         Move a list of atoms to newPosition. After all atoms moving 
         [and singlet positions updated], bond updated, update display once.
         
-        @param newPosition: a list of atom absolute position,
-                            the list order is the same as self.alist
-        @type  newPosition: list
+        @param newPosition: a list or Numeric array of atom absolute
+                            positions, in the same order as self.alist
+        @type  newPosition: list or Numeric array
         """   
         if len(newPositions) != len(self.alist):
             #bruce 050225 added some parameters to this error message
@@ -1110,7 +1112,14 @@ class Movie(IdentityCopyMixin): #bruce 080321 bugfix: added IdentityCopyMixin
             print msg
             raise ValueError, msg
                 #bruce 060108 reviewed/revised all 2 calls, added this exception to preexisting noop/errorprint (untested)
-        move_atoms_and_normalize_bondpoints(self.alist, newPositions) #bruce 051221 fixed bug 1239 in this function, then split it out
+        #bruce 051221 fixed bug 1239 in move_atoms_and_normalize_bondpoints,
+        # then split it out; 2009: use AtomListPositionSetter instead,
+        # reusing it for all frames as long as self.alist is the same list
+        alist, setter = self._alist_and_position_setter
+        if alist is not self.alist:
+            setter = AtomListPositionSetter(self.alist)
+            self._alist_and_position_setter = (self.alist, setter)
+        setter.set_posns(newPositions)
         self.glpane.gl_update()
         return
 
@@ -1143,6 +1152,7 @@ class MovableAtomList: #bruce 050426 splitting this out of class Movie... except
         self.alist = list(alist) # use A()?
             # is alist a public attribute? (if so, no need for methods to prune its atoms by part or killedness, etc)
         self.natoms = len(self.alist)
+        self._position_setter = AtomListPositionSetter(self.alist)
 
     def get_sim_posns(self): #bruce 060111 renamed and revised this from get_posns, for use in approximate fix of bug 1297
         # note: this method is no longer called as of bruce 060112, but its comments are relevant and are referred to
@@ -1184,7 +1194,9 @@ class MovableAtomList: #bruce 050426 splitting this out of class Movie... except
         # atoms
         #bruce 060111 comment: should probably be renamed set_sim_posns
         # since it corrects singlet posns
-        move_atoms_and_normalize_bondpoints(self.alist, newposns)
+        #2009: this now groups our atoms by chunk once (redoing that
+        # only when needed), then sets each chunk's positions in bulk
+        self._position_setter.set_posns(newposns)
 
     set_posns_no_inval = set_posns #e for now... later this can be faster, and require own/release around it
 
@@ -1207,6 +1219,7 @@ class MovableAtomList: #bruce 050426 splitting this out of class Movie... except
 
     def destroy(self):
         self.alist = None
+        self._position_setter = None
 
     pass # end of class MovableAtomList
 
@@ -1335,6 +1348,19 @@ class alist_and_moviefile:
             ## self.pause() ###k guess -- since we presumably hit the end... maybe return errcode instead, let caller decide??
             return False
         pass
+    def play_frames(self, start, stop, step = 1):
+        """
+        Generator: for each n in range(start, stop, step) (all of which must be
+        in range), set atoms to positions in frame n, then yield n.
+        The frames are computed in bulk (see OldFormatMovieFile.iter_frames),
+        so this is much faster than calling play_frame for each n
+        when step > 1.
+        """
+        ma = self.movable_atoms
+        for n, frame_n in self.moviefile.iter_frames(start, stop, step):
+            ma.set_posns(frame_n)
+            yield n
+        return
     def get_totalFramesActual(self):
         return self.moviefile.get_totalFramesActual()
     def close_file(self):
@@ -0,0 +1,176 @@
+# Copyright 2009 Nanorex, Inc.  See LICENSE file for details.
+"""
+read_coordinate_arrays.py -- read the atom positions written by a
+minimize (as an XYZ file by the simulator, or a .gro file by GROMACS)
+directly into Numeric arrays
+
+@version: $Id$
+@copyright: 2009 Nanorex, Inc.  See LICENSE file for details.
+
+These do the same thing as readxyz and readGromacsCoordinates in runSim.py,
+but parse the whole file with a few string and Numeric operations rather
+than a Python loop over its lines, check element types against all atoms
+at once, and return an Nx3 array of positions (which can be passed
+directly to Movie.moveAtoms or move_atoms_and_normalize_bondpoints).
+
+When the fast parsing finds anything wrong with the file, we just call
+the older reader, so that the error messages stay the same.
+"""
+
+from Numeric import array
+from Numeric import reshape
+from Numeric import transpose
+from Numeric import logical_and
+from Numeric import logical_or
+from Numeric import Float
+from Numeric import Int
+
+from model.elements import PeriodicTable
+from model.elements import Singlet
+
+from simulation.runSim import readxyz
+from simulation.runSim import readGromacsCoordinates
+from simulation.runSim import readGromacsTranslation
+
+# ==
+
+def element_codes_of_atoms(atoms):
+    """
+    Return a Numeric array of the element numbers of the given atoms
+    (0 for bondpoints).
+    """
+    return array([atom.element.eltnum for atom in atoms], Int)
+
+def element_codes_of_symbols(symbols):
+    """
+    Return a Numeric array of the element numbers of the elements with
+    the given symbols, using -1 for unknown symbols.
+    """
+    eltnum_of_symbol = {}
+    for elem in PeriodicTable.getAllElements().itervalues():
+        eltnum_of_symbol[elem.symbol] = elem.eltnum
+    return array( map(eltnum_of_symbol.get, symbols, [-1] * len(symbols)),
+                  Int )
+
+def elements_match(file_codes, atom_codes):
+    """
+    Given arrays of element numbers read from a file and of the atoms
+    they're supposed to be for, return True if they all match,
+    permitting H in the file for a bondpoint (as readxyz does).
+    """
+    hydrogen = PeriodicTable.getElement('H').eltnum
+    ok = logical_or( file_codes == atom_codes,
+                     logical_and( file_codes == hydrogen,
+                                  atom_codes == Singlet.eltnum ))
+    return not not logical_and.reduce(ok)
+
+# ==
+
+def _parse_xyz_arrays(filename):
+    """
+    Parse the single-frame XYZ file filename into an Nx3 array of positions
+    and an array of N element numbers. Return None if we can't open it or
+    find anything wrong with its format.
+    """
+    try:
+        lines = open(filename, "rU").read().splitlines()
+    except IOError:
+        return None
+    if len(lines) < 3:
+        return None
+    try:
+        numAtoms_junk = int(lines[0])
+        rms_junk = float(lines[1][4:])
+    except ValueError:
+        return None
+    lines = lines[2:]
+    if map(len, map(str.split, lines)).count(4) != len(lines):
+        return None # some line doesn't have 4 words
+    words = " ".join(lines).split()
+    symbols = words[0::4]
+    del words[0::4]
+    try:
+        posns = array(map(float, words), Float)
+    except ValueError:
+        return None
+    return reshape(posns, (len(symbols), 3)), element_codes_of_symbols(symbols)
+
+def read_xyz_positions(filename, alist):
+    """
+    Read a single-frame XYZ file created by the simulator, typically for
+    minimizing a part, checking that the number of atoms and their
+    elements agree with alist (as readxyz does).
+
+    On error, print a message to stdout and also return it to the caller.
+    On success, return a Numeric array of the new positions of the atoms
+    in alist (in the same order).
+    """
+    parsed = _parse_xyz_arrays(filename)
+    if parsed is not None:
+        posns, codes = parsed
+        if len(posns) == len(alist) and \
+           elements_match(codes, element_codes_of_atoms(alist)):
+            return posns
+    # let readxyz find the error and print the usual message
+    # (if it finds none, we were too strict, so use its result)
+    res = readxyz(filename, alist)
+    if type(res) == type(""):
+        return res
+    return array(res, Float)
+
+# ==
+
+def _parse_gromacs_arrays(filename):
+    """
+    Parse the gromacs coordinate file filename into an Nx3 array of
+    positions (in nm, with no translation applied), including any
+    virtual sites at the end. Return None if we can't open it or find
+    anything wrong with its format.
+    """
+    try:
+        lines = open(filename, "rU").read().splitlines()
+    except IOError:
+        return None
+    if len(lines) < 3:
+        return None
+    try:
+        numAtoms_junk = int(lines[1])
+    except ValueError:
+        return None
+    lines = lines[2:-1]
+    if "".join([line[44:] for line in lines]).strip():
+        return None # malformed results (output overflow?)
+    # (columns are fixed, and adjacent numbers might not be separated)
+    xstrs = [line[20:28] for line in lines]
+    ystrs = [line[28:36] for line in lines]
+    zstrs = [line[36:44] for line in lines]
+    for strs in (xstrs, ystrs, zstrs):
+        if "     nan" in strs:
+            return None # undefined results
+    try:
+        posns = array(map(float, xstrs + ystrs + zstrs), Float)
+    except ValueError:
+        return None
+    return transpose(reshape(posns, (3, len(lines))))
+
+def read_gromacs_positions(filename, atomList, tracefileProcessor = None):
+    """
+    Read a coordinate file created by gromacs, typically for minimizing
+    a part (as readGromacsCoordinates does).
+
+    On error, print a message to stdout and also return it to the caller.
+    On success, return a Numeric array of the new positions of the atoms
+    in atomList (in the same order), ignoring any virtual sites after them.
+    """
+    posns = _parse_gromacs_arrays(filename)
+    if posns is None or len(posns) < len(atomList):
+        res = readGromacsCoordinates(filename, atomList, tracefileProcessor)
+        if type(res) == type(""):
+            return res
+        return array(res, Float)
+    posns = posns * 10.0 + array(readGromacsTranslation(filename), Float)
+    if tracefileProcessor:
+        tracefileProcessor.newAtomPositions(posns)
+    return posns[:len(atomList)]
+
+# end
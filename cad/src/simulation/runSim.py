@@ -65,6 +65,7 @@ from simulation.PyrexSimulator import thePyrexSimulator
 from simulation.SimulatorParameters import SimulatorParameters
 from simulation.YukawaPotential import YukawaPotential
 from simulation.GromacsLog import GromacsLog
+from files.dpb_trajectory.keyframe_index import remove_keyframe_index
 
 from utilities.prefs_constants import electrostaticsForDnaDuringAdjust_prefs_key
 from utilities.prefs_constants import electrostaticsForDnaDuringMinimize_prefs_key
@@ -1394,6 +1395,7 @@ class SimRunner:
             if DEBUG_SIM:
                 print "deleting moviefile: [",moviefile,"]"
             os.remove (moviefile) # Delete before spawning simulator.
+            remove_keyframe_index(moviefile)
         return        
         #bruce 051231: here is an old comment related to remove_old_moviefile;
         # I don't know whether it's obsolete regarding the bug it warns about:
@@ -2616,6 +2618,9 @@ def readxyz(filename, alist):
        On error, print a message to stdout and also return it to the caller.
        On success, return a list of atom new positions
     in the same order as in the xyz file (hopefully the same order as in alist).
+
+    @see: read_xyz_positions in read_coordinate_arrays.py, which is
+          faster and returns an array.
     """
     from model.elements import Singlet
     
@@ -2683,13 +2688,11 @@ def readxyz(filename, alist):
 
     return newAtomsPos
 
-def readGromacsCoordinates(filename, atomList, tracefileProcessor = None):
+def readGromacsTranslation(filename):
     """
-    Read a coordinate file created by gromacs, typically for
-    minimizing a part.
-       On error, print a message to stdout and also return it to the caller.
-       On success, return a list of atom new positions
-    in the same order as in the xyz file (hopefully the same order as in alist).
+    Return the translation (dX, dY, dZ), in Angstroms, which should be added
+    to the coordinates in the given gromacs coordinate file, as recorded in
+    the .translate file written with it, or (0.0, 0.0, 0.0) if there is none.
     """
     translateFileName = None
     if (filename.endswith("-out.gro")):
@@ -2708,6 +2711,20 @@ def readGromacsCoordinates(filename, atomList, tracefileProcessor = None):
         dX = 0.0
         dY = 0.0
         dZ = 0.0
+    return dX, dY, dZ
+
+def readGromacsCoordinates(filename, atomList, tracefileProcessor = None):
+    """
+    Read a coordinate file created by gromacs, typically for
+    minimizing a part.
+       On error, print a message to stdout and also return it to the caller.
+       On success, return a list of atom new positions
+    in the same order as in the xyz file (hopefully the same order as in alist).
+
+    @see: read_gromacs_positions in read_coordinate_arrays.py, which is
+          faster and returns an array.
+    """
+    dX, dY, dZ = readGromacsTranslation(filename)
 
     try:
         lines = open(filename, "rU").readlines()
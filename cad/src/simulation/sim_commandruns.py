@@ -38,8 +38,8 @@ from simulation.runSim import FAILURE_ALREADY_DOCUMENTED
 from simulation.runSim import writemovie
 
 # these next two are only used in this file; should be split into their own file(s)
-from simulation.runSim import readxyz
-from simulation.runSim import readGromacsCoordinates
+from simulation.read_coordinate_arrays import read_xyz_positions
+from simulation.read_coordinate_arrays import read_gromacs_positions
 
 from simulation.sim_aspect import sim_aspect
 
@@ -608,13 +608,12 @@ class Minimize_CommandRun(CommandRun):
                 if (self.background):
                     return
                 tracefileProcessor = movie._simrun.tracefileProcessor
-                newPositions = readGromacsCoordinates(movie.filename + "-out.gro", movie.alist, tracefileProcessor)
+                newPositions = read_gromacs_positions(movie.filename + "-out.gro", movie.alist, tracefileProcessor)
             else:
-                newPositions = readxyz( movie.filename, movie.alist )
+                newPositions = read_xyz_positions( movie.filename, movie.alist )
                     # movie.alist is now created in writemovie [bruce 050325]
-            # retval is either a list of atom posns or an error message string.
-            assert type(newPositions) in [type([]),type("")]
-            if type(newPositions) == type([]):
+            # retval is either an array of atom posns or an error message string.
+            if type(newPositions) != type(""):
                 #bruce 060102 note: following code is approximately duplicated somewhere else in this file.
                 movie.moveAtoms(newPositions)
                 # bruce 050311 hand-merged mark's 1-line bugfix in assembly.py (rev 1.135):
@@ -0,0 +1,111 @@
+# Copyright 2009 Nanorex, Inc.  See LICENSE file for details.
+"""
+mmpbatchtests.py -- check that reading the atom and bond records of an mmp
+file in batches (see files_mmp.py) gives the same model as reading them one
+line at a time, by reading a file both ways and writing it back out
+
+@version: $Id$
+@copyright: 2009 Nanorex, Inc.  See LICENSE file for details.
+
+Run from cad/src with:
+
+  python tests/mmpbatchtests.py
+"""
+
+import sys
+import os
+import shutil
+import tempfile
+import unittest
+
+if __name__ == '__main__':
+    # make the modules in cad/src importable
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Cubane (from partlib/others/Cubane.mmp), with an unknown atom code (99)
+# in one bond record, and a bond record with only unknown atom codes
+MMP_WITH_DANGLING_BOND_CODES = """\
+mmpformat 050920 required; 080529 preferred
+kelvin 300
+group (View Data)
+egroup (View Data)
+group (Cubane)
+mol (Cubane) cpk
+atom 1 (6) (1018, 43, 714) def
+atom 2 (6) (-527, 46, 707) def
+bond1 1
+atom 3 (6) (-524, 1591, 710) def
+bond1 2
+atom 4 (6) (1020, 1589, 718) def
+bond1 1 99 3
+atom 5 (6) (-534, 43, 2254) def
+bond1 2
+atom 6 (6) (1010, 40, 2260) def
+bond1 1 5
+atom 7 (6) (-532, 1589, 2256) def
+bond1 3 5
+atom 8 (6) (1012, 1587, 2264) def
+bond1 4 6 7
+atom 9 (1) (1646, 2219, 2903) def
+bond1 8
+atom 10 (1) (-1169, 2223, 2889) def
+bond1 98
+atom 11 (1) (1642, -596, 2897) def
+bond1 6
+atom 12 (1) (-1173, -592, 2884) def
+bond1 5
+egroup (Cubane)
+end1
+group (Clipboard)
+egroup (Clipboard)
+end molecular machine part Cubane
+"""
+
+class MmpBatchReadingTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix = "mmpbatchtests-")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _read_and_write(self, text, readInBatches):
+        """
+        Read the mmp file contents text into a new Assembly (in batches
+        or not), then write that Assembly to a new mmp file, and return
+        the new file's contents.
+        """
+        from model.assembly import Assembly
+        from files.mmp.files_mmp import readmmp
+        from files.mmp.files_mmp_writing import writemmpfile_assy
+        from utilities.constants import SUCCESS
+        import foundation.env as env
+        infile = os.path.join(self.tmpdir, "in.mmp")
+        outfile = os.path.join(self.tmpdir, "out-%s.mmp" % readInBatches)
+        open(infile, "w").write(text)
+        assy = Assembly(None, run_updaters = True)
+        assy.set_glpane(None)
+        env.set_headless_main_assy(assy)
+        ok, grouplist = readmmp(assy, infile, readInBatches = readInBatches)
+        assert ok == SUCCESS
+        writemmpfile_assy(assy, outfile)
+        assy.close_assy()
+        return open(outfile, "rU").read()
+
+    def test_dangling_bond_codes(self):
+        one_at_a_time = self._read_and_write(MMP_WITH_DANGLING_BOND_CODES, False)
+        in_batches = self._read_and_write(MMP_WITH_DANGLING_BOND_CODES, True)
+        assert one_at_a_time.count("\natom ") == 12
+        assert in_batches == one_at_a_time
+
+    pass
+
+def test():
+    from ne1_startup.headless_batch import _initialize_headless
+    _initialize_headless()
+    suite = unittest.makeSuite(MmpBatchReadingTests, 'test')
+    runner = unittest.TextTestRunner()
+    runner.run(suite)
+
+if __name__ == "__main__":
+    test()
@@ -202,9 +202,17 @@ def debug_pref_read_bonds_compactly(): #bruce 080328
                  )
     return res
 
+def debug_pref_read_atoms_in_batches():
+    res = debug_pref("mmp format: read atoms and bonds in batches?",
+                     Choice_boolean_True, # use False to simulate old reading code for testing
+                     prefs_key = True
+                 )
+    return res
+
 # exercise them, to put them in the menu
 debug_pref_write_bonds_compactly()
 debug_pref_read_bonds_compactly()
+debug_pref_read_atoms_in_batches()
 
 # ==
 